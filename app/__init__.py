@@ -1,18 +1,167 @@
 # app/__init__.py
+"""
+Application factory.
+
+    from app import create_app
+    app = create_app()          # main.py does this once; gunicorn "main:app"
+
+Importing the package (or app.routes) builds nothing: no Flask app, no
+Supabase client, no openai/docx. Clients are created the first time a
+request uses them, and again in each forked worker, so
+`gunicorn --preload main:app` (see gunicorn.conf.py) is safe.
+"""
 import os
-from flask import Flask
-from app.routes import lti  # uses the Blueprint created in app/routes/__init__.py
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Modules that define @lti.route(...) for LTI core + Auth + Grader
+ROUTE_MODULES = (
+    # LTI core (launch, jwks, oidc login, AGS helpers, etc.)
+    "app.routes.lti_core",
+    # Auth (manual login, public signup, logout, etc.)
+    "app.routes.auth",
+    # Grader (grader_base page, assignments, submissions, review, grade-docx, grade-uscis-form, etc.)
+    "app.routes.grader",
+    "app.routes.lti_deep_link",
+)
+
+# Endpoints a working deployment must have; a missing one is logged at boot
+REQUIRED_ENDPOINTS = (
+    "lti.launch",               # POST /launch
+    "lti.grader_base",          # GET /grader
+    "lti.rubiqs_suite_login",   # GET/POST /rubiqs-suite-login
+    "lti.public_signup",        # GET/POST /public-signup
+    "lti.logout",
+    "lti.unauthorized",
+)
+
+
+def _import_routes(log):
+    import importlib
+
+    loaded = []
+    for m in ROUTE_MODULES:
+        try:
+            importlib.import_module(m)
+            loaded.append(m)
+        except Exception:
+            log.exception("❌ Failed importing routes module: %s", m)
+    log.debug("✅ Loaded route modules: %s", loaded)
+
 
 def create_app():
-    app = Flask(__name__, template_folder="templates", static_folder="static")
+    from datetime import timedelta
 
-    # minimal config (override with env vars in real deployments)
-    app.secret_key = os.getenv("SECRET_KEY", "dev-secret")
+    from flask import Flask, request
+    from flask_session import Session
 
-    # Register the LTI/Grader blueprint at root (so routes are /grader, /grader-base, etc.)
-    app.register_blueprint(lti, url_prefix="")
+    from app.utils.logger import configure_logging, get_logger, log_request_summary, start_request_log
 
-    return app
+    configure_logging()
+    log = get_logger(__name__)
+
+    from app.routes import lti
+    from app.supabase_client import supabase
+    from app.utils.auth_decorators import has_tool
+    from app.utils.metrics import (
+        finish_request_timer,
+        render_metrics,
+        request_elapsed,
+        request_spans,
+        start_request_timer,
+    )
+    from app.utils.session_interface import SafeSessionInterface
+    from app.utils.uploads import MAX_CONTENT_LENGTH, MAX_UPLOAD_BYTES, UploadTooLarge, close_request_uploads
+
+    app = Flask(
+        "main",
+        root_path=PROJECT_ROOT,
+        static_folder=os.path.join(PROJECT_ROOT, "static"),
+        static_url_path="/static",
+        template_folder=os.path.join(PROJECT_ROOT, "templates"),
+    )
+
+    # === Secrets / Session basics ===
+    app.secret_key = os.getenv("FLASK_SECRET", "dev-key")
+    app.permanent_session_lifetime = timedelta(days=7)
+
+    app.config.update(
+        {
+            "SESSION_TYPE": "filesystem",
+            "SESSION_FILE_DIR": "./.flask_session",
+            "SESSION_COOKIE_NAME": "lti_session",
+            "SESSION_PERMANENT": False,
+            "SESSION_USE_SIGNER": False,
+            "SESSION_COOKIE_SAMESITE": "None",  # exact casing
+            "SESSION_COOKIE_SECURE": True,  # flipped to False in dev toggle below
+            "TINYMCE_API_KEY": os.getenv("TINYMCE_API_KEY"),
+            "OPENAI_API_KEY": os.getenv("OPENAI_API_KEY"),
+            # Werkzeug answers 413 before parsing the form (see app/utils/uploads.py)
+            "MAX_CONTENT_LENGTH": MAX_CONTENT_LENGTH,
+            # Lazy client (app/supabase_client.py); created on first use per process
+            "SUPABASE": supabase,
+        }
+    )
 
-# WSGI convenience (so `gunicorn 'app:create_app()'` works or flask picks up `app`)
-app = create_app()
+    # --- Optional dev toggle so local HTTP can set cookies without Secure flag ---
+    if os.getenv("FLASK_ENV") == "development" or os.getenv("DEV_INSECURE_COOKIES") == "1":
+        app.config["SESSION_COOKIE_SECURE"] = False
+
+    # === Make has_tool available to all templates ===
+    app.jinja_env.globals.update(has_tool=has_tool)
+
+    # === Custom session interface to set cookie explicitly (with SameSite=None) ===
+    app.session_interface = SafeSessionInterface(
+        cache_dir=app.config["SESSION_FILE_DIR"], threshold=500, mode=0o600, key_prefix=""
+    )
+    Session(app)
+
+    # === ROUTE WIRING (Grader-only; no url_prefix → routes keep their declared paths) ===
+    _import_routes(log)
+    if "lti" not in app.blueprints:
+        app.register_blueprint(lti)
+
+    # ---------- Request timing / logging ----------
+    request_log = get_logger("request")
+
+    @app.before_request
+    def log_every_request():
+        start_request_timer()
+        start_request_log()
+        request_log.debug("📥 %s %s", request.method, request.path)
+
+    @app.after_request
+    def _record_request_timing(response):
+        response = finish_request_timer(response)
+        if request.endpoint == "static":
+            return response
+        return log_request_summary(response, request_elapsed(), request_spans())
+
+    app.teardown_request(close_request_uploads)
+
+    @app.errorhandler(413)
+    @app.errorhandler(UploadTooLarge)
+    def _upload_too_large(e):
+        return UploadTooLarge(getattr(e, "limit", MAX_UPLOAD_BYTES)).message, 413
+
+    # ---------- Minimal test/dev & diagnostics ----------
+    @app.route("/")
+    def index():
+        return "🚀 Rubiqs Grader LTI is live!"
+
+    @app.route("/health")
+    def health():
+        return {"ok": True}
+
+    @app.route("/metrics")
+    def metrics():
+        # Prometheus text exposition (per worker process)
+        return render_metrics(), 200, {"Content-Type": "text/plain; version=0.0.4; charset=utf-8"}
+
+    endpoints = {rule.endpoint for rule in app.url_map.iter_rules()}
+    missing = [ep for ep in REQUIRED_ENDPOINTS if ep not in endpoints]
+    if missing:
+        log.warning("⚠️ Missing endpoints: %s", missing)
+    log.debug("URL map:\n%s", app.url_map)
+
+    return app
@@ -0,0 +1,975 @@
+# app/asgi_grader.py
+"""
+ASGI entrypoint: async grading routes in front of the existing Flask app.
+
+    uvicorn app.asgi_grader:app --host 0.0.0.0 --port 8000 --workers 2
+
+POST /grade-docx and POST /grade-uscis-form are served here as coroutines:
+PostgREST, Storage, rubric downloads and the LLM go through httpx's async
+clients, so one process can hold hundreds of gradings waiting on the model.
+CPU/blocking pieces (multipart parsing, docx/PDF extraction, rubric parsing,
+the LMS passback) run in the default thread pool. Every other path is handed
+to the Flask app unchanged (asgiref's WsgiToAsgi), so the WSGI deployment and
+this one serve the same site. WsgiToAsgi alone runs every Flask request on one
+thread per process; here they get their own pool of ASGI_WSGI_THREADS (default
+32), so an open /grader-submissions/stream holds one thread, not the process.
+
+Sessions are the Flask-Session files: the `lti_session` cookie is looked up in
+the same FileSystemCache the Flask app uses and written back if changed.
+Responses render the same templates inside a Flask request context.
+"""
+import asyncio
+import contextvars
+import json
+import os
+import tempfile
+import time
+import uuid
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from http.cookies import SimpleCookie
+from urllib.parse import parse_qsl
+
+from concurrent.futures import ThreadPoolExecutor
+
+from asgiref.sync import sync_to_async
+from asgiref.wsgi import WsgiToAsgi, WsgiToAsgiInstance
+from flask import render_template
+from werkzeug.formparser import parse_form_data
+from werkzeug.utils import secure_filename
+
+from main import app as flask_app
+
+from app.routes.grader import UPLOAD_JOIN_TIMEOUT, post_grade_to_lms
+from app.utils.ai_usage_logger import log_ai_usage
+from app.utils.async_llm import LLMError
+from app.utils.async_llm import aclose as close_llm
+from app.utils import previews, rls_tokens
+from app.utils.async_supabase import AsyncSupabase
+from app.utils.content_store import content_key, release_object
+from app.utils.dashboard_cache import DASHBOARDS
+from app.utils.dashboard_cache import invalidate_for_session as invalidate_dashboards
+from app.utils.content_store import public_url as content_public_url
+from app.utils.extractor import extract_filled_fields_from_pdf, extract_pdf_text
+from app.utils.gpt_logging import log_gpt_interaction
+from app.utils.grading_functions import (
+    compare_answer_key_fields,
+    compare_fields_i130a,
+    compare_fields_i765,
+    compare_fields_n400,
+    delay_hours_for,
+    parse_rubric,
+    parse_score_feedback,
+)
+from app.utils.llm_scheduler import QUEUE_WAIT_SECONDS, SCHEDULER, estimate_tokens, queued_message
+from app.utils.logger import get_logger
+from app.utils.metrics import REGISTRY, REQUEST_METRIC, STAGE_METRIC
+from app.utils.model_router import complete_async, model_tiers
+from app.utils.prompt_templates import TEMPLATES, compile_template
+from app.utils.similarity import SIMILARITY, check_result, signature
+from app.utils.submission_events import publish_submission
+from app.utils.structured_grading import run_async as run_structured
+from app.utils.text_utils import normalize_title
+from app.utils.uploads import MAX_CONTENT_LENGTH, SPOOL_MEMORY_BYTES, SpooledUpload, UploadTooLarge
+
+log = get_logger(__name__)
+
+DEV_FAKE_UID = "00000000-0000-0000-0000-000000000001"
+CUSTOM_CLAIM = "https://purl.imsglobal.org/spec/lti/claim/custom"
+RESOURCE_LINK_CLAIM = "https://purl.imsglobal.org/spec/lti/claim/resource_link"
+ROLES_CLAIM = "https://purl.imsglobal.org/spec/lti/claim/roles"
+
+WSGI_THREADS = int(os.getenv("ASGI_WSGI_THREADS", "32"))
+
+db = AsyncSupabase()
+# This request's PostgREST client once its RLS uid is known (see _set_client_uid)
+_request_db = contextvars.ContextVar("request_db", default=None)
+_background = set()  # strong refs to fire-and-forget tasks
+
+
+class _Abort(Exception):
+    """Short-circuit a handler with a plain response (mirrors `return "...", status`)."""
+
+    def __init__(self, body: str, status: int = 400, content_type="text/html; charset=utf-8"):
+        super().__init__(body)
+        self.body = body
+        self.status = status
+        self.content_type = content_type
+
+
+# ---------- per-request context ----------
+class _Ctx:
+    def __init__(self, scope, endpoint):
+        self.scope = scope
+        self.endpoint = endpoint
+        self.path = scope.get("path", "")
+        self.headers = {k.decode("latin-1").lower(): v.decode("latin-1") for k, v in scope.get("headers", [])}
+        self.args = dict(parse_qsl(scope.get("query_string", b"").decode("latin-1")))
+        self.request_id = self.headers.get("x-request-id") or os.urandom(6).hex()
+        self.t0 = time.perf_counter()
+        self.spans = []
+        self.fields = {}
+        self.form = {}
+        self.files = {}
+        self.session = {}
+        self.sid = None
+        self.session_modified = False
+        self.queued_ticket = None  # cancelled after the response unless handed to a background task
+        self.upload_task = None  # released after the response unless a saved row references it
+
+    @contextmanager
+    def span(self, stage: str):
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(stage, time.perf_counter() - t0)
+
+    def record(self, stage: str, elapsed: float):
+        self.spans.append((stage, elapsed))
+        REGISTRY.observe(STAGE_METRIC, elapsed, stage=stage, endpoint=self.endpoint)
+
+    def set_session(self, key, value):
+        self.session[key] = value
+        self.session_modified = True
+
+
+# ---------- session (Flask-Session files) ----------
+def _load_session(ctx: _Ctx):
+    cookie = SimpleCookie(ctx.headers.get("cookie", ""))
+    name = flask_app.config.get("SESSION_COOKIE_NAME", "lti_session")
+    if name not in cookie:
+        return
+    si = flask_app.session_interface
+    ctx.sid = cookie[name].value
+    ctx.session = dict(si.cache.get(si.key_prefix + ctx.sid) or {})
+
+
+def _save_session(ctx: _Ctx):
+    if not (ctx.sid and ctx.session_modified):
+        return
+    si = flask_app.session_interface
+    si.cache.set(
+        si.key_prefix + ctx.sid,
+        dict(ctx.session),
+        int(flask_app.permanent_session_lifetime.total_seconds()),
+    )
+
+
+# ---------- body ----------
+async def _read_form(ctx: _Ctx, receive):
+    declared = int(ctx.headers.get("content-length") or 0)
+    if declared > MAX_CONTENT_LENGTH:
+        raise UploadTooLarge(MAX_CONTENT_LENGTH)
+
+    body = tempfile.SpooledTemporaryFile(max_size=SPOOL_MEMORY_BYTES)
+    size = 0
+    while True:
+        msg = await receive()
+        if msg["type"] == "http.disconnect":
+            body.close()
+            raise _Abort("client disconnected", 499)
+        chunk = msg.get("body", b"")
+        size += len(chunk)
+        if size > MAX_CONTENT_LENGTH:
+            body.close()
+            raise UploadTooLarge(MAX_CONTENT_LENGTH)
+        body.write(chunk)
+        if not msg.get("more_body"):
+            break
+    body.seek(0)
+
+    environ = {
+        "REQUEST_METHOD": "POST",
+        "CONTENT_TYPE": ctx.headers.get("content-type", ""),
+        "CONTENT_LENGTH": str(size),
+        "wsgi.input": body,
+    }
+    _, form, files = await asyncio.to_thread(parse_form_data, environ)
+    ctx.form, ctx.files = form, files
+
+
+# ---------- storage (content-addressed, same keys as the sync path) ----------
+async def _store_upload(bucket: str, upload: SpooledUpload):
+    """(public URL, seconds). Skips the transfer if the object already exists."""
+    t0 = time.perf_counter()
+    key = content_key(upload.sha256, upload.filename)
+    if not await db.object_exists(bucket, key):
+        payload = upload.payload()
+        try:
+            await db.upload(bucket, key, payload, upload.content_type)
+        finally:
+            if hasattr(payload, "close"):
+                payload.close()
+    return content_public_url(bucket, key), time.perf_counter() - t0
+
+
+async def _release_unsaved_upload(task):
+    """Drop a grade_docx upload whose submission row was never written."""
+    try:
+        url, _ = await task
+        await asyncio.to_thread(release_object, "submissions", url)
+    except Exception as e:
+        log.warning("⚠️ Releasing an unsaved submission upload failed: %s", e)
+
+
+async def _join_upload(ctx: _Ctx, task):
+    try:
+        with ctx.span("upload_wait"):
+            url, elapsed = await asyncio.wait_for(task, UPLOAD_JOIN_TIMEOUT)
+        ctx.record("upload", elapsed)
+        return url
+    except Exception as e:
+        log.warning("⚠️ Upload to submissions bucket failed (continuing without preview): %s", str(e))
+        return None
+
+
+# ---------- shared steps ----------
+def _is_uuid(v) -> bool:
+    try:
+        uuid.UUID(str(v))
+        return True
+    except Exception:
+        return False
+
+
+async def _set_client_uid(uid):
+    if rls_tokens.enabled():
+        # Locally minted JWT: the identity rides on every later query, no RPC
+        _request_db.set(db.as_user(rls_tokens.token_for(uid)))
+        return
+    try:
+        await db.rpc("set_client_uid", {"uid": str(uid)})
+    except Exception as e:
+        log.warning("⚠️ set_client_uid RPC failed (continuing): %s", str(e))
+
+
+def _db() -> AsyncSupabase:
+    return _request_db.get() or db
+
+
+async def _fetch(url: str):
+    resp = await db.get(url)
+    resp.raise_for_status()
+    return resp
+
+
+def _render(ctx: _Ctx, template: str, **kwargs) -> str:
+    with flask_app.test_request_context(ctx.path, headers={"Cookie": ctx.headers.get("cookie", "")}):
+        return render_template(template, **kwargs)
+
+
+def _write_debug(path: str, text: str):
+    with open(path, "w") as f:
+        f.write(text)
+
+
+async def _resolve_grader_assignment(ctx: _Ctx, launch_data: dict):
+    """Async twin of resolve_assignment_from_launch: slug arg > custom slug > resource_link title."""
+    base = [("tool", "eq.grader")]
+    for slug in (
+        (ctx.args.get("slug") or "").strip().lower(),
+        ((launch_data.get(CUSTOM_CLAIM) or {}).get("assignment_slug") or "").strip().lower(),
+    ):
+        if slug:
+            rows = await db.select("assignments", filters=[*base, ("slug", f"eq.{slug}")], limit=1)
+            if rows:
+                a = rows[0]
+                return a, (a.get("display_title") or a.get("assignment_title")), a.get("slug")
+
+    title = ((launch_data.get(RESOURCE_LINK_CLAIM) or {}).get("title") or "").strip()
+    if title:
+        rows = await db.select(
+            "assignments",
+            filters=[*base, ("or", f"(display_title.eq.{title},assignment_title.eq.{title})")],
+            limit=1,
+        )
+        if rows:
+            a = rows[0]
+            return a, (a.get("display_title") or a.get("assignment_title")), a.get("slug")
+    return None, None, None
+
+
+async def _uscis_assignment_for_title(title: str) -> dict:
+    try:
+        return await db.select(
+            "uscis_assignments",
+            "assignment_id, assignment_title, form_type",
+            filters=[("assignment_title", f"eq.{title}")],
+            single=True,
+        )
+    except Exception:
+        pass
+    try:
+        rows = await db.select(
+            "uscis_assignments",
+            "assignment_id, assignment_title, form_type",
+            filters=[("assignment_title", f"ilike.*{title}*")],
+            limit=1,
+        )
+        return rows[0] if rows else {}
+    except Exception:
+        return {}
+
+
+async def _grader_template(ctx: _Ctx, assignment_title: str, assignment_config: dict):
+    """Cached compiled prompt (shared with the WSGI routes); rubric fetched + parsed on a miss."""
+    tpl = TEMPLATES.get(assignment_title, assignment_config)
+    if tpl is not None:
+        return tpl
+    rubric_url = assignment_config.get("rubric_file", "")
+    with ctx.span("rubric_fetch"):
+        r = await db.get(rubric_url)
+    if r.status_code != 200:
+        raise _Abort(f"❌ Failed to download rubric file. Status {r.status_code}", 500)
+    rubric_text, rubric_total_points, rubric_json = await asyncio.to_thread(
+        parse_rubric,
+        r.content,
+        rubric_url,
+        assignment_config.get("total_points", 100),
+        assignment_config.get("total_points", 10),
+    )
+    return TEMPLATES.put(
+        assignment_title,
+        assignment_config,
+        compile_template(assignment_title, assignment_config, rubric_text, rubric_total_points, rubric_json),
+    )
+
+
+async def _grade_with_llm(route, tiers, tpl, student_text, max_tokens=1000) -> dict:
+    """Async twin of grader._grade_with_llm (structured output for criteria rubrics)."""
+
+    async def call(messages, **kw):
+        return await complete_async(route, tiers, messages, temperature=0.5, max_tokens=max_tokens, **kw)
+
+    llm_t0 = time.perf_counter()
+    if tpl.structured:
+        result = await run_structured(call, tpl.messages(student_text), tpl.criteria)
+        if not result.complete:
+            log.warning("⚠️ Structured grade incomplete after %s repair(s)", result.repairs)
+        return {
+            "score": result.score,
+            "feedback": result.feedback,
+            "criterion_scores": result.criterion_scores(),
+            "model": result.model,
+            "usage": result.usage,
+            "latency_ms": (time.perf_counter() - llm_t0) * 1000.0,
+        }
+    resp, model = await call(tpl.messages(student_text))
+    score, feedback = parse_score_feedback(resp["choices"][0]["message"]["content"])
+    if score is None:
+        # Left ungraded for review rather than recorded as a 0
+        log.warning("⚠️ No \"Score:\" line in the %s completion (model %s)", route, model)
+    return {
+        "score": score,
+        "feedback": feedback,
+        "criterion_scores": None,
+        "model": model,
+        "usage": resp.get("usage", {}),
+        "latency_ms": (time.perf_counter() - llm_t0) * 1000.0,
+    }
+
+
+async def _finish_queued_grading(ticket, table, submission_id, tiers, tpl, student_text, usage_fields, course_id=None):
+    """Grade a submission that was saved while still queued, once its slot is granted."""
+    await ticket.wait_async()
+    try:
+        graded = await _grade_with_llm("grade_docx", tiers, tpl, student_text)
+    except Exception as e:
+        log.error("❌ Queued grading failed for %s: %s", submission_id, str(e))
+        await db.update(table, {"feedback": f"❌ GPT error: {str(e)}"}, [("submission_id", f"eq.{submission_id}")])
+        return
+    finally:
+        ticket.release()
+
+    log_ai_usage(
+        **usage_fields,
+        model=graded["model"],
+        usage=graded["usage"],
+        latency_ms=graded["latency_ms"],
+        submission_id=submission_id,
+    )
+    update = {"score": graded["score"], "feedback": graded["feedback"], "grading_model": graded["model"]}
+    if graded["criterion_scores"] is not None:
+        update["criterion_scores"] = graded["criterion_scores"]
+    await db.update(table, update, [("submission_id", f"eq.{submission_id}")])
+    DASHBOARDS.invalidate(usage_fields.get("institution_id"))
+    if table == "submissions":
+        await asyncio.to_thread(
+            publish_submission,
+            {"submission_id": submission_id, "score": graded["score"]},
+            institution_id=usage_fields.get("institution_id"),
+            course_id=course_id,
+        )
+
+
+def _spawn(coro):
+    task = asyncio.create_task(coro)
+    _background.add(task)
+    task.add_done_callback(_background.discard)
+    return task
+
+
+# ---------- POST /grade-docx ----------
+async def grade_docx(ctx: _Ctx):
+    session = ctx.session
+    launch_data = session.get("launch_data", {}) or {}
+
+    with ctx.span("resolve"):
+        assignment_row, resolved_title, _ = await _resolve_grader_assignment(ctx, launch_data)
+    if not assignment_row:
+        raise _Abort("❌ Assignment not found. Please contact your instructor.", 400)
+
+    assignment_title = resolved_title or (assignment_row.get("assignment_title") or "")
+    assignment_config = assignment_row
+    assignment_id_db = assignment_row.get("assignment_id")
+
+    gpt_model = assignment_config.get("gpt_model", "gpt-4")
+    delay_hours = delay_hours_for(assignment_config.get("delay_posting", "immediate"))
+    rubric_url = assignment_config.get("rubric_file", "")
+    file = ctx.files.get("file")
+    inline_text = (ctx.form.get("inline_text") or "").strip()
+
+    if (not file or file.filename.strip() == "") and not inline_text:
+        raise _Abort("❌ No submission detected. Please upload a file or enter text.", 400)
+
+    full_text = ""
+    score = 0
+    total = 0
+    feedback = ""
+    incorrect_fields = []
+    rubric_total_points = assignment_config.get("total_points", 100)
+    upload_task = None
+    queued_ticket = None
+    grading_model = None
+    criterion_scores = None
+
+    if file:
+        file_ext = os.path.splitext(file.filename.lower())[-1]
+        # Requests we would turn away anyway are refused before anything is stored
+        answer_key_url = assignment_config.get("answer_key_file") or rubric_url
+        if gpt_model == "json" and file_ext != ".pdf":
+            raise _Abort("❌ Grading mode is set to Answer Key (JSON), but file is not a PDF.", 400)
+        if gpt_model == "json" and not answer_key_url:
+            raise _Abort("❌ No answer key found for this assignment.", 400)
+        if gpt_model != "json" and file_ext not in (".pdf", ".docx"):
+            raise _Abort("❌ Unsupported file type. Please upload .docx or .pdf", 400)
+
+        upload = await asyncio.to_thread(SpooledUpload.from_filestorage, file)
+        upload.filename = secure_filename(file.filename.lower())
+        # Overlaps extraction + grading; joined just before the insert
+        upload_task = ctx.upload_task = _spawn(_store_upload("submissions", upload))
+        if file_ext in previews.PREVIEW_EXTS:
+            previews.schedule(upload.sha256, file_ext, upload.payload())
+
+        try:
+            if gpt_model == "json":
+                with ctx.span("extract"):
+                    raw_fields = await asyncio.to_thread(_extract_fields, upload)
+
+                with ctx.span("rubric_fetch"):
+                    answer_key = (await _fetch(answer_key_url)).json()
+
+                result = await asyncio.to_thread(compare_answer_key_fields, raw_fields, answer_key)
+                score, total = result["score"], result["total"]
+                feedback = result["feedback"]
+                incorrect_fields = result.get("incorrect_fields", [])
+                full_text = json.dumps(raw_fields, indent=2)
+                await asyncio.to_thread(_write_debug, os.path.join("data", "last_mapped_fields.json"), full_text)
+            else:
+                with ctx.span("extract"):
+                    full_text = await asyncio.to_thread(_extract_text, upload, file_ext)
+        except _Abort:
+            raise
+        except Exception:
+            log.exception("❌ Critical grading failure")
+            raise _Abort(
+                _render(
+                    ctx,
+                    "feedback.html",
+                    pending_message="❌ Something went wrong while processing your submission. Please try again or contact your instructor.",
+                ),
+                200,
+            )
+    else:
+        full_text = inline_text
+
+    # ---------- LLM rubric scoring (non-JSON mode) ----------
+    if gpt_model != "json":
+        try:
+            tpl = await _grader_template(ctx, assignment_title, assignment_config)
+            rubric_total_points = tpl.total_points
+
+            usage_fields = {
+                "user_id": session.get("user_id"),
+                "institution_id": session.get("institution_id"),
+                "tool": "grader",
+                "assignment_id": assignment_id_db or assignment_title,
+            }
+            # In memory only (quota totals are refreshed by the usage ledger's thread): safe on the loop
+            ticket = SCHEDULER.enqueue(session.get("institution_id"), estimate_tokens(tpl.render(full_text)))
+            with ctx.span("llm_queue"):
+                granted = await ticket.wait_async(QUEUE_WAIT_SECONDS)
+            if not granted:
+                queued_ticket = ctx.queued_ticket = ticket
+                score = None
+                feedback = queued_message(ticket.position(), ticket.eta_seconds())
+            else:
+                try:
+                    with ctx.span("llm"):
+                        graded = await _grade_with_llm("grade_docx", model_tiers(assignment_config), tpl, full_text)
+                finally:
+                    ticket.release()
+                log_ai_usage(
+                    **usage_fields,
+                    model=graded["model"],
+                    usage=graded["usage"],
+                    latency_ms=graded["latency_ms"],
+                )
+                score, feedback = graded["score"], graded["feedback"]
+                grading_model = graded["model"]
+                criterion_scores = graded["criterion_scores"]
+        except _Abort:
+            raise
+        except LLMError as e:
+            raise _Abort(f"❌ GPT error: {str(e)}", 500)
+        except Exception as e:
+            raise _Abort(f"❌ Rubric or prompt error: {str(e)}", 500)
+
+    # ---------- RLS uid ----------
+    if not session.get("student_id"):
+        ctx.set_session("student_id", launch_data.get("sub"))
+    _uid = session.get("student_id") or session.get("user_id")
+    effective_uid = _uid if _is_uuid(_uid) else os.getenv("DEV_FAKE_UID", DEV_FAKE_UID)
+    await _set_client_uid(effective_uid)
+
+    student_file_url = await _join_upload(ctx, upload_task) if upload_task else None
+
+    # ---------- Near-duplicate check ----------
+    similarity_key = str(assignment_id_db or assignment_title)
+    with ctx.span("similarity"):
+        # signature hashing and a partition's first load from SQLite both block
+        text_signature = await asyncio.to_thread(signature, full_text)
+        similar = await asyncio.to_thread(SIMILARITY.query, similarity_key, text_signature, student_id=_uid)
+
+    # ---------- Row ----------
+    submission_id = str(uuid.uuid4())
+    now = datetime.utcnow()
+    release_time = now + timedelta(hours=delay_hours)
+    ready_to_post = delay_hours == 0 and not assignment_config.get("instructor_approval", False)
+    if gpt_model != "json":
+        # Grader (non-JSON) submissions always go through the review queue
+        ready_to_post = False
+    ctx.fields.update(
+        submission_id=submission_id,
+        assignment=assignment_title,
+        model=gpt_model,
+        grading_model=grading_model,
+        submission_type="inline" if inline_text else "file",
+        score=score,
+    )
+
+    arow = await _uscis_assignment_for_title(assignment_title)
+    cfg_ft = assignment_config.get("form_type")
+    cfg_type = assignment_config.get("assignment_type")
+    is_nomas = bool(arow) or bool(
+        (cfg_ft and cfg_ft.strip()) or (cfg_type and cfg_type.lower() == "uscis") or gpt_model == "json"
+    )
+
+    try:
+        if is_nomas:
+            payload = {
+                "submission_id": submission_id,
+                "student_id": session["student_id"],
+                "assignment_title": assignment_title,
+                "form_type": ((arow or {}).get("form_type") or cfg_ft or "").lower(),
+                "submission_time": now.isoformat() + "Z",
+                "submitted_at": now.isoformat() + "Z",
+                "score": score,
+                "total": total,
+                "feedback": feedback,
+                "incorrect_fields": incorrect_fields if gpt_model == "json" else [],
+                "student_file_url": student_file_url,
+                "student_text": full_text,
+                "delay_hours": delay_hours,
+                "release_time": release_time.isoformat(),
+                "ready_to_post": ready_to_post,
+                "pending": not ready_to_post,
+                "reviewed": False,
+                "instructor_notes": "",
+            }
+            if grading_model:
+                payload["grading_model"] = grading_model
+            if criterion_scores is not None:
+                payload["criterion_scores"] = criterion_scores
+            with ctx.span("db_insert"):
+                await _db().insert("uscis_submissions", payload)
+        else:
+            legacy_sid_text = str(session.get("student_id") or session.get("user_id") or effective_uid)
+            row = {
+                "submission_id": submission_id,
+                "tool": "grader",
+                "student_id": effective_uid,
+                "institution_id": session.get("institution_id"),
+                "course_id": session.get("course_id", "demo_course"),
+                "student_id_text_old": legacy_sid_text,
+                "assignment_title": assignment_title,
+                "submission_time": now.isoformat() + "Z",
+                "release_time": release_time.isoformat(),
+                "score": score,
+                "feedback": feedback,
+                "grading_model": grading_model,
+                "criterion_scores": criterion_scores,
+                "ai_check_result": check_result(similar) if text_signature else None,
+                "pending": not ready_to_post,
+                "reviewed": False,
+                "ready_to_post": ready_to_post,
+                "submission_type": "inline" if inline_text else "file",
+                "student_text": full_text,
+                "student_file_url": student_file_url,
+            }
+            try:
+                with ctx.span("db_insert"):
+                    await _db().insert("submissions", row)
+            except Exception as e:
+                log.error("❌ Supabase insert error: %s", e)
+                minimal_row = {
+                    k: row[k]
+                    for k in (
+                        "submission_id", "tool", "student_id", "student_id_text_old", "assignment_title",
+                        "submission_time", "pending", "reviewed", "ready_to_post", "score", "feedback",
+                    )
+                }
+                with ctx.span("db_insert"):
+                    await _db().insert("submissions", minimal_row)
+            await asyncio.to_thread(publish_submission, row)
+    except Exception as e:
+        log.exception("💥 Insert to Supabase failed completely: %s", repr(e))
+        raise _Abort("❌ Failed to save your submission (DB error). Please contact your instructor.", 500)
+
+    ctx.upload_task = None  # the row references it now
+    SIMILARITY.add(similarity_key, submission_id, text_signature, student_id=_uid)
+
+    if queued_ticket is not None:
+        ctx.queued_ticket = None  # the task owns it now
+        _spawn(
+            _finish_queued_grading(
+                queued_ticket,
+                "uscis_submissions" if is_nomas else "submissions",
+                submission_id,
+                model_tiers(assignment_config),
+                tpl,
+                full_text,
+                usage_fields,
+                session.get("course_id", "demo_course"),
+            )
+        )
+        return _render(ctx, "feedback.html", pending_message=feedback)
+
+    try:
+        log_gpt_interaction(assignment_title, full_text, feedback, score)
+    except Exception as e:
+        log.error("❌ GPT log failed: %s", str(e))
+
+    if assignment_config.get("instructor_approval"):
+        return _render(
+            ctx,
+            "feedback.html",
+            pending_message="✅ This submission requires instructor review. Your feedback will be posted after approval.",
+        )
+    if delay_hours > 0:
+        return _render(ctx, "feedback.html", pending_message=f"⏳ This submission will be released after {delay_hours} hour(s).")
+
+    if session.get("platform") == "canvas":
+        try:
+            with ctx.span("ags_post"):
+                await asyncio.to_thread(post_grade_to_lms, session, score, feedback)
+        except Exception as e:
+            log.error("❌ AGS post failed: %s", str(e))
+
+    return _render(
+        ctx,
+        "feedback.html",
+        feedback=feedback,
+        score=score if gpt_model != "json" else total - len(incorrect_fields),
+        rubric_total_points=rubric_total_points if gpt_model != "json" else total,
+        user_roles=launch_data.get(ROLES_CLAIM, []),
+    )
+
+
+def _extract_fields(upload: SpooledUpload) -> dict:
+    with upload.open() as fh:
+        return extract_filled_fields_from_pdf(fh)
+
+
+def _extract_text(upload: SpooledUpload, file_ext: str) -> str:
+    with upload.open() as fh:
+        if file_ext == ".pdf":
+            return extract_pdf_text(fh)
+        from docx import Document
+
+        return "\n".join(p.text for p in Document(fh).paragraphs if p.text.strip())
+
+
+# ---------- POST /grade-uscis-form ----------
+async def grade_uscis_form(ctx: _Ctx):
+    session = ctx.session
+    launch_data = session.get("launch_data", {}) or {}
+    resource_link = launch_data.get(RESOURCE_LINK_CLAIM, {})
+    assignment_title = normalize_title(
+        str(resource_link.get("title") or f"Assignment-{resource_link.get('id')}" or "Untitled Assignment").strip()
+    )
+
+    assignment_config = {}
+    try:
+        with ctx.span("resolve"):
+            assignment_config = await db.select(
+                "uscis_assignments", filters=[("assignment_title", f"eq.{assignment_title}")], single=True
+            )
+    except Exception as e:
+        log.warning("⚠️ uscis_assignments lookup failed: %s", str(e))
+    if not assignment_config:
+        from app.launch_utils import load_assignment_config
+
+        assignment_config = load_assignment_config(assignment_title) or {}
+
+    form_type = (assignment_config.get("form_type") or "").lower()
+    if not form_type:
+        raise _Abort(
+            "❌ No form_type found for this assignment. "
+            "Please ensure the assignment was created with a form type in NoMas.",
+            400,
+        )
+
+    file = ctx.files.get("file")
+    if not file or not file.filename.lower().endswith(".pdf"):
+        raise _Abort("❌ Please upload a valid PDF file.", 400)
+
+    upload = await asyncio.to_thread(SpooledUpload.from_filestorage, file)
+    upload.filename = secure_filename(file.filename.lower())
+    try:
+        with ctx.span("extract"):
+            raw_fields = await asyncio.to_thread(_extract_fields, upload)
+        # Upload failure is fatal here, as in the WSGI route
+        url, elapsed = await _store_upload("submissions", upload)
+        ctx.record("upload", elapsed)
+        student_file_url = url
+        previews.schedule(upload.sha256, ".pdf", upload.payload())
+    except Exception as e:
+        log.error("❌ PDF extraction failed: %s", str(e))
+        raise _Abort("❌ Failed to process the uploaded form. Please contact your instructor.", 500)
+
+    rubric_url = (
+        assignment_config.get("answer_key_file")
+        or assignment_config.get("rubric_file")
+        or assignment_config.get("rubric_file_url")
+    )
+    if not rubric_url:
+        raise _Abort("❌ This assignment is missing an answer key. Please contact your instructor.", 400)
+
+    try:
+        with ctx.span("rubric_fetch"):
+            answer_key_json = (await _fetch(rubric_url)).json()
+    except Exception as e:
+        log.error("❌ Failed to load answer key from URL: %s (%s)", rubric_url, e)
+        raise _Abort("❌ Could not retrieve answer key. Please contact your instructor.", 500)
+
+    compare = {"n400": compare_fields_n400, "i765": compare_fields_i765, "i130a": compare_fields_i130a}.get(form_type)
+    if compare is None:
+        raise _Abort(
+            json.dumps({"error": f"❌ Unsupported form type '{form_type}'."}), 400, "application/json"
+        )
+    result = await asyncio.to_thread(compare, raw_fields, answer_key_json)
+    score, total = result["score"], result["total"]
+    feedback = result["feedback"]
+    incorrect_fields = result["incorrect_fields"]
+    ctx.fields.update(assignment=assignment_title, form_type=form_type, score=score, total=total)
+
+    full_text = json.dumps(raw_fields, indent=2)
+    await asyncio.to_thread(_write_debug, os.path.join("data", "last_mapped_fields.json"), full_text)
+
+    if not session.get("student_id"):
+        ctx.set_session("student_id", launch_data.get("sub"))
+    await _set_client_uid(session["student_id"])
+
+    now = datetime.utcnow()
+    delay_hours = delay_hours_for(assignment_config.get("delay_posting", "immediate"))
+    release_time = now + timedelta(hours=delay_hours)
+    ready_to_post = delay_hours == 0 and not assignment_config.get("instructor_approval", False)
+
+    submission_data = {
+        "submission_id": str(uuid.uuid4()),
+        "student_id": session["student_id"],
+        "assignment_title": assignment_title,
+        "course_id": session.get("course_id", "demo_course"),
+        "institution_id": session.get("institution_id"),
+        "submission_time": now.isoformat(),
+        "score": score,
+        "feedback": feedback,
+        "submission_type": "file",
+        "student_text": full_text,
+        "student_file_url": student_file_url,
+        "ai_check_result": None,
+        "instructor_notes": "",
+        "delay_hours": delay_hours,
+        "ready_to_post": ready_to_post,
+        "pending": not ready_to_post,
+        "reviewed": False,
+        "release_time": release_time.isoformat(),
+        "incorrect_fields": incorrect_fields,
+    }
+    uscis_payload = {
+        k: submission_data[k]
+        for k in (
+            "submission_id", "student_id", "assignment_title", "submission_time", "score", "feedback",
+            "student_file_url", "student_text", "incorrect_fields", "delay_hours", "release_time",
+            "ready_to_post", "pending", "reviewed", "instructor_notes",
+        )
+    }
+    uscis_payload.update(form_type=form_type, total=total)
+
+    try:
+        with ctx.span("db_insert"):
+            await _db().insert("uscis_submissions", uscis_payload)
+    except Exception as e:
+        log.error("❌ uscis_submissions insert failed: %s", repr(e))
+        try:
+            with ctx.span("db_insert"):
+                await _db().insert("submissions", submission_data)
+        except Exception as e2:
+            log.error("❌ Legacy submissions insert also failed: %s", repr(e2))
+
+    try:
+        log_gpt_interaction(assignment_title, full_text, feedback, score)
+    except Exception as e:
+        log.error("❌ GPT log failed: %s", str(e))
+
+    if assignment_config.get("instructor_approval"):
+        return _render(ctx, "feedback.html", pending_message="✅ Submission received. Awaiting instructor approval.")
+    if delay_hours > 0:
+        return _render(ctx, "feedback.html", pending_message=f"⏳ Feedback will be released in {delay_hours} hour(s).")
+    if session.get("platform") == "canvas":
+        try:
+            with ctx.span("ags_post"):
+                await asyncio.to_thread(post_grade_to_lms, session, score, feedback)
+        except Exception as e:
+            log.error("❌ Canvas grade passback failed: %s", str(e))
+    return _render(ctx, "feedback.html", feedback=feedback, score=score, rubric_total_points=total)
+
+
+# ---------- ASGI app ----------
+ROUTES = {
+    ("POST", "/grade-docx"): ("asgi.grade_docx", grade_docx),
+    ("POST", "/grade-uscis-form"): ("asgi.grade_uscis_form", grade_uscis_form),
+}
+
+
+class AsyncGraderApp:
+    def __init__(self, fallback):
+        self.fallback = fallback
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "lifespan":
+            return await self._lifespan(receive, send)
+        if scope["type"] == "http":
+            route = ROUTES.get((scope.get("method"), scope.get("path")))
+            if route is not None:
+                return await self._handle(scope, receive, send, *route)
+        return await self.fallback(scope, receive, send)
+
+    async def _lifespan(self, receive, send):
+        while True:
+            msg = await receive()
+            if msg["type"] == "lifespan.startup":
+                await send({"type": "lifespan.startup.complete"})
+            elif msg["type"] == "lifespan.shutdown":
+                if _background:
+                    # Queued gradings already have their rows saved; give them a chance to finish
+                    await asyncio.wait(set(_background), timeout=30)
+                await db.aclose()
+                await close_llm()
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+
+    async def _handle(self, scope, receive, send, endpoint, handler):
+        ctx = _Ctx(scope, endpoint)
+        status, content_type = 200, "text/html; charset=utf-8"
+        try:
+            await asyncio.to_thread(_load_session, ctx)
+            await _read_form(ctx, receive)
+            body = await handler(ctx)
+        except _Abort as a:
+            body, status, content_type = a.body, a.status, a.content_type
+        except UploadTooLarge as e:
+            body, status = e.message, 413
+        except Exception:
+            log.exception("💥 Unhandled error in %s", endpoint)
+            body, status = "Internal Server Error", 500
+        finally:
+            for f in ctx.files.values():
+                f.close()
+            if ctx.queued_ticket is not None:
+                ctx.queued_ticket.cancel()
+            if ctx.upload_task is not None:
+                _spawn(_release_unsaved_upload(ctx.upload_task))
+        if status < 400:
+            # Same process as the Flask dashboards: a new submission changes what they show
+            invalidate_dashboards(ctx.session)
+
+        try:
+            await asyncio.to_thread(_save_session, ctx)
+        except Exception as e:
+            log.warning("⚠️ Session save failed: %s", e)
+
+        elapsed = time.perf_counter() - ctx.t0
+        REGISTRY.observe(REQUEST_METRIC, elapsed, endpoint=endpoint, method="POST", status=status)
+        timing = [f"{n};dur={d * 1000:.1f}" for n, d in ctx.spans] + [f"total;dur={elapsed * 1000:.1f}"]
+        get_logger("request").info(
+            "request",
+            extra={
+                "fields": {
+                    "request_id": ctx.request_id,
+                    "method": "POST",
+                    "path": ctx.path,
+                    "endpoint": endpoint,
+                    "status": status,
+                    "dur_ms": round(elapsed * 1000, 1),
+                    "spans_ms": {n: round(d * 1000, 1) for n, d in ctx.spans},
+                    **ctx.fields,
+                }
+            },
+        )
+
+        data = body.encode("utf-8") if isinstance(body, str) else body
+        await send(
+            {
+                "type": "http.response.start",
+                "status": status,
+                "headers": [
+                    (b"content-type", content_type.encode()),
+                    (b"content-length", str(len(data)).encode()),
+                    (b"server-timing", ", ".join(timing).encode()),
+                    (b"x-request-id", ctx.request_id.encode()),
+                ],
+            }
+        )
+        await send({"type": "http.response.body", "body": data})
+
+
+# ---------- Flask fallback ----------
+_wsgi_pool = ThreadPoolExecutor(max_workers=WSGI_THREADS, thread_name_prefix="wsgi")
+
+
+class _ThreadedWsgiInstance(WsgiToAsgiInstance):
+    # asgiref's default is thread_sensitive=True: every request on one thread
+    run_wsgi_app = sync_to_async(
+        WsgiToAsgiInstance.__dict__["run_wsgi_app"].func, thread_sensitive=False, executor=_wsgi_pool
+    )
+
+
+class _ThreadedWsgiToAsgi(WsgiToAsgi):
+    async def __call__(self, scope, receive, send):
+        await _ThreadedWsgiInstance(self.wsgi_application, self.duplicate_header_limit)(scope, receive, send)
+
+
+app = AsyncGraderApp(_ThreadedWsgiToAsgi(flask_app))
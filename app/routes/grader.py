@@ -3,47 +3,80 @@
 # Note: You may need to move helper functions/constants imported in lti_routes.py into utils and import them here.
 
 # app/routes/grader.py  — imports
+import hashlib
 import json
 import os
 import shutil
+import time
 import uuid
 from datetime import datetime, timedelta
 
-import requests
-from docx import Document
 from flask import (
     current_app,
     flash,
+    g,
     jsonify,
+    make_response,
     redirect,
     render_template,
     request,
+    Response,
     send_file,
     session,
+    stream_with_context,
     url_for,
 )
-from requests_oauthlib import OAuth1Session
 from werkzeug.utils import secure_filename
 from app.utils.slug import slugify
-from app.supabase_client import supabase, upload_to_supabase
+from app.supabase_client import bind_rls_uid, supabase
 from app.utils.assignment_resolver import resolve_assignment_from_launch
 
 
 from ..launch_utils import load_assignment_config
-from ..utils.ai_usage_logger import log_ai_usage  # if you log usage
-from ..utils.auth_decorators import require_tool
+from ..utils.ai_usage_logger import log_ai_usage, next_month_start, usage_totals
+from ..utils.auth_decorators import is_staff, require_tool, session_role
 from ..utils.extractor import extract_filled_fields_from_pdf, extract_pdf_text
+from ..utils.export import EXPORT_COLUMNS, ParquetUnavailable, columns as export_columns
+from ..utils.export import csv_chunks, iter_rows, parquet_chunks
 from ..utils.gpt_logging import log_gpt_interaction
+from ..utils.grade_stats import STATS_TABLE, summarize as summarize_stats
 from ..utils.grading_functions import (
+    compare_answer_key_fields,
     compare_fields_i130a,
     compare_fields_i765,
     compare_fields_n400,
+    delay_hours_for,
+    group_radio_fields,
+    parse_rubric,
+    parse_score_feedback,
 )
+from ..utils.lazy_import import lazy_module
+from ..utils.llm_scheduler import QUEUE_WAIT_SECONDS, SCHEDULER, estimate_tokens, queued_message
+from ..utils.logger import annotate, get_logger
+from ..utils.model_router import complete as complete_with_fallback
+from ..utils.model_router import model_tiers
+from ..utils.prompt_templates import TEMPLATES, compile_template
+from ..utils.similarity import SIMILARITY, check_result, signature
+from ..utils.review_queue import REVIEW_QUEUE
+from ..utils.submission_events import EVENTS, publish_submission, publish_submissions
+from ..utils.structured_grading import run as run_structured
+from ..utils.background import submit
+from ..utils.dashboard_cache import DASHBOARDS, cached_response, invalidate_for_session as invalidate_dashboards
+from ..utils.content_store import content_key, put_object, release_object, store_upload
+from ..utils.content_store import public_url as content_public_url
+from ..utils.metrics import record_span, span
+from ..utils import pg_reads, previews, rls_tokens
 from ..utils.text_utils import normalize_title
+from ..utils.uploads import spool_request_file
 
 # 🔁 switch to relative imports so the package name doesn't matter
 from . import lti
 
+log = get_logger(__name__)
+
+# Only rubric/answer-key downloads use requests
+requests = lazy_module("requests")
+
 # --- Feature flag (optional) ---
 FERPA_SAFE_MODE = (os.getenv("FERPA_SAFE_MODE") or "false").strip().lower() in {
     "1",
@@ -52,6 +85,14 @@ FERPA_SAFE_MODE = (os.getenv("FERPA_SAFE_MODE") or "false").strip().lower() in {
     "on",
 }
 
+# Seconds grade_docx waits for its background storage upload before giving up on the preview link
+UPLOAD_JOIN_TIMEOUT = float(os.getenv("UPLOAD_JOIN_TIMEOUT", "30"))
+
+# Bulk review endpoints: most ids per request, and per statement (keeps the
+# PostgREST `in.(...)` URL well under proxy limits)
+BULK_MAX_IDS = int(os.getenv("BULK_MAX_IDS", "1000"))
+BULK_CHUNK = 200
+
 
 # --- RLS helper: single source + global hook ---
 from uuid import UUID
@@ -59,38 +100,55 @@ from uuid import UUID
 ALL_ZERO_UUID = "00000000-0000-0000-0000-000000000000"
 
 
+def rls_uid():
+    """The uid RLS should see for this session (None if there is no caller)."""
+    # Prefer a real UUID when available; otherwise fall back to a DEV-safe UUID
+    raw_uid = (
+        ALL_ZERO_UUID
+        if (session.get("is_superuser") or session.get("role") == "superuser")
+        else (session.get("user_id") or session.get("student_id"))
+    )
+
+    if not raw_uid:
+        return None
+
+    try:
+        # If this succeeds, raw_uid is a UUID and we can use it directly
+        UUID(str(raw_uid))
+        return str(raw_uid)
+    except Exception:
+        # Not a UUID (e.g., "demo_user", "byu"); use a deterministic safe UUID so RLS passes
+        return os.getenv("DEV_FAKE_UID", "00000000-0000-0000-0000-000000000001")
+
+
+def set_rls_uid(uid):
+    """
+    RLS identity for the rest of this request: the caller's own JWT (minted
+    locally, no round trip) when SUPABASE_JWT_SECRET is set, else the
+    set_client_uid RPC.
+    """
+    if rls_tokens.enabled():
+        bind_rls_uid(uid)
+    else:
+        supabase.rpc("set_client_uid", {"uid": str(uid)}).execute()
+
+
 def apply_rls_uid():
     """Tell Supabase RLS who the caller is (idempotent)."""
     try:
         if not supabase:
             return
 
-        # Prefer a real UUID when available; otherwise fall back to a DEV-safe UUID
-        raw_uid = (
-            ALL_ZERO_UUID
-            if (session.get("is_superuser") or session.get("role") == "superuser")
-            else (session.get("user_id") or session.get("student_id"))
-        )
-
-        if not raw_uid:
+        effective_uid = rls_uid()
+        if not effective_uid:
             return
 
-        DEV_FAKE_UID = os.getenv("DEV_FAKE_UID", "00000000-0000-0000-0000-000000000001")
-
-        try:
-            # If this succeeds, raw_uid is a UUID and we can use it directly
-            UUID(str(raw_uid))
-            effective_uid = str(raw_uid)
-        except Exception:
-            # Not a UUID (e.g., "demo_user", "byu"); use a deterministic safe UUID so RLS passes
-            effective_uid = DEV_FAKE_UID
-
-        supabase.rpc("set_client_uid", {"uid": effective_uid}).execute()
+        set_rls_uid(effective_uid)
     except Exception as e:
         try:
             current_app.logger.info(f"apply_rls_uid fallback/skip: {e}")
         except Exception:
-            print("apply_rls_uid fallback/skip:", e)
+            log.debug("apply_rls_uid fallback/skip: %s", e)
 
 # --- Back-compat alias so older links to /grader-base still work ---
 @lti.route("/grader-base", methods=["GET"])
@@ -191,27 +249,59 @@ def _supabase_health():
     return "\n".join([f"{k}: {v}" for k, v in out.items()])
 
 
+_PG_READ_ENDPOINTS = {
+    "lti.grader_base", "lti.grader_submissions", "lti.grader_assignments", "lti.instructor_review",
+}
+
+
 @lti.before_app_request
 def _grader_rls_hook():
+    # These reads go through pg_reads, which sets the RLS claims in its own transaction
+    if request.method == "GET" and request.endpoint in _PG_READ_ENDPOINTS and pg_reads.enabled():
+        return None
     # Runs before every request handled by this blueprint
     apply_rls_uid()
 
 
+@lti.teardown_app_request
+def _cancel_unclaimed_ticket(exc):
+    # grade_docx hands a still-queued ticket to the background job; any other
+    # exit (error return, exception) gives its place back so it never holds a slot
+    ticket = g.pop("_queued_ticket", None)
+    if ticket is not None:
+        ticket.cancel()
+    # Likewise a stored file whose row was never saved is released (off the request thread)
+    upload_future = g.pop("_submission_upload", None)
+    if upload_future is not None:
+        submit(_release_unsaved_upload, upload_future)
+
+
+@lti.after_app_request
+def _invalidate_dashboards(response):
+    # Any successful write may change what the dashboards show
+    if request.method not in ("GET", "HEAD", "OPTIONS") and response.status_code < 400:
+        invalidate_dashboards()
+    return response
+
+
 @lti.route("/grader", methods=["GET"], endpoint="grader_base")
 @require_tool("grader")
 def grader_base():
     if "launch_data" not in session and not session.get("logged_in"):
         return redirect(url_for("lti.unauthorized"))
 
-    # 🔐 Tell PostgREST who we are for RLS policies
-    apply_rls_uid()
-
     inst_id = session.get("institution_id")
     course_id = session.get("course_id")
 
-    try:
+    def load():
+        if pg_reads.enabled():
+            return pg_reads.grader_base_assignments(
+                inst_id, course_id, session.get("is_superuser"), uid=rls_uid()
+            )
+        # 🔐 Tell PostgREST who we are for RLS policies
+        apply_rls_uid()
         if session.get("is_superuser"):
-            print("👑 Superuser — loading all Grader assignments")
+            log.debug("👑 Superuser — loading all Grader assignments")
             resp = (
                 supabase.table("assignments")
                 .select(
@@ -223,7 +313,7 @@ def grader_base():
                 .execute()
             )
         else:
-            print("👤 Instructor — filter by institution/course (allow legacy NULLs)")
+            log.debug("👤 Instructor — filter by institution/course")
             q = (
                 supabase.table("assignments")
                 .select(
@@ -232,20 +322,23 @@ def grader_base():
                 .eq("tool", "grader")
             )
 
-            # Only add these OR-filters if the session value exists.
+            # Only add these filters if the session value exists.
             if inst_id:
-                q = q.or_(f"institution_id.eq.{inst_id},institution_id.is.null")
+                q = q.eq("institution_id", inst_id)
             if course_id:
-                q = q.or_(f"course_id.eq.{course_id},course_id.is.null")
+                q = q.eq("course_id", course_id)
 
             resp = q.order("created_at", desc=True).limit(300).execute()
 
-        assignments = resp.data or []
-    except Exception as e:
-        print("❌ Supabase fetch error in /grader-base:", repr(e))
-        assignments = []
+        return resp.data or []
 
-    return render_template("grader/grader_base.html", assignments=assignments)
+    try:
+        return cached_response(
+            load, lambda assignments: render_template("grader/grader_base.html", assignments=assignments)
+        )
+    except Exception as e:
+        log.error("❌ Supabase fetch error in /grader-base: %s", repr(e))
+        return render_template("grader/grader_base.html", assignments=[])
 
 
 @lti.route("/student-demo", methods=["GET"])
@@ -255,7 +348,7 @@ def student_demo_iframe():
     session["student_id"] = "demo_student"
     session["user_id"] = "demo_user"
 
-    print("✅ [student-demo] session['user_id'] =", session.get("user_id"))
+    log.debug("✅ [student-demo] session['user_id'] = %s", session.get("user_id"))
 
     session["platform"] = "demo"
     session["course_id"] = "demo_course"
@@ -291,13 +384,177 @@ def student_demo_iframe():
     )
 
 
+def _upload_submission_file(key, payload, content_type=None):
+    """Background half of the grade_docx upload: (public URL, seconds taken)."""
+    t0 = time.perf_counter()
+    put_object("submissions", key, payload, content_type)
+    return content_public_url("submissions", key), time.perf_counter() - t0
+
+
+def _join_submission_upload(future):
+    """Wait for the background upload; a failure only costs the preview link."""
+    try:
+        with span("upload_wait"):
+            url, elapsed = future.result(timeout=UPLOAD_JOIN_TIMEOUT)
+        record_span("upload", elapsed)
+        log.debug("📎 Uploaded submission file to: %s", url)
+        return url
+    except Exception as e:
+        log.warning(
+            "⚠️ Upload to submissions bucket failed (continuing without preview): %s",
+            str(e),
+        )
+        return None
+
+
+def _release_unsaved_upload(future):
+    """Background: drop a grade_docx upload whose submission row was never written."""
+    try:
+        url, _ = future.result(timeout=UPLOAD_JOIN_TIMEOUT)
+        release_object("submissions", url)
+    except Exception as e:
+        log.warning("⚠️ Releasing an unsaved submission upload failed: %s", e)
+
+
+class RubricUnavailable(Exception):
+    def __init__(self, status):
+        super().__init__(f"rubric download failed with status {status}")
+        self.status = status
+
+
+def _grader_template(assignment_title, assignment_config):
+    """
+    Compiled prompt prefix for an assignment (prompt_templates.TEMPLATES);
+    the rubric is only downloaded and parsed on a cache miss.
+    """
+    tpl = TEMPLATES.get(assignment_title, assignment_config)
+    if tpl is not None:
+        return tpl
+
+    rubric_url = assignment_config.get("rubric_file") or ""
+    with span("rubric_fetch"):
+        if rubric_url.startswith(("http://", "https://")):
+            r = requests.get(rubric_url)
+            log.debug("🌐 Downloaded rubric file: %s status: %s", rubric_url, r.status_code)
+            if r.status_code != 200:
+                raise RubricUnavailable(r.status_code)
+            content = r.content
+        else:
+            # Legacy rows that stored a filename under rubrics/
+            with open(os.path.join("rubrics", rubric_url), "rb") as f:
+                content = f.read()
+
+    rubric_text, rubric_total_points, rubric_json = parse_rubric(
+        content,
+        rubric_url,
+        default_total=assignment_config.get("total_points", 100),
+        sections_total=assignment_config.get("total_points", 10),
+    )
+    return TEMPLATES.put(
+        assignment_title,
+        assignment_config,
+        compile_template(assignment_title, assignment_config, rubric_text, rubric_total_points, rubric_json),
+    )
+
+
+def _grade_with_llm(route, tiers, tpl, student_text, max_tokens=1000):
+    """
+    One grading exchange for a compiled template:
+    {"score", "feedback", "criterion_scores", "model", "usage", "latency_ms"}.
+
+    Criteria rubrics use structured output (per-criterion points, score None
+    if some criteria stay unscored); everything else the "Score:" text format
+    (score None when the completion has no Score: line).
+    """
+    call = lambda messages, **kw: complete_with_fallback(  # noqa: E731
+        route, tiers, messages, temperature=0.5, max_tokens=max_tokens, **kw
+    )
+    llm_t0 = time.perf_counter()
+    if tpl.structured:
+        result = run_structured(call, tpl.messages(student_text), tpl.criteria)
+        if not result.complete:
+            log.warning("⚠️ Structured grade incomplete after %s repair(s)", result.repairs)
+        return {
+            "score": result.score,
+            "feedback": result.feedback,
+            "criterion_scores": result.criterion_scores(),
+            "model": result.model,
+            "usage": result.usage,
+            "latency_ms": (time.perf_counter() - llm_t0) * 1000.0,
+        }
+
+    resp, model = call(tpl.messages(student_text))
+    score, feedback = parse_score_feedback(resp["choices"][0]["message"]["content"])
+    if score is None:
+        # Left ungraded for review rather than recorded as a 0
+        log.warning("⚠️ No \"Score:\" line in the %s completion (model %s)", route, model)
+    return {
+        "score": score,
+        "feedback": feedback,
+        "criterion_scores": None,
+        "model": model,
+        "usage": resp.get("usage", {}),
+        "latency_ms": (time.perf_counter() - llm_t0) * 1000.0,
+    }
+
+
+def _finish_queued_grading(ticket, table, submission_id, tiers, tpl, student_text, usage_fields, course_id=None):
+    """
+    Background half of a grade_docx call that was still queued behind other
+    institutions: grade once the slot is granted and fill in the saved row.
+    Started by _start_when_granted, so no pool thread waits for the slot.
+    """
+    try:
+        graded = _grade_with_llm("grade_docx", tiers, tpl, student_text)
+    except Exception as e:
+        log.error("❌ Queued grading failed for %s: %s", submission_id, str(e))
+        supabase.table(table).update({"feedback": f"❌ GPT error: {str(e)}"}).eq(
+            "submission_id", submission_id
+        ).execute()
+        return
+    finally:
+        ticket.release()
+
+    log_ai_usage(
+        **usage_fields,
+        model=graded["model"],
+        usage=graded["usage"],
+        latency_ms=graded["latency_ms"],
+        submission_id=submission_id,
+    )
+    update = {"score": graded["score"], "feedback": graded["feedback"], "grading_model": graded["model"]}
+    if graded["criterion_scores"] is not None:
+        update["criterion_scores"] = graded["criterion_scores"]
+    supabase.table(table).update(update).eq("submission_id", submission_id).execute()
+    DASHBOARDS.invalidate(usage_fields.get("institution_id"))
+    if table == "submissions":
+        publish_submission(
+            {"submission_id": submission_id, "score": graded["score"]},
+            institution_id=usage_fields.get("institution_id"),
+            course_id=course_id,
+        )
+    log.debug("📝 Queued grading finished for %s (waited %.1fs)", submission_id, ticket.waited)
+
+
+def _start_when_granted(ticket, fn, *args):
+    """Submits fn(*args) to the background pool once ticket is granted."""
+
+    def start():
+        try:
+            submit(fn, *args)
+        except RuntimeError:  # pool shutting down
+            ticket.release()
+
+    ticket.when_granted(start)
+
+
 @lti.route("/grade-docx", methods=["POST"])
 def grade_docx():
-    print("Superuser session flag:", session.get("is_superuser"))
-    print("🎯 Reached grade-docx")
-    print("🚨 /grade-docx route HIT")
-    print("🔎 DEBUG ROUTE VERSION: Aug 20 — unified writer, safe UUIDs")
-    print(f"🔐 FERPA_SAFE_MODE: {FERPA_SAFE_MODE}")
+    log.debug("Superuser session flag: %s", session.get("is_superuser"))
+    log.debug("🎯 Reached grade-docx")
+    log.debug("🚨 /grade-docx route HIT")
+    log.debug("🔎 DEBUG ROUTE VERSION: Aug 20 — unified writer, safe UUIDs")
+    log.debug("🔐 FERPA_SAFE_MODE: %s", FERPA_SAFE_MODE)
 
     # --- Local imports used in this route ---
     import json
@@ -305,57 +562,58 @@ def grade_docx():
     import re
     import uuid
     from datetime import datetime, timedelta
-    from io import BytesIO
 
     import openai
     from werkzeug.utils import secure_filename
 
     # -# --- RESOLVE: slug > custom > title ---
     launch_data = session.get("launch_data", {}) or {}
-    assignment_row, resolved_title, resolved_slug = resolve_assignment_from_launch(launch_data, request)
+    with span("resolve"):
+        assignment_row, resolved_title, resolved_slug = resolve_assignment_from_launch(launch_data, request)
 
     if not assignment_row:
         return "❌ Assignment not found. Please contact your instructor.", 400
 
     assignment_title = resolved_title or (assignment_row.get("assignment_title") or "")
     assignment_config = assignment_row  # use DB row as the single source of truth
-    print("🎯 Resolved assignment — title:", assignment_title, "| slug:", resolved_slug)
+    log.debug(
+        "🎯 Resolved assignment — title: %s | slug: %s",
+        assignment_title,
+        resolved_slug,
+    )
 
 
     # 🔎 Resolve assignment_id (some schemas require NOT NULL / FK)
     assignment_id_db = None
     try:
-        aresp = (
-            supabase.table("assignments")
-            .select("assignment_id, tool")
-            .eq("assignment_title", assignment_title)
-            .single()
-            .execute()
-        )
+        with span("resolve"):
+            aresp = (
+                supabase.table("assignments")
+                .select("assignment_id, tool")
+                .eq("assignment_title", assignment_title)
+                .single()
+                .execute()
+            )
         if aresp and aresp.data:
             assignment_id_db = aresp.data.get("assignment_id")
             if (aresp.data.get("tool") or "grader").lower() != "grader":
-                print("⚠️ Assignment tool mismatch; continuing:", aresp.data.get("tool"))
+                log.warning(
+                    "⚠️ Assignment tool mismatch; continuing: %s",
+                    aresp.data.get("tool"),
+                )
     except Exception as e:
-        print("ℹ️ Could not resolve assignment_id:", repr(e))
+        log.debug("ℹ️ Could not resolve assignment_id: %s", repr(e))
 
     gpt_model = assignment_config.get("gpt_model", "gpt-4")
     delay_setting = assignment_config.get("delay_posting", "immediate")
-    delay_hours = {
-        "immediate": 0,
-        "1m": 0.0166,
-        "12h": 12,
-        "24h": 24,
-        "36h": 36,
-        "48h": 48,
-    }.get(delay_setting, 0)
+    delay_hours = delay_hours_for(delay_setting)
 
     rubric_url = assignment_config.get("rubric_file", "")
     file = request.files.get("file")
     inline_text = (request.form.get("inline_text") or "").strip()
 
-    print("📎 Uploaded file object:", file)
-    print("📝 Inline text received:", inline_text)
+    log.debug("📎 Uploaded file object: %s", file)
+    log.debug("📝 Inline text received: %s", inline_text)
 
     if (not file or file.filename.strip() == "") and not inline_text:
         return "❌ No submission detected. Please upload a file or enter text.", 400
@@ -369,141 +627,64 @@ def grade_docx():
     feedback = ""
     incorrect_fields = []
     rubric_total_points = assignment_config.get("total_points", 100)
+    queued_ticket = None  # set when the LLM call is still waiting on the fair-share queue
+    grading_model = None  # model that actually produced the grade (after any failover)
+    criterion_scores = None  # per-criterion points when the rubric has criteria
 
     # ---------- File upload + text extraction ----------
+    upload_future = None
     if file:
         filename = file.filename.lower()
         file_ext = os.path.splitext(filename)[-1]
         safe_name = secure_filename(filename)
-        unique_path = f"{uuid.uuid4()}_{safe_name}"
-        file_bytes = file.read()
 
-        # Upload original file to Storage (for review preview)
-        try:
-            supabase.storage.from_("submissions").upload(unique_path, file_bytes)
-            SUPABASE_PROJECT_ID = os.getenv("SUPABASE_PROJECT_ID")
-            student_file_url = f"https://{SUPABASE_PROJECT_ID}/storage/v1/object/public/submissions/{unique_path}"
-            print("📎 Uploaded submission file to:", student_file_url)
-        except Exception as e:
-            print(
-                "⚠️ Upload to submissions bucket failed (continuing without preview):",
-                str(e),
+        # Requests we would turn away anyway are refused before anything is stored
+        answer_key_url = assignment_config.get("answer_key_file") or rubric_url
+        if gpt_model == "json" and file_ext != ".pdf":
+            return (
+                "❌ Grading mode is set to Answer Key (JSON), but file is not a PDF.",
+                400,
             )
-            student_file_url = None
+        if gpt_model == "json" and not answer_key_url:
+            return "❌ No answer key found for this assignment.", 400
+        if gpt_model != "json" and file_ext not in (".pdf", ".docx"):
+            return "❌ Unsupported file type. Please upload .docx or .pdf", 400
+
+        upload = spool_request_file(file)
+
+        # Upload original file to Storage (for review preview) in the background;
+        # the URL is only needed for the insert, so extraction + grading overlap it
+        upload_future = g._submission_upload = submit(
+            _upload_submission_file,
+            content_key(upload.sha256, safe_name),
+            upload.payload(),
+            upload.content_type,
+        )
+        # Reviewer preview, cached by the same hash as the storage key
+        if file_ext in previews.PREVIEW_EXTS:
+            previews.schedule(upload.sha256, file_ext, upload.payload())
 
         try:
             if gpt_model == "json":
                 # === NoMas / Answer-key JSON mode (expects PDF) ===
-                if file_ext != ".pdf":
-                    return (
-                        "❌ Grading mode is set to Answer Key (JSON), but file is not a PDF.",
-                        400,
-                    )
-
-                raw_fields = extract_filled_fields_from_pdf(BytesIO(file_bytes))
+                with span("extract"):
+                    with upload.open() as fh:
+                        raw_fields = extract_filled_fields_from_pdf(fh)
                 with open("data/debug_n400_extracted_fields.json", "w") as f:
                     json.dump(raw_fields, f, indent=2)
-                print("🔬 DEBUG — Extracted sample keys:", list(raw_fields.keys())[:20])
-
-                answer_key_url = assignment_config.get("answer_key_file") or rubric_url
-                if not answer_key_url:
-                    return "❌ No answer key found for this assignment.", 400
+                log.debug(
+                    "🔬 DEBUG — Extracted sample keys: %s",
+                    list(raw_fields.keys())[:20],
+                )
 
-                resp = requests.get(answer_key_url)
+                with span("rubric_fetch"):
+                    resp = requests.get(answer_key_url)
                 resp.raise_for_status()
                 answer_key = resp.json()
-                print("📘 Answer key loaded")
-
-                # Compare helper supports either flat dict or {sections:[{fields:[]}]}
-                def compare_fields(student_data, answer_key):
-                    feedback_lines, incorrect_keys = [], []
-                    sc, tot = 0, 0
-                    fields = []
-
-                    if isinstance(answer_key, dict) and "sections" in answer_key:
-                        fields = [
-                            f
-                            for sec in answer_key["sections"]
-                            for f in sec.get("fields", [])
-                        ]
-                    else:
-                        for k, v in answer_key.items():
-                            if isinstance(v, dict):
-                                fields.append(
-                                    {
-                                        "field": k,
-                                        "expected": v.get("expected", ""),
-                                        "match": v.get("match", "exact"),
-                                    }
-                                )
-                            else:
-                                fields.append(
-                                    {"field": k, "expected": v, "match": "exact"}
-                                )
-
-                    for fld in fields:
-                        key = fld["field"]
-                        expected = str(fld.get("expected", "")).strip().lower()
-                        match = fld.get("match", "exact")
-                        tot += 1
-
-                        val = str(student_data.get(key, "") or "").strip().lower()
-                        if val == "off":
-                            base = key.rsplit("_", 1)[0]
-                            candidates = {
-                                k: v
-                                for k, v in student_data.items()
-                                if k.startswith(base) and str(v).lower() != "off"
-                            }
-                            val = (
-                                str(list(candidates.values())[0]).strip().lower()
-                                if candidates
-                                else ""
-                            )
-
-                        if not val:
-                            base = key.rsplit("_", 1)[0]
-                            val = (
-                                str(
-                                    next(
-                                        (
-                                            v
-                                            for k2, v in student_data.items()
-                                            if k2.startswith(base)
-                                            and str(v).lower() != "off"
-                                        ),
-                                        "",
-                                    )
-                                )
-                                .strip()
-                                .lower()
-                            )
-
-                        if not val:
-                            incorrect_keys.append(key)
-                            feedback_lines.append(
-                                f"⚠️ Field '{key}' is empty or missing."
-                            )
-                        elif match == "exact" and val != expected:
-                            incorrect_keys.append(key)
-                            feedback_lines.append(
-                                f"❌ Field '{key}' appears incorrect. Expected '{expected}' but got '{val}'."
-                            )
-                        else:
-                            sc += 1
-
-                    feedback_lines.append(
-                        f"\nYou have {len(incorrect_keys)} error{'s' if len(incorrect_keys) != 1 else ''} in your submission."
-                    )
-                    feedback_lines.append(f"\n✅ Score: {sc} / {tot}")
-                    return {
-                        "score": sc,
-                        "total": tot,
-                        "feedback": "\n".join(feedback_lines),
-                        "incorrect_fields": incorrect_keys,
-                    }
+                log.debug("📘 Answer key loaded")
 
-                result = compare_fields(raw_fields, answer_key)
+                # Flat dict or {sections:[{fields:[]}]}
+                result = compare_answer_key_fields(raw_fields, answer_key)
                 score = result["score"]
                 total = result["total"]
                 feedback = result["feedback"]
@@ -512,27 +693,25 @@ def grade_docx():
 
                 with open(os.path.join("data", "last_mapped_fields.json"), "w") as f:
                     f.write(full_text)
-                print("✅ Saved mapped fields to data/last_mapped_fields.json")
+                log.debug("✅ Saved mapped fields to data/last_mapped_fields.json")
 
             else:
                 # === Regular Rubiqs Grader mode ===
                 if file_ext == ".pdf":
-                    full_text = extract_pdf_text(BytesIO(file_bytes))
-                elif file_ext == ".docx":
+                    with span("extract"):
+                        with upload.open() as fh:
+                            full_text = extract_pdf_text(fh)
+                else:
                     from docx import Document
 
-                    doc = Document(BytesIO(file_bytes))
-                    full_text = "\n".join(
-                        [p.text for p in doc.paragraphs if p.text.strip()]
-                    )
-                else:
-                    return "❌ Unsupported file type. Please upload .docx or .pdf", 400
+                    with span("extract"), upload.open() as fh:
+                        doc = Document(fh)
+                        full_text = "\n".join(
+                            [p.text for p in doc.paragraphs if p.text.strip()]
+                        )
 
         except Exception:
-            print("❌ Critical grading failure:")
-            import traceback
-
-            traceback.print_exc()
+            log.exception("❌ Critical grading failure")
             return render_template(
                 "feedback.html",
                 pending_message="❌ Something went wrong while processing your submission. Please try again or contact your instructor.",
@@ -544,106 +723,47 @@ def grade_docx():
     # ---------- GPT rubric scoring (non-JSON mode) ----------
     if gpt_model != "json":
         try:
-            r = requests.get(rubric_url)
-            print("🌐 Downloaded rubric file:", rubric_url, "status:", r.status_code)
-            if r.status_code != 200:
-                return f"❌ Failed to download rubric file. Status {r.status_code}", 500
-
-            rubric_content = r.content
-            rubric_json = None
-            rubric_text = ""
-
-            if rubric_url.endswith(".json"):
-                rubric_json = json.loads(rubric_content)
-                if "criteria" in rubric_json:
-                    rubric_text = "\n".join(
-                        [f"- {c['description']}" for c in rubric_json["criteria"]]
-                    )
-                    rubric_total_points = sum(
-                        c.get("max_points", 1) for c in rubric_json["criteria"]
-                    )
-                elif "sections" in rubric_json:
-                    rubric_text = "\n".join(
-                        [
-                            f"- {f['field']}: expected '{f['expected']}'"
-                            for s in rubric_json["sections"]
-                            for f in s.get("fields", [])
-                        ]
-                    )
-                    rubric_total_points = assignment_config.get("total_points", 10)
-                else:
-                    rubric_text = "(Invalid JSON rubric format)"
-                    rubric_total_points = assignment_config.get("total_points", 100)
-            elif rubric_url.endswith(".docx"):
-                from docx import Document
-
-                doc = Document(BytesIO(rubric_content))
-                rubric_text = "\n".join([p.text for p in doc.paragraphs])
-                rubric_total_points = assignment_config.get("total_points", 100)
-            elif rubric_url.endswith(".pdf"):
-                rubric_text = extract_pdf_text(BytesIO(rubric_content))
-                rubric_total_points = assignment_config.get("total_points", 100)
-            else:
-                rubric_text = "(Unknown rubric format)"
-                rubric_total_points = assignment_config.get("total_points", 100)
-
-            grading_difficulty = assignment_config.get("grading_difficulty", "balanced")
-            student_level = assignment_config.get("student_level", "college")
-            feedback_tone = assignment_config.get("feedback_tone", "supportive")
-            ai_notes = assignment_config.get("ai_notes", "")
-
-            prompt = f"""
-You are a helpful AI grader.
-
-Assignment Title: {assignment_title}
-Grading Difficulty: {grading_difficulty}
-Student Level: {student_level}
-Feedback Tone: {feedback_tone}
-Total Points: {rubric_total_points}
-
-Rubric:
-{rubric_text[:2000]}
-"""
-            if ai_notes:
-                prompt += f"\nInstructor Notes:\n{ai_notes}"
-
-            prompt += f"""
-
-Student Submission:
----
-{full_text[:3000]}
----
-
-Return your response in this format:
-
-Score: <number from 0 to {rubric_total_points}>
-Feedback: <detailed, helpful feedback>
-""".strip()
+            try:
+                tpl = _grader_template(assignment_title, assignment_config)
+            except RubricUnavailable as e:
+                return f"❌ Failed to download rubric file. Status {e.status}", 500
+            rubric_total_points = tpl.total_points
 
             openai.api_key = os.getenv("OPENAI_API_KEY")
-            resp = openai.ChatCompletion.create(
-                model=gpt_model,
-                messages=[{"role": "user", "content": prompt}],
-                temperature=0.5,
-                max_tokens=1000,
-            )
-            output = resp["choices"][0]["message"]["content"]
-            usage = resp.get("usage", {})
+            usage_fields = {
+                "user_id": session.get("user_id"),
+                "institution_id": session.get("institution_id"),
+                "tool": "grader",
+                "assignment_id": assignment_id_db or assignment_title,
+            }
 
-            # Billing/reporting
-            log_ai_usage(
-                user_id=session.get("user_id"),
-                institution_id=session.get("institution_id"),
-                tool="grader",
-                model=gpt_model,
-                assignment_id=assignment_title,
-                usage=usage,
-            )
+            # Fair share across institutions; over-share tenants wait here
+            ticket = SCHEDULER.enqueue(session.get("institution_id"), estimate_tokens(tpl.render(full_text)))
+            with span("llm_queue"):
+                granted = ticket.wait(QUEUE_WAIT_SECONDS)
+            if not granted:
+                # Save the submission now and grade it when its turn comes
+                queued_ticket = g._queued_ticket = ticket
+                score = None
+                feedback = queued_message(ticket.position(), ticket.eta_seconds())
+            else:
+                try:
+                    with span("llm"):
+                        graded = _grade_with_llm("grade_docx", model_tiers(assignment_config), tpl, full_text)
+                finally:
+                    ticket.release()
+
+                # Billing/reporting (buffered; flushed off-thread)
+                log_ai_usage(
+                    **usage_fields,
+                    model=graded["model"],
+                    usage=graded["usage"],
+                    latency_ms=graded["latency_ms"],
+                )
 
-            m = re.search(r"Score:\s*(\d{1,3})", output)
-            score = int(m.group(1)) if m else 0
-            fm = re.search(r"Feedback:\s*(.+)", output, re.DOTALL)
-            feedback = fm.group(1).strip() if fm else output.strip()
+                score, feedback = graded["score"], graded["feedback"]
+                grading_model = graded["model"]
+                criterion_scores = graded["criterion_scores"]
 
         except openai.error.OpenAIError as e:
             return f"❌ GPT error: {str(e)}", 500
@@ -664,18 +784,29 @@ Feedback: <detailed, helpful feedback>
     _uid = session.get("student_id") or session.get("user_id")
     try:
         if _is_uuid(_uid):
-            supabase.rpc("set_client_uid", {"uid": str(_uid)}).execute()
-            print("🔐 set_client_uid ->", _uid)
+            set_rls_uid(str(_uid))
+            log.debug("🔐 RLS uid -> %s", _uid)
         else:
             # Use a deterministic fake UUID for dev so RLS sees a non-null UID
             DEV_FAKE_UID = os.getenv(
                 "DEV_FAKE_UID", "00000000-0000-0000-0000-000000000001"
             )
-            supabase.rpc("set_client_uid", {"uid": DEV_FAKE_UID}).execute()
-            print("🔐 set_client_uid -> DEV_FAKE_UID", DEV_FAKE_UID)
+            set_rls_uid(DEV_FAKE_UID)
+            log.debug("🔐 RLS uid -> DEV_FAKE_UID %s", DEV_FAKE_UID)
 
     except Exception as e:
-        print("⚠️ set_client_uid RPC failed (continuing):", str(e))
+        log.warning("⚠️ Setting RLS uid failed (continuing): %s", str(e))
+
+    if upload_future is not None:
+        student_file_url = _join_submission_upload(upload_future)
+
+    # ---------- Near-duplicate check (local MinHash index, no model call) ----------
+    similarity_key = str(assignment_id_db or assignment_title)
+    with span("similarity"):
+        text_signature = signature(full_text)
+        similar = SIMILARITY.query(similarity_key, text_signature, student_id=_uid)
+    if similar:
+        log.info("🔁 %s: %d near-duplicate submission(s) in %s", assignment_title, len(similar), similarity_key)
 
     # ---------- Build submission payload ----------
     submission_id = str(uuid.uuid4())
@@ -699,7 +830,7 @@ Feedback: <detailed, helpful feedback>
         "submission_type": "inline" if inline_text else "file",
         "student_text": full_text,
         "student_file_url": student_file_url,
-        "ai_check_result": None,
+        "ai_check_result": check_result(similar) if text_signature else None,
         "instructor_notes": "",
         "delay_hours": delay_hours,
         "ready_to_post": ready_to_post,
@@ -709,6 +840,15 @@ Feedback: <detailed, helpful feedback>
         "incorrect_fields": incorrect_fields if gpt_model == "json" else [],
     }
 
+    annotate(
+        submission_id=submission_id,
+        assignment=assignment_title,
+        model=gpt_model,
+        grading_model=grading_model,
+        submission_type=submission_data["submission_type"],
+        score=score,
+    )
+
     # --- Optional: force Grader (non-JSON mode) into pending review queue by default ---
     if (assignment_config.get("gpt_model") or "").lower() != "json":
         submission_data["ready_to_post"] = False
@@ -716,7 +856,7 @@ Feedback: <detailed, helpful feedback>
 
     # ---------- Single, unified writer (NO duplicates) ----------
     try:
-        print("✅ Submitting to Supabase:", submission_data["submission_id"])
+        log.debug("✅ Submitting to Supabase: %s", submission_data["submission_id"])
 
         # Detect NoMas/USCIS by DB title or config hint
         is_nomas = False
@@ -788,8 +928,13 @@ Feedback: <detailed, helpful feedback>
                 "reviewed": submission_data["reviewed"],
                 "instructor_notes": submission_data["instructor_notes"],
             }
-            supabase.table("uscis_submissions").insert(payload).execute()
-            print("🗄️ Wrote to uscis_submissions")
+            if grading_model:
+                payload["grading_model"] = grading_model
+            if criterion_scores is not None:
+                payload["criterion_scores"] = criterion_scores
+            with span("db_insert"):
+                supabase.table("uscis_submissions").insert(payload).execute()
+            log.debug("🗄️ Wrote to uscis_submissions")
         else:
             # === Generic Rubiqs Grader submission -> public.submissions (full, RLS-safe) ===
 
@@ -822,6 +967,9 @@ Feedback: <detailed, helpful feedback>
                 # grading status
                 "score": score,
                 "feedback": feedback,
+                "grading_model": grading_model,
+                "criterion_scores": criterion_scores,
+                "ai_check_result": submission_data["ai_check_result"],
                 "pending": submission_data["pending"],
                 "reviewed": submission_data["reviewed"],
                 "ready_to_post": submission_data["ready_to_post"],
@@ -832,9 +980,10 @@ Feedback: <detailed, helpful feedback>
             }
 
             try:
-                resp = supabase.table("submissions").insert(row).execute()
+                with span("db_insert"):
+                    resp = supabase.table("submissions").insert(row).execute()
                 if getattr(resp, "error", None):
-                    print("❌ Supabase insert error:", resp.error)
+                    log.error("❌ Supabase insert error: %s", resp.error)
 
                     # Fallback minimal row also needs legacy column:
                     minimal_row = {
@@ -850,27 +999,32 @@ Feedback: <detailed, helpful feedback>
                         "score": row["score"],
                         "feedback": row["feedback"],
                     }
-                    print("↪️ Retrying with minimal_row:", minimal_row)
-                    resp2 = supabase.table("submissions").insert(minimal_row).execute()
+                    log.debug("↪️ Retrying with minimal_row: %s", minimal_row)
+                    with span("db_insert"):
+                        resp2 = supabase.table("submissions").insert(minimal_row).execute()
                     if getattr(resp2, "error", None):
-                        print("💥 Supabase insert error (minimal row):", resp2.error)
+                        log.error(
+                            "💥 Supabase insert error (minimal row): %s",
+                            resp2.error,
+                        )
                         return (
                             "❌ Failed to save your submission (DB error). Please contact your instructor.",
                             500,
                         )
                     saved2 = (resp2.data or [minimal_row])[0]
-                    print(
-                        "🗄️ Wrote to submissions (submission_id, minimal):",
+                    log.debug(
+                        "🗄️ Wrote to submissions (submission_id, minimal): %s",
                         saved2.get("submission_id") or saved2.get("id"),
                     )
                 else:
                     saved = (resp.data or [row])[0]
-                    print(
-                        "🗄️ Wrote to submissions (submission_id):",
+                    log.debug(
+                        "🗄️ Wrote to submissions (submission_id): %s",
                         saved.get("submission_id") or saved.get("id"),
                     )
+                publish_submission(row)
             except Exception as e2:
-                print("💥 Insert to Supabase failed completely:", repr(e2))
+                log.error("💥 Insert to Supabase failed completely: %s", repr(e2))
                 return (
                     "❌ Failed to save your submission (DB error). Please contact your instructor.",
                     500,
@@ -882,20 +1036,37 @@ Feedback: <detailed, helpful feedback>
         shutil.rmtree("converted_images", ignore_errors=True)
 
     except Exception as e:
-        import traceback
-
-        print("💥 Insert to Supabase failed completely:", repr(e))
-        traceback.print_exc()  # ⬅️ prints PostgREST error body / stack
+        # exc_info carries the PostgREST error body / stack
+        log.exception("💥 Insert to Supabase failed completely: %s", repr(e))
         return (
             "❌ Failed to save your submission (DB error). Please contact your instructor.",
             500,
         )
 
+    g.pop("_submission_upload", None)  # the row references it now
+    SIMILARITY.add(similarity_key, submission_id, text_signature, student_id=_uid)
+
+    if queued_ticket is not None:
+        g.pop("_queued_ticket", None)  # the background job owns it now
+        _start_when_granted(
+            queued_ticket,
+            _finish_queued_grading,
+            queued_ticket,
+            "uscis_submissions" if is_nomas else "submissions",
+            submission_id,
+            model_tiers(assignment_config),
+            tpl,
+            full_text,
+            usage_fields,
+            session.get("course_id", "demo_course"),
+        )
+        return render_template("feedback.html", pending_message=feedback)
+
     # ---------- Optional log ----------
     try:
         log_gpt_interaction(assignment_title, full_text, feedback, score)
     except Exception as e:
-        print("❌ GPT log failed:", str(e))
+        log.error("❌ GPT log failed: %s", str(e))
 
     # ---------- Final response / AGS ----------
     if assignment_config.get("instructor_approval"):
@@ -911,15 +1082,15 @@ Feedback: <detailed, helpful feedback>
     else:
         if session.get("platform") == "canvas":
             try:
-                print("🎯 Canvas detected — attempting AGS post...")
-                post_grade_to_lms(session, score, feedback)
+                log.debug("🎯 Canvas detected — attempting AGS post...")
+                with span("ags_post"):
+                    post_grade_to_lms(session, score, feedback)
             except Exception as e:
-                print("❌ AGS post failed:", str(e))
+                log.error("❌ AGS post failed: %s", str(e))
         else:
-            print(
-                "ℹ️ AGS posting skipped — not Canvas (platform:",
+            log.debug(
+                "ℹ️ AGS posting skipped — not Canvas (platform: %s)",
                 session.get("platform"),
-                ")",
             )
 
         return render_template(
@@ -941,66 +1112,67 @@ def nomas_dashboard():
     inst_id = session.get("institution_id")
     course_id = session.get("course_id", "demo_course")
 
-    # --- Assignments ---
-    try:
-        if session.get("is_superuser"):
-            aresp = (
-                supabase.table("uscis_assignments")
-                .select(
-                    "assignment_id, assignment_title, form_type, institution_id, course_id, created_at"
+    def load():
+        # --- Assignments ---
+        try:
+            if session.get("is_superuser"):
+                aresp = (
+                    supabase.table("uscis_assignments")
+                    .select(
+                        "assignment_id, assignment_title, form_type, institution_id, course_id, created_at"
+                    )
+                    .order("created_at", desc=True)
+                    .execute()
                 )
-                .order("created_at", desc=True)
-                .execute()
-            )
-            assignments = aresp.data or []
-        else:
-            aresp = (
-                supabase.table("uscis_assignments")
-                .select(
-                    "assignment_id, assignment_title, form_type, institution_id, course_id, created_at"
+                assignments = aresp.data or []
+            else:
+                aresp = (
+                    supabase.table("uscis_assignments")
+                    .select(
+                        "assignment_id, assignment_title, form_type, institution_id, course_id, created_at"
+                    )
+                    .eq("institution_id", inst_id)
+                    .eq("course_id", course_id)
+                    .order("created_at", desc=True)
+                    .execute()
                 )
-                .or_(f"institution_id.eq.{inst_id},institution_id.is.null")
-                .or_(f"course_id.eq.{course_id},course_id.is.null")
-                .order("created_at", desc=True)
-                .execute()
-            )
-            assignments = aresp.data or []
-    except Exception as e:
-        print("❌ load uscis_assignments:", e)
-        assignments = []
+                assignments = aresp.data or []
+        except Exception as e:
+            log.error("❌ load uscis_assignments: %s", e)
+            assignments = []
 
-    # --- Submissions (order by submitted_at, fallback to submission_time) ---
-    try:
+        # --- Submissions (order by submitted_at, fallback to submission_time) ---
         try:
-            sresp = (
-                supabase.table("uscis_submissions")
-                .select("*")
-                .order("submitted_at", desc=True)
-                .limit(300)
-                .execute()
-            )
-            submissions = sresp.data or []
-        except Exception:
-            sresp = (
-                supabase.table("uscis_submissions")
-                .select("*")
-                .order("submission_time", desc=True)
-                .limit(300)
-                .execute()
-            )
-            submissions = sresp.data or []
-    except Exception as e:
-        print("❌ load uscis_submissions:", e)
-        submissions = []
+            try:
+                sresp = (
+                    supabase.table("uscis_submissions")
+                    .select("*")
+                    .order("submitted_at", desc=True)
+                    .limit(300)
+                    .execute()
+                )
+                submissions = sresp.data or []
+            except Exception:
+                sresp = (
+                    supabase.table("uscis_submissions")
+                    .select("*")
+                    .order("submission_time", desc=True)
+                    .limit(300)
+                    .execute()
+                )
+                submissions = sresp.data or []
+        except Exception as e:
+            log.error("❌ load uscis_submissions: %s", e)
+            submissions = []
 
-    # normalize aliases the template expects
-    for s in submissions:
-        s.setdefault("user_id", s.get("student_id"))
-        s.setdefault("submitted_at", s.get("submission_time"))
+        # normalize aliases the template expects
+        for s in submissions:
+            s.setdefault("user_id", s.get("student_id"))
+            s.setdefault("submitted_at", s.get("submission_time"))
 
-    return render_template(
-        "nomas_dashboard.html", assignments=assignments, submissions=submissions
-    )
+        return {"assignments": assignments, "submissions": submissions}
+
+    return cached_response(load, lambda data: render_template("nomas_dashboard.html", **data))
 
 
 @lti.route("/uscis-dashboard")
@@ -1009,12 +1181,12 @@ def uscis_dashboard():
 
     # Filter USCIS assignments by course
     if session.get("is_superuser"):
-        print("👑 Superuser: loading all USCIS assignments")
+        log.debug("👑 Superuser: loading all USCIS assignments")
         assignments = (
             supabase.table("uscis_assignments").select("*").execute().data or []
         )
     else:
-        print("👤 Instructor: filtering USCIS assignments by institution and course")
+        log.debug("👤 Instructor: filtering USCIS assignments by institution and course")
         assignments = (
             supabase.table("uscis_assignments")
             .select("*")
@@ -1038,39 +1210,12 @@ def generate_answer_key():
     if not uploaded_file.filename.lower().endswith(".pdf"):
         return "❌ Please upload a PDF file.", 400
 
-    pdf_bytes = uploaded_file.read()
-    raw_fields = extract_filled_fields_from_pdf(pdf_bytes)
-
-    # === STEP 1.5: Normalize filled fields, keep only checked/filled ===
-    filtered_fields = {}
-    for key, value in raw_fields.items():
-        value_normalized = str(value).strip().lower()
-        if value_normalized in ["", "off"]:
-            continue
-        filtered_fields[key] = value
-
-    # === STEP 1.6: Optional - Group known radio buttons under semantic labels ===
-    grouped_fields = {}
-    radio_groups = {
-        "Reason for Filing": [
-            "Page1_General Provision_1",
-            "Page1_Spouse of U.S. Citizen_2",
-            "Page1_VAWA_3",
-        ]
-    }
-
-    for group_label, field_keys in radio_groups.items():
-        for k in field_keys:
-            if filtered_fields.get(k) == "On":
-                grouped_fields[group_label] = {k: "Yes"}
-                break
+    upload = spool_request_file(uploaded_file)
+    with upload.open() as fh:
+        raw_fields = extract_filled_fields_from_pdf(fh)
 
-    # Add all non-radio fields back in
-    for k, v in filtered_fields.items():
-        if not any(k in group for group in radio_groups.values()):
-            grouped_fields[k] = v
-
-    fields = grouped_fields
+    # === STEP 1.5: Keep only checked/filled fields, group known radio buttons ===
+    fields = group_radio_fields(raw_fields)
 
     # === Step 2: Prepare Supabase client ===
     SUPABASE_URL = os.getenv("SUPABASE_URL")
@@ -1078,19 +1223,17 @@ def generate_answer_key():
 
     SUPABASE_PROJECT_ID = os.getenv("SUPABASE_PROJECT_ID")
 
-    # === Step 3: Upload answer key as JSON to Supabase ===
-    key_json = json.dumps(fields, indent=2)
-    unique_filename = f"generated_keys/answer_key_{uuid.uuid4()}.json"
+    # === Step 3: Upload answer key as JSON to Supabase (content-addressed) ===
+    key_bytes = json.dumps(fields, indent=2).encode("utf-8")
+    unique_filename = content_key(hashlib.sha256(key_bytes).hexdigest(), "answer_key.json")
 
     try:
-        supabase.storage.from_("rubrics").upload(
-            unique_filename, key_json.encode("utf-8")
-        )
+        put_object("rubrics", unique_filename, key_bytes, "application/json")
     except Exception as e:
         return f"❌ Failed to upload to Supabase: {str(e)}", 500
 
     # === Step 4: Build public URL and redirect back to dashboard ===
-    public_url = f"https://{SUPABASE_PROJECT_ID}/storage/v1/object/public/rubrics/{unique_filename}"
+    public_url = content_public_url("rubrics", unique_filename)
     return redirect(f"/nomas-dashboard?rubric_url={public_url}")
 
 
@@ -1111,7 +1254,7 @@ def create_uscis_assignment():
     if "launch_data" not in session and not session.get("logged_in"):
         return redirect(url_for("lti.unauthorized"))
 
-    print("🚨 create-uscis-assignment route HIT")
+    log.debug("🚨 create-uscis-assignment route HIT")
 
     SUPABASE_URL = os.getenv("SUPABASE_URL")
     SUPABASE_KEY = os.getenv("SUPABASE_KEY")
@@ -1127,16 +1270,10 @@ def create_uscis_assignment():
 
     if answer_key_file and answer_key_file.filename:
         try:
-            filename = secure_filename(answer_key_file.filename)
-            unique_path = f"generated_keys/{uuid.uuid4()}_{filename}"
-            supabase.storage.from_("rubrics").upload(
-                unique_path, answer_key_file.read()
-            )
-            SUPABASE_PROJECT_ID = os.getenv("SUPABASE_PROJECT_ID")
-            rubric_url = f"https://{SUPABASE_PROJECT_ID}/storage/v1/object/public/rubrics/{unique_path}"
-            print(f"✅ Uploaded answer key file to Supabase: {rubric_url}")
+            rubric_url = store_upload("rubrics", spool_request_file(answer_key_file))
+            log.debug("✅ Uploaded answer key file to Supabase: %s", rubric_url)
         except Exception as e:
-            print("❌ Error uploading answer key file:", str(e))
+            log.error("❌ Error uploading answer key file: %s", str(e))
 
     require_review = request.form.get("require_review", "").lower() == "true"
     total_points = request.form.get("total_points")
@@ -1183,18 +1320,16 @@ def create_uscis_assignment():
 
 @lti.route("/grade-uscis-form", methods=["POST"])
 def grade_uscis_form():
-    print("🎯 Reached grade-uscis-form")
-    print("🚨 /grade-uscis-form route HIT")
-    print("🔎 DEBUG ROUTE VERSION: July 11 — USCIS forms only (N-400 for now)")
-    print(f"🔐 FERPA_SAFE_MODE: {FERPA_SAFE_MODE}")
+    log.debug("🎯 Reached grade-uscis-form")
+    log.debug("🚨 /grade-uscis-form route HIT")
+    log.debug("🔎 DEBUG ROUTE VERSION: July 11 — USCIS forms only (N-400 for now)")
+    log.debug("🔐 FERPA_SAFE_MODE: %s", FERPA_SAFE_MODE)
 
     # Local imports to keep this route self-contained
     import json
     import os
     import uuid
     from datetime import datetime
-    from io import BytesIO
-    from pprint import pprint
 
     import requests
     from werkzeug.utils import secure_filename
@@ -1210,28 +1345,29 @@ def grade_uscis_form():
             title_from_claim or f"Assignment-{id_from_claim}" or "Untitled Assignment"
         ).strip()
     )
-    print("🧠 resource_link:", resource_link)
-    print("🧠 assignment_title after normalize:", assignment_title)
+    log.debug("🧠 resource_link: %s", resource_link)
+    log.debug("🧠 assignment_title after normalize: %s", assignment_title)
 
     # ✅ Data-driven: resolve assignment from Supabase first (no name guessing)
     assignment_config = {}
     try:
-        aresp = (
-            supabase.table("uscis_assignments")
-            .select("*")
-            .eq("assignment_title", assignment_title)
-            .single()
-            .execute()
-        )
+        with span("resolve"):
+            aresp = (
+                supabase.table("uscis_assignments")
+                .select("*")
+                .eq("assignment_title", assignment_title)
+                .single()
+                .execute()
+            )
         assignment_config = aresp.data or {}
     except Exception as e:
-        print("⚠️ uscis_assignments lookup failed:", str(e))
+        log.warning("⚠️ uscis_assignments lookup failed: %s", str(e))
 
     # Fallback to legacy loader only if DB lookup failed
     if not assignment_config:
         assignment_config = load_assignment_config(assignment_title) or {}
 
-    print("📦 assignment_config resolved:", assignment_config)
+    log.debug("📦 assignment_config resolved: %s", assignment_config)
 
     form_type = (assignment_config.get("form_type") or "").lower()
     if not form_type:
@@ -1241,8 +1377,8 @@ def grade_uscis_form():
             400,
         )
 
-    print("🎯 Resolved assignment title:", assignment_title)
-    print("🧩 Using assignment_config:", assignment_config)
+    log.debug("🎯 Resolved assignment title: %s", assignment_title)
+    log.debug("🧩 Using assignment_config: %s", assignment_config)
 
     # --- Validate uploaded file (PDF only for USCIS form grading) ---
     file = request.files.get("file")
@@ -1251,23 +1387,23 @@ def grade_uscis_form():
 
     # === Upload and Extract PDF Fields ===
     filename = secure_filename(file.filename.lower())
-    file_bytes = file.read()
-    unique_path = f"submissions/{uuid.uuid4()}_{filename}"
+    upload = spool_request_file(file)
 
     try:
-        raw_fields = extract_filled_fields_from_pdf(BytesIO(file_bytes))
-        pprint(list(raw_fields.items())[:20])  # Debug: show sample fields
+        with span("extract"), upload.open() as fh:
+            raw_fields = extract_filled_fields_from_pdf(fh)
+        log.debug("🔬 Extracted sample keys: %s", list(raw_fields)[:20])
 
         # Save raw extraction for debugging
         with open("data/debug_extracted_fields.json", "w") as f:
             json.dump(raw_fields, f, indent=2)
 
-        # Upload original PDF to Storage
-        supabase.storage.from_("submissions").upload(unique_path, file_bytes)
-        SUPABASE_PROJECT_ID = os.getenv("SUPABASE_PROJECT_ID")
-        student_file_url = f"https://{SUPABASE_PROJECT_ID}/storage/v1/object/public/submissions/{unique_path}"
+        # Upload original PDF to Storage (skipped if this exact file is already there)
+        with span("upload"):
+            student_file_url = store_upload("submissions", upload)
+        previews.schedule(upload.sha256, ".pdf", upload.payload())
     except Exception as e:
-        print("❌ PDF extraction failed:", str(e))
+        log.error("❌ PDF extraction failed: %s", str(e))
         return (
             "❌ Failed to process the uploaded form. Please contact your instructor.",
             500,
@@ -1279,7 +1415,7 @@ def grade_uscis_form():
         or assignment_config.get("rubric_file")
         or assignment_config.get("rubric_file_url")
     )
-    print("📎 rubric_url resolved to:", rubric_url)
+    log.debug("📎 rubric_url resolved to: %s", rubric_url)
 
     if not rubric_url:
         return (
@@ -1288,12 +1424,13 @@ def grade_uscis_form():
         )
 
     try:
-        answer_key_response = requests.get(rubric_url)
+        with span("rubric_fetch"):
+            answer_key_response = requests.get(rubric_url)
         answer_key_response.raise_for_status()
         answer_key_json = answer_key_response.json()
     except Exception as e:
-        print("❌ Failed to load answer key from URL:", rubric_url)
-        print("📛 Error:", str(e))
+        log.error("❌ Failed to load answer key from URL: %s", rubric_url)
+        log.debug("📛 Error: %s", str(e))
         return "❌ Could not retrieve answer key. Please contact your instructor.", 500
 
     # === Compare fields according to form type ===
@@ -1310,6 +1447,7 @@ def grade_uscis_form():
     total = result["total"]
     feedback = result["feedback"]
     incorrect_fields = result["incorrect_fields"]
+    annotate(assignment=assignment_title, form_type=form_type, score=score, total=total)
 
     full_text = json.dumps(raw_fields, indent=2)
 
@@ -1317,7 +1455,7 @@ def grade_uscis_form():
     debug_path = os.path.join("data", "last_mapped_fields.json")
     with open(debug_path, "w") as f:
         f.write(full_text)
-    print(f"✅ Saved extracted fields to {debug_path}")
+    log.debug("✅ Saved extracted fields to %s", debug_path)
 
     # === Store Submission in Supabase ===
     if not session.get("student_id"):
@@ -1326,19 +1464,12 @@ def grade_uscis_form():
 
     # Set client UID for RLS policies that rely on auth.uid() emulation
     try:
-        supabase.rpc("set_client_uid", {"uid": session["student_id"]}).execute()
+        set_rls_uid(session["student_id"])
     except Exception as e:
-        print("⚠️ set_client_uid RPC failed (continuing):", str(e))
+        log.warning("⚠️ Setting RLS uid failed (continuing): %s", str(e))
 
     now = datetime.utcnow()
-    delay_hours = {
-        "immediate": 0,
-        "1m": 0.0166,
-        "12h": 12,
-        "24h": 24,
-        "36h": 36,
-        "48h": 48,
-    }.get(assignment_config.get("delay_posting", "immediate"), 0)
+    delay_hours = delay_hours_for(assignment_config.get("delay_posting", "immediate"))
     release_time = now + timedelta(hours=delay_hours)
     ready_to_post = delay_hours == 0 and not assignment_config.get(
         "instructor_approval", False
@@ -1367,7 +1498,7 @@ def grade_uscis_form():
     }
 
     try:
-        print("✅ Submitting to Supabase:", submission_data["submission_id"])
+        log.debug("✅ Submitting to Supabase: %s", submission_data["submission_id"])
 
         # Insert ONLY columns that exist in uscis_submissions
         uscis_payload = {
@@ -1392,24 +1523,26 @@ def grade_uscis_form():
             # "attempt_number": 1,
         }
 
-        supabase.table("uscis_submissions").insert(uscis_payload).execute()
-        print("🗄️ Wrote to uscis_submissions")
+        with span("db_insert"):
+            supabase.table("uscis_submissions").insert(uscis_payload).execute()
+        log.debug("🗄️ Wrote to uscis_submissions")
 
     except Exception as e:
         # Log the exact server error so you can see missing/invalid columns
-        print("❌ uscis_submissions insert failed:", repr(e))
+        log.error("❌ uscis_submissions insert failed: %s", repr(e))
         try:
             # Safe fallback so you never lose a submission during the demo
-            supabase.table("submissions").insert(submission_data).execute()
-            print("↪️ Fallback: wrote to legacy submissions")
+            with span("db_insert"):
+                supabase.table("submissions").insert(submission_data).execute()
+            log.debug("↪️ Fallback: wrote to legacy submissions")
         except Exception as e2:
-            print("❌ Legacy submissions insert also failed:", repr(e2))
+            log.error("❌ Legacy submissions insert also failed: %s", repr(e2))
 
     # Optional: log to your GPT interaction log (safe to continue if it fails)
     try:
         log_gpt_interaction(assignment_title, full_text, feedback, score)
     except Exception as e:
-        print("❌ GPT log failed:", str(e))
+        log.error("❌ GPT log failed: %s", str(e))
 
     # === Display Feedback / AGS passback ===
     if assignment_config.get("instructor_approval"):
@@ -1425,9 +1558,10 @@ def grade_uscis_form():
     else:
         if session.get("platform") == "canvas":
             try:
-                post_grade_to_lms(session, score, feedback)
+                with span("ags_post"):
+                    post_grade_to_lms(session, score, feedback)
             except Exception as e:
-                print("❌ Canvas grade passback failed:", str(e))
+                log.error("❌ Canvas grade passback failed: %s", str(e))
         return render_template(
             "feedback.html",
             feedback=feedback,
@@ -1443,7 +1577,7 @@ def edit_uscis_assignment(assignment_id):
 
     if request.method == "POST":
         try:
-            print("📥 USCIS Edit POST:", dict(request.form))
+            log.debug("📥 USCIS Edit POST fields: %s", sorted(request.form))
 
             # === Step 1: Load existing assignment ===
             existing = (
@@ -1462,18 +1596,8 @@ def edit_uscis_assignment(assignment_id):
             # === Step 2: Check for uploaded answer key ===
             answer_key_file = request.files.get("answer_key_upload")
             if answer_key_file and answer_key_file.filename:
-                import uuid
-
-                from werkzeug.utils import secure_filename
-
-                filename = secure_filename(answer_key_file.filename)
-                unique_path = f"generated_keys/{uuid.uuid4()}_{filename}"
-                supabase.storage.from_("rubrics").upload(
-                    unique_path, answer_key_file.read()
-                )
-                SUPABASE_PROJECT_ID = os.getenv("SUPABASE_PROJECT_ID")
-                rubric_url = f"https://{SUPABASE_PROJECT_ID}/storage/v1/object/public/rubrics/{unique_path}"
-                print("✅ New answer key uploaded:", rubric_url)
+                rubric_url = store_upload("rubrics", spool_request_file(answer_key_file))
+                log.debug("✅ New answer key uploaded: %s", rubric_url)
 
             # === Step 3: Update fields ===
             updated_fields = {
@@ -1496,11 +1620,11 @@ def edit_uscis_assignment(assignment_id):
             supabase.table("uscis_assignments").update(updated_fields).eq(
                 "assignment_id", assignment_id
             ).execute()
-            print("✅ Assignment updated.")
+            log.debug("✅ Assignment updated.")
             return redirect("/nomas-dashboard")
 
         except Exception as e:
-            print("❌ Error updating USCIS assignment:", e)
+            log.error("❌ Error updating USCIS assignment: %s", e)
             return f"Error: {e}", 500
 
     # === GET: Load current values ===
@@ -1535,7 +1659,7 @@ def delete_uscis_assignment():
         ).execute()
         return jsonify({"success": True})
     except Exception as e:
-        print("❌ Error deleting USCIS assignment:", e)
+        log.error("❌ Error deleting USCIS assignment: %s", e)
         return jsonify({"success": False, "error": str(e)}), 500
 
 
@@ -1555,7 +1679,7 @@ def nomas_review():
             .execute()
         ).data
     except Exception as e:
-        print("ℹ️ uscis_submissions lookup failed:", e)
+        log.debug("ℹ️ uscis_submissions lookup failed: %s", e)
 
     if not row:
         try:
@@ -1567,12 +1691,61 @@ def nomas_review():
                 .execute()
             ).data
         except Exception as e:
-            print("ℹ️ legacy submissions lookup failed:", e)
+            log.debug("ℹ️ legacy submissions lookup failed: %s", e)
 
     if not row:
         return "❌ Submission not found.", 404
 
-    return render_template("grader/nomas_review.html", submission=row)
+    return render_template(
+        "grader/nomas_review.html",
+        submission=row,
+        preview_key=previews.ensure(row.get("student_file_url")),
+    )
+
+
+@lti.route("/preview/<key>", methods=["GET"], endpoint="file_preview")
+def file_preview(key):
+    """Cached preview page for a submitted file (app/utils/previews.py); 202 while it's being built."""
+    if "launch_data" not in session and not session.get("logged_in"):
+        return redirect(url_for("lti.unauthorized"))
+    if not previews.valid_key(key):
+        return "❌ Preview not found.", 404
+
+    info = previews.manifest(key)
+    html = ""
+    if info and info.get("kind") == "html":
+        # The manifest can outlive its file (cache cleanup); a rebuild won't start while it exists
+        path = previews.file_path(key, info.get("file") or "")
+        try:
+            if not path:
+                raise FileNotFoundError(info.get("file"))
+            with open(path, encoding="utf-8") as f:
+                html = f.read()
+        except OSError:
+            return "❌ Preview not found.", 404
+    resp = make_response(
+        render_template("grader/file_preview.html", info=info, key=key, html=html),
+        200 if info else 202,
+    )
+    # Sanitized already; this keeps anything that slipped through inert
+    resp.headers["Content-Security-Policy"] = (
+        "default-src 'none'; img-src 'self' data:; style-src 'unsafe-inline'"
+    )
+    resp.headers["Cache-Control"] = "private, max-age=3600" if info else "no-store"
+    return resp
+
+
+@lti.route("/preview/<key>/<name>", methods=["GET"], endpoint="file_preview_asset")
+def file_preview_asset(key, name):
+    if "launch_data" not in session and not session.get("logged_in"):
+        return redirect(url_for("lti.unauthorized"))
+    path = previews.file_path(key, name)
+    if not path:
+        return "❌ Preview not found.", 404
+    # Content-addressed: a key's files never change
+    resp = send_file(os.path.abspath(path), max_age=31536000, conditional=True)
+    resp.headers["Cache-Control"] = "private, max-age=31536000, immutable"
+    return resp
 
 
 @lti.route("/nomas/approve-and-send", methods=["POST"])
@@ -1613,6 +1786,7 @@ def nomas_delete_submission():
         supabase.table("uscis_submissions").delete().eq(
             "submission_id", str(submission_id)
         ).execute()
+        SIMILARITY.remove(submission_id)
         if request.is_json:
             return jsonify({"success": True}), 200
         from flask import flash
@@ -1654,17 +1828,17 @@ def nomas_save_notes():
         if rec.data:
             uid = str(rec.data.get("student_id") or "")
     except Exception as e:
-        print("⚠️ uscis_submissions lookup failed in save-notes:", str(e))
+        log.warning("⚠️ uscis_submissions lookup failed in save-notes: %s", str(e))
 
     if not uid:
         uid = str(session.get("student_id") or session.get("user_id") or "")
 
     if uid:
         try:
-            supabase.rpc("set_client_uid", {"uid": uid}).execute()
-            print("🔐 set_client_uid:", uid)
+            set_rls_uid(uid)
+            log.debug("🔐 RLS uid: %s", uid)
         except Exception as e:
-            print("⚠️ set_client_uid RPC failed (continuing):", str(e))
+            log.warning("⚠️ Setting RLS uid failed (continuing): %s", str(e))
 
     # --- Update notes ---
     try:
@@ -1675,12 +1849,15 @@ def nomas_save_notes():
             .execute()
         )
         if not (upd.data and len(upd.data) > 0):
-            print("⚠️ Notes update affected 0 rows; submission_id:", submission_id)
+            log.warning(
+                "⚠️ Notes update affected 0 rows; submission_id: %s",
+                submission_id,
+            )
             return "❌ Could not save notes (permission or row not found).", 403
 
-        print("✅ Instructor notes saved for:", submission_id)
+        log.debug("✅ Instructor notes saved for: %s", submission_id)
     except Exception as e:
-        print("❌ Error updating uscis_submissions notes:", str(e))
+        log.error("❌ Error updating uscis_submissions notes: %s", str(e))
         return f"❌ Error saving notes: {e}", 500
 
     # --- Go back to where the form asked us to ---
@@ -1707,6 +1884,8 @@ def post_grade():
             with open(private_key_path) as f:
                 private_key = f.read()
 
+            from requests_oauthlib import OAuth1Session
+
             oauth = OAuth1Session(
                 client_key=os.getenv("CLIENT_ID"),
                 signature_method="RSA-SHA1",
@@ -1732,9 +1911,9 @@ def post_grade():
                 headers={"Content-Type": "application/vnd.ims.lis.v1.score+json"},
             )
             ags_response.raise_for_status()
-            print("✅ Manual grade posted by instructor.")
+            log.debug("✅ Manual grade posted by instructor.")
         except Exception as e:
-            print("❌ Instructor grade post failed:", str(e))
+            log.error("❌ Instructor grade post failed: %s", str(e))
 
     return render_template(
         "feedback.html",
@@ -1754,7 +1933,7 @@ def test_grader():
         response = supabase.table("assignments").select("*").execute()
         rubric_index = response.data or []
     except Exception as e:
-        print("❌ Supabase fetch error in test-grader:", e)
+        log.error("❌ Supabase fetch error in test-grader: %s", e)
         flash("❌ Error loading assignments.", "danger")
         rubric_index = []
 
@@ -1816,96 +1995,37 @@ def test_grader():
                 gpt_score=gpt_score,
             )
 
-        # Load rubric
-        rubric_text = ""
-        rubric_path = os.path.join("rubrics", selected_config.get("rubric_file", ""))
+        # Same compiled prompt grade_docx uses
         try:
-            if rubric_path.endswith(".json"):
-                with open(rubric_path, encoding="utf-8") as f:
-                    rubric_json = json.load(f)
-
-                if "sections" in rubric_json:
-                    rubric_text = "\n".join(
-                        [f"- {section['title']}" for section in rubric_json["sections"]]
-                    )
-                    rubric_total_points = rubric_json.get("total_points")
-                elif "criteria" in rubric_json:
-                    rubric_text = "\n".join(
-                        [f"- {c['description']}" for c in rubric_json["criteria"]]
-                    )
-                    # rubric_total_points = get_total_points_from_rubric(rubric_json)
-                else:
-                    return (
-                        "❌ Unrecognized rubric format. Please upload a valid .json rubric with 'sections' or 'criteria'.",
-                        400,
-                    )
-
-            elif rubric_path.endswith(".docx"):
-                doc = Document(rubric_path)
-                rubric_text = "\n".join([para.text for para in doc.paragraphs])
-            elif rubric_path.endswith(".pdf"):
-                rubric_text = extract_pdf_text(rubric_path)
-        except:
-            rubric_text = "(Unable to load rubric.)"
-
-        # Build GPT prompt
-        prompt = f"""
-You are a helpful AI grader.
-
-Assignment Title: {assignment_title}
-Grading Difficulty: {selected_config.get("grading_difficulty")}
-Student Level: {selected_config.get("student_level")}
-Feedback Tone: {selected_config.get("feedback_tone")}
-Total Points: {selected_config.get("total_points")}
-
-Rubric:
-{rubric_text}
-"""
-
-        if selected_config.get("ai_notes"):
-            prompt += f"""
-
-Instructor Notes:
-{selected_config["ai_notes"]}
-"""
-
-        prompt += f"""
-
-Student Submission:
----
-The following is the student's full submission. Please preserve paragraph formatting, line breaks, and indentation when analyzing or quoting their writing.
-
-\"\"\"{submission_text}\"\"\"
----
-
-Return your response in this format:
-
-Score: <number from 0 to {selected_config.get("total_points")}>
-Feedback: <detailed, helpful feedback in paragraph form>
-
-(Note: A future version of this tool may request table-based feedback. If no such instruction is present, return standard narrative feedback only.)
-"""
-
-        gpt_prompt = prompt.strip()
+            tpl = _grader_template(assignment_title, selected_config)
+        except Exception as e:
+            log.warning("⚠️ test-grader rubric load failed: %s", e)
+            tpl = compile_template(
+                assignment_title,
+                selected_config,
+                "(Unable to load rubric.)",
+                selected_config.get("total_points"),
+            )
+        gpt_prompt = tpl.render(submission_text)
 
         try:
-            model_to_use = selected_config.get("gpt_model", "gpt-4")
             openai.api_key = os.getenv("OPENAI_API_KEY")
-            response = openai.ChatCompletion.create(
-                model=model_to_use,
-                messages=[{"role": "user", "content": gpt_prompt}],
-                temperature=0.5,
-                max_tokens=500,
+            # Instructor previews wait their institution's turn like graded submissions
+            with SCHEDULER.enqueue(session.get("institution_id"), estimate_tokens(gpt_prompt, 500)):
+                graded = _grade_with_llm(
+                    "test_grader", model_tiers(selected_config), tpl, submission_text, max_tokens=500
+                )
+            log_ai_usage(
+                user_id=session.get("user_id"),
+                institution_id=session.get("institution_id"),
+                tool="test_grader",
+                model=graded["model"],
+                assignment_id=selected_config.get("assignment_id") or assignment_title,
+                usage=graded["usage"],
+                latency_ms=graded["latency_ms"],
             )
-            output = response["choices"][0]["message"]["content"]
 
-            score_match = re.search(r"Score:\s*(\d{1,3})", output)
-            gpt_score = int(score_match.group(1)) if score_match else None
-
-            feedback_match = re.search(r"Feedback:\s*(.+)", output, re.DOTALL)
-            gpt_feedback = (
-                feedback_match.group(1).strip() if feedback_match else output.strip()
-            )
+            gpt_score, gpt_feedback = graded["score"], graded["feedback"]
 
             log_gpt_interaction(assignment_title, gpt_prompt, gpt_feedback, gpt_score)
 
@@ -1933,7 +2053,7 @@ def save_assignment():
     if "launch_data" not in session and not session.get("logged_in"):
         return redirect(url_for("lti.unauthorized"))
 
-    print("🚨 HIT /save-assignment")
+    log.debug("🚨 HIT /save-assignment")
 
     # 🔐 RLS: tell PostgREST who we are
     apply_rls_uid()
@@ -1988,33 +2108,17 @@ def save_assignment():
     additional_file = request.files.get("additional_files")
 
     # -------- File uploads -> storage URLs --------
-    from werkzeug.utils import secure_filename
-
-    # Use the assignment title to namespace files in the bucket
-    secure_title = secure_filename(assignment_title).replace(" ", "_")
-
     def _save_and_upload(fileobj, bucket: str) -> str:
         """
         Upload the given FileStorage to Supabase and return a PUBLIC URL string.
         """
-        fname = secure_filename(fileobj.filename).replace(" ", "_")
+        # spool once (size-capped); small files stay in memory, big ones stream from disk
+        upload = spool_request_file(fileobj)
 
-        # storage key inside the bucket: <assignment-title>/<filename>
-        key = f"{secure_title}/{fname}" if secure_title else fname
-
-        # read file bytes
-        data = fileobj.read()
-        # reset pointer in case file is used again later
-        try:
-            fileobj.seek(0)
-        except Exception:
-            pass
-
-        # content type if Werkzeug provided one
-        content_type = getattr(fileobj, "mimetype", None)
-
-        # upload the bytes using the canonical helper
-        upload_to_supabase(bucket, key, data, content_type=content_type)
+        # storage key is content-addressed (sha256/<hh>/<sha256><ext>), so re-saving
+        # an assignment with the same file is a HEAD, not a re-upload
+        key = content_key(upload.sha256, fileobj.filename)
+        put_object(bucket, key, upload.payload(), upload.content_type)
 
         # return a public URL string so downstream code keeps working
         return supabase.storage.from_(bucket).get_public_url(key)
@@ -2096,18 +2200,18 @@ def save_assignment():
         ins = supabase.table("assignments").insert(payload).execute()
         data = getattr(ins, "data", None)
         err = getattr(ins, "error", None)
-        print("📝 insert data:", data)
-        print("🧯 insert error:", err)
+        log.debug("📝 insert data: %s", data)
+        log.debug("🧯 insert error: %s", err)
         if not data:
             raise RuntimeError(err or "Insert returned no rows")
     except Exception as e:
         # Print PostgREST body when available
-        print("❌ Insert exception:", repr(e))
+        log.error("❌ Insert exception: %s", repr(e))
         resp = getattr(e, "response", None)
         if resp is not None:
             try:
-                print("❌ PostgREST text:", getattr(resp, "text", None))
-                print("❌ PostgREST json:", resp.json())
+                log.error("❌ PostgREST text: %s", getattr(resp, "text", None))
+                log.error("❌ PostgREST json: %s", resp.json())
             except Exception:
                 pass
 
@@ -2129,19 +2233,23 @@ def save_assignment():
     return redirect(url_for("lti.grader_base", success=assignment_title))
 
 
+def _review_scope() -> tuple:
+    return session.get("institution_id"), session.get("course_id"), bool(session.get("is_superuser"))
+
+
 @lti.route("/instructor-review", methods=["GET", "POST"], endpoint="instructor_review")
 def instructor_review():
     submission_id = request.values.get("submission_id")  # args or form
     current_review = None
     next_id = None
 
-    print("🔍 is_superuser:", session.get("is_superuser"))
-    print("🔍 course_id:", session.get("course_id"))
-    print("🔍 institution_id:", session.get("institution_id"))
+    log.debug("🔍 is_superuser: %s", session.get("is_superuser"))
+    log.debug("🔍 course_id: %s", session.get("course_id"))
+    log.debug("🔍 institution_id: %s", session.get("institution_id"))
 
     # ---------- POST: update score/feedback ----------
     if request.method == "POST":
-        print("📩 POST form data:", dict(request.form))
+        log.debug("📩 POST form fields: %s", sorted(request.form))
         submission_id = (request.form.get("submission_id") or "").strip()
         if not submission_id:
             return "❌ submission_id required", 400
@@ -2159,13 +2267,13 @@ def instructor_review():
             if rec.data:
                 uid = rec.data.get("student_id") or rec.data.get("user_id")
         except Exception as e:
-            print("⚠️ lookup for RLS uid failed:", str(e))
+            log.warning("⚠️ lookup for RLS uid failed: %s", str(e))
 
         if uid:
             try:
-                supabase.rpc("set_client_uid", {"uid": str(uid)}).execute()
+                set_rls_uid(str(uid))
             except Exception as e:
-                print("⚠️ set_client_uid RPC failed (continuing):", str(e))
+                log.warning("⚠️ Setting RLS uid failed (continuing): %s", str(e))
 
         # do not touch submission_time here
         updated_score = request.form.get("score")
@@ -2181,70 +2289,41 @@ def instructor_review():
                 }
             ).eq("submission_id", submission_id).execute()
         except Exception as e:
-            print("❌ update failed:", str(e))
+            log.error("❌ update failed: %s", str(e))
             return f"❌ Failed to save review: {e}", 500
+        REVIEW_QUEUE.invalidate(submission_id)
 
         # go back to the same submission page
         return redirect(url_for("lti.instructor_review", submission_id=submission_id))
 
-    # ---------- GET: load one submission or a review queue ----------
-    if submission_id:
-        resp = (
-            supabase.table("submissions")
-            .select("*")
-            .eq("submission_id", submission_id)
-            .execute()
-        )
-        reviews = resp.data or []
-    else:
-        if session.get("is_superuser"):
-            print("👑 Superuser: all unreviewed")
-            resp = (
-                supabase.table("submissions")
-                .select("*")
-                .eq("pending", True)
-                .eq("reviewed", False)
-                .order("submission_time", desc=True)
-                .execute()
-            )
-        else:
-            print("👤 Instructor: filtered unreviewed by institution/course")
-            resp = (
-                supabase.table("submissions")
-                .select("*")
-                .eq("institution_id", session.get("institution_id"))
-                .eq("course_id", session.get("course_id"))
-                .eq("pending", True)
-                .eq("reviewed", False)
-                .order("submission_time", desc=True)
-                .execute()
-            )
-        reviews = resp.data or []
-
-    # sanity
-    reviews = [
-        r for r in reviews if r.get("submission_id") and r.get("assignment_title")
-    ]
-
-    if submission_id:
-        current_review = reviews[0] if reviews else None
-    if not current_review and reviews:
-        current_review = reviews[0]
-        if len(reviews) > 1:
-            next_id = reviews[1]["submission_id"]
+    # ---------- GET: the current submission plus the next few ----------
+    win = REVIEW_QUEUE.window(_review_scope(), submission_id=submission_id, uid=rls_uid())
+    current_review = win.current
+    reviews = ([current_review] if current_review else []) + win.upcoming
+    next_id = win.next_id
 
     # hotfix: hide any seeded test note if it exists
     bad = "Test feedback (RLS check)"
     if current_review and (current_review.get("instructor_notes") or "").strip() == bad:
         current_review["instructor_notes"] = ""
 
-    # template handles the viewer (Google gview iframe)
-    return render_template(
-        "instructor_review.html",
-        current_review=current_review,
-        reviews=reviews,
-        next_id=next_id,
+    # template shows the cached preview (/preview/<key>) when there is one
+    preview_key = previews.ensure(current_review.get("student_file_url")) if current_review else None
+    resp = make_response(
+        render_template(
+            "instructor_review.html",
+            current_review=current_review,
+            reviews=reviews,
+            next_id=next_id,
+            preview_key=preview_key,
+        )
     )
+    if win.prefetch_url:
+        # Let the browser fetch the next preview (or file) while this one is read
+        next_key = previews.ensure(win.prefetch_url)
+        next_url = url_for("lti.file_preview", key=next_key) if next_key else win.prefetch_url
+        resp.headers["Link"] = f"<{next_url}>; rel=prefetch"
+    return resp
 
 
 @lti.route("/instructor-review/save-notes", methods=["POST"])
@@ -2265,10 +2344,10 @@ def instructor_save_notes():
     if record.data:
         uid = str(record.data.get("student_id") or session.get("user_id"))
     if uid:
-        supabase.rpc("set_client_uid", {"uid": uid}).execute()
-        print("🔐 Using set_client_uid with:", uid)
+        set_rls_uid(uid)
+        log.debug("🔐 Using RLS uid: %s", uid)
 
-        print("🔐 Using set_client_uid with:", uid)
+        log.debug("🔐 Using RLS uid: %s", uid)
 
     response = (
         supabase.table("submissions")
@@ -2276,48 +2355,17 @@ def instructor_save_notes():
         .eq("submission_id", submission_id)
         .execute()
     )
+    REVIEW_QUEUE.invalidate(submission_id)
 
-    print("✅ Instructor notes saved for:", submission_id)
+    log.debug("✅ Instructor notes saved for: %s", submission_id)
     return redirect("/instructor-review?submission_id=" + submission_id)
 
 
 @lti.route("/instructor-review-button", methods=["GET", "POST"])
 def instructor_review_button():
-    print("🔍 is_superuser:", session.get("is_superuser"))
-    print("🔍 institution_id:", session.get("institution_id"))
-    print("🔍 course_id:", session.get("course_id"))
-
-    if session.get("is_superuser"):
-        print("👑 Superuser: loading all unreviewed submissions")
-        response = (
-            supabase.table("submissions")
-            .select("*")
-            .eq("pending", True)
-            .eq("reviewed", False)
-            .execute()
-        )
-    else:
-        print(
-            "👤 Instructor: filtering unreviewed submissions by institution and course"
-        )
-        response = (
-            supabase.table("submissions")
-            .select("*")
-            .eq("institution_id", session.get("institution_id"))
-            .eq("course_id", session.get("course_id"))
-            .eq("pending", True)
-            .eq("reviewed", False)
-            .execute()
-        )
-
-    reviews = response.data or []
-
-    # ✅ Filter out any malformed entries
-    reviews = [
-        r for r in reviews if r.get("submission_id") and r.get("assignment_title")
-    ]
-
-    print(f"🧪 Number of pending reviews found: {len(reviews)}")  # ✅ Add this
+    log.debug("🔍 is_superuser: %s", session.get("is_superuser"))
+    log.debug("🔍 institution_id: %s", session.get("institution_id"))
+    log.debug("🔍 course_id: %s", session.get("course_id"))
 
     submission_id = request.args.get("submission_id")
 
@@ -2343,25 +2391,27 @@ def instructor_review_button():
                 "timestamp": datetime.utcnow().isoformat(),
             }
         ).eq("submission_id", submission_id).execute()
+        REVIEW_QUEUE.invalidate(submission_id)
 
         return redirect(url_for("lti.instructor_review_button"))
 
-    current_review = None
-    if submission_id:
-        current_review = next(
-            (r for r in reviews if r["submission_id"] == submission_id), None
-        )
-    elif reviews:
-        current_review = reviews[0]
+    scope = _review_scope()
+    win = REVIEW_QUEUE.window(scope, submission_id=submission_id, uid=rls_uid())
+    # Only submissions still in this scope's queue
+    current_review = win.current if REVIEW_QUEUE.contains(scope, win.current) else None
+    log.debug("🧪 Review %s in queue: %s", submission_id, bool(current_review))
 
-        return render_template(
-            "instructor_review.html", current_review=current_review, reviews=reviews
-        )
+    return render_template(
+        "instructor_review.html",
+        current_review=current_review,
+        reviews=([current_review] + win.upcoming) if current_review else [],
+        next_id=win.next_id if current_review else None,
+    )
 
 
 def post_grade_to_lms(session, score, feedback):
-    print("🧪 lineitem_url:", session.get("lineitem_url"))
-    print("🧪 feedback:", feedback)
+    log.debug("🧪 lineitem_url: %s", session.get("lineitem_url"))
+    log.debug("🧪 feedback: %s", feedback)
 
     try:
         launch_data = session.get("launch_data", {})
@@ -2370,7 +2420,7 @@ def post_grade_to_lms(session, score, feedback):
         )
 
         if not ags_claim or "lineitem" not in ags_claim:
-            print("⚠️ AGS info missing — cannot post grade.")
+            log.warning("⚠️ AGS info missing — cannot post grade.")
             return
 
         lineitem_url = ags_claim["lineitem"].split("?")[0] + "/scores"
@@ -2378,6 +2428,8 @@ def post_grade_to_lms(session, score, feedback):
         with open(private_key_path) as f:
             private_key = f.read()
 
+        from requests_oauthlib import OAuth1Session
+
         oauth = OAuth1Session(
             client_key=os.getenv("CLIENT_ID"),
             signature_method="RSA-SHA1",
@@ -2391,18 +2443,19 @@ def post_grade_to_lms(session, score, feedback):
             .get("title", "")
             .strip()
         )
-        print("📝 Assignment Title:", assignment_title)
+        log.debug("📝 Assignment Title: %s", assignment_title)
         assignment_config = load_assignment_config(assignment_title)
 
         if not assignment_config or not assignment_config.get("total_points"):
-            print(
-                f"❌ Missing assignment config or total_points for: {assignment_title}"
+            log.error(
+                "❌ Missing assignment config or total_points for: %s",
+                assignment_title,
             )
             return
 
         rubric_total_points = assignment_config.get("total_points")
         if rubric_total_points is None:
-            print(f"❌ total_points is None for assignment: {assignment_title}")
+            log.error("❌ total_points is None for assignment: %s", assignment_title)
             return
 
         score_payload = {
@@ -2415,9 +2468,10 @@ def post_grade_to_lms(session, score, feedback):
             "timestamp": datetime.utcnow().isoformat() + "Z",
         }
 
-        print("📦 Final Score Payload:")
-        for k, v in score_payload.items():
-            print(f"  {k}: {repr(v)} ({type(v)})")
+        log.debug(
+            "📦 Final Score Payload",
+            extra={"fields": {k: v for k, v in score_payload.items() if k != "comment"}},
+        )
 
         response = oauth.post(
             lineitem_url,
@@ -2426,12 +2480,12 @@ def post_grade_to_lms(session, score, feedback):
         )
 
         if response.status_code >= 200 and response.status_code < 300:
-            print("✅ Grade posted to LMS.")
+            log.debug("✅ Grade posted to LMS.")
         else:
-            print("⚠️ AGS post failed:", response.text)
+            log.warning("⚠️ AGS post failed: %s", response.text)
 
     except Exception as e:
-        print("❌ Error in post_grade_to_lms():", str(e))
+        log.error("❌ Error in post_grade_to_lms(): %s", str(e))
 
 
 @lti.route("/edit-assignment/<assignment_id>", methods=["GET", "POST"])
@@ -2440,9 +2494,9 @@ def edit_assignment(assignment_id):
         return redirect(url_for("lti.unauthorized"))
 
     if request.method == "POST":
-        print("🚀 Save Assignment POST route hit")
+        log.debug("🚀 Save Assignment POST route hit")
         try:
-            print("📥 POST data:", request.form)
+            log.debug("📥 POST fields: %s", sorted(request.form))
 
             total_points = request.form.get("total_points", type=int)
             gpt_model = request.form.get("gpt_model", "gpt-4")
@@ -2455,8 +2509,8 @@ def edit_assignment(assignment_id):
             faith_raw = request.form.get("faith_integration", "false")
             faith_integration = faith_raw.lower() == "true"
 
-            print(
-                "🧠 Final values to save:",
+            log.debug(
+                "🧠 Final values to save: %s",
                 {
                     "total_points": total_points,
                     "ai_notes": ai_notes,
@@ -2488,14 +2542,14 @@ def edit_assignment(assignment_id):
             )
 
             if hasattr(response, "error") and response.error:
-                print("❌ Supabase error:", response.error.message)
+                log.error("❌ Supabase error: %s", response.error.message)
                 return f"❌ Supabase update error: {response.error.message}", 500
 
-            print("✅ Assignment updated successfully")
+            log.debug("✅ Assignment updated successfully")
             return redirect(url_for("lti.view_assignments"))
 
         except Exception as e:
-            print("❌ Exception in edit_assignment:", e)
+            log.error("❌ Exception in edit_assignment: %s", e)
             return "Internal Server Error", 500
 
     # ✅ GET request logic — check in assignments first
@@ -2517,7 +2571,7 @@ def edit_assignment(assignment_id):
         )
         data = response.data
         if data:
-            print("↪️ Redirecting to edit_chat_assignment route...")
+            log.debug("↪️ Redirecting to edit_chat_assignment route...")
             return redirect(
                 url_for("lti.edit_chat_assignment", assignment_id=assignment_id)
             )
@@ -2554,21 +2608,19 @@ def view_assignments():
         course_id = session.get("course_id", "demo_course")
 
         if session.get("is_superuser"):
-            print("👑 Superuser: loading all assignments")
+            log.debug("👑 Superuser: loading all assignments")
             response = supabase.table("assignments").select("*").execute()
         else:
-            print(
-                "👤 Instructor: filtering assignments by institution and course (allow legacy NULLs)"
-            )
+            log.debug("👤 Instructor: filtering assignments by institution and course")
             q = supabase.table("assignments").select("*").eq("tool", "grader")
 
             inst_id = session.get("institution_id")
             if inst_id:
-                q = q.or_(f"institution_id.eq.{inst_id},institution_id.is.null")
+                q = q.eq("institution_id", inst_id)
 
             course_id = session.get("course_id")
             if course_id:
-                q = q.or_(f"course_id.eq.{course_id},course_id.is.null")
+                q = q.eq("course_id", course_id)
 
             response = q.order("created_at", desc=True).execute()
 
@@ -2576,15 +2628,14 @@ def view_assignments():
 
         # 🧪 Add this debug loop AFTER fetching
         for a in assignments:
-            print(
-                "🧪 ASSIGNMENT DEBUG:",
+            log.debug(
+                "🧪 ASSIGNMENT DEBUG: %s | ID: %s",
                 a.get("assignment_title"),
-                "| ID:",
                 a.get("assignment_id"),
             )
 
     except Exception as e:
-        print("❌ Supabase fetch error (view-assignments):", e)
+        log.error("❌ Supabase fetch error (view-assignments): %s", e)
         flash("❌ Error loading assignments.", "danger")
         assignments = []
 
@@ -2598,7 +2649,7 @@ def delete_assignment():
 
     data = request.get_json()
     assignment_title = data.get("assignment_title", "").strip()
-    print(f"🗑 Deleting assignment: {assignment_title}")
+    log.debug("🗑 Deleting assignment: %s", assignment_title)
 
     if not assignment_title:
         return jsonify({"success": False, "error": "Missing assignment title"}), 400
@@ -2631,117 +2682,104 @@ def nomas_training_dashboard():
     inst_id = session.get("institution_id")
     course_id = session.get("course_id", "demo_course")
 
-    # --- Assignments (USCIS/NoMas) ---
-    try:
-        if session.get("is_superuser"):
-            aresp = (
-                supabase.table("uscis_assignments")
-                .select(
-                    "assignment_id, assignment_title, form_type, institution_id, course_id, created_at"
-                )
-                .order("created_at", desc=True)
-                .execute()
-            )
-            assignments = aresp.data or []
-        else:
-            # strict first
-            aresp = (
-                supabase.table("uscis_assignments")
-                .select(
-                    "assignment_id, assignment_title, form_type, institution_id, course_id, created_at"
+    def load():
+        # --- Assignments (USCIS/NoMas) ---
+        try:
+            if session.get("is_superuser"):
+                aresp = (
+                    supabase.table("uscis_assignments")
+                    .select(
+                        "assignment_id, assignment_title, form_type, institution_id, course_id, created_at"
+                    )
+                    .order("created_at", desc=True)
+                    .execute()
                 )
-                .eq("institution_id", inst_id)
-                .eq("course_id", course_id)
-                .order("created_at", desc=True)
-                .execute()
-            )
-            assignments = aresp.data or []
-            # include legacy rows with NULLs
-            if not assignments:
+                assignments = aresp.data or []
+            else:
                 aresp = (
                     supabase.table("uscis_assignments")
                     .select(
                         "assignment_id, assignment_title, form_type, institution_id, course_id, created_at"
                     )
-                    .or_(f"institution_id.is.null,institution_id.eq.{inst_id}")
-                    .or_(f"course_id.is.null,course_id.eq.{course_id}")
+                    .eq("institution_id", inst_id)
+                    .eq("course_id", course_id)
                     .order("created_at", desc=True)
                     .execute()
                 )
                 assignments = aresp.data or []
-    except Exception as e:
-        print("❌ load uscis_assignments:", e)
-        assignments = []
+        except Exception as e:
+            log.error("❌ load uscis_assignments: %s", e)
+            assignments = []
 
-    # Build a quick lookup of title -> form_type for fallback mapping
-    assignment_ft_by_title = {
-        (a.get("assignment_title") or ""): (a.get("form_type") or None)
-        for a in assignments
-    }
+        # Build a quick lookup of title -> form_type for fallback mapping
+        assignment_ft_by_title = {
+            (a.get("assignment_title") or ""): (a.get("form_type") or None)
+            for a in assignments
+        }
 
-    # --- Submissions (NoMas only) — tolerate missing columns like institution_id/course_id ---
-    try:
-        sresp = (
-            supabase.table("uscis_submissions")
-            .select("*")
-            .order("submission_time", desc=True)
-            .execute()
-        )
-        submissions = sresp.data or []
-    except Exception as e:
-        current_app.logger.exception("❌ Failed to load NoMas submissions: %s", e)
-        submissions = []
+        # --- Submissions (NoMas only) — tolerate missing columns like institution_id/course_id ---
+        try:
+            sresp = (
+                supabase.table("uscis_submissions")
+                .select("*")
+                .order("submission_time", desc=True)
+                .execute()
+            )
+            submissions = sresp.data or []
+        except Exception as e:
+            current_app.logger.exception("❌ Failed to load NoMas submissions: %s", e)
+            submissions = []
 
-    # --- Fallback: if uscis_submissions is empty, surface legacy 'submissions' rows that correspond to NoMas assignments ---
-    try:
-        if not submissions:
-            titles = [
-                a.get("assignment_title")
-                for a in assignments
-                if a.get("assignment_title")
-            ]
-            if titles:
-                if session.get("is_superuser"):
-                    legacy = (
-                        supabase.table("submissions")
-                        .select("*")
-                        .in_("assignment_title", titles)
-                        .order("submission_time", desc=True)
-                        .limit(200)
-                        .execute()
-                    ).data or []
-                else:
-                    legacy = (
-                        supabase.table("submissions")
-                        .select("*")
-                        .in_("assignment_title", titles)
-                        .or_(f"institution_id.is.null,institution_id.eq.{inst_id}")
-                        .or_(f"course_id.is.null,course_id.eq.{course_id}")
-                        .order("submission_time", desc=True)
-                        .limit(200)
-                        .execute()
-                    ).data or []
-                # Map legacy rows to the template shape
-                mapped = []
-                for r in legacy:
-                    mapped.append(
-                        {
-                            **r,
-                            "user_id": r.get("student_id"),
-                            "submitted_at": r.get("submission_time"),
-                            "form_type": assignment_ft_by_title.get(
-                                r.get("assignment_title") or "", None
-                            ),
-                        }
-                    )
-                submissions = mapped
-    except Exception as e:
-        print("⚠️ fallback from submissions failed:", e)
+        # --- Fallback: if uscis_submissions is empty, surface legacy 'submissions' rows that correspond to NoMas assignments ---
+        try:
+            if not submissions:
+                titles = [
+                    a.get("assignment_title")
+                    for a in assignments
+                    if a.get("assignment_title")
+                ]
+                if titles:
+                    if session.get("is_superuser"):
+                        legacy = (
+                            supabase.table("submissions")
+                            .select("*")
+                            .in_("assignment_title", titles)
+                            .order("submission_time", desc=True)
+                            .limit(200)
+                            .execute()
+                        ).data or []
+                    else:
+                        legacy = (
+                            supabase.table("submissions")
+                            .select("*")
+                            .in_("assignment_title", titles)
+                            .eq("institution_id", inst_id)
+                            .eq("course_id", course_id)
+                            .order("submission_time", desc=True)
+                            .limit(200)
+                            .execute()
+                        ).data or []
+                    # Map legacy rows to the template shape
+                    mapped = []
+                    for r in legacy:
+                        mapped.append(
+                            {
+                                **r,
+                                "user_id": r.get("student_id"),
+                                "submitted_at": r.get("submission_time"),
+                                "form_type": assignment_ft_by_title.get(
+                                    r.get("assignment_title") or "", None
+                                ),
+                            }
+                        )
+                    submissions = mapped
+        except Exception as e:
+            log.warning("⚠️ fallback from submissions failed: %s", e)
 
-    return render_template(
-        "grader/nomas_training_dashboard.html",
-        assignments=assignments,
-        submissions=submissions,
+        return {"assignments": assignments, "submissions": submissions}
+
+    return cached_response(
+        load, lambda data: render_template("grader/nomas_training_dashboard.html", **data)
     )
 
 
@@ -2761,64 +2799,50 @@ def _debug_nomas_latest():
 
 @lti.route("/release-pending", methods=["GET"])
 def release_pending_feedback():
-    print("🚀 /release-pending triggered")
+    log.debug("🚀 /release-pending triggered")
 
     try:
         from datetime import datetime
 
         now = datetime.utcnow().isoformat()
 
-        response = (
-            supabase.table("submissions")
-            .select("*")
-            .eq("pending", True)
-            .lt("release_time", now)
-            .execute()
-        )
-
-        if hasattr(response, "error") and response.error:
-            print("❌ Supabase query error:", response.error.message)
-            return f"Supabase query failed: {response.error.message}", 500
-
-        pending = response.data or []
-        print(f"📬 Found {len(pending)} entries eligible for release")
-
-        released = 0
-
-        for entry in pending:
-            assignment_id = entry.get("assignment_id")
-            student_id = entry.get("student_id")
-            score = entry.get("score")
-            feedback = entry.get("feedback")
-            submission_id = entry.get("submission_id")
-
-            if not all([assignment_id, student_id, score, feedback, submission_id]):
-                print(f"⚠️ Skipping incomplete submission: {submission_id}")
-                continue
-
-            if student_id:
-                supabase.rpc("set_client_uid", {"uid": str(student_id)}).execute()
-                print("🔐 Using set_client_uid with:", student_id)
-
-            update_response = (
+        if pg_reads.enabled():
+            pending = pg_reads.release_due(now)
+        else:
+            response = (
                 supabase.table("submissions")
-                .update({"pending": False, "reviewed": True, "released_at": now})
-                .eq("submission_id", submission_id)
+                .select("*")
+                .eq("pending", True)
+                .lt("release_time", now)
                 .execute()
             )
 
-            if hasattr(update_response, "error") and update_response.error:
-                print(
-                    f"❌ Error updating submission {submission_id}: {update_response.error.message}"
-                )
+            if hasattr(response, "error") and response.error:
+                log.error("❌ Supabase query error: %s", response.error.message)
+                return f"Supabase query failed: {response.error.message}", 500
+
+            pending = response.data or []
+        log.debug("📬 Found %s entries eligible for release", len(pending))
+
+        due = []
+        for entry in pending:
+            keys = ("assignment_id", "student_id", "score", "feedback", "submission_id")
+            if not all(entry.get(k) for k in keys):
+                log.warning("⚠️ Skipping incomplete submission: %s", entry.get("submission_id"))
                 continue
+            due.append(str(entry["submission_id"]))
 
-            released += 1
+        # One UPDATE ... RETURNING per BULK_CHUNK ids, not one per submission
+        rows = _release_submissions(due, scoped=False) if due else []
+        publish_submissions(rows)
+        released = len(rows)
 
+        if released:
+            DASHBOARDS.invalidate()
         return f"✅ Released {released} submissions", 200
 
     except Exception as e:
-        print("❌ Fatal error in release process:", str(e))
+        log.error("❌ Fatal error in release process: %s", str(e))
         return f"❌ Internal error: {str(e)}", 500
 
 
@@ -2827,18 +2851,21 @@ def run_delay_checker():
     from datetime import datetime
 
     # Fetch submissions that are still waiting
-    response = (
-        supabase.table("submissions").select("*").eq("ready_to_post", False).execute()
-    )
+    if pg_reads.enabled():
+        waiting = pg_reads.delay_unchecked()
+    else:
+        waiting = (
+            supabase.table("submissions").select("*").eq("ready_to_post", False).execute()
+        ).data
 
-    if not response.data:
-        print("✅ No submissions pending release.")
+    if not waiting:
+        log.debug("✅ No submissions pending release.")
         return "✅ No pending submissions to check.", 200
 
     now = datetime.utcnow()
     updates_made = 0
 
-    for submission in response.data:
+    for submission in waiting:
         try:
             # Get the release_time from the database (this is already stored when you save submissions)
             release_time = datetime.fromisoformat(
@@ -2854,15 +2881,42 @@ def run_delay_checker():
                 updates_made += 1
 
         except Exception as e:
-            print(
-                f"❌ Error checking submission {submission.get('submission_id')}: {str(e)}"
+            log.error(
+                "❌ Error checking submission %s: %s",
+                submission.get('submission_id'),
+                str(e),
             )
 
-    print(f"✅ Delay check complete. Updated {updates_made} submissions.")
+    log.debug("✅ Delay check complete. Updated %s submissions.", updates_made)
+    if updates_made:
+        DASHBOARDS.invalidate()
 
     return f"✅ Delay check complete. Updated {updates_made} submissions.", 200
 
 
+@lti.route("/grader/ai-usage", methods=["GET"])
+@require_tool("grader")
+def grader_ai_usage():
+    """
+    Per-institution / per-assignment token + latency totals for ?month=YYYY-MM
+    (default: this UTC month), from the usage sink, so every worker's calls count.
+    """
+    month = (request.args.get("month") or datetime.utcnow().strftime("%Y-%m")).strip()
+    if not re.fullmatch(r"\d{4}-(0[1-9]|1[0-2])", month):
+        return jsonify({"error": "month must be YYYY-MM"}), 400
+    since, until = f"{month}-01", next_month_start(month)
+    try:
+        if session.get("is_superuser") or session.get("role") == "superuser":
+            rows = usage_totals(since=since, until=until)
+        else:
+            inst = session.get("institution_id")
+            rows = usage_totals(str(inst), since, until) if inst else []
+    except Exception as e:
+        log.error("❌ AI usage totals failed: %s", str(e))
+        return jsonify({"error": "Usage totals unavailable"}), 503
+    return jsonify(rows), 200
+
+
 @lti.route(
     "/grader/download-activity-log",
     methods=["GET"],
@@ -2883,10 +2937,10 @@ def delete_submission():
         submission_id = request.form.get("submission_id") or request.get_json().get(
             "submission_id"
         )
-        print("🧪 DELETE REQUEST RECEIVED:", submission_id)
+        log.debug("🧪 DELETE REQUEST RECEIVED: %s", submission_id)
 
         if not submission_id:
-            print("❌ No submission_id received")
+            log.error("❌ No submission_id received")
             return (
                 jsonify({"success": False, "error": "No submission_id provided"}),
                 400,
@@ -2897,19 +2951,19 @@ def delete_submission():
         # Try to fetch the submission
         record = (
             supabase.table("submissions")
-            .select("student_id")
+            .select("student_id, student_file_url")
             .eq("submission_id", parsed_id)
             .single()
             .execute()
         )
         if not record.data:
-            print("❌ Submission not found in Supabase:", parsed_id)
+            log.error("❌ Submission not found in Supabase: %s", parsed_id)
             return jsonify({"success": False, "error": "Submission not found"}), 404
 
         uid = str(record.data.get("student_id") or session.get("user_id"))
         if uid:
-            supabase.rpc("set_client_uid", {"uid": uid}).execute()
-            print("🔐 Using set_client_uid with:", uid)
+            set_rls_uid(uid)
+            log.debug("🔐 Using RLS uid: %s", uid)
 
         # Delete the record
         response = (
@@ -2918,7 +2972,7 @@ def delete_submission():
             .eq("submission_id", parsed_id)
             .execute()
         )
-        print("🧪 DELETE RESPONSE:", response)
+        log.debug("🧪 DELETE RESPONSE: %s", response)
 
         # Double-check if it's gone
         confirm = (
@@ -2928,14 +2982,30 @@ def delete_submission():
             .execute()
         )
         if confirm.data:
-            print("❌ Record still exists after delete.")
+            log.error("❌ Record still exists after delete.")
             return jsonify({"success": False, "error": "Delete failed"}), 500
 
-        print("✅ Submission deleted:", parsed_id)
+        SIMILARITY.remove(parsed_id)
+        publish_submission(
+            {"submission_id": parsed_id},
+            deleted=True,
+            institution_id=session.get("institution_id"),
+            course_id=session.get("course_id"),
+        )
+
+        # Storage objects are shared by identical uploads: drop it only if unreferenced
+        file_url = record.data.get("student_file_url")
+        if file_url:
+            try:
+                release_object("submissions", file_url)
+            except Exception as e:
+                log.warning("⚠️ Could not release stored file (row deleted): %s", str(e))
+
+        log.debug("✅ Submission deleted: %s", parsed_id)
         return jsonify({"success": True}), 200
 
     except Exception as e:
-        print("❌ DELETE ERROR:", str(e))
+        log.error("❌ DELETE ERROR: %s", str(e))
         return jsonify({"success": False, "error": str(e)}), 500
 
 
@@ -2946,7 +3016,7 @@ def accept_submission():
     else:
         submission_id = request.form.get("submission_id")
 
-    print("🧪 ACCEPT REQUEST RECEIVED:", submission_id)
+    log.debug("🧪 ACCEPT REQUEST RECEIVED: %s", submission_id)
 
     try:
         if not submission_id:
@@ -2962,13 +3032,13 @@ def accept_submission():
         )
 
         if not record.data:
-            print("❌ Submission not found in Supabase:", parsed_id)
+            log.error("❌ Submission not found in Supabase: %s", parsed_id)
             return jsonify({"success": False, "error": "Submission not found"}), 404
 
         uid = str(record.data.get("student_id") or session.get("user_id"))
         if uid:
-            supabase.rpc("set_client_uid", {"uid": uid}).execute()
-            print("🔐 Using set_client_uid with:", uid)
+            set_rls_uid(uid)
+            log.debug("🔐 Using RLS uid: %s", uid)
 
         response = (
             supabase.table("submissions")
@@ -2977,10 +3047,12 @@ def accept_submission():
             .execute()
         )
 
-        print("🧪 ACCEPT RESPONSE:", response)
+        log.debug("🧪 ACCEPT RESPONSE: %s", response)
+        if response.data:
+            publish_submission(response.data[0])
 
         if hasattr(response, "data") and not response.data:
-            print("⚠️ No rows updated. Possibly already reviewed.")
+            log.warning("⚠️ No rows updated. Possibly already reviewed.")
             return (
                 jsonify(
                     {
@@ -2998,9 +3070,236 @@ def accept_submission():
             return redirect(url_for("lti.instructor_review"))
 
     except Exception as e:
-        print("❌ ACCEPT ERROR:", str(e))
+        log.error("❌ ACCEPT ERROR: %s", str(e))
+        return jsonify({"success": False, "error": "Internal error"}), 500
+
+
+# ---------- Bulk review actions ----------
+# One filtered UPDATE/DELETE ... RETURNING per BULK_CHUNK ids instead of a
+# page round trip (and up to four queries) per submission. Ids come as JSON
+# {"submission_ids": [...]} or repeated submission_ids form fields; the
+# answer is {"success", "count", "results": {id: status}}, where an id that
+# was not returned (missing, outside the caller's scope, or, for release,
+# no longer pending) is "not_found". RLS sees the caller, as for every other
+# request (_grader_rls_hook). Only staff (is_staff) may call them, and a
+# non-superuser needs an institution or course in the session.
+def _bulk_ids():
+    if request.is_json:
+        raw = (request.get_json(silent=True) or {}).get("submission_ids") or []
+    else:
+        raw = request.form.getlist("submission_ids")
+    if not isinstance(raw, list):
+        return []
+    return list(dict.fromkeys(str(i).strip() for i in raw if str(i or "").strip()))
+
+
+def _bulk_request():
+    """(ids, None) or (None, error response)."""
+    if "launch_data" not in session and not session.get("logged_in"):
+        return None, (jsonify({"success": False, "error": "Unauthorized"}), 401)
+    if not is_staff():
+        return None, (jsonify({"success": False, "error": "Forbidden"}), 403)
+    if session_role() != "superuser" and not (session.get("institution_id") or session.get("course_id")):
+        return None, (jsonify({"success": False, "error": "No institution or course in session"}), 403)
+    ids = _bulk_ids()
+    if not ids:
+        return None, (jsonify({"success": False, "error": "Missing submission_ids"}), 400)
+    if len(ids) > BULK_MAX_IDS:
+        return None, (jsonify({"success": False, "error": f"At most {BULK_MAX_IDS} ids per request"}), 413)
+    return ids, None
+
+
+def _bulk_write(table: str, ids: list, build, scoped: bool = True) -> list:
+    """Runs build(table query).in_(ids) per chunk; returns the affected rows."""
+    rows = []
+    for i in range(0, len(ids), BULK_CHUNK):
+        q = build(supabase.table(table)).in_("submission_id", ids[i : i + BULK_CHUNK])
+        if scoped and session_role() != "superuser":
+            if not (session.get("institution_id") or session.get("course_id")):
+                raise PermissionError("bulk write without an institution or course")
+            if session.get("institution_id"):
+                q = q.eq("institution_id", session["institution_id"])
+            if session.get("course_id"):
+                q = q.eq("course_id", session["course_id"])
+        with span(f"bulk_{table}"):
+            rows.extend(q.execute().data or [])
+    for sid in ids:
+        REVIEW_QUEUE.invalidate(sid)
+    return rows
+
+
+def _bulk_response(ids: list, rows: list, status: str, extra: dict = None):
+    done = {str(r.get("submission_id")) for r in rows}
+    results = {sid: (status if sid in done else "not_found") for sid in ids}
+    log.debug("📦 Bulk %s: %s of %s", status, len(done), len(ids))
+    return jsonify({"success": True, "count": len(done), "results": results, **(extra or {})}), 200
+
+
+def _post_scores_to_lms(scores_url: str, rows: list):
+    """Background job: one OAuth session posts every row's score to the line item."""
+    try:
+        from requests_oauthlib import OAuth1Session
+
+        with open(os.path.join("app", "keys", "private_key.pem")) as f:
+            private_key = f.read()
+        oauth = OAuth1Session(
+            client_key=os.getenv("CLIENT_ID"),
+            signature_method="RSA-SHA1",
+            rsa_key=private_key,
+            signature_type="auth_header",
+        )
+    except Exception as e:
+        log.error("❌ AGS batch of %s not posted: %s", len(rows), str(e))
+        return
+    totals = {}
+    posted = 0
+    with span("ags_post_batch"):
+        for row in rows:
+            title = row.get("assignment_title") or ""
+            if title not in totals:
+                totals[title] = (load_assignment_config(title) or {}).get("total_points")
+            payload = {
+                "userId": row.get("student_id"),
+                "scoreGiven": row.get("score"),
+                "scoreMaximum": totals[title],
+                "comment": str(row.get("feedback") or "Graded with Rubiqs"),
+                "activityProgress": "Completed",
+                "gradingProgress": "FullyGraded",
+                "timestamp": datetime.utcnow().isoformat() + "Z",
+            }
+            try:
+                resp = oauth.post(
+                    scores_url,
+                    json=payload,
+                    headers={"Content-Type": "application/vnd.ims.lis.v1.score+json"},
+                )
+                if 200 <= resp.status_code < 300:
+                    posted += 1
+                else:
+                    log.warning("⚠️ AGS post failed for %s: %s", row.get("submission_id"), resp.text)
+            except Exception as e:
+                log.error("❌ AGS post error for %s: %s", row.get("submission_id"), str(e))
+    log.info("✅ Posted %s of %s grade(s) to the LMS", posted, len(rows))
+
+
+def queue_lms_passbacks(rows: list) -> dict:
+    """
+    Queues the scores of just-approved rows for the caller's AGS line item,
+    as one background job. Like grade_docx, only Canvas launches post.
+    Returns {submission_id: "queued" | "skipped"}.
+    """
+    ags_claim = session.get("launch_data", {}).get(
+        "https://purl.imsglobal.org/spec/lti-ags/claim/endpoint"
+    ) or {}
+    postable = []
+    if session.get("platform") == "canvas" and "lineitem" in ags_claim:
+        postable = [r for r in rows if r.get("student_id") and r.get("score") is not None]
+    if postable:
+        submit(_post_scores_to_lms, ags_claim["lineitem"].split("?")[0] + "/scores", postable)
+    queued = {str(r.get("submission_id")) for r in postable}
+    return {str(r.get("submission_id")): ("queued" if str(r.get("submission_id")) in queued else "skipped") for r in rows}
+
+
+def _release_submissions(ids: list, scoped: bool = True) -> list:
+    """Marks the still-pending ids released; returns their rows."""
+    now = datetime.utcnow().isoformat()
+    return _bulk_write(
+        "submissions",
+        ids,
+        lambda t: t.update({"pending": False, "reviewed": True, "released_at": now}).eq("pending", True),
+        scoped=scoped,
+    )
+
+
+@lti.route("/instructor-review/bulk-accept", methods=["POST"])
+def bulk_accept_submissions():
+    ids, error = _bulk_request()
+    if error:
+        return error
+    try:
+        rows = _bulk_write("submissions", ids, lambda t: t.update({"pending": False, "reviewed": True}))
+    except Exception as e:
+        log.error("❌ BULK ACCEPT ERROR: %s", str(e))
+        return jsonify({"success": False, "error": "Internal error"}), 500
+    publish_submissions(rows)
+    return _bulk_response(ids, rows, "approved", {"ags": queue_lms_passbacks(rows)})
+
+
+@lti.route("/instructor-review/bulk-release", methods=["POST"])
+def bulk_release_submissions():
+    ids, error = _bulk_request()
+    if error:
+        return error
+    try:
+        rows = _release_submissions(ids)
+    except Exception as e:
+        log.error("❌ BULK RELEASE ERROR: %s", str(e))
+        return jsonify({"success": False, "error": "Internal error"}), 500
+    publish_submissions(rows)
+    return _bulk_response(ids, rows, "released", {"ags": queue_lms_passbacks(rows)})
+
+
+def _release_stored_files(urls):
+    for url in urls:
+        try:
+            release_object("submissions", url)
+        except Exception as e:
+            log.warning("⚠️ Could not release stored file (row deleted): %s", str(e))
+
+
+@lti.route("/bulk-delete-submissions", methods=["POST"])
+def bulk_delete_submissions():
+    ids, error = _bulk_request()
+    if error:
+        return error
+    try:
+        rows = _bulk_write("submissions", ids, lambda t: t.delete())
+    except Exception as e:
+        log.error("❌ BULK DELETE ERROR: %s", str(e))
         return jsonify({"success": False, "error": "Internal error"}), 500
 
+    for r in rows:
+        SIMILARITY.remove(r.get("submission_id"))
+    publish_submissions(
+        rows, deleted=True, institution_id=session.get("institution_id"), course_id=session.get("course_id")
+    )
+    # Storage objects are shared by identical uploads: drop each only if unreferenced
+    urls = list(dict.fromkeys(r["student_file_url"] for r in rows if r.get("student_file_url")))
+    if urls:
+        submit(_release_stored_files, urls)
+    return _bulk_response(ids, rows, "deleted")
+
+
+# uscis_submissions has no scope columns; RLS alone decides, as for the single-id routes
+@lti.route("/nomas/bulk-approve", methods=["POST"])
+def nomas_bulk_approve():
+    ids, error = _bulk_request()
+    if error:
+        return error
+    try:
+        rows = _bulk_write(
+            "uscis_submissions", ids, lambda t: t.update({"reviewed": True, "pending": False}), scoped=False
+        )
+    except Exception as e:
+        current_app.logger.exception("Bulk approve error: %s", e)
+        return jsonify({"success": False, "error": "Approve failed"}), 500
+    return _bulk_response(ids, rows, "approved")
+
+
+@lti.route("/nomas/bulk-delete", methods=["POST"])
+def nomas_bulk_delete():
+    ids, error = _bulk_request()
+    if error:
+        return error
+    try:
+        rows = _bulk_write("uscis_submissions", ids, lambda t: t.delete(), scoped=False)
+    except Exception as e:
+        current_app.logger.exception("Bulk delete error: %s", e)
+        return jsonify({"success": False, "error": "Delete failed"}), 500
+    for r in rows:
+        SIMILARITY.remove(r.get("submission_id"))
+    return _bulk_response(ids, rows, "deleted")
+
 
 @lti.route("/student-demo-direct")
 def student_demo():
@@ -3043,47 +3342,52 @@ def grade_docx_demo():
     return grade_docx()
 
 
+class _DashboardDBError(Exception):
+    pass
+
+
 @lti.route("/grader-submissions")
 def grader_submissions():
-    # 🔐 Ensure RLS visibility for this request
-    apply_rls_uid()
+    inst_id = session.get("institution_id")
+    course_id = session.get("course_id")
+    is_super = bool(session.get("is_superuser"))
 
-    try:
-        inst_id = session.get("institution_id")
-        course_id = session.get("course_id")
-        is_super = bool(session.get("is_superuser"))
+    def load():
+        if not pg_reads.enabled():
+            # 🔐 Ensure RLS visibility for this request
+            apply_rls_uid()
 
-        print(
-            "📥 /grader-submissions | super:",
+        log.debug(
+            "📥 /grader-submissions | super: %s | inst: %s | course: %s",
             is_super,
-            "| inst:",
             inst_id,
-            "| course:",
             course_id,
         )
 
-        q = (
-            supabase.table("submissions")
-            .select("*")
-            .eq("tool", "grader")
-            .order("submission_time", desc=True)
-            .limit(300)
-        )
+        if pg_reads.enabled():
+            rows = pg_reads.grader_submissions(inst_id, course_id, is_super, uid=rls_uid())
+        else:
+            q = (
+                supabase.table("submissions")
+                .select("*")
+                .eq("tool", "grader")
+                .order("submission_time", desc=True)
+                .limit(300)
+            )
 
-        # Include rows for this inst/course OR legacy NULLs
-        if not is_super:
-            if inst_id:
-                q = q.or_(f"institution_id.eq.{inst_id},institution_id.is.null")
-            if course_id:
-                q = q.or_(f"course_id.eq.{course_id},course_id.is.null")
+            # Only rows for this inst/course (legacy NULL scopes: migrations/0006)
+            if not is_super:
+                if inst_id:
+                    q = q.eq("institution_id", inst_id)
+                if course_id:
+                    q = q.eq("course_id", course_id)
 
-        resp = q.execute()
-        if getattr(resp, "error", None):
-            print("❌ Supabase error /grader-submissions:", resp.error)
-            return jsonify({"error": "DB error: " + str(resp.error)}), 500
+            resp = q.execute()
+            if getattr(resp, "error", None):
+                raise _DashboardDBError(resp.error)
 
-        rows = getattr(resp, "data", None) or []
-        print(f"📦 returning {len(rows)} row(s)")
+            rows = getattr(resp, "data", None) or []
+        log.debug("📦 returning %s row(s)", len(rows))
 
         # Normalize for the frontend
         out = []
@@ -3104,16 +3408,115 @@ def grader_submissions():
                     "score": r.get("score") or r.get("instructor_score"),
                 }
             )
-        return jsonify(out), 200
+        return out
 
+    try:
+        return cached_response(load, lambda out: (jsonify(out), 200))
+    except _DashboardDBError as e:
+        log.error("❌ Supabase error /grader-submissions: %s", e)
+        return jsonify({"error": "DB error: " + str(e)}), 500
     except Exception as e:
-        import traceback
-
-        print("❌ Error in /grader-submissions:", repr(e))
-        traceback.print_exc()
+        log.exception("❌ Error in /grader-submissions: %s", repr(e))
         return jsonify({"error": "Server error while loading submissions"}), 500
 
 
+@lti.route("/grader-stats", methods=["GET"])
+def grader_stats():
+    """Per-assignment count/mean/median/histogram/pending from the assignment_stats summary table."""
+    if "launch_data" not in session and not session.get("logged_in"):
+        return jsonify({"error": "Unauthorized"}), 401
+    if not is_staff():
+        return jsonify({"error": "Forbidden"}), 403
+
+    is_super = session_role() == "superuser"
+    inst = session.get("institution_id")
+    course = session.get("course_id")
+    if not (is_super or inst or course):
+        return jsonify({"error": "No institution or course in session"}), 403
+
+    def load():
+        q = supabase.table(STATS_TABLE).select("*")
+        # Own scope only, like the dashboards ('' keys are unscoped rows: superusers)
+        if not is_super:
+            if inst:
+                q = q.eq("institution_key", str(inst))
+            if course:
+                q = q.eq("course_key", str(course))
+        if request.args.get("assignment_title"):
+            q = q.eq("assignment_title", request.args["assignment_title"])
+        return summarize_stats(q.execute().data or [])
+
+    try:
+        return cached_response(load, lambda stats: (jsonify(stats), 200))
+    except Exception as e:
+        log.error("❌ grader-stats error: %s", e)
+        return jsonify({"error": "DB error"}), 500
+
+
+@lti.route("/grader-export", methods=["GET"])
+@require_tool("grader")
+def grader_export():
+    """
+    Stream a scope's submissions as CSV (default) or Parquet.
+
+        /grader-export?table=submissions|uscis_submissions&format=csv|parquet
+                      &include_text=1&assignment_title=...
+    """
+    if "launch_data" not in session and not session.get("logged_in"):
+        return redirect(url_for("lti.unauthorized"))
+
+    table = request.args.get("table", "submissions")
+    fmt = (request.args.get("format") or "csv").lower()
+    include_text = (request.args.get("include_text") or "").lower() in {"1", "true", "yes", "on"}
+    if table not in EXPORT_COLUMNS or fmt not in ("csv", "parquet"):
+        return jsonify({"error": "table must be submissions|uscis_submissions, format csv|parquet"}), 400
+
+    is_super = bool(session.get("is_superuser") or session.get("role") == "superuser")
+    scope = (session.get("institution_id"), session.get("course_id"), is_super)
+    cols = export_columns(table, include_text)
+    pages = iter_rows(supabase, table, scope, include_text, request.args.get("assignment_title"))
+    stamp = datetime.utcnow().strftime("%Y%m%d-%H%M%S")
+
+    if fmt == "parquet":
+        try:
+            body, mimetype = parquet_chunks(pages, cols), "application/vnd.apache.parquet"
+        except ParquetUnavailable as e:
+            return jsonify({"error": str(e)}), 501
+    else:
+        body, mimetype = csv_chunks(pages, cols), "text/csv"
+
+    log.info("📤 Export %s as %s (text=%s)", table, fmt, include_text)
+    return Response(
+        stream_with_context(body),
+        mimetype=mimetype,
+        headers={
+            "Content-Disposition": f'attachment; filename="{table}-{stamp}.{fmt}"',
+            "Cache-Control": "no-store",
+            "X-Accel-Buffering": "no",
+        },
+    )
+
+
+@lti.route("/grader-submissions/stream")
+def grader_submissions_stream():
+    """SSE feed of new/changed submissions in the caller's scope (see submission_events)."""
+    if "launch_data" not in session and not session.get("logged_in"):
+        return jsonify({"error": "Unauthorized"}), 401
+    if not is_staff():
+        return jsonify({"error": "Forbidden"}), 403
+
+    is_super = session_role() == "superuser"
+    scope = (session.get("institution_id"), session.get("course_id"), is_super)
+    if not (is_super or scope[0] or scope[1]):
+        return jsonify({"error": "No institution or course in session"}), 403
+    last_event_id = request.headers.get("Last-Event-ID") or request.args.get("last_event_id")
+    return Response(
+        stream_with_context(EVENTS.stream(scope, last_event_id)),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
 @lti.route("/save-submission", methods=["POST"])
 def save_submission():
     try:
@@ -3146,17 +3549,15 @@ def save_submission():
 
         res = supabase.table("submissions").insert(row).execute()
         if getattr(res, "error", None):
-            print("❌ Supabase insert error:", res.error)
+            log.error("❌ Supabase insert error: %s", res.error)
             return jsonify({"success": False, "error": str(res.error)}), 500
 
         saved = (res.data or [row])[0]
+        publish_submission({**row, **saved})
         return jsonify({"success": True, "submission": saved}), 200
 
     except Exception as e:
-        import traceback
-
-        print("❌ Error /save-submission:", repr(e))
-        traceback.print_exc()
+        log.exception("❌ Error /save-submission: %s", repr(e))
         return jsonify({"success": False, "error": "Server error"}), 500
 
 
@@ -3169,7 +3570,12 @@ def grader_assignments():
     inst = session.get("institution_id")
     course = session.get("course_id")
 
-    try:
+    def load():
+        if pg_reads.enabled():
+            is_super = bool(session.get("is_superuser") or session.get("role") == "superuser")
+            rows = pg_reads.grader_assignments(inst, course, is_super, uid=rls_uid())
+            log.debug("📦 grader-assignments returning %s row(s) (direct)", len(rows))
+            return rows
         q = (
             supabase.table("assignments")
             .select(
@@ -3180,20 +3586,21 @@ def grader_assignments():
             .limit(300)
         )
 
-        # Only scope for non-superusers — include legacy NULLs so older rows still appear
+        # Only scope for non-superusers
         if not (session.get("is_superuser") or session.get("role") == "superuser"):
             if inst:
-                q = q.or_(f"institution_id.eq.{inst},institution_id.is.null")
+                q = q.eq("institution_id", inst)
             if course:
-                q = q.or_(f"course_id.eq.{course},course_id.is.null")
+                q = q.eq("course_id", course)
 
-        res = q.execute()
-        rows = res.data or []
-        print(f"📦 grader-assignments returning {len(rows)} row(s)")
-        return jsonify(rows), 200
+        rows = q.execute().data or []
+        log.debug("📦 grader-assignments returning %s row(s)", len(rows))
+        return rows
 
+    try:
+        return cached_response(load, lambda rows: (jsonify(rows), 200))
     except Exception as e:
-        print("❌ grader-assignments error:", e)
+        log.error("❌ grader-assignments error: %s", e)
         return jsonify({"error": "DB error"}), 500
 
 
@@ -3217,20 +3624,10 @@ import traceback
 # client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
 
 
-def _try_extract_json(text: str):
-    m = re.search(r"\{.*\}", text, re.S)
-    if not m:
-        return None
-    try:
-        return json.loads(m.group(0))
-    except Exception:
-        return None
-
-
 import os
 import re
 
-import openai
+openai = lazy_module("openai")  # imported by the first route that uses it
 
 
 @lti.route("/download-mapped-fields")
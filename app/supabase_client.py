@@ -1,41 +1,122 @@
 # app/supabase_client.py
+"""
+Process-wide Supabase client, created on first use.
+
+`supabase` is a stand-in that builds the real client the first time an
+attribute is used (supabase-py is the slowest import in the app) and builds
+it again in a forked child, so `gunicorn --preload` workers never share the
+parent's HTTP connections. `bool(supabase)` only says whether a client is
+configured; it doesn't create one.
+
+After bind_rls_uid(uid) (app/utils/rls_tokens.py), `supabase.table(...)` and
+`supabase.rpc(...)` for the rest of that request go out with uid's JWT
+instead of the service key, on the same connection pool; storage and
+anything outside a request keep the service client.
+"""
+import importlib.util
 import os
+import threading
+
+from flask import g, has_request_context
 
-try:
-    from supabase import create_client
-except ImportError:
-    create_client = None
+from app.utils.logger import get_logger
+
+log = get_logger(__name__)
 
 SUPABASE_URL = os.getenv("SUPABASE_URL")
 SUPABASE_KEY = os.getenv("SUPABASE_SERVICE_ROLE_KEY") or os.getenv("SUPABASE_ANON_KEY")
 
-supabase = None
-if create_client and SUPABASE_URL and SUPABASE_KEY:
-    try:
-        supabase = create_client(SUPABASE_URL, SUPABASE_KEY)
-        print("✅ Supabase client initialized")
-    except Exception as e:
-        print(f"⚠️ Could not initialize Supabase client: {e}")
-else:
-    if not create_client:
-        print("⚠️ 'supabase' package not installed (pip install supabase)")
-    else:
-        print("⚠️ Missing SUPABASE_URL or key; Supabase client not created")
-
-
-def upload_to_supabase(bucket: str, path: str, bytes_data: bytes,
+# Calls that go through the request's user client once bind_rls_uid() ran
+_RLS_ATTRS = frozenset({"table", "from_", "rpc"})
+
+
+class _LazyClient:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._client = None
+        self._pid = None
+        self._installed = None
+
+    def configured(self) -> bool:
+        if self._installed is None:
+            self._installed = importlib.util.find_spec("supabase") is not None
+            if not self._installed:
+                log.warning("⚠️ 'supabase' package not installed (pip install supabase)")
+        return bool(self._installed and SUPABASE_URL and SUPABASE_KEY)
+
+    __bool__ = configured
+
+    def client(self):
+        if self._client is not None and self._pid == os.getpid():
+            return self._client
+        with self._lock:
+            if self._client is None or self._pid != os.getpid():
+                if not self.configured():
+                    raise RuntimeError("Supabase client not configured (SUPABASE_URL / key missing)")
+                from supabase import create_client
+
+                self._client = create_client(SUPABASE_URL, SUPABASE_KEY)
+                self._pid = os.getpid()
+                log.info("✅ Supabase client initialized (pid %s)", self._pid)
+        return self._client
+
+    def reset(self):
+        """Forget the client (gunicorn post_fork); the next use creates a new one."""
+        with self._lock:
+            self._client = None
+            self._pid = None
+
+    def for_token(self, token: str):
+        """PostgREST client authorized as the token's user, sharing the service client's HTTP pool."""
+        from postgrest import SyncPostgrestClient
+
+        base = self.client().postgrest
+        # httpx header keys come back lower-cased; drop the service key's so only one is sent
+        headers = {k: v for k, v in base.headers.items() if k.lower() != "authorization"}
+        headers["Authorization"] = f"Bearer {token}"
+        return SyncPostgrestClient(
+            str(base.base_url),
+            schema=base.headers.get("Accept-Profile", "public"),
+            headers=headers,
+            http_client=base.session,
+        )
+
+    def __getattr__(self, name):
+        if name in _RLS_ATTRS and has_request_context():
+            user_db = g.get("_rls_db")
+            if user_db is not None:
+                return getattr(user_db, name)
+        return getattr(self.client(), name)
+
+    def __repr__(self):
+        return f"<lazy Supabase client ({'ready' if self._client is not None else 'not created'})>"
+
+
+supabase = _LazyClient()
+
+
+def bind_rls_uid(uid):
+    """Send the rest of this request's PostgREST calls as uid (locally minted JWT)."""
+    from app.utils.rls_tokens import token_for
+
+    g._rls_db = supabase.for_token(token_for(uid))
+
+
+def upload_to_supabase(bucket: str, path: str, bytes_data,
                        content_type: str = "application/octet-stream",
                        upsert: bool = True) -> str:
     """
-    Upload bytes to Supabase Storage and return a public URL.
+    Upload bytes (or an open binary file, streamed) to Supabase Storage and
+    return a public URL.
     """
-    if supabase is None:
+    if not supabase:
         raise RuntimeError("Supabase client not configured")
 
     supabase.storage.from_(bucket).upload(
         path,
         bytes_data,
-        {"content-type": content_type, "upsert": upsert},
+        # storage3 sends these as HTTP headers, which must be strings
+        {"content-type": content_type or "application/octet-stream", "upsert": "true" if upsert else "false"},
     )
 
     return f"{SUPABASE_URL}/storage/v1/object/public/{bucket}/{path}"
@@ -1,4 +1,380 @@
 # app/utils/ai_usage_logger.py
-def log_ai_usage(user_id=None, institution_id=None, tool=None, model=None, assignment_id=None, usage=None):
-    # no-op logger; swap for your real telemetry later
+"""
+AI usage ledger.
+
+log_ai_usage() only appends to an in-memory buffer; a background thread
+flushes batches (every AI_USAGE_FLUSH_EVERY events or AI_USAGE_FLUSH_SECONDS,
+whichever comes first) to the configured sink:
+
+    AI_USAGE_SINK=sqlite    (default) -> AI_USAGE_SQLITE_PATH, default data/ai_usage.sqlite3
+    AI_USAGE_SINK=supabase            -> table "ai_usage_events"
+    AI_USAGE_SINK=none                -> keep rollups only
+
+Per-(institution, assignment) rollups of tokens and latency are also kept in
+memory, but they only cover this process since it started (debugging).
+
+Monthly quotas (llm_scheduler) read institution_tokens(), which never does
+I/O: it is the sink's total for the month (every worker, across restarts; the
+supabase sink uses the ai_usage_totals RPC from migrations/0007) as last read
+by the flusher thread, plus this process's calls the sink didn't have yet.
+The flusher re-reads each institution asked about every
+AI_USAGE_QUOTA_REFRESH_SECONDS (default 60), right after a flush, so a batch
+is always counted either in the buffer or in that read. An institution's
+first ask only sees this process's calls until the flusher has read it
+(it is woken for that). sink_totals() gives the same per-assignment totals
+for reports. With AI_USAGE_SINK=none only this process's calls are counted.
+"""
+import atexit
+import os
+import sqlite3
+import threading
+import time
+from datetime import datetime
+
+from app.utils.logger import get_logger
+
+log = get_logger(__name__)
+
+FLUSH_EVERY = int(os.getenv("AI_USAGE_FLUSH_EVERY", "50"))
+FLUSH_SECONDS = float(os.getenv("AI_USAGE_FLUSH_SECONDS", "10"))
+MAX_BUFFER = int(os.getenv("AI_USAGE_MAX_BUFFER", "10000"))
+QUOTA_REFRESH_SECONDS = float(os.getenv("AI_USAGE_QUOTA_REFRESH_SECONDS", "60"))
+SUPABASE_TABLE = "ai_usage_events"
+SUPABASE_TOTALS_RPC = "ai_usage_totals"
+
+_SQLITE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS ai_usage_events (
+    ts                TEXT NOT NULL,
+    kind              TEXT NOT NULL,
+    user_id           TEXT,
+    institution_id    TEXT,
+    tool              TEXT,
+    model             TEXT,
+    assignment_id     TEXT,
+    submission_id     TEXT,
+    prompt_tokens     INTEGER,
+    completion_tokens INTEGER,
+    total_tokens      INTEGER,
+    latency_ms        REAL,
+    score             REAL
+)
+"""
+_COLUMNS = (
+    "ts", "kind", "user_id", "institution_id", "tool", "model", "assignment_id",
+    "submission_id", "prompt_tokens", "completion_tokens", "total_tokens",
+    "latency_ms", "score",
+)
+
+
+def _empty_rollup():
+    return {
+        "requests": 0,
+        "prompt_tokens": 0,
+        "completion_tokens": 0,
+        "total_tokens": 0,
+        "latency_ms_sum": 0.0,
+        "latency_ms_max": 0.0,
+    }
+
+
+class UsageLedger:
+    def __init__(self, sink=None, flush_every=FLUSH_EVERY, flush_seconds=FLUSH_SECONDS):
+        self.sink = (sink or os.getenv("AI_USAGE_SINK") or "sqlite").strip().lower()
+        self.flush_every = max(1, flush_every)
+        self.flush_seconds = max(0.1, flush_seconds)
+        self._lock = threading.Lock()
+        self._buffer = []
+        self._rollups = {}  # (institution_id, assignment_id) -> rollup dict
+        self._monthly = {}  # (institution_id, "YYYY-MM") -> tokens recorded here since the sink read
+        self._sink_monthly = {}  # (institution_id, "YYYY-MM") -> (sink total, monotonic read time)
+        self._watched = set()  # (institution_id, "YYYY-MM") keys the flusher keeps fresh
+        self._flush_lock = threading.Lock()  # one flush or quota read at a time
+        self._wake = threading.Event()
+        self._thread = None
+        self._pid = None
+        self.dropped = 0
+
+    # ---------- write side (request thread: no I/O) ----------
+    def record(self, event: dict):
+        with self._lock:
+            if len(self._buffer) >= MAX_BUFFER:
+                # Sink is down for a long time; keep the newest events
+                self._buffer.pop(0)
+                self.dropped += 1
+            self._buffer.append(event)
+            if event.get("kind") == "completion":
+                self._add_to_rollup(event)
+            full = len(self._buffer) >= self.flush_every
+        self._ensure_thread()
+        if full:
+            self._wake.set()
+
+    def _add_to_rollup(self, e: dict):
+        key = (e.get("institution_id"), e.get("assignment_id"))
+        r = self._rollups.get(key)
+        if r is None:
+            r = self._rollups[key] = _empty_rollup()
+        r["requests"] += 1
+        r["prompt_tokens"] += e.get("prompt_tokens") or 0
+        r["completion_tokens"] += e.get("completion_tokens") or 0
+        r["total_tokens"] += e.get("total_tokens") or 0
+        lat = e.get("latency_ms") or 0.0
+        r["latency_ms_sum"] += lat
+        r["latency_ms_max"] = max(r["latency_ms_max"], lat)
+        mkey = (e.get("institution_id"), (e.get("ts") or "")[:7])
+        self._monthly[mkey] = self._monthly.get(mkey, 0) + (e.get("total_tokens") or 0)
+
+    # ---------- read side ----------
+    def rollups(self, institution_id=None):
+        """
+        [{"institution_id", "assignment_id", "requests", "*_tokens",
+          "latency_ms_avg", "latency_ms_max"}, ...] of this process since it
+        started. Not a report: use sink_totals() for that.
+        """
+        with self._lock:
+            items = [(k, dict(v)) for k, v in self._rollups.items()]
+        out = []
+        for (inst, assignment), r in items:
+            if institution_id is not None and inst != institution_id:
+                continue
+            r["institution_id"] = inst
+            r["assignment_id"] = assignment
+            r["latency_ms_avg"] = round(r.pop("latency_ms_sum") / r["requests"], 1) if r["requests"] else 0.0
+            out.append(r)
+        out.sort(key=lambda r: r["total_tokens"], reverse=True)
+        return out
+
+    def institution_tokens(self, institution_id, month: str = None) -> int:
+        """
+        Tokens used by an institution in `month` ("YYYY-MM"; default or
+        "current": this UTC month), by every worker writing to the sink.
+        In memory only; the flusher thread keeps the sink's part fresh.
+        """
+        if month in (None, "current"):
+            month = datetime.utcnow().strftime("%Y-%m")
+        key = (institution_id, month)
+        with self._lock:
+            cached = self._sink_monthly.get(key)
+            total = (cached[0] if cached else 0) + self._monthly.get(key, 0)
+            first = self.sink in ("sqlite", "supabase") and key not in self._watched
+            if first:
+                self._watched.add(key)
+        if first:
+            self._ensure_thread()
+            self._wake.set()
+        return total
+
+    def _refresh_quotas(self):
+        """Flusher thread: re-read the sink's monthly totals of the watched institutions that are due."""
+        month = datetime.utcnow().strftime("%Y-%m")
+        now = time.monotonic()
+        with self._lock:
+            self._watched = {k for k in self._watched if k[1] >= month}
+            due = [
+                k for k in self._watched
+                if k not in self._sink_monthly or now - self._sink_monthly[k][1] > QUOTA_REFRESH_SECONDS
+            ]
+        for key in due:
+            institution_id, month = key
+            try:
+                rows = self.sink_totals(institution_id, month + "-01", next_month_start(month))
+            except Exception as e:
+                log.warning("⚠️ ai usage total for %s failed (using the last one): %s", institution_id, e)
+                continue
+            # institution_id None (unscoped calls) fetches every institution: keep the unscoped rows
+            total = sum(r["total_tokens"] for r in rows if r["institution_id"] == institution_id)
+            with self._lock:
+                self._sink_monthly[key] = (total, time.monotonic())
+                # Called under _flush_lock, so everything not in that read is still buffered
+                self._monthly[key] = sum(
+                    e.get("total_tokens") or 0
+                    for e in self._buffer
+                    if e.get("kind") == "completion"
+                    and e.get("institution_id") == institution_id
+                    and (e.get("ts") or "")[:7] == month
+                )
+
+    def sink_totals(self, institution_id=None, since: str = None, until: str = None) -> list:
+        """
+        Per-(institution, assignment) completion totals from the sink in
+        [since, until) (ISO dates/times, UTC; None: unbounded), every
+        institution when institution_id is None. Same row shape as rollups().
+        Does I/O.
+        """
+        since = since or "1970-01-01"
+        if self.sink == "supabase":
+            from app.supabase_client import supabase
+
+            if not supabase:
+                return []
+            # The service client: the RPC isn't granted to API callers
+            resp = supabase.client().rpc(
+                SUPABASE_TOTALS_RPC, {"p_institution_id": institution_id, "p_since": since, "p_until": until}
+            ).execute()
+            rows = resp.data if isinstance(resp.data, list) else []
+        elif self.sink == "sqlite":
+            try:
+                con = sqlite3.connect(_sqlite_path(), timeout=5)
+            except sqlite3.Error:
+                return []
+            try:
+                con.row_factory = sqlite3.Row
+                rows = [
+                    dict(r)
+                    for r in con.execute(
+                        "SELECT institution_id, assignment_id, COUNT(*) AS requests, "
+                        "COALESCE(SUM(prompt_tokens), 0) AS prompt_tokens, "
+                        "COALESCE(SUM(completion_tokens), 0) AS completion_tokens, "
+                        "COALESCE(SUM(total_tokens), 0) AS total_tokens, "
+                        "ROUND(COALESCE(AVG(latency_ms), 0), 1) AS latency_ms_avg, "
+                        "COALESCE(MAX(latency_ms), 0) AS latency_ms_max "
+                        "FROM ai_usage_events WHERE kind = 'completion' AND ts >= ? "
+                        "AND (? IS NULL OR ts < ?) AND (? IS NULL OR institution_id = ?) "
+                        "GROUP BY institution_id, assignment_id",
+                        (since, until, until, institution_id, institution_id),
+                    )
+                ]
+            except sqlite3.OperationalError:
+                rows = []  # no table yet
+            finally:
+                con.close()
+        else:
+            return []
+        for r in rows:
+            for k in ("requests", "prompt_tokens", "completion_tokens", "total_tokens"):
+                r[k] = int(r.get(k) or 0)
+            r["latency_ms_avg"] = float(r.get("latency_ms_avg") or 0)
+            r["latency_ms_max"] = float(r.get("latency_ms_max") or 0)
+        rows.sort(key=lambda r: r["total_tokens"], reverse=True)
+        return rows
+
+    # ---------- flushing ----------
+    def _ensure_thread(self):
+        # Re-create after fork (gunicorn workers inherit the object, not the thread)
+        if self._thread is not None and self._pid == os.getpid() and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is not None and self._pid == os.getpid() and self._thread.is_alive():
+                return
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._run, name="ai-usage-flush", daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            self._wake.wait(self.flush_seconds)
+            self._wake.clear()
+            try:
+                self.flush(refresh_quotas=True)
+            except Exception as e:
+                log.warning("⚠️ ai usage flush failed: %s", e)
+
+    def flush(self, refresh_quotas: bool = False):
+        with self._flush_lock:
+            with self._lock:
+                batch, self._buffer = self._buffer, []
+            try:
+                if batch and self.sink == "supabase":
+                    self._flush_supabase(batch)
+                elif batch and self.sink == "sqlite":
+                    self._flush_sqlite(batch)
+            except Exception:
+                # Put the batch back in front so nothing is lost on a transient error
+                with self._lock:
+                    self._buffer[:0] = batch[-MAX_BUFFER:]
+                raise
+            if refresh_quotas:
+                self._refresh_quotas()
+        return len(batch)
+
+    def _flush_supabase(self, batch):
+        from app.supabase_client import supabase
+
+        if not supabase:
+            return
+        # PostgREST bulk inserts need every row to carry the same keys
+        rows = [{c: e.get(c) for c in _COLUMNS} for e in batch]
+        supabase.table(SUPABASE_TABLE).insert(rows).execute()
+
+    def _flush_sqlite(self, batch):
+        path = _sqlite_path()
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        con = sqlite3.connect(path, timeout=5)
+        try:
+            con.execute(_SQLITE_SCHEMA)
+            con.executemany(
+                f"INSERT INTO ai_usage_events ({', '.join(_COLUMNS)}) "
+                f"VALUES ({', '.join('?' for _ in _COLUMNS)})",
+                [tuple(e.get(c) for c in _COLUMNS) for e in batch],
+            )
+            con.commit()
+        finally:
+            con.close()
+
+
+def next_month_start(month: str) -> str:
+    """"2026-12" -> "2027-01-01"."""
+    y, m = (int(p) for p in month.split("-"))
+    return f"{y + m // 12}-{m % 12 + 1:02d}-01"
+
+
+def _sqlite_path() -> str:
+    return os.getenv("AI_USAGE_SQLITE_PATH") or os.path.join("data", "ai_usage.sqlite3")
+
+
+LEDGER = UsageLedger()
+
+
+@atexit.register
+def _flush_on_exit():
+    try:
+        LEDGER.flush()
+    except Exception:
+        pass
+
+
+def _as_int(v):
+    try:
+        return int(v)
+    except (TypeError, ValueError):
+        return None
+
+
+def log_ai_usage(user_id=None, institution_id=None, tool=None, model=None, assignment_id=None,
+                 usage=None, latency_ms=None, submission_id=None):
+    """Buffer one completion's token usage. Never does I/O on the caller's thread."""
+    usage = usage or {}
+    LEDGER.record(
+        {
+            "ts": datetime.utcnow().isoformat() + "Z",
+            "kind": "completion",
+            "user_id": str(user_id) if user_id is not None else None,
+            "institution_id": str(institution_id) if institution_id is not None else None,
+            "tool": tool,
+            "model": model,
+            "assignment_id": str(assignment_id) if assignment_id is not None else None,
+            "submission_id": submission_id,
+            "prompt_tokens": _as_int(usage.get("prompt_tokens")),
+            "completion_tokens": _as_int(usage.get("completion_tokens")),
+            "total_tokens": _as_int(usage.get("total_tokens")),
+            "latency_ms": round(latency_ms, 1) if latency_ms is not None else None,
+            "score": None,
+        }
+    )
     return True
+
+
+def usage_rollups(institution_id=None):
+    """This process's calls since it started (debugging; see usage_totals)."""
+    return LEDGER.rollups(institution_id)
+
+
+def usage_totals(institution_id=None, since: str = None, until: str = None):
+    """Every worker's calls, from the sink (reports, billing)."""
+    return LEDGER.sink_totals(institution_id, since, until)
+
+
+def flush_ai_usage():
+    """Synchronous flush (shutdown hooks, scripts)."""
+    return LEDGER.flush()
+
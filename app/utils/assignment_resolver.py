@@ -2,6 +2,35 @@
 from typing import Dict, Optional, Tuple
 from flask import request
 from app.supabase_client import supabase
+from app.utils import pg_reads
+
+
+def _by_slug(slug: str) -> list:
+    if pg_reads.enabled():
+        return pg_reads.assignment_by_slug(slug)
+    return (
+        supabase.table("assignments")
+        .select("*")
+        .eq("tool", "grader")
+        .eq("slug", slug)
+        .limit(1)
+        .execute()
+    ).data
+
+
+def _by_title(title: str) -> list:
+    # Prefer display_title match, fallback to assignment_title
+    if pg_reads.enabled():
+        return pg_reads.assignment_by_title(title)
+    return (
+        supabase.table("assignments")
+        .select("*")
+        .eq("tool", "grader")
+        .or_(f"display_title.eq.{title},assignment_title.eq.{title}")
+        .limit(1)
+        .execute()
+    ).data
+
 
 def _get_custom_param(launch_data: dict, key: str) -> Optional[str]:
     # LTI 1.3 custom params usually appear under this claim
@@ -22,14 +51,7 @@ def resolve_assignment_from_launch(launch_data: dict, req) -> Tuple[Optional[Dic
     # 1) URL override for dev/test
     slug = (req.args.get("slug") or "").strip().lower()
     if slug:
-        row = (
-            supabase.table("assignments")
-            .select("*")
-            .eq("tool", "grader")
-            .eq("slug", slug)
-            .limit(1)
-            .execute()
-        ).data
+        row = _by_slug(slug)
         if row:
             a = row[0]
             return a, (a.get("display_title") or a.get("assignment_title")), a.get("slug")
@@ -38,14 +60,7 @@ def resolve_assignment_from_launch(launch_data: dict, req) -> Tuple[Optional[Dic
     if launch_data:
         slug = (_get_custom_param(launch_data, "assignment_slug") or "").lower()
         if slug:
-            row = (
-                supabase.table("assignments")
-                .select("*")
-                .eq("tool", "grader")
-                .eq("slug", slug)
-                .limit(1)
-                .execute()
-            ).data
+            row = _by_slug(slug)
             if row:
                 a = row[0]
                 return a, (a.get("display_title") or a.get("assignment_title")), a.get("slug")
@@ -57,15 +72,7 @@ def resolve_assignment_from_launch(launch_data: dict, req) -> Tuple[Optional[Dic
         title = (rl.get("title") or "").strip()
 
     if title:
-        # Prefer display_title match, fallback to assignment_title
-        row = (
-            supabase.table("assignments")
-            .select("*")
-            .eq("tool", "grader")
-            .or_(f"display_title.eq.{title},assignment_title.eq.{title}")
-            .limit(1)
-            .execute()
-        ).data
+        row = _by_title(title)
         if row:
             a = row[0]
             return a, (a.get("display_title") or a.get("assignment_title")), a.get("slug")
@@ -0,0 +1,73 @@
+# app/utils/async_llm.py
+"""
+Async chat-completions call over httpx for the ASGI grading path.
+
+Same endpoint and payload as openai==0.28's ChatCompletion.create, reading
+OPENAI_API_KEY / OPENAI_API_BASE, and returns the same dict shape
+(resp["choices"][0]["message"]["content"], resp["usage"]). One waiting call
+costs a coroutine, not a worker thread.
+
+429s are retried (LLM_MAX_RETRIES, default 2) honouring Retry-After; pass
+timeout= to bound a single call (model_router does, per fallback tier).
+"""
+import asyncio
+import os
+
+import httpx
+
+API_BASE = (os.getenv("OPENAI_API_BASE") or "https://api.openai.com/v1").rstrip("/")
+TIMEOUT = httpx.Timeout(float(os.getenv("LLM_TIMEOUT_SECONDS", "120")), connect=10.0)
+MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "2"))
+
+_client = None
+
+
+class LLMError(Exception):
+    def __init__(self, status: int, message: str):
+        super().__init__(f"{status}: {message}")
+        self.status = status
+
+
+def _http() -> httpx.AsyncClient:
+    global _client
+    if _client is None or _client.is_closed:
+        _client = httpx.AsyncClient(
+            timeout=TIMEOUT,
+            limits=httpx.Limits(max_connections=int(os.getenv("LLM_MAX_CONNECTIONS", "500"))),
+        )
+    return _client
+
+
+async def aclose():
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+
+
+async def chat_completion(model: str, messages, temperature: float = 0.5, max_tokens: int = 1000,
+                          timeout: float = None, retries: int = None, **extra):
+    headers = {"Authorization": f"Bearer {os.getenv('OPENAI_API_KEY') or ''}"}
+    payload = {"model": model, "messages": messages, "temperature": temperature, "max_tokens": max_tokens, **extra}
+
+    retries = MAX_RETRIES if retries is None else retries
+    request_timeout = TIMEOUT if timeout is None else httpx.Timeout(timeout, connect=min(timeout, 10.0))
+
+    for attempt in range(retries + 1):
+        resp = await _http().post(
+            f"{API_BASE}/chat/completions", json=payload, headers=headers, timeout=request_timeout
+        )
+        if resp.status_code == 429 and attempt < retries:
+            try:
+                wait = float(resp.headers.get("Retry-After") or 0)
+            except ValueError:
+                wait = 0
+            await asyncio.sleep(wait or 0.5 * (2 ** attempt))
+            continue
+        if resp.status_code >= 400:
+            try:
+                message = resp.json().get("error", {}).get("message") or resp.text
+            except ValueError:
+                message = resp.text
+            raise LLMError(resp.status_code, message)
+        return resp.json()
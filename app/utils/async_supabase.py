@@ -0,0 +1,152 @@
+# app/utils/async_supabase.py
+"""
+Minimal async Supabase client (httpx) for the ASGI grading path.
+
+Covers only what grading needs — PostgREST select/insert/rpc and Storage
+HEAD/upload — with the same URL, key and header conventions supabase-py uses,
+so it talks to the same project (and to benchmarks/fake_supabase.py).
+
+One httpx.AsyncClient (connection pool) per event loop; call aclose() on
+shutdown. as_user(token) gives a view on the same pool whose PostgREST
+calls carry a user's JWT (rls_tokens.py) instead of the service key.
+
+The pool has no default headers: the key is added per request, and only to
+requests for self.url (PostgREST, Storage). get() fetches instructor-set
+URLs (rubrics, answer keys) that can point anywhere, so it sends none.
+"""
+import json
+import os
+
+import httpx
+
+from app.utils.logger import get_logger
+
+log = get_logger(__name__)
+
+TIMEOUT = httpx.Timeout(float(os.getenv("ASYNC_SUPABASE_TIMEOUT", "30")), connect=10.0)
+LIMITS = httpx.Limits(
+    max_connections=int(os.getenv("ASYNC_SUPABASE_MAX_CONNECTIONS", "100")),
+    max_keepalive_connections=20,
+)
+
+
+class AsyncSupabaseError(Exception):
+    def __init__(self, status: int, body):
+        self.status = status
+        self.body = body
+        msg = body.get("message") if isinstance(body, dict) else body
+        super().__init__(f"{status}: {msg}")
+
+
+class AsyncSupabase:
+    def __init__(self, url: str = None, key: str = None):
+        self.url = (url or os.getenv("SUPABASE_URL") or "").rstrip("/")
+        self.key = key or os.getenv("SUPABASE_SERVICE_ROLE_KEY") or os.getenv("SUPABASE_ANON_KEY")
+        self._client = None
+        self._parent = None
+        self._auth = {}
+
+    def as_user(self, token: str) -> "AsyncSupabase":
+        """Same connection pool; PostgREST calls authorized as the token's user (RLS)."""
+        view = AsyncSupabase(self.url, self.key)
+        view._parent = self
+        view._auth = {"Authorization": f"Bearer {token}"}
+        return view
+
+    @property
+    def configured(self) -> bool:
+        return bool(self.url and self.key)
+
+    def _http(self) -> httpx.AsyncClient:
+        if self._parent is not None:
+            return self._parent._http()
+        if self._client is None or self._client.is_closed:
+            self._client = httpx.AsyncClient(timeout=TIMEOUT, limits=LIMITS)
+        return self._client
+
+    def _headers(self, extra=None, service: bool = False) -> dict:
+        """Credentials for a request to self.url (service key for Storage); never for other hosts."""
+        headers = {"apikey": self.key, "Authorization": f"Bearer {self.key}"}
+        if not service:
+            headers.update(self._auth)
+        if extra:
+            headers.update(extra)
+        return headers
+
+    async def aclose(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    @staticmethod
+    def _check(resp: httpx.Response):
+        if resp.status_code >= 400:
+            try:
+                body = resp.json()
+            except ValueError:
+                body = resp.text
+            raise AsyncSupabaseError(resp.status_code, body)
+
+    # ---------- PostgREST ----------
+    async def select(self, table: str, columns: str = "*", filters=(), single: bool = False,
+                     limit: int = None, order: str = None):
+        """
+        filters: [(column, "op.value"), ...] in PostgREST syntax, e.g.
+        [("tool", "eq.grader"), ("or", "(display_title.eq.X,assignment_title.eq.X)")].
+        Returns a row dict (single=True) or a list of rows.
+        """
+        params = [("select", columns), *filters]
+        if order:
+            params.append(("order", order))
+        if limit is not None:
+            params.append(("limit", str(limit)))
+        headers = self._headers({"Accept": "application/vnd.pgrst.object+json"} if single else None)
+        resp = await self._http().get(f"{self.url}/rest/v1/{table}", params=params, headers=headers)
+        self._check(resp)
+        return resp.json()
+
+    async def insert(self, table: str, rows):
+        resp = await self._http().post(
+            f"{self.url}/rest/v1/{table}",
+            content=json.dumps(rows, default=str),
+            headers=self._headers({"Content-Type": "application/json", "Prefer": "return=representation"}),
+        )
+        self._check(resp)
+        return resp.json()
+
+    async def update(self, table: str, values: dict, filters=()):
+        resp = await self._http().patch(
+            f"{self.url}/rest/v1/{table}",
+            params=list(filters),
+            content=json.dumps(values, default=str),
+            headers=self._headers({"Content-Type": "application/json", "Prefer": "return=representation"}),
+        )
+        self._check(resp)
+        return resp.json()
+
+    async def rpc(self, name: str, params: dict):
+        resp = await self._http().post(f"{self.url}/rest/v1/rpc/{name}", json=params, headers=self._headers())
+        self._check(resp)
+        return resp.json() if resp.content else None
+
+    # ---------- Storage ----------
+    async def object_exists(self, bucket: str, key: str) -> bool:
+        resp = await self._http().head(
+            f"{self.url}/storage/v1/object/{bucket}/{key}", headers=self._headers(service=True)
+        )
+        return resp.status_code == 200
+
+    async def upload(self, bucket: str, key: str, payload, content_type: str = None, upsert: bool = True):
+        """payload: bytes or an open binary file (streamed by httpx's multipart encoder)."""
+        resp = await self._http().post(
+            f"{self.url}/storage/v1/object/{bucket}/{key}",
+            files={"file": (key.rsplit("/", 1)[-1], payload, content_type or "application/octet-stream")},
+            data={"cacheControl": "3600"},
+            headers=self._headers({"x-upsert": "true" if upsert else "false"}, service=True),
+        )
+        self._check(resp)
+        return resp.json()
+
+    async def get(self, url: str) -> httpx.Response:
+        """Plain GET through the shared pool, without credentials (rubric / answer-key downloads)."""
+        return await self._http().get(url, follow_redirects=True)
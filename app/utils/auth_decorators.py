@@ -5,7 +5,12 @@ from functools import wraps
 
 from flask import redirect, session, url_for
 
-__all__ = ["login_required", "has_tool", "require_tool", "require_superuser"]
+__all__ = ["login_required", "has_tool", "require_tool", "require_superuser", "session_role", "is_staff"]
+
+LTI_ROLES_CLAIM = "https://purl.imsglobal.org/spec/lti/claim/roles"
+# LTI role names (the part after '#', or the short legacy form) that may grade
+LTI_STAFF_ROLES = {"Instructor", "TeachingAssistant", "ContentDeveloper", "Administrator"}
+STAFF_ROLES = {"superuser", "admin", "institution_admin", "instructor"}
 
 
 def _is_logged_in() -> bool:
@@ -19,6 +24,27 @@ def _is_logged_in() -> bool:
     )
 
 
+def session_role(sess=None) -> str:
+    """
+    The caller's role: "superuser", else the LTI launch's roles claim
+    ("instructor" or "student"), else the dashboard login's session["role"]
+    ("admin", "institution_admin", "instructor", "user", ...).
+    """
+    sess = session if sess is None else sess
+    if sess.get("is_superuser") or sess.get("role") == "superuser":
+        return "superuser"
+    roles = sess.get("roles") or (sess.get("launch_data") or {}).get(LTI_ROLES_CLAIM) or []
+    if roles:
+        names = {str(r).rsplit("#", 1)[-1].rsplit("/", 1)[-1] for r in roles}
+        return "instructor" if names & LTI_STAFF_ROLES else "student"
+    return (sess.get("role") or "user").strip().lower()
+
+
+def is_staff(sess=None) -> bool:
+    """Instructors, admins and superusers: the roles that may see and change others' submissions."""
+    return session_role(sess) in STAFF_ROLES
+
+
 def _safe_redirect():
     # Try known endpoints; fall back to "/"
     for ep in ("lti.unauthorized", "manual_login", "index"):
@@ -0,0 +1,34 @@
+# app/utils/background.py
+"""
+Shared thread pool for work a request can overlap with its own slow stages
+(e.g. the storage upload in grade_docx runs while the text is extracted and
+graded, and is joined just before the row is written).
+
+The pool is created lazily and re-created after fork, so gunicorn workers
+never inherit a parent's dead threads. BACKGROUND_WORKERS sizes it (default 8).
+"""
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+MAX_WORKERS = int(os.getenv("BACKGROUND_WORKERS", "8"))
+
+_lock = threading.Lock()
+_executor = None
+_pid = None
+
+
+def executor() -> ThreadPoolExecutor:
+    global _executor, _pid
+    if _executor is not None and _pid == os.getpid():
+        return _executor
+    with _lock:
+        if _executor is None or _pid != os.getpid():
+            _executor = ThreadPoolExecutor(max_workers=MAX_WORKERS, thread_name_prefix="rubiqs-bg")
+            _pid = os.getpid()
+    return _executor
+
+
+def submit(fn, *args, **kwargs):
+    """Run fn in the shared pool; returns a concurrent.futures.Future."""
+    return executor().submit(fn, *args, **kwargs)
@@ -0,0 +1,158 @@
+# app/utils/content_store.py
+"""
+Content-addressed Storage objects.
+
+Files are stored under their SHA-256 instead of a fresh uuid4 path:
+
+    <bucket>/sha256/<first 2 hex>/<sha256><ext>
+
+so the same essay, scan or rubric uploaded twice is transferred and stored
+once. Before uploading we check a per-process index of keys known to exist,
+then a HEAD on the object; only a miss sends the bytes.
+
+Reference counts are derived from the rows that point at an object (e.g.
+submissions.student_file_url) rather than kept in a separate counter, so they
+can never drift from the data. release_object() deletes the object only when
+no referencing row is left. A concurrent upload of the same content between
+that count and the delete can still lose its object; the preview link is the
+only thing affected, which is the same failure mode as a failed upload.
+Counts bypass RLS (service client), since a caller can't see every row that
+references an object.
+"""
+import os
+import threading
+from collections import OrderedDict
+
+from app.supabase_client import supabase
+from app.utils.logger import get_logger
+
+log = get_logger(__name__)
+
+KEY_PREFIX = "sha256"
+INDEX_SIZE = int(os.getenv("CONTENT_INDEX_SIZE", "50000"))
+
+# Tables/columns holding public URLs of objects in each bucket
+REFERENCES = {
+    "submissions": (("submissions", "student_file_url"), ("uscis_submissions", "student_file_url")),
+    "rubrics": (
+        ("assignments", "rubric_file"),
+        ("assignments", "answer_key_file"),
+        ("uscis_assignments", "rubric_file"),
+        ("uscis_assignments", "answer_key_file"),
+    ),
+    "attachments": (("assignments", "additional_file"),),
+}
+
+_lock = threading.Lock()
+_known = OrderedDict()  # (bucket, key) -> True, LRU of objects seen to exist
+
+
+def content_key(sha256: str, filename: str = "") -> str:
+    ext = os.path.splitext((filename or "").lower())[-1]
+    return f"{KEY_PREFIX}/{sha256[:2]}/{sha256}{ext}"
+
+
+def is_content_key(key: str) -> bool:
+    return (key or "").startswith(KEY_PREFIX + "/")
+
+
+def public_url(bucket: str, key: str) -> str:
+    SUPABASE_PROJECT_ID = os.getenv("SUPABASE_PROJECT_ID")
+    return f"https://{SUPABASE_PROJECT_ID}/storage/v1/object/public/{bucket}/{key}"
+
+
+def key_from_url(bucket: str, url: str):
+    marker = f"/storage/v1/object/public/{bucket}/"
+    if not url or marker not in url:
+        return None
+    return url.split(marker, 1)[1].split("?", 1)[0]
+
+
+def _remember(bucket: str, key: str):
+    with _lock:
+        _known[(bucket, key)] = True
+        _known.move_to_end((bucket, key))
+        while len(_known) > INDEX_SIZE:
+            _known.popitem(last=False)
+
+
+def _forget(bucket: str, key: str):
+    with _lock:
+        _known.pop((bucket, key), None)
+
+
+def object_exists(bucket: str, key: str) -> bool:
+    with _lock:
+        if (bucket, key) in _known:
+            return True
+    try:
+        found = supabase.storage.from_(bucket).exists(key)
+    except Exception as e:
+        log.debug("ℹ️ HEAD %s/%s failed, assuming missing: %s", bucket, key, e)
+        return False
+    if found:
+        _remember(bucket, key)
+    return found
+
+
+def put_object(bucket: str, key: str, payload, content_type: str = None) -> bool:
+    """
+    Store payload (bytes or an open binary file, which is closed) at key unless
+    it is already there. Returns True if bytes were transferred.
+    """
+    try:
+        if object_exists(bucket, key):
+            log.debug("♻️ Reusing stored object %s/%s", bucket, key)
+            return False
+        # upsert: two requests racing on the same content write identical bytes
+        supabase.storage.from_(bucket).upload(
+            key,
+            payload,
+            {"content-type": content_type or "application/octet-stream", "upsert": "true"},
+        )
+        _remember(bucket, key)
+        return True
+    finally:
+        if hasattr(payload, "close"):
+            payload.close()
+
+
+def store_upload(bucket: str, upload) -> str:
+    """Content-address a SpooledUpload into bucket and return its public URL."""
+    key = content_key(upload.sha256, upload.filename)
+    put_object(bucket, key, upload.payload(), upload.content_type)
+    return public_url(bucket, key)
+
+
+def reference_count(bucket: str, url: str) -> int:
+    """
+    Rows in every table pointing at url. Counted with the service client, not
+    the request's RLS client: other users' rows share the object too.
+    """
+    total = 0
+    for table, column in REFERENCES.get(bucket, ()):
+        try:
+            resp = supabase.client().table(table).select(column, count="exact").eq(column, url).limit(1).execute()
+            total += resp.count or 0
+        except Exception as e:
+            # Unknown column/table on this deployment: treat as referenced, never delete blindly
+            log.warning("⚠️ Reference count on %s.%s failed: %s", table, column, e)
+            return 1
+    return total
+
+
+def release_object(bucket: str, url: str) -> bool:
+    """
+    Call after deleting a row that referenced url. Removes the object once
+    nothing references it; returns True if it was removed.
+    """
+    key = key_from_url(bucket, url)
+    if not key:
+        return False
+    if reference_count(bucket, url) > 0:
+        log.debug("🔗 %s/%s still referenced; keeping", bucket, key)
+        return False
+    _forget(bucket, key)
+    supabase.storage.from_(bucket).remove([key])
+    log.debug("🗑️ Removed unreferenced object %s/%s", bucket, key)
+    return True
@@ -0,0 +1,154 @@
+# app/utils/dashboard_cache.py
+"""
+Short-TTL dashboard cache with strong ETags.
+
+The dashboards (grader_base, grader_submissions, grader_assignments,
+nomas_dashboard, nomas_training_dashboard) used to re-query Supabase on every
+page load and every JS refresh. Their query results are now cached per
+(endpoint, scope), where scope is (institution_id, course_id, role, uid):
+
+    return cached_response(load, lambda data: render_template(..., **data))
+
+- load() runs only on a miss; its data is kept for DASHBOARD_CACHE_TTL
+  seconds (default 30). What's cached is the query result, not the rendered
+  page, so nothing user-specific from a template is shared within a scope.
+- role is session_role() (from the LTI roles claim for launches), and uid is
+  the caller's user id, because load() runs under the caller's own RLS
+  identity: two users only share an entry if RLS would show them the same
+  rows. Superusers see everything and share one entry per scope.
+- The ETag is built from the newest submission_time/created_at in the data,
+  the row count and a digest of the data, so it is the same in every worker
+  for the same rows. A matching If-None-Match gets 304 Not Modified from
+  cached_response(), which the view calls after its own auth checks, so an
+  unchanged dashboard costs no query.
+- Successful writes invalidate the writer's institution (and superuser and
+  unscoped entries, which see every institution); writes with no institution
+  clear everything. The cache is per process, so another worker's write is
+  only seen once the TTL lapses.
+"""
+import hashlib
+import json
+import os
+import threading
+import time
+
+from flask import current_app, request, session
+
+from app.utils.auth_decorators import session_role
+
+DASHBOARD_CACHE_TTL = float(os.getenv("DASHBOARD_CACHE_TTL", "30"))
+DASHBOARD_CACHE_SIZE = int(os.getenv("DASHBOARD_CACHE_SIZE", "2048"))
+TIMESTAMP_FIELDS = ("submission_time", "submitted_at", "created_at")
+SUPERUSER = "superuser"
+
+
+def scope_key(sess=None) -> tuple:
+    sess = session if sess is None else sess
+    role = session_role(sess)
+    uid = None if role == SUPERUSER else str(sess.get("user_id") or sess.get("student_id") or "")
+    return (sess.get("institution_id"), sess.get("course_id"), role, uid)
+
+
+def _rows(data):
+    """Every dict row in a view's data (a list, or a dict of lists)."""
+    if isinstance(data, dict):
+        return [r for v in data.values() if isinstance(v, list) for r in v if isinstance(r, dict)]
+    if isinstance(data, list):
+        return [r for r in data if isinstance(r, dict)]
+    return []
+
+
+def make_etag(data) -> str:
+    rows = _rows(data)
+    newest = max((str(r.get(f) or "") for r in rows for f in TIMESTAMP_FIELDS), default="")
+    digest = hashlib.sha1(json.dumps(data, sort_keys=True, default=str).encode()).hexdigest()[:16]
+    return hashlib.sha1(f"{newest}|{len(rows)}|{digest}".encode()).hexdigest()[:24]
+
+
+class _Entry:
+    def __init__(self, data):
+        self.data = data
+        self.etag = make_etag(data)
+        self.stored_at = time.monotonic()
+
+
+class DashboardCache:
+    def __init__(self, ttl: float = DASHBOARD_CACHE_TTL, size: int = DASHBOARD_CACHE_SIZE):
+        self.ttl = ttl
+        self.size = size
+        self._lock = threading.Lock()
+        self._items = {}  # (endpoint, scope) -> _Entry
+        self.hits = 0
+        self.misses = 0
+        self.not_modified = 0
+
+    def get(self, endpoint, scope):
+        with self._lock:
+            entry = self._items.get((endpoint, scope))
+            if entry is not None and time.monotonic() - entry.stored_at <= self.ttl:
+                return entry
+            self._items.pop((endpoint, scope), None)
+            return None
+
+    def put(self, endpoint, scope, data) -> _Entry:
+        entry = _Entry(data)
+        with self._lock:
+            if len(self._items) >= self.size:
+                # Drop the oldest tenth rather than tracking LRU order on every read
+                for key in sorted(self._items, key=lambda k: self._items[k].stored_at)[: max(1, self.size // 10)]:
+                    del self._items[key]
+            self._items[(endpoint, scope)] = entry
+        return entry
+
+    def invalidate(self, institution_id=None):
+        """Drop what a write in this institution could have changed (everything if None)."""
+        with self._lock:
+            if institution_id is None:
+                self._items.clear()
+                return
+            for key in [
+                k for k in self._items
+                if k[1][0] in (institution_id, None) or k[1][2] == SUPERUSER
+            ]:
+                del self._items[key]
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"entries": len(self._items), "hits": self.hits, "misses": self.misses,
+                    "not_modified": self.not_modified}
+
+
+DASHBOARDS = DashboardCache()
+
+
+def _finish(resp, etag):
+    resp.set_etag(etag)
+    resp.headers["Cache-Control"] = "private, no-cache"
+    return resp
+
+
+def cached_response(load, respond):
+    """
+    load() -> data (queried on a miss only); respond(data) -> response. Exceptions
+    from load() propagate and nothing is cached.
+    """
+    scope = scope_key()
+    entry = DASHBOARDS.get(request.endpoint, scope)
+    if entry is None:
+        DASHBOARDS.misses += 1
+        entry = DASHBOARDS.put(request.endpoint, scope, load())
+    else:
+        DASHBOARDS.hits += 1
+    if request.if_none_match.contains(entry.etag):
+        DASHBOARDS.not_modified += 1
+        return _finish(current_app.response_class(status=304), entry.etag)
+    resp = current_app.make_response(respond(entry.data))
+    if resp.status_code != 200:
+        return resp
+    return _finish(resp, entry.etag)
+
+
+def invalidate_for_session(sess=None):
+    sess = session if sess is None else sess
+    scope = scope_key(sess)
+    DASHBOARDS.invalidate(None if scope[2] == SUPERUSER else scope[0])
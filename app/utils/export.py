@@ -0,0 +1,216 @@
+# app/utils/export.py
+"""
+Streaming gradebook export (CSV, or Parquet when pyarrow is installed).
+
+    rows = iter_rows(supabase, "submissions", scope, include_text=False)
+    return Response(csv_chunks(rows, columns("submissions", False)), mimetype="text/csv")
+
+- Rows are read in pages of EXPORT_PAGE_SIZE with keyset pagination on
+  (submission_time, submission_id): each page asks for rows strictly after the
+  last one seen instead of using an OFFSET, so page N costs the same as page 1
+  and nothing is skipped or repeated when rows are inserted mid-export.
+- Each page is encoded and yielded before the next is fetched; memory is one
+  page regardless of how many submissions the scope has.
+- student_text is only selected when asked for (it is most of each row).
+- Parquet writes one row group per page through a sink that hands its bytes
+  to the response as they are produced. pyarrow is optional; without it
+  ParquetUnavailable is raised before anything is streamed.
+"""
+import csv
+import io
+import json
+import os
+
+EXPORT_PAGE_SIZE = int(os.getenv("EXPORT_PAGE_SIZE", "1000"))
+
+# Exported columns per table, in order; student_text is appended on request
+EXPORT_COLUMNS = {
+    "submissions": (
+        "submission_id", "student_id", "assignment_title", "institution_id", "course_id",
+        "submission_time", "score", "grading_model", "criterion_scores", "feedback",
+        "instructor_notes", "reviewed", "pending", "ready_to_post", "release_time",
+        "submission_type", "student_file_url", "ai_check_result",
+    ),
+    "uscis_submissions": (
+        "submission_id", "student_id", "assignment_title", "form_type", "submission_time",
+        "score", "total", "grading_model", "incorrect_fields", "feedback", "instructor_notes",
+        "reviewed", "pending", "ready_to_post", "release_time", "student_file_url",
+    ),
+}
+NUMERIC_COLUMNS = {"score", "total"}
+BOOLEAN_COLUMNS = {"reviewed", "pending", "ready_to_post"}
+
+
+class ParquetUnavailable(RuntimeError):
+    pass
+
+
+def columns(table: str, include_text: bool = False) -> list:
+    cols = list(EXPORT_COLUMNS[table])
+    if include_text:
+        cols.append("student_text")
+    return cols
+
+
+def _quote(v) -> str:
+    """PostgREST filter value, quoted so ':' '+' ',' in timestamps/ids are literal."""
+    return '"' + str(v).replace("\\", "\\\\").replace('"', '\\"') + '"'
+
+
+def iter_rows(client, table: str, scope=None, include_text: bool = False, assignment_title=None,
+              page_size: int = EXPORT_PAGE_SIZE):
+    """
+    Yields pages (lists of row dicts) in (submission_time, submission_id) order.
+    scope = (institution_id, course_id, is_superuser); scope filters apply to
+    submissions only (uscis_submissions has no scope columns; RLS governs it).
+    """
+    inst, course, superuser = scope or (None, None, True)
+    select = ",".join(columns(table, include_text))
+    after = None
+    while True:
+        q = client.table(table).select(select)
+        if table == "submissions":
+            q = q.eq("tool", "grader")
+            if not superuser:
+                if inst:
+                    q = q.eq("institution_id", inst)
+                if course:
+                    q = q.eq("course_id", course)
+        if assignment_title:
+            q = q.eq("assignment_title", assignment_title)
+        if after is not None:
+            t, sid = after
+            if t is None:
+                # Legacy rows without a submission_time sort first
+                q = q.or_(
+                    "submission_time.not.is.null,"
+                    f"and(submission_time.is.null,submission_id.gt.{_quote(sid)})"
+                )
+            else:
+                q = q.or_(
+                    f"submission_time.gt.{_quote(t)},"
+                    f"and(submission_time.eq.{_quote(t)},submission_id.gt.{_quote(sid)})"
+                )
+        page = (
+            q.order("submission_time", nullsfirst=True)
+            .order("submission_id")
+            .limit(page_size)
+            .execute()
+            .data
+            or []
+        )
+        if not page:
+            return
+        yield page
+        if len(page) < page_size:
+            return
+        last = page[-1]
+        after = (last.get("submission_time"), last.get("submission_id"))
+
+
+def _cell(v):
+    if isinstance(v, (dict, list)):
+        return json.dumps(v, default=str)
+    return "" if v is None else v
+
+
+def csv_chunks(pages, cols):
+    """One CSV chunk (str) for the header and one per page."""
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+    writer.writerow(cols)
+    yield buf.getvalue()
+    for page in pages:
+        buf.seek(0)
+        buf.truncate()
+        for r in page:
+            writer.writerow([_cell(r.get(c)) for c in cols])
+        yield buf.getvalue()
+
+
+class _ChunkSink:
+    """Write-only file object that collects what pyarrow writes until drained."""
+
+    def __init__(self):
+        self._chunks = []
+        self._pos = 0
+        self.closed = False
+
+    def write(self, data):
+        b = bytes(data)
+        self._chunks.append(b)
+        self._pos += len(b)
+        return len(b)
+
+    def tell(self):
+        return self._pos
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def writable(self):
+        return True
+
+    def drain(self) -> bytes:
+        out, self._chunks = b"".join(self._chunks), []
+        return out
+
+
+def _arrow():
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError as e:
+        raise ParquetUnavailable("Parquet export needs pyarrow (pip install pyarrow)") from e
+    return pa, pq
+
+
+def _parquet_schema(pa, cols):
+    def typ(c):
+        if c in NUMERIC_COLUMNS:
+            return pa.float64()
+        if c in BOOLEAN_COLUMNS:
+            return pa.bool_()
+        return pa.string()
+
+    return pa.schema([(c, typ(c)) for c in cols])
+
+
+def _parquet_value(c, v):
+    if v is None:
+        return None
+    if c in NUMERIC_COLUMNS:
+        try:
+            return float(v)
+        except (TypeError, ValueError):
+            return None
+    if c in BOOLEAN_COLUMNS:
+        return bool(v)
+    return json.dumps(v, default=str) if isinstance(v, (dict, list)) else str(v)
+
+
+def parquet_chunks(pages, cols):
+    """Parquet bytes, one row group per page. Call before streaming: raises ParquetUnavailable."""
+    pa, pq = _arrow()
+    schema = _parquet_schema(pa, cols)
+
+    def gen():
+        sink = _ChunkSink()
+        writer = pq.ParquetWriter(pa.PythonFile(sink, mode="w"), schema)
+        try:
+            for page in pages:
+                table = pa.Table.from_pydict(
+                    {c: [_parquet_value(c, r.get(c)) for r in page] for c in cols}, schema=schema
+                )
+                writer.write_table(table)
+                chunk = sink.drain()
+                if chunk:
+                    yield chunk
+        finally:
+            writer.close()
+        yield sink.drain()
+
+    return gen()
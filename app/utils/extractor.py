@@ -3,8 +3,8 @@ from io import BytesIO
 
 def extract_pdf_text(file_or_bytes) -> str:
     # Minimal placeholder so your app runs. Replace with your real PDF extractor.
-    # Accepts path/bytes/BytesIO; returns a simple string to avoid crashes.
-    if isinstance(file_or_bytes, (bytes, bytearray, BytesIO)):
+    # Accepts path/bytes/BytesIO/open binary file; returns a simple string to avoid crashes.
+    if isinstance(file_or_bytes, (bytes, bytearray, BytesIO)) or hasattr(file_or_bytes, "read"):
         return "[PDF text placeholder]"
     try:
         with open(file_or_bytes, "rb"):
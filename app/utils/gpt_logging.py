@@ -1,4 +1,22 @@
 # app/utils/gpt_logging.py
+from datetime import datetime
+
+from app.utils.ai_usage_logger import LEDGER
+
+
 def log_gpt_interaction(assignment_title, prompt_or_text, feedback, score=None):
-    # no-op logger; replace with your real log sink
+    # Goes through the same buffered ledger as token usage. Only the outcome is
+    # kept (not the student text or feedback) so the sink stays FERPA-friendly.
+    try:
+        score = float(score) if score is not None else None
+    except (TypeError, ValueError):
+        score = None
+    LEDGER.record(
+        {
+            "ts": datetime.utcnow().isoformat() + "Z",
+            "kind": "interaction",
+            "assignment_id": assignment_title,
+            "score": score,
+        }
+    )
     return True
@@ -0,0 +1,99 @@
+# app/utils/grade_stats.py
+"""
+Per-assignment grade statistics from the assignment_stats summary table.
+
+The table is kept current by a trigger on public.submissions
+(migrations/0004_assignment_stats.sql): every insert, score/review change and
+delete adds or subtracts that row's contribution to its assignment's
+counters. Editing an assignment's total_points rebuilds that title's rows
+(0008_assignment_stats_security.sql), since the histogram buckets depend on
+it. Reading stats is therefore one row per (scope, assignment) and never
+touches submissions directly (RLS on the table checks the caller can see one):
+
+    rows = supabase.table("assignment_stats").select("*")...execute().data
+    stats = summarize(rows)
+
+A row holds submissions, scored, pending (not yet reviewed), score_sum,
+total_points and a fixed 10-bucket histogram of score as a percentage of
+total_points. mean is exact; median is interpolated inside the histogram
+bucket that holds the middle score, so it is accurate to within one bucket
+(a tenth of total_points).
+
+Rows for the same assignment under different scope keys (a superuser sees
+every scope) are merged.
+"""
+
+HISTOGRAM_BUCKETS = 10  # must match the SQL
+BUCKET_PERCENT = 100 // HISTOGRAM_BUCKETS
+STATS_TABLE = "assignment_stats"
+
+
+def _num(v, default=0.0) -> float:
+    try:
+        return float(v)
+    except (TypeError, ValueError):
+        return default
+
+
+def _histogram(v) -> list:
+    h = [int(_num(x)) for x in (v or [])][:HISTOGRAM_BUCKETS]
+    return h + [0] * (HISTOGRAM_BUCKETS - len(h))
+
+
+def histogram_median_percent(histogram: list):
+    """Median score percentage by linear interpolation inside the middle bucket."""
+    n = sum(histogram)
+    if n <= 0:
+        return None
+    half = n / 2.0
+    seen = 0
+    for i, count in enumerate(histogram):
+        if count and seen + count >= half:
+            return (i + (half - seen) / count) * BUCKET_PERCENT
+        seen += count
+    return 100.0
+
+
+def merge(rows) -> dict:
+    """assignment_title -> merged counters across scope keys."""
+    out = {}
+    for r in rows or []:
+        title = r.get("assignment_title")
+        if not title:
+            continue
+        m = out.setdefault(title, {
+            "submissions": 0, "scored": 0, "pending": 0, "score_sum": 0.0,
+            "histogram": [0] * HISTOGRAM_BUCKETS, "total_points": None, "updated_at": None,
+        })
+        m["submissions"] += int(_num(r.get("submissions")))
+        m["scored"] += int(_num(r.get("scored")))
+        m["pending"] += int(_num(r.get("pending")))
+        m["score_sum"] += _num(r.get("score_sum"))
+        m["histogram"] = [a + b for a, b in zip(m["histogram"], _histogram(r.get("histogram")))]
+        if r.get("total_points") is not None:
+            m["total_points"] = _num(r.get("total_points"), None)
+        m["updated_at"] = max(filter(None, [m["updated_at"], r.get("updated_at")]), default=None)
+    return out
+
+
+def summarize(rows) -> list:
+    """One dict per assignment (title order): counts, mean, median, histogram."""
+    stats = []
+    for title, m in sorted(merge(rows).items()):
+        total = m["total_points"] or 100.0
+        median_pct = histogram_median_percent(m["histogram"])
+        stats.append({
+            "assignment_title": title,
+            "submissions": m["submissions"],
+            "scored": m["scored"],
+            "pending_review": m["pending"],
+            "total_points": total,
+            "mean": round(m["score_sum"] / m["scored"], 2) if m["scored"] else None,
+            "median": round(median_pct * total / 100.0, 2) if median_pct is not None else None,
+            "histogram": [
+                {"from_percent": i * BUCKET_PERCENT, "to_percent": (i + 1) * BUCKET_PERCENT, "count": c}
+                for i, c in enumerate(m["histogram"])
+            ],
+            "updated_at": m["updated_at"],
+        })
+    return stats
@@ -1,4 +1,12 @@
 # app/utils/grading_functions.py
+import json
+import re
+from bisect import bisect_left
+from io import BytesIO
+
+from app.utils.extractor import extract_pdf_text
+
+
 def _compare_generic(student_fields: dict, answer_key: dict):
     score = 0
     total = 0
@@ -31,3 +39,189 @@ def compare_fields_i765(student_fields, answer_key_json):
 
 def compare_fields_i130a(student_fields, answer_key_json):
     return _compare_generic(student_fields, answer_key_json)
+
+
+# ---------- Answer-key (NoMas JSON mode) comparison ----------
+def _answer_key_fields(answer_key):
+    """Flatten {sections:[{fields:[...]}]} or a flat {field: expected|{expected, match}} key."""
+    if isinstance(answer_key, dict) and "sections" in answer_key:
+        return [f for sec in answer_key["sections"] for f in sec.get("fields", [])]
+
+    fields = []
+    for k, v in answer_key.items():
+        if isinstance(v, dict):
+            fields.append({"field": k, "expected": v.get("expected", ""), "match": v.get("match", "exact")})
+        else:
+            fields.append({"field": k, "expected": v, "match": "exact"})
+    return fields
+
+
+class _PrefixIndex:
+    """
+    First non-"off" value among keys starting with a prefix, in the student's
+    field order. Replaces a full scan of student_data per empty/"off" field
+    (quadratic on big forms) with a bisect over the sorted keys.
+    """
+
+    def __init__(self, student_data: dict):
+        entries = []
+        for pos, (k, v) in enumerate(student_data.items()):
+            s = str(v)
+            if s.lower() != "off":
+                entries.append((k, pos, s))
+        entries.sort()
+        self._keys = [e[0] for e in entries]
+        self._entries = entries
+
+    def first(self, prefix: str) -> str:
+        lo = bisect_left(self._keys, prefix)
+        best = None
+        for k, pos, s in self._entries[lo:]:
+            if not k.startswith(prefix):
+                break
+            if best is None or pos < best[0]:
+                best = (pos, s)
+        return best[1].strip().lower() if best else ""
+
+
+def compare_answer_key_fields(student_data: dict, answer_key):
+    """
+    Grade extracted PDF fields against an answer key (flat dict or sections).
+
+    Radio groups export one key per option, so an empty/"off" field falls back to
+    the first filled sibling sharing its "<base>_" prefix.
+    """
+    feedback_lines, incorrect_keys = [], []
+    sc, tot = 0, 0
+    siblings = None
+
+    for fld in _answer_key_fields(answer_key):
+        key = fld["field"]
+        expected = str(fld.get("expected", "")).strip().lower()
+        match = fld.get("match", "exact")
+        tot += 1
+
+        val = str(student_data.get(key, "") or "").strip().lower()
+        if val == "off" or not val:
+            if siblings is None:
+                siblings = _PrefixIndex(student_data)
+            val = siblings.first(key.rsplit("_", 1)[0])
+
+        if not val:
+            incorrect_keys.append(key)
+            feedback_lines.append(f"⚠️ Field '{key}' is empty or missing.")
+        elif match == "exact" and val != expected:
+            incorrect_keys.append(key)
+            feedback_lines.append(
+                f"❌ Field '{key}' appears incorrect. Expected '{expected}' but got '{val}'."
+            )
+        else:
+            sc += 1
+
+    feedback_lines.append(
+        f"\nYou have {len(incorrect_keys)} error{'s' if len(incorrect_keys) != 1 else ''} in your submission."
+    )
+    feedback_lines.append(f"\n✅ Score: {sc} / {tot}")
+    return {
+        "score": sc,
+        "total": tot,
+        "feedback": "\n".join(feedback_lines),
+        "incorrect_fields": incorrect_keys,
+    }
+
+
+# ---------- Answer-key generation ----------
+RADIO_GROUPS = {
+    "Reason for Filing": [
+        "Page1_General Provision_1",
+        "Page1_Spouse of U.S. Citizen_2",
+        "Page1_VAWA_3",
+    ]
+}
+
+
+def group_radio_fields(raw_fields: dict, radio_groups=RADIO_GROUPS) -> dict:
+    """Keep only filled/checked fields and fold known radio buttons under a semantic label."""
+    filtered_fields = {
+        k: v for k, v in raw_fields.items() if str(v).strip().lower() not in ("", "off")
+    }
+
+    grouped_fields = {}
+    for group_label, field_keys in radio_groups.items():
+        for k in field_keys:
+            if filtered_fields.get(k) == "On":
+                grouped_fields[group_label] = {k: "Yes"}
+                break
+
+    # Add all non-radio fields back in
+    radio_keys = {k for keys in radio_groups.values() for k in keys}
+    for k, v in filtered_fields.items():
+        if k not in radio_keys:
+            grouped_fields[k] = v
+    return grouped_fields
+
+
+# ---------- LLM output ----------
+_SCORE_RE = re.compile(r"Score:\s*(\d{1,3})")
+_FEEDBACK_RE = re.compile(r"Feedback:\s*(.+)", re.DOTALL)
+
+
+def parse_score_feedback(output: str):
+    """(score or None, feedback) from a "Score: N / Feedback: ..." completion."""
+    m = _SCORE_RE.search(output)
+    fm = _FEEDBACK_RE.search(output)
+    score = int(m.group(1)) if m else None
+    feedback = fm.group(1).strip() if fm else output.strip()
+    return score, feedback
+
+
+# ---------- Release delay ----------
+DELAY_HOURS = {
+    "immediate": 0,
+    "1m": 0.0166,
+    "12h": 12,
+    "24h": 24,
+    "36h": 36,
+    "48h": 48,
+}
+
+
+def delay_hours_for(delay_setting) -> float:
+    return DELAY_HOURS.get(delay_setting, 0)
+
+
+# ---------- Rubrics ----------
+def parse_rubric(rubric_content: bytes, rubric_url: str, default_total=100, sections_total=10):
+    """
+    (rubric_text, total_points, rubric_json) for a downloaded rubric file.
+    Format is picked from the URL extension; rubric_json is None unless .json.
+    """
+    if rubric_url.endswith(".json"):
+        rubric_json = json.loads(rubric_content)
+        if "criteria" in rubric_json:
+            rubric_text = "\n".join([f"- {c['description']}" for c in rubric_json["criteria"]])
+            total = sum(c.get("max_points", 1) for c in rubric_json["criteria"])
+        elif "sections" in rubric_json:
+            rubric_text = "\n".join(
+                [
+                    f"- {f['field']}: expected '{f['expected']}'"
+                    for s in rubric_json["sections"]
+                    for f in s.get("fields", [])
+                ]
+            )
+            total = sections_total
+        else:
+            rubric_text = "(Invalid JSON rubric format)"
+            total = default_total
+        return rubric_text, total, rubric_json
+
+    if rubric_url.endswith(".docx"):
+        from docx import Document
+
+        doc = Document(BytesIO(rubric_content))
+        return "\n".join([p.text for p in doc.paragraphs]), default_total, None
+
+    if rubric_url.endswith(".pdf"):
+        return extract_pdf_text(BytesIO(rubric_content)), default_total, None
+
+    return "(Unknown rubric format)", default_total, None
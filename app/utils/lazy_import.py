@@ -0,0 +1,43 @@
+# app/utils/lazy_import.py
+"""
+Deferred imports for heavy modules that only some requests need.
+
+    openai = lazy_module("openai")
+    ...
+    openai.ChatCompletion.create(...)   # the first attribute access imports it
+
+Importing the app therefore doesn't pay for openai/docx/... until a route
+actually uses them. The real import runs through importlib (under Python's
+import lock), so concurrent first uses are safe; attribute reads and writes
+(e.g. `openai.api_key = ...`) go straight to the real module afterwards.
+"""
+import importlib
+
+
+class _LazyModule:
+    __slots__ = ("_name", "_module")
+
+    def __init__(self, name: str):
+        object.__setattr__(self, "_name", name)
+        object.__setattr__(self, "_module", None)
+
+    def _load(self):
+        module = self._module
+        if module is None:
+            module = importlib.import_module(self._name)
+            object.__setattr__(self, "_module", module)
+        return module
+
+    def __getattr__(self, attr):
+        return getattr(self._load(), attr)
+
+    def __setattr__(self, attr, value):
+        setattr(self._load(), attr, value)
+
+    def __repr__(self):
+        state = "loaded" if self._module is not None else "not loaded"
+        return f"<lazy module {self._name!r} ({state})>"
+
+
+def lazy_module(name: str) -> _LazyModule:
+    return _LazyModule(name)
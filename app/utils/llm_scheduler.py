@@ -0,0 +1,342 @@
+# app/utils/llm_scheduler.py
+"""
+Weighted fair queueing in front of LLM calls.
+
+Every institution shares one OpenAI key, so a single course's deadline used to
+be able to take every slot. Callers now take a ticket before calling the model:
+
+    ticket = SCHEDULER.enqueue(session.get("institution_id"), cost=estimate_tokens(prompt))
+    if not ticket.wait(LLM_QUEUE_WAIT_SECONDS):
+        ...  # still queued: ticket.position(), ticket.eta_seconds()
+    try:
+        resp = openai.ChatCompletion.create(...)
+    finally:
+        ticket.release()
+
+A caller that can't wait (the submission was saved while still queued) uses
+ticket.when_granted(fn) instead: fn runs on the releasing thread right after
+the grant, so no thread sits in wait() meanwhile. fn must be quick (hand off
+to a pool) and the job it starts must release the ticket.
+
+Dispatch (start-time fair queueing):
+
+- each institution has a weight; a ticket's virtual start is
+  max(global virtual time, the institution's last virtual finish) and its
+  finish is start + cost / weight, so tenants with equal weights get equal
+  token throughput regardless of how many requests each has queued;
+- at most LLM_GLOBAL_CONCURRENCY calls run at once, and at most the
+  institution's own concurrency limit (LLM_INSTITUTION_CONCURRENCY);
+- an institution past its monthly token quota is not refused: its tickets
+  run one at a time and only when no in-quota ticket is eligible. Usage comes
+  from LEDGER.institution_tokens(): the persisted usage sink's monthly total
+  (all workers, survives restarts) as last read by the ledger's flusher
+  thread, plus unflushed calls. It is a memory read, so enqueue() never
+  does I/O and is safe to call on an event loop.
+
+Per-institution overrides come from LLM_TENANT_LIMITS, a JSON object:
+
+    {"<institution_id>": {"weight": 2, "concurrency": 16, "monthly_tokens": 5000000}}
+
+Concurrency limits are per process; with N workers the effective global limit
+is N times LLM_GLOBAL_CONCURRENCY. Quotas are shared through the sink.
+"""
+import asyncio
+import json
+import os
+import threading
+import time
+from collections import deque
+
+from app.utils.ai_usage_logger import LEDGER
+from app.utils.logger import get_logger
+
+log = get_logger(__name__)
+
+GLOBAL_CONCURRENCY = int(os.getenv("LLM_GLOBAL_CONCURRENCY", "32"))
+INSTITUTION_CONCURRENCY = int(os.getenv("LLM_INSTITUTION_CONCURRENCY", "8"))
+MONTHLY_TOKENS = int(os.getenv("LLM_INSTITUTION_MONTHLY_TOKENS", "0"))  # 0 = unlimited
+OVER_QUOTA_CONCURRENCY = 1
+QUEUE_WAIT_SECONDS = float(os.getenv("LLM_QUEUE_WAIT_SECONDS", "20"))
+DEFAULT_CALL_SECONDS = 8.0  # ETA prior until real call times are observed
+DEFAULT_TENANT = "default"
+
+
+def _tenant_overrides() -> dict:
+    raw = os.getenv("LLM_TENANT_LIMITS") or ""
+    if not raw.strip():
+        return {}
+    try:
+        return {str(k): v for k, v in json.loads(raw).items()}
+    except (ValueError, AttributeError) as e:
+        log.warning("⚠️ Ignoring invalid LLM_TENANT_LIMITS: %s", e)
+        return {}
+
+
+def estimate_tokens(prompt: str, max_tokens: int = 1000) -> int:
+    """Rough prompt + completion size (~4 chars/token) used as the ticket's cost."""
+    return len(prompt or "") // 4 + max_tokens
+
+
+class _Tenant:
+    def __init__(self, name: str, weight: float, concurrency: int, monthly_tokens: int):
+        self.name = name
+        self.weight = max(float(weight), 0.01)
+        self.concurrency = max(int(concurrency), 1)
+        self.monthly_tokens = int(monthly_tokens)
+        self.active = 0
+        self.last_finish = 0.0
+        self.queue = deque()
+
+    def over_quota(self) -> bool:
+        if self.monthly_tokens <= 0:
+            return False
+        inst = None if self.name == DEFAULT_TENANT else self.name
+        return LEDGER.institution_tokens(inst, month="current") >= self.monthly_tokens
+
+    def limit(self, over_quota: bool) -> int:
+        return OVER_QUOTA_CONCURRENCY if over_quota else self.concurrency
+
+
+class Ticket:
+    def __init__(self, scheduler, tenant: _Tenant, cost: int, vstart: float, over_quota: bool):
+        self.scheduler = scheduler
+        self.tenant = tenant
+        self.cost = cost
+        self.vstart = vstart
+        self.over_quota = over_quota
+        self.enqueued_at = time.monotonic()
+        self.granted_at = None
+        self.released = False
+        self.cancelled = False
+        self._event = threading.Event()
+        self._futures = []  # (loop, future) pairs from wait_async
+        self._callbacks = []  # from when_granted
+
+    # ---------- state ----------
+    @property
+    def granted(self) -> bool:
+        return self._event.is_set()
+
+    @property
+    def waited(self) -> float:
+        end = self.granted_at if self.granted_at is not None else time.monotonic()
+        return end - self.enqueued_at
+
+    def _grant(self):
+        self.granted_at = time.monotonic()
+        self._event.set()
+        for loop, fut in self._futures:
+            loop.call_soon_threadsafe(lambda f=fut: f.done() or f.set_result(True))
+        self._futures = []
+        # Called under the scheduler lock: run them once it is released
+        self.scheduler._ready.extend(self._callbacks)
+        self._callbacks = []
+
+    # ---------- waiting ----------
+    def wait(self, timeout: float = None) -> bool:
+        """Block until the call may start; False if still queued after timeout."""
+        return self._event.wait(timeout)
+
+    async def wait_async(self, timeout: float = None) -> bool:
+        if self.granted:
+            return True
+        loop = asyncio.get_running_loop()
+        fut = loop.create_future()
+        with self.scheduler._lock:
+            if self.granted:
+                return True
+            self._futures.append((loop, fut))
+        try:
+            await asyncio.wait_for(asyncio.shield(fut), timeout)
+            return True
+        except asyncio.TimeoutError:
+            return self.granted
+
+    def when_granted(self, fn):
+        """Calls fn() once granted (now, if it already is) without holding a thread until then."""
+        with self.scheduler._lock:
+            if not self.granted:
+                self._callbacks.append(fn)
+                return
+        fn()
+
+    def position(self) -> int:
+        """Tickets that will be dispatched before this one (0 once granted)."""
+        return self.scheduler.position(self)
+
+    def eta_seconds(self) -> float:
+        return self.scheduler.eta_seconds(self.position())
+
+    # ---------- finishing ----------
+    def release(self):
+        self.scheduler._release(self)
+
+    def cancel(self):
+        """Give up a queued ticket (or release a granted one)."""
+        self.scheduler._cancel(self)
+
+    def __enter__(self):
+        self.wait()
+        return self
+
+    def __exit__(self, *exc):
+        self.release()
+
+
+class FairScheduler:
+    def __init__(self, global_concurrency: int = GLOBAL_CONCURRENCY,
+                 institution_concurrency: int = INSTITUTION_CONCURRENCY,
+                 monthly_tokens: int = MONTHLY_TOKENS, overrides: dict = None):
+        self.global_concurrency = max(int(global_concurrency), 1)
+        self.institution_concurrency = institution_concurrency
+        self.monthly_tokens = monthly_tokens
+        self.overrides = _tenant_overrides() if overrides is None else overrides
+        self._lock = threading.Lock()
+        self._tenants = {}
+        self._active = 0
+        self._vtime = 0.0
+        self._call_seconds = DEFAULT_CALL_SECONDS  # EWMA of how long a slot is held
+        self._ready = []  # when_granted callbacks of tickets just granted
+
+    def _tenant(self, institution_id) -> _Tenant:
+        name = str(institution_id) if institution_id else DEFAULT_TENANT
+        t = self._tenants.get(name)
+        if t is None:
+            o = self.overrides.get(name) or {}
+            t = self._tenants[name] = _Tenant(
+                name,
+                o.get("weight", 1.0),
+                o.get("concurrency", self.institution_concurrency),
+                o.get("monthly_tokens", self.monthly_tokens),
+            )
+        return t
+
+    # ---------- queueing ----------
+    def enqueue(self, institution_id, cost: int = 1000) -> Ticket:
+        cost = max(int(cost), 1)
+        with self._lock:
+            tenant = self._tenant(institution_id)
+        over = tenant.over_quota()  # may read the usage sink; keep it outside the lock
+        with self._lock:
+            vstart = max(self._vtime, tenant.last_finish)
+            tenant.last_finish = vstart + cost / tenant.weight
+            ticket = Ticket(self, tenant, cost, vstart, over)
+            tenant.queue.append(ticket)
+            self._dispatch()
+        self._run_ready()
+        if not ticket.granted:
+            log.info(
+                "⏳ LLM call queued for %s (position %s%s)",
+                tenant.name,
+                self.position(ticket),
+                ", over monthly quota" if over else "",
+            )
+        return ticket
+
+    def _eligible(self):
+        best = None
+        for t in self._tenants.values():
+            if not t.queue:
+                continue
+            head = t.queue[0]
+            if t.active >= t.limit(head.over_quota):
+                continue
+            key = (head.over_quota, head.vstart)
+            if best is None or key < best[0]:
+                best = (key, t)
+        return best[1] if best else None
+
+    def _dispatch(self):
+        while self._active < self.global_concurrency:
+            tenant = self._eligible()
+            if tenant is None:
+                return
+            ticket = tenant.queue.popleft()
+            tenant.active += 1
+            self._active += 1
+            self._vtime = max(self._vtime, ticket.vstart)
+            ticket._grant()
+
+    def _run_ready(self):
+        with self._lock:
+            ready, self._ready = self._ready, []
+        for fn in ready:
+            try:
+                fn()
+            except Exception:
+                log.exception("💥 LLM ticket grant callback failed")
+
+    def _release(self, ticket: Ticket):
+        with self._lock:
+            if ticket.released or not ticket.granted:
+                return
+            ticket.released = True
+            ticket.tenant.active -= 1
+            self._active -= 1
+            held = time.monotonic() - ticket.granted_at
+            self._call_seconds = 0.8 * self._call_seconds + 0.2 * held
+            self._dispatch()
+        self._run_ready()
+
+    def _cancel(self, ticket: Ticket):
+        with self._lock:
+            queued = not ticket.granted
+            if queued:
+                ticket.cancelled = True
+                ticket._callbacks = []
+                try:
+                    ticket.tenant.queue.remove(ticket)
+                except ValueError:
+                    pass
+                self._dispatch()
+        if queued:
+            self._run_ready()
+        else:
+            self._release(ticket)
+
+    # ---------- estimates ----------
+    def position(self, ticket: Ticket) -> int:
+        with self._lock:
+            if ticket.granted or ticket.cancelled:
+                return 0
+            mine = (ticket.over_quota, ticket.vstart)
+            ahead = 0
+            for t in self._tenants.values():
+                for other in t.queue:
+                    if other is ticket:
+                        continue
+                    if (other.over_quota, other.vstart) <= mine:
+                        ahead += 1
+                    else:
+                        break  # per-tenant queues are in vstart order
+            return ahead
+
+    def eta_seconds(self, position: int) -> float:
+        """Rough wait: whole "rounds" of global slots ahead of us times the mean call time."""
+        rounds = position // self.global_concurrency + 1
+        return round(rounds * self._call_seconds, 1)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                "active": self._active,
+                "global_concurrency": self.global_concurrency,
+                "call_seconds": round(self._call_seconds, 2),
+                "tenants": {
+                    name: {"active": t.active, "queued": len(t.queue), "weight": t.weight,
+                           "concurrency": t.concurrency, "monthly_tokens": t.monthly_tokens}
+                    for name, t in self._tenants.items()
+                },
+            }
+
+
+SCHEDULER = FairScheduler()
+
+
+def queued_message(position: int, eta_seconds: float) -> str:
+    minutes = max(1, int(round(eta_seconds / 60.0)))
+    return (
+        f"⏳ Your submission was received and is #{position + 1} in the grading queue "
+        f"(about {minutes} minute{'s' if minutes != 1 else ''}). "
+        "Feedback will appear once it has been graded and reviewed."
+    )
@@ -0,0 +1,175 @@
+# app/utils/metrics.py
+"""
+Lightweight request + stage timing.
+
+- A per-request timer (started/stopped from main.py hooks)
+- Named spans (`with span("llm"): ...`) for the slow stages of a route
+- An in-memory histogram registry rendered as Prometheus text at /metrics
+
+Everything is process-local: with several gunicorn workers each one keeps its
+own registry, which is how the Prometheus client's default mode behaves too.
+"""
+import threading
+import time
+from contextlib import contextmanager
+
+from flask import g, has_request_context, request
+
+# Seconds. Tuned for grading: most stages are sub-second, LLM calls are 5–60s.
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60)
+
+REQUEST_METRIC = "rubiqs_request_duration_seconds"
+STAGE_METRIC = "rubiqs_stage_duration_seconds"
+
+
+class Histogram:
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * len(self.buckets)
+        self.total = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        # Buckets are cumulative in the exposition format; store per-bucket
+        # counts here and accumulate when rendering.
+        for i, upper in enumerate(self.buckets):
+            if value <= upper:
+                self.counts[i] += 1
+                break
+        self.total += value
+        self.count += 1
+
+
+class Registry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._series = {}  # (name, labels_tuple) -> Histogram
+        self._help = {
+            REQUEST_METRIC: "Wall time of a whole request.",
+            STAGE_METRIC: "Wall time of a named stage inside a request.",
+        }
+
+    def observe(self, name: str, value: float, **labels):
+        key = (name, tuple(sorted((k, str(v)) for k, v in labels.items())))
+        with self._lock:
+            hist = self._series.get(key)
+            if hist is None:
+                hist = self._series[key] = Histogram()
+            hist.observe(value)
+
+    def reset(self):
+        with self._lock:
+            self._series.clear()
+
+    def render_prometheus(self) -> str:
+        with self._lock:
+            snapshot = {
+                key: (h.buckets, list(h.counts), h.total, h.count)
+                for key, h in self._series.items()
+            }
+
+        lines = []
+        for name in sorted({n for n, _ in snapshot}):
+            lines.append(f"# HELP {name} {self._help.get(name, name)}")
+            lines.append(f"# TYPE {name} histogram")
+            for (n, labels), (buckets, counts, total, count) in sorted(snapshot.items()):
+                if n != name:
+                    continue
+                running = 0
+                for upper, c in zip(buckets, counts):
+                    running += c
+                    lines.append(
+                        f"{name}_bucket{_fmt_labels(labels, le=_fmt_float(upper))} {running}"
+                    )
+                lines.append(f"{name}_bucket{_fmt_labels(labels, le='+Inf')} {count}")
+                lines.append(f"{name}_sum{_fmt_labels(labels)} {total:.6f}")
+                lines.append(f"{name}_count{_fmt_labels(labels)} {count}")
+        return "\n".join(lines) + "\n"
+
+
+def _fmt_float(v) -> str:
+    return ("%f" % v).rstrip("0").rstrip(".")
+
+
+def _fmt_labels(labels, **extra) -> str:
+    pairs = list(labels) + list(extra.items())
+    if not pairs:
+        return ""
+    esc = lambda s: str(s).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+    return "{" + ",".join(f'{k}="{esc(v)}"' for k, v in pairs) + "}"
+
+
+REGISTRY = Registry()
+
+
+# ---------- Request timer (wired from main.py) ----------
+def start_request_timer():
+    g._rq_t0 = time.perf_counter()
+    g._rq_spans = []
+
+
+def finish_request_timer(response):
+    t0 = getattr(g, "_rq_t0", None)
+    if t0 is None:
+        return response
+
+    elapsed = time.perf_counter() - t0
+    g._rq_elapsed = elapsed
+    REGISTRY.observe(
+        REQUEST_METRIC,
+        elapsed,
+        endpoint=request.endpoint or "unmatched",
+        method=request.method,
+        status=response.status_code,
+    )
+
+    # Server-Timing lets you read the breakdown straight from browser devtools
+    parts = [f"{n};dur={d * 1000:.1f}" for n, d in getattr(g, "_rq_spans", [])]
+    parts.append(f"total;dur={elapsed * 1000:.1f}")
+    response.headers["Server-Timing"] = ", ".join(parts)
+    return response
+
+
+def request_elapsed():
+    """Seconds taken by the current request (after finish_request_timer ran)."""
+    return getattr(g, "_rq_elapsed", None) if has_request_context() else None
+
+
+def request_spans():
+    """[(stage, seconds), ...] recorded so far in the current request."""
+    return list(getattr(g, "_rq_spans", [])) if has_request_context() else []
+
+
+# ---------- Stage spans ----------
+@contextmanager
+def span(stage: str):
+    """
+    Time a named stage of the current request:
+
+        with span("rubric_fetch"):
+            r = requests.get(rubric_url)
+
+    Recorded even if the block raises, so failures show up as latency too.
+    """
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_span(stage, time.perf_counter() - t0)
+
+
+def record_span(stage: str, elapsed: float):
+    """
+    Record a stage timed elsewhere (e.g. in a background thread, which has no
+    request context) against the current request.
+    """
+    endpoint = "none"
+    if has_request_context():
+        endpoint = request.endpoint or "unmatched"
+        if hasattr(g, "_rq_spans"):
+            g._rq_spans.append((stage, elapsed))
+    REGISTRY.observe(STAGE_METRIC, elapsed, stage=stage, endpoint=endpoint)
+
+
+def render_metrics() -> str:
+    return REGISTRY.render_prometheus()
@@ -0,0 +1,140 @@
+# app/utils/migrate.py
+"""
+Applies migrations/NNNN_*.sql in order and records them in
+public.schema_migrations.
+
+    DATABASE_URL=postgresql://... python -m app.utils.migrate            # apply pending
+    DATABASE_URL=postgresql://... python -m app.utils.migrate --status   # list, apply nothing
+    DATABASE_URL=postgresql://... python -m app.utils.migrate --dry-run  # apply pending, roll back
+
+- Each file runs in its own transaction together with its schema_migrations
+  row, so a failing file leaves nothing behind and the next run retries it.
+- Before each file, rubiqs.legacy_institution_id / rubiqs.legacy_course_id are
+  set (transaction-local) from LEGACY_INSTITUTION_ID / LEGACY_COURSE_ID;
+  0006_backfill_scopes.sql uses them for rows it can't scope otherwise.
+- A recorded file whose contents changed is reported, not re-run.
+- 0001-0004 were applied by hand before this existed. They are idempotent,
+  so on an existing project the first run just applies them again and
+  records them.
+
+Needs psycopg2 (pip install psycopg2-binary), like app/utils/pg_reads.py.
+"""
+import argparse
+import hashlib
+import os
+import re
+import sys
+
+from app.utils.logger import get_logger
+
+log = get_logger(__name__)
+
+MIGRATIONS_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), "migrations")
+_NAME = re.compile(r"^(\d{4})_[\w-]+\.sql$")
+
+_CREATE_TABLE = """
+    CREATE TABLE IF NOT EXISTS public.schema_migrations (
+        version     text        PRIMARY KEY,
+        name        text        NOT NULL,
+        checksum    text        NOT NULL,
+        applied_at  timestamptz NOT NULL DEFAULT now()
+    )"""
+
+
+def migration_files(directory: str = MIGRATIONS_DIR) -> list:
+    """[(version, filename, path)] sorted by version."""
+    found = []
+    for fn in os.listdir(directory):
+        m = _NAME.match(fn)
+        if m:
+            found.append((m.group(1), fn, os.path.join(directory, fn)))
+    return sorted(found)
+
+
+def _checksum(sql: str) -> str:
+    return hashlib.sha256(sql.encode("utf-8")).hexdigest()
+
+
+class _NoticeLog(list):
+    """Sends the server's RAISE NOTICE output to the log as it arrives."""
+
+    def append(self, notice):
+        log.info("📝 %s", notice.strip())
+
+
+def run(database_url: str, status_only: bool = False, dry_run: bool = False) -> int:
+    """Applies pending migrations; returns how many were (or, with dry_run, would be) applied."""
+    import psycopg2
+
+    conn = psycopg2.connect(database_url, application_name="rubiqs-migrate")
+    conn.notices = _NoticeLog()
+    try:
+        with conn, conn.cursor() as cur:
+            cur.execute(_CREATE_TABLE)
+            cur.execute("SELECT version, checksum FROM public.schema_migrations")
+            applied = dict(cur.fetchall())
+
+        count = 0
+        for version, fn, path in migration_files():
+            with open(path, encoding="utf-8") as f:
+                sql = f.read()
+            checksum = _checksum(sql)
+            if version in applied:
+                if applied[version] != checksum:
+                    log.warning("⚠️ %s changed since it was applied; not re-running it", fn)
+                elif status_only:
+                    log.info("✅ %s", fn)
+                continue
+            count += 1
+            if status_only:
+                log.info("⏳ %s (pending)", fn)
+                continue
+
+            log.info("🛠️ Applying %s%s", fn, " (dry run)" if dry_run else "")
+            try:
+                with conn.cursor() as cur:
+                    cur.execute(
+                        "SELECT set_config('rubiqs.legacy_institution_id', %s, true), "
+                        "set_config('rubiqs.legacy_course_id', %s, true)",
+                        (os.getenv("LEGACY_INSTITUTION_ID", ""), os.getenv("LEGACY_COURSE_ID", "")),
+                    )
+                    cur.execute(sql)
+                    cur.execute(
+                        "INSERT INTO public.schema_migrations (version, name, checksum) VALUES (%s, %s, %s)",
+                        (version, fn, checksum),
+                    )
+                if dry_run:
+                    conn.rollback()
+                else:
+                    conn.commit()
+            except Exception:
+                conn.rollback()
+                log.exception("❌ %s failed; rolled back", fn)
+                raise
+        return count
+    finally:
+        conn.close()
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--status", action="store_true", help="list applied/pending migrations, change nothing")
+    ap.add_argument("--dry-run", action="store_true", help="apply pending migrations, then roll each one back")
+    args = ap.parse_args(argv)
+
+    database_url = os.getenv("DATABASE_URL") or os.getenv("SUPABASE_DB_URL")
+    if not database_url:
+        sys.exit("DATABASE_URL is not set")
+
+    from app.utils.logger import configure_logging
+
+    configure_logging()
+    n = run(database_url, status_only=args.status, dry_run=args.dry_run)
+    if args.status:
+        log.info("%s pending migration(s)", n)
+    else:
+        log.info("✅ %s migration(s) %s", n, "checked" if args.dry_run else "applied")
+
+
+if __name__ == "__main__":
+    main()
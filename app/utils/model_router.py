@@ -0,0 +1,171 @@
+# app/utils/model_router.py
+"""
+Model routing with fallback tiers.
+
+An assignment's `gpt_model` is its primary tier. If that model is slow or
+rate-limited the call fails over to the next tier instead of making the
+student wait:
+
+    resp, model = complete("grade_docx", model_tiers(assignment_config), messages,
+                           temperature=0.5, max_tokens=1000)
+
+- Tiers: gpt_model, then the assignment's `fallback_models` (list or comma
+  string), else LLM_FALLBACK_MODELS (default "gpt-3.5-turbo").
+- Each route has a latency SLO (LLM_SLO_<ROUTE>_SECONDS, else LLM_SLO_SECONDS,
+  default 45). The primary gets LLM_PRIMARY_BUDGET_SHARE (0.6) of it as its
+  openai `request_timeout`; later tiers split what is left.
+- Timeouts, 429s, 5xx and connection errors fail over; auth/permission
+  errors don't (another model won't fix a bad key).
+- A model that fails BREAKER_FAILURES times in a row is skipped for
+  BREAKER_COOLDOWN_SECONDS, so a bad outage doesn't cost every request its
+  primary timeout. The last tier is always tried.
+
+The model that produced the answer is returned so it can be stored on the
+submission (grading_model).
+"""
+import os
+import threading
+import time
+
+from app.utils.lazy_import import lazy_module
+from app.utils.logger import get_logger
+
+openai = lazy_module("openai")
+
+log = get_logger(__name__)
+
+DEFAULT_SLO_SECONDS = float(os.getenv("LLM_SLO_SECONDS", "45"))
+PRIMARY_BUDGET_SHARE = float(os.getenv("LLM_PRIMARY_BUDGET_SHARE", "0.6"))
+MIN_ATTEMPT_SECONDS = 1.0
+FALLBACK_MODELS = os.getenv("LLM_FALLBACK_MODELS", "gpt-3.5-turbo")
+BREAKER_FAILURES = int(os.getenv("LLM_BREAKER_FAILURES", "3"))
+BREAKER_COOLDOWN_SECONDS = float(os.getenv("LLM_BREAKER_COOLDOWN_SECONDS", "60"))
+
+_lock = threading.Lock()
+_health = {}  # model -> {"failures": int, "open_until": monotonic seconds}
+
+
+def _fatal(e) -> bool:
+    """Errors that another model can't fix."""
+    return isinstance(e, (openai.error.AuthenticationError, openai.error.PermissionError))
+
+
+def route_slo(route: str) -> float:
+    v = os.getenv(f"LLM_SLO_{route.upper()}_SECONDS")
+    return float(v) if v else DEFAULT_SLO_SECONDS
+
+
+def _as_list(v):
+    if not v:
+        return []
+    if isinstance(v, str):
+        v = v.split(",")
+    return [str(m).strip() for m in v if m and str(m).strip()]
+
+
+def model_tiers(assignment_config: dict, default: str = "gpt-4") -> list:
+    """[primary, fallback, ...] for an assignment row; "json" (answer-key mode) is not a model."""
+    cfg = assignment_config or {}
+    tiers = []
+    for m in [cfg.get("gpt_model") or default] + (_as_list(cfg.get("fallback_models")) or _as_list(FALLBACK_MODELS)):
+        if m.lower() != "json" and m not in tiers:
+            tiers.append(m)
+    return tiers or [default]
+
+
+def attempt_timeouts(slo: float, n: int) -> list:
+    """Per-tier request timeouts that add up to the SLO."""
+    if n <= 1:
+        return [max(slo, MIN_ATTEMPT_SECONDS)]
+    first = max(slo * PRIMARY_BUDGET_SHARE, MIN_ATTEMPT_SECONDS)
+    rest = max((slo - first) / (n - 1), MIN_ATTEMPT_SECONDS)
+    return [first] + [rest] * (n - 1)
+
+
+# ---------- circuit breaker ----------
+def _available(model: str) -> bool:
+    with _lock:
+        h = _health.get(model)
+        return not h or h["open_until"] <= time.monotonic()
+
+
+def _record(model: str, ok: bool):
+    with _lock:
+        h = _health.setdefault(model, {"failures": 0, "open_until": 0.0})
+        if ok:
+            h["failures"] = 0
+            return
+        h["failures"] += 1
+        if h["failures"] >= BREAKER_FAILURES:
+            h["open_until"] = time.monotonic() + BREAKER_COOLDOWN_SECONDS
+            h["failures"] = 0
+            log.warning("⚡ %s skipped for %.0fs after repeated failures", model, BREAKER_COOLDOWN_SECONDS)
+
+
+def reset_health():
+    with _lock:
+        _health.clear()
+
+
+def _plan(route: str, tiers: list):
+    tiers = list(tiers) or ["gpt-4"]
+    usable = [m for m in tiers[:-1] if _available(m)] + tiers[-1:]
+    return list(zip(usable, attempt_timeouts(route_slo(route), len(usable))))
+
+
+# ---------- calls ----------
+def complete(route: str, tiers: list, messages, **kwargs):
+    """openai 0.28 ChatCompletion with failover. Returns (response, model_used)."""
+    plan = _plan(route, tiers)
+    last_err = None
+    for i, (model, timeout) in enumerate(plan):
+        t0 = time.perf_counter()
+        try:
+            resp = openai.ChatCompletion.create(model=model, messages=messages, request_timeout=timeout, **kwargs)
+        except openai.error.OpenAIError as e:
+            if _fatal(e):
+                raise
+            _record(model, ok=False)
+            last_err = e
+            if i + 1 < len(plan):
+                log.warning(
+                    "↪️ %s: %s failed after %.1fs (%s); failing over to %s",
+                    route, model, time.perf_counter() - t0, type(e).__name__, plan[i + 1][0],
+                )
+            continue
+        _record(model, ok=True)
+        return resp, model
+    raise last_err
+
+
+async def complete_async(route: str, tiers: list, messages, **kwargs):
+    """Same routing over the async httpx client (ASGI path)."""
+    import httpx
+
+    from app.utils.async_llm import LLMError, chat_completion
+
+    plan = _plan(route, tiers)
+    last_err = None
+    for i, (model, timeout) in enumerate(plan):
+        t0 = time.perf_counter()
+        try:
+            # Don't sit out a Retry-After when there's another tier to try
+            retries = 0 if i + 1 < len(plan) else None
+            resp = await chat_completion(model, messages, timeout=timeout, retries=retries, **kwargs)
+        except LLMError as e:
+            if e.status in (401, 403):
+                raise
+            _record(model, ok=False)
+            last_err = e
+        except httpx.HTTPError as e:
+            _record(model, ok=False)
+            last_err = LLMError(0, f"{type(e).__name__}: {e}")
+        else:
+            _record(model, ok=True)
+            return resp, model
+        if i + 1 < len(plan):
+            log.warning(
+                "↪️ %s: %s failed after %.1fs (%s); failing over to %s",
+                route, model, time.perf_counter() - t0, last_err, plan[i + 1][0],
+            )
+    raise last_err
@@ -0,0 +1,307 @@
+# app/utils/pg_reads.py
+"""
+Direct, pooled Postgres reads for the hottest queries (optional).
+
+Every read normally goes PostgREST over HTTPS. With DATABASE_URL set (the
+Supabase direct connection, or the session-mode pooler on 5432; transaction-
+mode poolers drop prepared statements) and psycopg2 installed, these reads
+use a connection pool instead:
+
+    if pg_reads.enabled():
+        rows = pg_reads.grader_submissions(inst_id, course_id, is_super, uid=rls_uid())
+    else:
+        ...PostgREST query...
+
+- Same shapes as PostgREST: each statement returns json_agg() of its rows,
+  so timestamps, uuids, numerics and jsonb come back exactly as the
+  PostgREST client would have decoded them.
+- Prepared statements: each is PREPAREd once per pooled connection and then
+  EXECUTEd, so the hot path is bind + execute, no parse/plan.
+- RLS: every read runs in its own read-only transaction that first does what
+  PostgREST does for a request: SET LOCAL ROLE (PG_READS_ROLE; default
+  RLS_JWT_ROLE when per-user JWTs are on, see rls_tokens.py, else
+  service_role to match SUPABASE_SERVICE_ROLE_KEY) and
+  set_config('request.jwt.claims', ..., true) with the caller's uid as sub.
+  Both are transaction-local, so nothing leaks to the connection's next user.
+- The pool (PG_POOL_MIN/PG_POOL_MAX, default 1/10) is created on first use
+  and re-created after fork, like the background pool.
+
+Scope filters are plain equality, as in the PostgREST queries (legacy NULL
+scopes were backfilled by migrations/0006_backfill_scopes.sql), so the plans
+can use the (tool, institution_id, course_id, time) indexes from 0005. Each
+scoped query is prepared in one variant per filter combination: "_ic" with
+both, "_i" or "_c" when the session lacks one, and the bare name for
+superusers. Parameters are untyped, so Postgres takes their types from the
+columns (text or uuid, whichever the project uses) and no cast hides the
+index. A scoped query's own parameters are written {p1}, {p2}, ... and
+numbered after the scope's.
+"""
+import json
+import os
+import threading
+from contextlib import contextmanager
+
+from app.utils import rls_tokens
+from app.utils.logger import get_logger
+from app.utils.metrics import span
+
+log = get_logger(__name__)
+
+DATABASE_URL = os.getenv("DATABASE_URL") or os.getenv("SUPABASE_DB_URL")
+PG_READS = os.getenv("PG_READS", "1") == "1"
+PG_READS_ROLE = os.getenv("PG_READS_ROLE") or (rls_tokens.ROLE if rls_tokens.enabled() else "service_role")
+PG_POOL_MIN = int(os.getenv("PG_POOL_MIN", "1"))
+PG_POOL_MAX = int(os.getenv("PG_POOL_MAX", "10"))
+STATEMENT_TIMEOUT_MS = int(os.getenv("PG_READS_STATEMENT_TIMEOUT_MS", "10000"))
+DASHBOARD_LIMIT = 300
+REVIEW_WINDOW_COLUMNS = "submission_id, submission_time, assignment_title, student_id, score, student_file_url"
+
+# suffix -> filter replacing {scope}; see _scoped()
+_SCOPE_VARIANTS = {
+    "": "",
+    "_i": "\n              AND institution_id = $1",
+    "_c": "\n              AND course_id = $1",
+    "_ic": "\n              AND institution_id = $1 AND course_id = $2",
+}
+
+# name -> (parameter types, SQL returning one json value)
+STATEMENTS = {
+    "assignment_by_slug": ("text", """
+        SELECT coalesce(json_agg(t), '[]') FROM (
+            SELECT * FROM public.assignments
+            WHERE tool = 'grader' AND slug = $1
+            LIMIT 1
+        ) t"""),
+    "assignment_by_title": ("text", """
+        SELECT coalesce(json_agg(t), '[]') FROM (
+            SELECT * FROM public.assignments
+            WHERE tool = 'grader' AND (display_title = $1 OR assignment_title = $1)
+            LIMIT 1
+        ) t"""),
+    # release_time's type comes from the column (PostgREST compares it the same way)
+    "release_due": ("", """
+        SELECT coalesce(json_agg(t), '[]') FROM (
+            SELECT * FROM public.submissions
+            WHERE pending AND release_time < $1
+        ) t"""),
+    "submission_by_id": ("", """
+        SELECT coalesce(json_agg(t), '[]') FROM (
+            SELECT * FROM public.submissions
+            WHERE submission_id = $1
+            LIMIT 1
+        ) t"""),
+    "delay_unchecked": ("", """
+        SELECT coalesce(json_agg(t), '[]') FROM (
+            SELECT * FROM public.submissions
+            WHERE ready_to_post = false
+        ) t"""),
+}
+
+# name -> SQL with a {scope} slot; prepared per _SCOPE_VARIANTS suffix
+SCOPED_STATEMENTS = {
+    "review_queue": """
+        SELECT coalesce(json_agg(t), '[]') FROM (
+            SELECT * FROM public.submissions
+            WHERE pending AND NOT reviewed{scope}
+            ORDER BY submission_time DESC
+        ) t""",
+    # Review queue cursor (app/utils/review_queue.py): the first page, then
+    # the page after (submission_time, submission_id); same order as above
+    "review_window": """
+        SELECT coalesce(json_agg(t), '[]') FROM (
+            SELECT """ + REVIEW_WINDOW_COLUMNS + """ FROM public.submissions
+            WHERE pending AND NOT reviewed{scope}
+            ORDER BY submission_time DESC, submission_id DESC
+            LIMIT {p1}
+        ) t""",
+    "review_window_after": """
+        SELECT coalesce(json_agg(t), '[]') FROM (
+            SELECT """ + REVIEW_WINDOW_COLUMNS + """ FROM public.submissions
+            WHERE pending AND NOT reviewed{scope}
+              AND (submission_time < {p1} OR (submission_time = {p1} AND submission_id < {p2}))
+            ORDER BY submission_time DESC, submission_id DESC
+            LIMIT {p3}
+        ) t""",
+    "grader_base_assignments": """
+        SELECT coalesce(json_agg(t), '[]') FROM (
+            SELECT assignment_id, assignment_title, tool, created_at, institution_id, course_id
+            FROM public.assignments
+            WHERE tool = 'grader'{scope}
+            ORDER BY created_at DESC
+            LIMIT """ + str(DASHBOARD_LIMIT) + """
+        ) t""",
+    "grader_assignments": """
+        SELECT coalesce(json_agg(t), '[]') FROM (
+            SELECT assignment_id, assignment_title, total_points, created_at, institution_id,
+                   created_by, tool, course_id, gpt_model, instructor_approval
+            FROM public.assignments
+            WHERE tool = 'grader'{scope}
+            ORDER BY created_at DESC
+            LIMIT """ + str(DASHBOARD_LIMIT) + """
+        ) t""",
+    "grader_submissions": """
+        SELECT coalesce(json_agg(t), '[]') FROM (
+            SELECT * FROM public.submissions
+            WHERE tool = 'grader'{scope}
+            ORDER BY submission_time DESC
+            LIMIT """ + str(DASHBOARD_LIMIT) + """
+        ) t""",
+}
+for _name, _sql in SCOPED_STATEMENTS.items():
+    for _suffix, _filter in _SCOPE_VARIANTS.items():
+        _sql_variant = _sql.replace("{scope}", _filter)
+        for _i in range(1, 4):
+            _sql_variant = _sql_variant.replace(f"{{p{_i}}}", f"${_filter.count('$') + _i}")
+        STATEMENTS[_name + _suffix] = ("", _sql_variant)
+
+_lock = threading.Lock()
+_pool = None
+_pid = None
+_installed = None
+
+
+def enabled() -> bool:
+    """True when DATABASE_URL is set, PG_READS isn't 0 and psycopg2 is installed."""
+    global _installed
+    if not (PG_READS and DATABASE_URL):
+        return False
+    if _installed is None:
+        try:
+            import psycopg2.pool  # noqa: F401
+            _installed = True
+        except ImportError:
+            log.warning("⚠️ DATABASE_URL is set but psycopg2 is not installed; reads stay on PostgREST")
+            _installed = False
+    return _installed
+
+
+def pool():
+    global _pool, _pid
+    if _pool is not None and _pid == os.getpid():
+        return _pool
+    with _lock:
+        if _pool is None or _pid != os.getpid():
+            import psycopg2.extensions
+            import psycopg2.pool
+
+            class _Connection(psycopg2.extensions.connection):
+                """Remembers which statements are already PREPAREd on it."""
+
+                def __init__(self, *args, **kwargs):
+                    super().__init__(*args, **kwargs)
+                    self.prepared = set()
+                    self.set_session(readonly=True, autocommit=False)
+
+            # A parent's pool is abandoned, not closed: its sockets belong to the parent
+            _pool = psycopg2.pool.ThreadedConnectionPool(
+                PG_POOL_MIN,
+                PG_POOL_MAX,
+                DATABASE_URL,
+                connection_factory=_Connection,
+                application_name="rubiqs-grader",
+                options=f"-c statement_timeout={STATEMENT_TIMEOUT_MS}",
+            )
+            _pid = os.getpid()
+            log.info("✅ Postgres read pool ready (%s-%s connections)", PG_POOL_MIN, PG_POOL_MAX)
+    return _pool
+
+
+@contextmanager
+def _transaction(uid=None):
+    """Read-only transaction with PostgREST-style role and JWT claims set locally."""
+    p = pool()
+    conn = p.getconn()
+    broken = False
+    try:
+        with conn.cursor() as cur:
+            cur.execute(
+                "SELECT set_config('role', %s, true), set_config('request.jwt.claims', %s, true)",
+                (PG_READS_ROLE, json.dumps({"role": PG_READS_ROLE, "sub": str(uid) if uid else None})),
+            )
+            yield conn, cur
+        conn.commit()
+    except Exception:
+        try:
+            conn.rollback()
+        except Exception:
+            broken = True
+        raise
+    finally:
+        p.putconn(conn, close=broken or bool(conn.closed))
+
+
+def _execute(name: str, params: tuple = (), uid=None) -> list:
+    types, sql = STATEMENTS[name]
+    with span(f"pg.{name}"), _transaction(uid) as (conn, cur):
+        if name not in conn.prepared:
+            cur.execute(f"PREPARE {name}{f' ({types})' if types else ''} AS {sql}")
+            conn.prepared.add(name)
+        if params:
+            cur.execute(f"EXECUTE {name} ({', '.join(['%s'] * len(params))})", params)
+        else:
+            cur.execute(f"EXECUTE {name}")
+        row = cur.fetchone()
+    return (row[0] if row else None) or []
+
+
+def _scoped(name: str, inst_id, course_id, is_super, uid=None) -> list:
+    """Runs the variant of a SCOPED_STATEMENTS query matching the filters that apply."""
+    if is_super:
+        return _execute(name, (), uid)
+    suffix = {(True, True): "_ic", (True, False): "_i", (False, True): "_c", (False, False): ""}[
+        (bool(inst_id), bool(course_id))
+    ]
+    return _execute(name + suffix, tuple(str(v) for v in (inst_id, course_id) if v), uid)
+
+
+# ---------- Queries (same rows as the PostgREST calls they replace) ----------
+def assignment_by_slug(slug: str, uid=None) -> list:
+    return _execute("assignment_by_slug", (slug,), uid)
+
+
+def assignment_by_title(title: str, uid=None) -> list:
+    return _execute("assignment_by_title", (title,), uid)
+
+
+def review_queue(inst_id, course_id, is_super: bool, uid=None) -> list:
+    """Unreviewed pending submissions, newest first (instructors: exact inst/course match)."""
+    if is_super:
+        return _execute("review_queue", (), uid)
+    # Like the PostgREST .eq() pair: a missing value matches nothing
+    params = tuple(str(v) if v is not None else None for v in (inst_id, course_id))
+    return _execute("review_queue_ic", params, uid)
+
+
+def review_window(inst_id, course_id, is_super: bool, after=None, limit: int = 6, uid=None) -> list:
+    """Up to limit queue rows (REVIEW_WINDOW_COLUMNS) after the (submission_time, submission_id) cursor."""
+    name = "review_window" if after is None else "review_window_after"
+    if is_super:
+        scope = ()
+    else:
+        scope = tuple(str(v) if v is not None else None for v in (inst_id, course_id))
+        name += "_ic"
+    return _execute(name, scope + (tuple(after) if after is not None else ()) + (int(limit),), uid)
+
+
+def submission_by_id(submission_id: str, uid=None) -> list:
+    return _execute("submission_by_id", (submission_id,), uid)
+
+
+def grader_base_assignments(inst_id, course_id, is_super: bool, uid=None) -> list:
+    return _scoped("grader_base_assignments", inst_id, course_id, is_super, uid)
+
+
+def grader_assignments(inst_id, course_id, is_super: bool, uid=None) -> list:
+    return _scoped("grader_assignments", inst_id, course_id, is_super, uid)
+
+
+def grader_submissions(inst_id, course_id, is_super: bool, uid=None) -> list:
+    return _scoped("grader_submissions", inst_id, course_id, is_super, uid)
+
+
+def release_due(now_iso: str) -> list:
+    return _execute("release_due", (now_iso,))
+
+
+def delay_unchecked() -> list:
+    return _execute("delay_unchecked")
@@ -0,0 +1,243 @@
+# app/utils/previews.py
+"""
+Server-side previews of submitted files, cached by content hash.
+
+The review pages used to load student_file_url through the Google Docs
+viewer iframe, which fetches and converts the whole file again on every
+view. Previews are now built once, in the background, right after the
+submission is stored:
+
+    schedule(preview_key(url), ".docx", upload.payload())   # grade_docx / grade_uscis_form
+    manifest(key)       # {"kind": "html"} / {"kind": "pages", "pages": [...]} once built, else None
+
+and /preview/<key> serves them from local disk.
+
+- .docx → HTML with mammoth, sanitized with bleach. Embedded images stay
+  inline as data: URIs.
+- .pdf → the first PREVIEW_MAX_PAGES pages (default 30), rendered with
+  PyMuPDF PREVIEW_WIDTH px wide (default 1000). They are WebP when Pillow is
+  installed, else PNG.
+- The key is the file's SHA-256, taken from its content-addressed storage
+  path (content_store.py), so a file submitted twice is rendered once. Files
+  stored before content addressing are keyed by a hash of their URL (those
+  paths were unique per upload) and are built on first view: the page says
+  "preparing" and reloads itself.
+- Output goes to PREVIEW_DIR/<key>/ (default data/previews). It is built in
+  a temp dir and renamed into place, so a reader never sees half a preview
+  and two workers building the same file don't clash.
+
+Each host has its own directory; a host that hasn't seen a file builds it on
+first view, like the legacy case.
+"""
+import hashlib
+import io
+import json
+import os
+import re
+import shutil
+import tempfile
+import threading
+
+from app.utils.background import submit
+from app.utils.content_store import is_content_key, key_from_url
+from app.utils.lazy_import import lazy_module
+from app.utils.logger import get_logger
+from app.utils.metrics import span
+
+log = get_logger(__name__)
+
+requests = lazy_module("requests")
+
+PREVIEW_DIR = os.getenv("PREVIEW_DIR") or os.path.join("data", "previews")
+PREVIEW_WIDTH = int(os.getenv("PREVIEW_WIDTH", "1000"))
+PREVIEW_MAX_PAGES = int(os.getenv("PREVIEW_MAX_PAGES", "30"))
+PREVIEW_QUALITY = int(os.getenv("PREVIEW_QUALITY", "70"))
+PREVIEW_EXTS = (".docx", ".pdf")
+BUCKET = "submissions"
+
+_KEY = re.compile(r"^[0-9a-f]{64}$|^url-[0-9a-f]{64}$")
+_HTML_TAGS = {
+    "a", "b", "blockquote", "br", "code", "div", "em", "h1", "h2", "h3", "h4", "h5", "h6", "hr",
+    "i", "img", "li", "ol", "p", "pre", "s", "span", "strong", "sub", "sup", "table", "tbody",
+    "td", "tfoot", "th", "thead", "tr", "u", "ul",
+}
+_HTML_ATTRS = {
+    "a": ["href", "title"],
+    "img": ["src", "alt"],
+    "td": ["colspan", "rowspan"],
+    "th": ["colspan", "rowspan"],
+}
+
+_lock = threading.Lock()
+_building = set()
+
+
+def preview_ext(url: str) -> str:
+    ext = os.path.splitext((url or "").split("?", 1)[0].lower())[-1]
+    return ext if ext in PREVIEW_EXTS else ""
+
+
+def preview_key(url: str):
+    """Cache key for a stored submission file: its SHA-256, or url-<hash of url> for legacy paths."""
+    key = key_from_url(BUCKET, url)
+    if not key:
+        return None
+    if is_content_key(key):
+        return os.path.splitext(os.path.basename(key))[0]
+    return "url-" + hashlib.sha256(url.encode("utf-8")).hexdigest()
+
+
+def valid_key(key: str) -> bool:
+    return bool(key and _KEY.match(key))
+
+
+def _dir(key: str) -> str:
+    return os.path.join(PREVIEW_DIR, key)
+
+
+def manifest(key: str):
+    """The built preview's manifest, or None (not built yet / unknown key)."""
+    if not valid_key(key):
+        return None
+    try:
+        with open(os.path.join(_dir(key), "manifest.json"), encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def file_path(key: str, name: str):
+    """Path of one of the preview's files (html or a page image), or None."""
+    if not valid_key(key) or name != os.path.basename(name) or name == "manifest.json":
+        return None
+    path = os.path.join(_dir(key), name)
+    return path if os.path.isfile(path) else None
+
+
+# ---------- Rendering ----------
+def _docx_html(data: bytes) -> str:
+    import bleach
+    import mammoth
+
+    html = mammoth.convert_to_html(io.BytesIO(data)).value
+    return bleach.clean(
+        html,
+        tags=_HTML_TAGS,
+        attributes=_HTML_ATTRS,
+        protocols=["http", "https", "mailto", "data"],
+        strip=True,
+    )
+
+
+def _image_writer():
+    """(extension, pixmap -> bytes): WebP through Pillow when installed, else PNG."""
+    try:
+        from PIL import Image
+    except ImportError:
+        return "png", lambda pix: pix.tobytes("png")
+
+    def webp(pix):
+        buf = io.BytesIO()
+        Image.frombytes("RGB", (pix.width, pix.height), pix.samples).save(
+            buf, "WEBP", quality=PREVIEW_QUALITY, method=4
+        )
+        return buf.getvalue()
+
+    return "webp", webp
+
+
+def _pdf_pages(data: bytes, out_dir: str) -> dict:
+    import pymupdf
+
+    ext, encode = _image_writer()
+    pages = []
+    with pymupdf.open(stream=data, filetype="pdf") as doc:
+        for i, page in enumerate(doc):
+            if i >= PREVIEW_MAX_PAGES:
+                break
+            zoom = PREVIEW_WIDTH / max(page.rect.width, 1)
+            pix = page.get_pixmap(matrix=pymupdf.Matrix(zoom, zoom), alpha=False)
+            name = f"page-{i + 1}.{ext}"
+            with open(os.path.join(out_dir, name), "wb") as f:
+                f.write(encode(pix))
+            pages.append({"file": name, "width": pix.width, "height": pix.height})
+        total = doc.page_count
+    return {"kind": "pages", "pages": pages, "total_pages": total}
+
+
+def build(key: str, ext: str, payload) -> bool:
+    """Renders payload (bytes or an open binary file, which is closed) into PREVIEW_DIR/<key>/."""
+    try:
+        data = payload if isinstance(payload, bytes) else payload.read()
+    finally:
+        if hasattr(payload, "close"):
+            payload.close()
+    if manifest(key) is not None:
+        return False
+
+    os.makedirs(PREVIEW_DIR, exist_ok=True)
+    tmp = tempfile.mkdtemp(prefix=f".{key}-", dir=PREVIEW_DIR)
+    try:
+        with span("preview_build"):
+            if ext == ".docx":
+                with open(os.path.join(tmp, "doc.html"), "w", encoding="utf-8") as f:
+                    f.write(_docx_html(data))
+                info = {"kind": "html", "file": "doc.html"}
+            else:
+                info = _pdf_pages(data, tmp)
+        with open(os.path.join(tmp, "manifest.json"), "w", encoding="utf-8") as f:
+            json.dump(info, f)
+        try:
+            os.rename(tmp, _dir(key))
+        except OSError:
+            # Another worker finished the same content first
+            return False
+        tmp = None
+        log.debug("🖼️ Preview ready: %s (%s)", key, info["kind"])
+        return True
+    finally:
+        if tmp:
+            shutil.rmtree(tmp, ignore_errors=True)
+
+
+def _run(key: str, ext: str, payload=None, url: str = None):
+    try:
+        if payload is None:
+            resp = requests.get(url, timeout=30)
+            resp.raise_for_status()
+            payload = resp.content
+        build(key, ext, payload)
+    except Exception as e:
+        log.warning("⚠️ Preview for %s failed: %s", key, e)
+    finally:
+        with _lock:
+            _building.discard(key)
+
+
+def schedule(key: str, ext: str, payload=None, url: str = None) -> bool:
+    """
+    Builds the preview in the background pool unless it exists or is already
+    being built. payload is the file (bytes or an open file); without it the
+    file is downloaded from url. Returns True if a build was started.
+    """
+    if not (valid_key(key) and ext in PREVIEW_EXTS) or manifest(key) is not None:
+        if hasattr(payload, "close"):
+            payload.close()
+        return False
+    with _lock:
+        if key in _building:
+            if hasattr(payload, "close"):
+                payload.close()
+            return False
+        _building.add(key)
+    submit(_run, key, ext, payload, url)
+    return True
+
+
+def ensure(url: str):
+    """Preview key for url, scheduling a build from Storage if it isn't there yet (None: no preview)."""
+    key, ext = preview_key(url), preview_ext(url)
+    if not (key and ext):
+        return None
+    schedule(key, ext, url=url)
+    return key
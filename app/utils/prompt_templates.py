@@ -0,0 +1,168 @@
+# app/utils/prompt_templates.py
+"""
+Compiled grading prompts.
+
+Everything in a grading prompt except the student's text depends only on the
+assignment: persona, difficulty, level, tone, total points, rubric, instructor
+notes and the answer format. That prefix is compiled once per assignment and
+cached; a request only appends the submission:
+
+    tpl = TEMPLATES.get(title, assignment_config)
+    if tpl is None:
+        rubric_text, total, rubric_json = parse_rubric(download(rubric_url), rubric_url, ...)
+        tpl = TEMPLATES.put(title, assignment_config, compile_template(title, assignment_config,
+                                                                     rubric_text, total, rubric_json))
+    resp = openai.ChatCompletion.create(model=..., messages=tpl.messages(student_text))
+
+A cache hit also skips the rubric download and parse. For JSON rubrics with
+criteria (and STRUCTURED_GRADING on) the prefix lists them numbered with their
+maximum points and asks for a submit_grade function call instead of
+"Score:/Feedback:" text; see structured_grading. The prefix is sent as
+the system message and the submission as the user message, so the stable
+part always comes first — byte-identical across a class's submissions, which
+is what provider-side prompt caching keys on.
+
+The cache key includes a fingerprint of the fields the prefix is built from
+(rubric_file included), so editing an assignment or uploading a new rubric
+(new content-addressed URL) misses naturally; PROMPT_CACHE_TTL bounds how long
+a rubric overwritten in place under a legacy URL can stay stale.
+"""
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from app.utils.structured_grading import FUNCTION_NAME, STRUCTURED_GRADING, rubric_criteria
+
+PROMPT_CACHE_SIZE = int(os.getenv("PROMPT_CACHE_SIZE", "512"))
+PROMPT_CACHE_TTL = float(os.getenv("PROMPT_CACHE_TTL", "600"))
+RUBRIC_CHARS = 2000
+SUBMISSION_CHARS = 3000
+
+# Assignment fields the compiled prefix depends on
+TEMPLATE_FIELDS = (
+    "grading_difficulty",
+    "student_level",
+    "feedback_tone",
+    "ai_notes",
+    "total_points",
+    "rubric_file",
+)
+
+
+class PromptTemplate:
+    def __init__(self, prefix: str, total_points, rubric_json=None, key=None, criteria=None):
+        self.prefix = prefix
+        self.total_points = total_points
+        self.rubric_json = rubric_json
+        self.criteria = criteria or []  # set when the model is asked for structured output
+        self.key = key
+        self.compiled_at = time.monotonic()
+
+    @property
+    def structured(self) -> bool:
+        return bool(self.criteria)
+
+    @staticmethod
+    def submission_block(student_text: str) -> str:
+        return f"Student Submission:\n---\n{(student_text or '')[:SUBMISSION_CHARS]}\n---"
+
+    def messages(self, student_text: str) -> list:
+        return [
+            {"role": "system", "content": self.prefix},
+            {"role": "user", "content": self.submission_block(student_text)},
+        ]
+
+    def render(self, student_text: str) -> str:
+        """The whole prompt as one string (previews, logs, token estimates)."""
+        return f"{self.prefix}\n\n{self.submission_block(student_text)}"
+
+
+def compile_template(assignment_title, assignment_config, rubric_text, rubric_total_points,
+                     rubric_json=None) -> PromptTemplate:
+    cfg = assignment_config or {}
+    criteria = rubric_criteria(rubric_json) if STRUCTURED_GRADING else []
+    if criteria:
+        rubric_text = "\n".join(
+            f"{c['criterion']}. {c['description']} (max {c['max_points']:g} points)" for c in criteria
+        )
+    parts = [
+        "You are a helpful AI grader.",
+        "\n".join(
+            [
+                f"Assignment Title: {assignment_title}",
+                f"Grading Difficulty: {cfg.get('grading_difficulty') or 'balanced'}",
+                f"Student Level: {cfg.get('student_level') or 'college'}",
+                f"Feedback Tone: {cfg.get('feedback_tone') or 'supportive'}",
+                f"Total Points: {rubric_total_points}",
+            ]
+        ),
+        f"Rubric:\n{(rubric_text or '')[:RUBRIC_CHARS]}",
+    ]
+    if cfg.get("ai_notes"):
+        parts.append(f"Instructor Notes:\n{cfg['ai_notes']}")
+    if criteria:
+        parts.append(
+            f"Call {FUNCTION_NAME} with points and a short comment for every rubric criterion "
+            f"(1-{len(criteria)}), and detailed, helpful overall feedback."
+        )
+    else:
+        parts.append(
+            "Return your response in this format:\n\n"
+            f"Score: <number from 0 to {rubric_total_points}>\n"
+            "Feedback: <detailed, helpful feedback>"
+        )
+    return PromptTemplate("\n\n".join(parts).strip(), rubric_total_points, rubric_json, criteria=criteria)
+
+
+def template_key(assignment_title, assignment_config) -> tuple:
+    cfg = assignment_config or {}
+    fingerprint = hashlib.sha1(
+        json.dumps([assignment_title] + [cfg.get(f) for f in TEMPLATE_FIELDS], default=str).encode()
+    ).hexdigest()
+    return (str(cfg.get("assignment_id") or assignment_title), fingerprint)
+
+
+class TemplateCache:
+    def __init__(self, size: int = PROMPT_CACHE_SIZE, ttl: float = PROMPT_CACHE_TTL):
+        self.size = size
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._items = OrderedDict()  # template_key -> PromptTemplate
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, assignment_title, assignment_config):
+        key = template_key(assignment_title, assignment_config)
+        with self._lock:
+            tpl = self._items.get(key)
+            if tpl is not None and time.monotonic() - tpl.compiled_at <= self.ttl:
+                self._items.move_to_end(key)
+                self.hits += 1
+                return tpl
+            self._items.pop(key, None)
+            self.misses += 1
+            return None
+
+    def put(self, assignment_title, assignment_config, tpl: PromptTemplate) -> PromptTemplate:
+        tpl.key = template_key(assignment_title, assignment_config)
+        with self._lock:
+            self._items[tpl.key] = tpl
+            self._items.move_to_end(tpl.key)
+            while len(self._items) > self.size:
+                self._items.popitem(last=False)
+        return tpl
+
+    def invalidate(self, assignment_id=None):
+        """Drop one assignment's templates (any fingerprint), or everything."""
+        with self._lock:
+            if assignment_id is None:
+                self._items.clear()
+                return
+            for key in [k for k in self._items if k[0] == str(assignment_id)]:
+                del self._items[key]
+
+
+TEMPLATES = TemplateCache()
@@ -0,0 +1,203 @@
+# app/utils/review_queue.py
+"""
+Instructor review queue: a cursor over the pending, unreviewed submissions
+of a scope, newest first.
+
+    win = REVIEW_QUEUE.window(scope, submission_id=request.args.get("submission_id"))
+    win.current        # the full row (select *) being reviewed, or None
+    win.upcoming       # the next NEXT_N rows, REVIEW_WINDOW_COLUMNS only
+    win.next_id
+    win.prefetch_url   # next row's student_file_url, for a Link: rel=prefetch
+
+- The cursor is the current row's (submission_time, submission_id), so the
+  next N come from one range query on submissions_review_queue_idx
+  (migrations/0005) instead of loading the whole queue and scanning it.
+- While the instructor reads the current item, the next one's full row (with
+  its text) is fetched in the background pool into a small per-process
+  cache, so following "next" costs just that one range query. A cached row
+  is used once; a click that beats the prefetch waits for it rather than
+  querying twice.
+- Reads go through pg_reads when it is enabled, else PostgREST. Rows without
+  a submission_time (legacy) sort first, as in Postgres' DESC order.
+
+scope is (institution_id, course_id, is_superuser), as for exports.
+Instructors see exactly their institution and course; superusers see all.
+"""
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+from concurrent.futures import TimeoutError as FutureTimeout
+
+from app.supabase_client import supabase
+from app.utils import pg_reads
+from app.utils.background import submit
+from app.utils.export import _quote
+from app.utils.logger import get_logger
+from app.utils.metrics import span
+
+log = get_logger(__name__)
+
+NEXT_N = int(os.getenv("REVIEW_QUEUE_NEXT", "5"))
+PREFETCH_TTL = float(os.getenv("REVIEW_PREFETCH_TTL", "120"))
+PREFETCH_WAIT = float(os.getenv("REVIEW_PREFETCH_WAIT", "2"))
+PREFETCH_CACHE_SIZE = int(os.getenv("REVIEW_PREFETCH_CACHE_SIZE", "512"))
+
+
+class ReviewWindow:
+    def __init__(self, current=None, upcoming=None):
+        self.current = current
+        self.upcoming = upcoming or []
+
+    @property
+    def next_id(self):
+        return self.upcoming[0]["submission_id"] if self.upcoming else None
+
+    @property
+    def prefetch_url(self):
+        return (self.upcoming[0].get("student_file_url") or None) if self.upcoming else None
+
+
+def _valid(rows) -> list:
+    return [r for r in rows or [] if r.get("submission_id") and r.get("assignment_title")]
+
+
+class ReviewQueue:
+    def __init__(self, ttl: float = PREFETCH_TTL, size: int = PREFETCH_CACHE_SIZE):
+        self.ttl = ttl
+        self.size = size
+        self._lock = threading.Lock()
+        self._rows = OrderedDict()  # (scope, submission_id) -> (expires, row or Future)
+
+    # ---------- Queries ----------
+    def page(self, scope, after=None, n: int = NEXT_N, uid=None) -> list:
+        """Up to n queue rows after the (submission_time, submission_id) cursor (None: from the top)."""
+        inst, course, superuser = scope
+        with span("review_queue.page"):
+            if pg_reads.enabled() and (after is None or after[0] is not None):
+                return _valid(pg_reads.review_window(inst, course, superuser, after=after, limit=n, uid=uid))
+
+            q = (
+                supabase.table("submissions")
+                .select(pg_reads.REVIEW_WINDOW_COLUMNS.replace(" ", ""))
+                .eq("pending", True)
+                .eq("reviewed", False)
+            )
+            if not superuser:
+                q = q.eq("institution_id", inst).eq("course_id", course)
+            if after is not None:
+                t, sid = after
+                if t is None:
+                    q = q.or_(f"submission_time.not.is.null,and(submission_time.is.null,submission_id.lt.{_quote(sid)})")
+                else:
+                    q = q.or_(
+                        f"submission_time.lt.{_quote(t)},"
+                        f"and(submission_time.eq.{_quote(t)},submission_id.lt.{_quote(sid)})"
+                    )
+            resp = (
+                q.order("submission_time", desc=True)
+                .order("submission_id", desc=True)
+                .limit(n)
+                .execute()
+            )
+            return _valid(resp.data)
+
+    @staticmethod
+    def fetch(submission_id, uid=None):
+        """The full row, or None."""
+        if pg_reads.enabled():
+            rows = pg_reads.submission_by_id(str(submission_id), uid=uid)
+        else:
+            rows = supabase.table("submissions").select("*").eq("submission_id", submission_id).execute().data
+        return (rows or [None])[0]
+
+    # ---------- Prefetch cache ----------
+    def prefetch(self, scope, submission_id, uid=None):
+        """Starts fetching the full row in the background unless it's already cached or on its way."""
+        key = (tuple(scope), str(submission_id))
+        now = time.monotonic()
+        with self._lock:
+            entry = self._rows.get(key)
+            if entry is not None and entry[0] > now:
+                return
+            future = Future()
+            self._rows[key] = (now + self.ttl, future)
+            self._rows.move_to_end(key)
+            while len(self._rows) > self.size:
+                self._rows.popitem(last=False)
+
+        def run():
+            try:
+                future.set_result(self.fetch(submission_id, uid))
+            except Exception as e:
+                log.warning("⚠️ Review prefetch failed for %s: %s", submission_id, e)
+                future.set_result(None)
+
+        try:
+            submit(run)
+        except RuntimeError:  # pool shutting down
+            self.invalidate(submission_id)
+
+    def row(self, scope, submission_id, uid=None):
+        """The full row: the prefetched copy when there is one (used once), else a fresh read."""
+        key = (tuple(scope), str(submission_id))
+        with self._lock:
+            entry = self._rows.pop(key, None)
+        if entry is not None and entry[0] > time.monotonic():
+            _, value = entry
+            if isinstance(value, Future):
+                try:
+                    value = value.result(timeout=PREFETCH_WAIT)
+                except FutureTimeout:
+                    value = None
+            if value is not None:
+                log.debug("⚡ Review row %s served from prefetch", submission_id)
+                return value
+        return self.fetch(submission_id, uid)
+
+    def invalidate(self, submission_id=None):
+        """Drops cached copies of one submission (every scope), or everything."""
+        with self._lock:
+            if submission_id is None:
+                self._rows.clear()
+                return
+            for key in [k for k in self._rows if k[1] == str(submission_id)]:
+                self._rows.pop(key, None)
+
+    @staticmethod
+    def contains(scope, row) -> bool:
+        """True if row is (still) in scope's queue."""
+        if not row or not row.get("pending") or row.get("reviewed"):
+            return False
+        inst, course, superuser = scope
+        return superuser or (
+            str(row.get("institution_id")) == str(inst) and str(row.get("course_id")) == str(course)
+        )
+
+    # ---------- The view ----------
+    def window(self, scope, submission_id=None, n: int = NEXT_N, uid=None) -> ReviewWindow:
+        """
+        The current item plus the next n. With submission_id that row is the
+        current one (prefetched if we got there by "next") and its cursor
+        gives the rest in one query; without, the top of the queue is.
+        """
+        if submission_id:
+            current = self.row(scope, submission_id, uid)
+            if not _valid([current] if current else []):
+                return ReviewWindow()
+            upcoming = self.page(scope, (current.get("submission_time"), current["submission_id"]), n, uid)
+        else:
+            top = self.page(scope, None, n + 1, uid)
+            if not top:
+                return ReviewWindow()
+            current = self.row(scope, top[0]["submission_id"], uid)
+            upcoming = top[1:]
+
+        win = ReviewWindow(current, upcoming)
+        if win.next_id:
+            self.prefetch(scope, win.next_id, uid)
+        return win
+
+
+REVIEW_QUEUE = ReviewQueue()
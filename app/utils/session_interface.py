@@ -0,0 +1,24 @@
+# app/utils/session_interface.py
+from flask_session.sessions import FileSystemSessionInterface
+
+
+class SafeSessionInterface(FileSystemSessionInterface):
+    """Filesystem sessions that always set the cookie explicitly (SameSite=None for LMS iframes)."""
+
+    def __init__(self, cache_dir, threshold, mode, key_prefix):
+        super().__init__(
+            cache_dir=cache_dir, threshold=threshold, mode=mode, key_prefix=key_prefix
+        )
+
+    def save_session(self, app, session, response):
+        session_id = getattr(session, "sid", None)
+        if isinstance(session_id, bytes):
+            session_id = session_id.decode("utf-8")
+        response.set_cookie(
+            app.config["SESSION_COOKIE_NAME"],
+            session_id,
+            httponly=True,
+            secure=bool(app.config.get("SESSION_COOKIE_SECURE", True)),
+            samesite=app.config.get("SESSION_COOKIE_SAMESITE", "None"),
+            path="/",
+        )
@@ -0,0 +1,344 @@
+# app/utils/similarity.py
+"""
+Near-duplicate index over submission text (MinHash + LSH), partitioned per
+assignment.
+
+Copied essays are flagged locally, without a model call per pair:
+
+    sig = signature(full_text)                      # ~ms, once per submission
+    matches = SIMILARITY.query(assignment_key, sig, student_id=uid)  # [(submission_id, similarity), ...]
+    ... insert the row with ai_check_result=check_result(matches) ...
+    SIMILARITY.add(assignment_key, submission_id, sig, student_id=uid)
+
+- Text is normalized (lowercase, words only) and shingled into word
+  SIMILARITY_SHINGLE_WORDS-grams (default 5). Each shingle is hashed once to
+  64 bits; NUM_PERM (64) universal hashes (a*x + b mod 2^61-1) give the
+  signature. The fraction of equal signature slots estimates Jaccard
+  similarity of the shingle sets.
+- LSH splits the signature into BANDS bands of ROWS rows; submissions that
+  share any band bucket are candidates (with 8x8 the candidate curve rises
+  around 0.77, just under the 0.8 default threshold). Candidates are then
+  scored on the full signature, so a query only touches dict lookups plus a
+  handful of comparisons.
+- Each signature keeps the submitter's id, and a query skips the submitter's
+  own rows, so a resubmission isn't flagged as a copy of the earlier attempt.
+  Rows stored before the id was kept have none and are never skipped.
+- Partitions are loaded lazily from SQLite (SIMILARITY_SQLITE_PATH, default
+  data/similarity.sqlite3) the first time an assignment is queried; add()
+  appends to the in-memory partition immediately; rows are persisted off the
+  request thread by a single writer that batches whatever has queued up.
+  Deleted submissions are dropped with remove(), which blanks the row and
+  stamps removed_at rather than deleting it.
+
+Per process; each worker keeps its own copy of the partitions it has seen.
+Every SIMILARITY_REFRESH_SECONDS (default 30) a partition picks up the rows
+other workers have added or removed since its last read (by created_at /
+removed_at, re-reading a REFRESH_OVERLAP window to cover writes still queued
+when it last looked; applying a row twice is harmless).
+"""
+import hashlib
+import os
+import random
+import re
+import sqlite3
+import struct
+import threading
+import time
+from collections import defaultdict
+
+from app.utils.background import submit
+from app.utils.logger import get_logger
+
+log = get_logger(__name__)
+
+NUM_PERM = 64
+BANDS = 8
+ROWS = NUM_PERM // BANDS
+SHINGLE_WORDS = int(os.getenv("SIMILARITY_SHINGLE_WORDS", "5"))
+THRESHOLD = float(os.getenv("SIMILARITY_THRESHOLD", "0.8"))
+MIN_WORDS = 20  # shorter texts are too small to compare meaningfully
+MAX_MATCHES = 10
+REFRESH_SECONDS = float(os.getenv("SIMILARITY_REFRESH_SECONDS", "30"))
+REFRESH_OVERLAP = 60.0
+
+_PRIME = (1 << 61) - 1
+_rng = random.Random(0x5EED)  # fixed: signatures must be stable across processes and restarts
+_PERMS = [(_rng.randrange(1, _PRIME), _rng.randrange(0, _PRIME)) for _ in range(NUM_PERM)]
+_WORD_RE = re.compile(r"[a-z0-9']+")
+_SIG_FORMAT = f"<{NUM_PERM}Q"
+
+_SQLITE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS minhash_signatures (
+    partition     TEXT NOT NULL,
+    submission_id TEXT NOT NULL,
+    signature     BLOB NOT NULL,
+    created_at    REAL NOT NULL,
+    student_id    TEXT,
+    removed_at    REAL,
+    PRIMARY KEY (partition, submission_id)
+)
+"""
+# Added after the table first shipped; older files get them on first connect
+_SQLITE_ADDED_COLUMNS = {"student_id": "TEXT", "removed_at": "REAL"}
+
+
+def _sqlite_path() -> str:
+    return os.getenv("SIMILARITY_SQLITE_PATH") or os.path.join("data", "similarity.sqlite3")
+
+
+def shingles(text: str) -> set:
+    words = _WORD_RE.findall((text or "").lower())
+    if len(words) < MIN_WORDS:
+        return set()
+    n = min(SHINGLE_WORDS, len(words))
+    return {" ".join(words[i:i + n]) for i in range(len(words) - n + 1)}
+
+
+def signature(text: str):
+    """MinHash signature (tuple of NUM_PERM ints), or None if the text is too short."""
+    grams = shingles(text)
+    if not grams:
+        return None
+    hashes = [
+        int.from_bytes(hashlib.blake2b(g.encode(), digest_size=8).digest(), "little") for g in grams
+    ]
+    return tuple(min((a * h + b) % _PRIME for h in hashes) for a, b in _PERMS)
+
+
+def estimate(sig_a, sig_b) -> float:
+    """Estimated Jaccard similarity of two signatures."""
+    return sum(1 for x, y in zip(sig_a, sig_b) if x == y) / NUM_PERM
+
+
+def _bands(sig):
+    return [(i, sig[i * ROWS:(i + 1) * ROWS]) for i in range(BANDS)]
+
+
+def check_result(matches) -> dict:
+    """ai_check_result payload for a submission's near-duplicate matches."""
+    return {
+        "method": "minhash",
+        "threshold": THRESHOLD,
+        "flagged": bool(matches),
+        "matches": [{"submission_id": sid, "similarity": round(sim, 3)} for sid, sim in matches],
+    }
+
+
+class _Partition:
+    def __init__(self):
+        self.signatures = {}  # submission_id -> signature
+        self.students = {}  # submission_id -> submitter's id (when known)
+        self.buckets = defaultdict(set)  # (band, rows) -> {submission_id}
+        self.synced = 0.0  # time.time() as of the last read from SQLite
+        self.checked = time.monotonic()
+        self.refreshing = False
+
+    def add(self, submission_id, sig, student_id=None):
+        self.remove(submission_id)
+        self.signatures[submission_id] = sig
+        if student_id:
+            self.students[submission_id] = student_id
+        for band in _bands(sig):
+            self.buckets[band].add(submission_id)
+
+    def remove(self, submission_id):
+        self.students.pop(submission_id, None)
+        sig = self.signatures.pop(submission_id, None)
+        if sig is None:
+            return
+        for band in _bands(sig):
+            ids = self.buckets.get(band)
+            if ids:
+                ids.discard(submission_id)
+                if not ids:
+                    del self.buckets[band]
+
+    def candidates(self, sig) -> set:
+        found = set()
+        for band in _bands(sig):
+            found |= self.buckets.get(band, set())
+        return found
+
+
+class SimilarityIndex:
+    def __init__(self, path: str = None, threshold: float = THRESHOLD):
+        self.path = path or _sqlite_path()
+        self.threshold = threshold
+        self._lock = threading.Lock()
+        self._partitions = {}
+        self._pending = []  # (sql, params) waiting for the writer
+        self._writing = False
+        self._migrated = False
+
+    # ---------- persistence ----------
+    def _connect(self):
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        con = sqlite3.connect(self.path, timeout=5)
+        if not self._migrated:
+            con.execute(_SQLITE_SCHEMA)
+            have = {row[1] for row in con.execute("PRAGMA table_info(minhash_signatures)")}
+            for column, kind in _SQLITE_ADDED_COLUMNS.items():
+                if column not in have:
+                    try:
+                        con.execute(f"ALTER TABLE minhash_signatures ADD COLUMN {column} {kind}")
+                    except sqlite3.OperationalError:
+                        pass  # another worker added it first
+            con.commit()
+            self._migrated = True
+        return con
+
+    def _read(self, key: str, since: float = None) -> list:
+        """(submission_id, signature blob, student_id, removed_at) rows: live ones, or all changed since `since`."""
+        con = self._connect()
+        try:
+            if since is None:
+                return con.execute(
+                    "SELECT submission_id, signature, student_id, removed_at FROM minhash_signatures "
+                    "WHERE partition = ? AND removed_at IS NULL",
+                    (key,),
+                ).fetchall()
+            return con.execute(
+                "SELECT submission_id, signature, student_id, removed_at FROM minhash_signatures "
+                "WHERE partition = ? AND (created_at >= ? OR removed_at >= ?)",
+                (key, since, since),
+            ).fetchall()
+        finally:
+            con.close()
+
+    @staticmethod
+    def _apply(part: _Partition, rows):
+        for submission_id, blob, student_id, removed_at in rows:
+            if removed_at is not None:
+                part.remove(submission_id)
+            else:
+                part.add(submission_id, struct.unpack(_SIG_FORMAT, blob), student_id)
+
+    def _load(self, key: str) -> _Partition:
+        part = _Partition()
+        started = time.time()
+        try:
+            self._apply(part, self._read(key))
+            part.synced = started
+        except (sqlite3.Error, struct.error) as e:
+            log.warning("⚠️ Similarity index for %s not loaded (starting empty): %s", key, e)
+        return part
+
+    def _refresh(self, key: str, part: _Partition):
+        """Applies rows other workers added or removed since the partition last read SQLite."""
+        started = time.time()
+        try:
+            rows = self._read(key, since=part.synced - REFRESH_OVERLAP)
+        except sqlite3.Error as e:
+            log.warning("⚠️ Similarity index refresh for %s failed: %s", key, e)
+            rows = None
+        with self._lock:
+            part.refreshing = False
+            part.checked = time.monotonic()
+            if rows is None:
+                return
+            try:
+                self._apply(part, rows)
+            except struct.error as e:
+                log.warning("⚠️ Similarity index refresh for %s skipped a bad row: %s", key, e)
+            part.synced = started
+
+    def _write(self, sql: str, params: tuple):
+        """Queue a write; one background task drains the queue in a single transaction."""
+        with self._lock:
+            self._pending.append((sql, params))
+            if self._writing:
+                return
+            self._writing = True
+        submit(self._flush)
+
+    def _flush(self):
+        while True:
+            with self._lock:
+                batch, self._pending = self._pending, []
+                if not batch:
+                    self._writing = False
+                    return
+            try:
+                con = self._connect()
+                try:
+                    with con:
+                        for sql, params in batch:
+                            con.execute(sql, params)
+                finally:
+                    con.close()
+            except sqlite3.Error as e:
+                log.warning("⚠️ Similarity index write failed (%d rows): %s", len(batch), e)
+
+    def _partition(self, key: str) -> _Partition:
+        part = self._partitions.get(key)
+        if part is None:
+            loaded = self._load(key)  # outside the lock; first loader wins
+            with self._lock:
+                part = self._partitions.setdefault(key, loaded)
+            return part
+        if time.monotonic() - part.checked >= REFRESH_SECONDS:
+            with self._lock:
+                stale = not part.refreshing and time.monotonic() - part.checked >= REFRESH_SECONDS
+                if stale:
+                    part.refreshing = True  # one refresher; the rest use what's loaded
+            if stale:
+                self._refresh(key, part)
+        return part
+
+    # ---------- API ----------
+    def query(self, key, sig, exclude=None, student_id=None) -> list:
+        """
+        [(submission_id, similarity)] at or above the threshold, most similar
+        first, leaving out submission `exclude` and student_id's own rows.
+        """
+        if sig is None:
+            return []
+        student_id = str(student_id) if student_id else None
+        part = self._partition(str(key))
+        with self._lock:
+            scored = [
+                (sid, estimate(sig, part.signatures[sid]))
+                for sid in part.candidates(sig)
+                if sid != exclude
+                and sid in part.signatures
+                and (student_id is None or part.students.get(sid) != student_id)
+            ]
+        matches = sorted((m for m in scored if m[1] >= self.threshold), key=lambda m: -m[1])
+        return matches[:MAX_MATCHES]
+
+    def add(self, key, submission_id, sig, student_id=None, persist: bool = True):
+        if sig is None or not submission_id:
+            return
+        key, submission_id = str(key), str(submission_id)
+        student_id = str(student_id) if student_id else None
+        part = self._partition(key)
+        with self._lock:
+            part.add(submission_id, sig, student_id)
+        if persist:
+            self._write(
+                "INSERT OR REPLACE INTO minhash_signatures "
+                "(partition, submission_id, signature, created_at, student_id, removed_at) "
+                "VALUES (?, ?, ?, ?, ?, NULL)",
+                (key, submission_id, struct.pack(_SIG_FORMAT, *sig), time.time(), student_id),
+            )
+
+    def remove(self, submission_id, key=None):
+        """Drop a deleted submission (from one partition, or every loaded one; other workers on refresh)."""
+        submission_id = str(submission_id)
+        with self._lock:
+            parts = [self._partitions.get(str(key))] if key is not None else list(self._partitions.values())
+            for part in parts:
+                if part is not None:
+                    part.remove(submission_id)
+        self._write(
+            "UPDATE minhash_signatures SET signature = x'', student_id = NULL, removed_at = ? "
+            "WHERE submission_id = ? AND removed_at IS NULL",
+            (time.time(), submission_id),
+        )
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {key: len(part.signatures) for key, part in self._partitions.items()}
+
+
+SIMILARITY = SimilarityIndex()
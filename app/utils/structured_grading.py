@@ -0,0 +1,229 @@
+# app/utils/structured_grading.py
+"""
+Structured grading output (function calling) for rubrics with criteria.
+
+Free-text grading pulls the score out of "Score: N" with a regex; a miss used
+to become 0 and send the submission to manual re-grading. When the rubric is a
+JSON rubric with "criteria", the model is instead asked to call `submit_grade`
+with points per criterion:
+
+    {"criteria": [{"criterion": 1, "points": 18, "comment": "..."}, ...],
+     "feedback": "overall feedback"}
+
+Criterion numbers are 1-based positions in rubric_json["criteria"]. Validation
+is a dict walk (every criterion present once, points numeric and within
+0..max_points). If some criteria are missing or invalid, only those are
+requested again, with a schema restricted to them; the valid ones are kept.
+After STRUCTURED_REPAIR_ATTEMPTS (default 1) the grade is returned incomplete
+with score None rather than a silent 0.
+
+The exchange is written as a generator so the sync (openai 0.28) and async
+(httpx) paths share it:
+
+    result = run(lambda messages, **kw: complete_with_fallback(route, tiers, messages, **kw),
+                 tpl.messages(text), tpl.criteria)
+"""
+import json
+import os
+import re
+
+FUNCTION_NAME = "submit_grade"
+STRUCTURED_GRADING = (os.getenv("STRUCTURED_GRADING") or "true").strip().lower() in {"1", "true", "yes", "on"}
+REPAIR_ATTEMPTS = int(os.getenv("STRUCTURED_REPAIR_ATTEMPTS", "1"))
+
+_FENCE_RE = re.compile(r"```(?:json)?\s*(\{.*?\})\s*```", re.S)
+_OBJECT_RE = re.compile(r"\{.*\}", re.S)
+
+
+def extract_json(text: str):
+    """First JSON object in a completion: a fenced block, else the outermost {...}."""
+    if not text:
+        return None
+    for m in (_FENCE_RE.search(text), _OBJECT_RE.search(text)):
+        if m:
+            try:
+                return json.loads(m.group(1) if m.re is _FENCE_RE else m.group(0))
+            except ValueError:
+                continue
+    return None
+
+
+def rubric_criteria(rubric_json) -> list:
+    """[{"criterion", "description", "max_points"}, ...] or [] if the rubric has no criteria."""
+    if not isinstance(rubric_json, dict):
+        return []
+    out = []
+    for i, c in enumerate(rubric_json.get("criteria") or [], start=1):
+        if not isinstance(c, dict):
+            continue
+        try:
+            max_points = float(c.get("max_points", 1))
+        except (TypeError, ValueError):
+            max_points = 1.0
+        out.append({"criterion": i, "description": c.get("description") or f"Criterion {i}", "max_points": max_points})
+    return out
+
+
+def grade_function(criteria: list, only=None) -> dict:
+    """Function schema for submit_grade, optionally restricted to some criterion numbers."""
+    numbers = [c["criterion"] for c in criteria if only is None or c["criterion"] in only]
+    return {
+        "name": FUNCTION_NAME,
+        "description": "Submit the grade: points for every listed rubric criterion plus overall feedback.",
+        "parameters": {
+            "type": "object",
+            "properties": {
+                "criteria": {
+                    "type": "array",
+                    "items": {
+                        "type": "object",
+                        "properties": {
+                            "criterion": {"type": "integer", "enum": numbers},
+                            "points": {"type": "number", "minimum": 0},
+                            "comment": {"type": "string"},
+                        },
+                        "required": ["criterion", "points", "comment"],
+                    },
+                },
+                "feedback": {"type": "string"},
+            },
+            "required": ["criteria"] if only else ["criteria", "feedback"],
+        },
+    }
+
+
+def _raw_arguments(resp) -> str:
+    msg = resp["choices"][0]["message"]
+    call = msg.get("function_call") or {}
+    return call.get("arguments") or msg.get("content") or ""
+
+
+def _parse_arguments(raw: str):
+    try:
+        return json.loads(raw)
+    except (TypeError, ValueError):
+        return extract_json(raw)
+
+
+def validate(args, criteria: list, only=None):
+    """
+    ({criterion: {"points", "comment"}}, [bad criterion numbers], overall feedback)
+    for parsed submit_grade arguments. `only` limits which criteria are expected.
+    """
+    expected = {c["criterion"]: c for c in criteria if only is None or c["criterion"] in only}
+    scores = {}
+    items = args.get("criteria") if isinstance(args, dict) else None
+    for item in items if isinstance(items, list) else []:
+        if not isinstance(item, dict):
+            continue
+        try:
+            n = int(item.get("criterion"))
+            points = float(item.get("points"))
+        except (TypeError, ValueError):
+            continue
+        c = expected.get(n)
+        if c is None or n in scores or not 0 <= points <= c["max_points"]:
+            continue
+        scores[n] = {"points": points, "comment": str(item.get("comment") or "").strip()}
+    bad = [n for n in expected if n not in scores]
+    feedback = str(args.get("feedback") or "").strip() if isinstance(args, dict) else ""
+    return scores, bad, feedback
+
+
+class StructuredGrade:
+    def __init__(self, criteria, scores, feedback, model, usage, repairs):
+        self.criteria = [
+            dict(c, points=scores.get(c["criterion"], {}).get("points"),
+                 comment=scores.get(c["criterion"], {}).get("comment", ""))
+            for c in criteria
+        ]
+        self.complete = all(c["points"] is not None for c in self.criteria)
+        self.score = round(sum(c["points"] for c in self.criteria)) if self.complete else None
+        self.model = model
+        self.usage = usage
+        self.repairs = repairs
+        self.feedback = self._feedback_text(feedback)
+
+    def _feedback_text(self, overall: str) -> str:
+        lines = [overall] if overall else []
+        for c in self.criteria:
+            pts = "?" if c["points"] is None else f"{c['points']:g}"
+            line = f"- {c['description']}: {pts}/{c['max_points']:g}"
+            if c["comment"]:
+                line += f" — {c['comment']}"
+            lines.append(line)
+        if not self.complete:
+            lines.append("(Some criteria could not be scored automatically; the instructor will complete the grade.)")
+        return "\n".join(lines).strip()
+
+    def criterion_scores(self) -> list:
+        """What gets stored on the submission (submissions.criterion_scores)."""
+        return [
+            {k: c[k] for k in ("criterion", "description", "points", "max_points", "comment")}
+            for c in self.criteria
+        ]
+
+
+def _add_usage(total: dict, usage: dict):
+    for k in ("prompt_tokens", "completion_tokens", "total_tokens"):
+        total[k] = total.get(k, 0) + int((usage or {}).get(k) or 0)
+
+
+def _session(messages: list, criteria: list):
+    """Yields (messages, call kwargs), receives (response, model); returns a StructuredGrade."""
+    usage = {}
+    resp, model = yield messages, {
+        "functions": [grade_function(criteria)],
+        "function_call": {"name": FUNCTION_NAME},
+    }
+    _add_usage(usage, resp.get("usage"))
+    raw = _raw_arguments(resp)
+    scores, bad, feedback = validate(_parse_arguments(raw), criteria)
+
+    repairs = 0
+    while bad and repairs < REPAIR_ATTEMPTS:
+        repairs += 1
+        names = ", ".join(str(n) for n in bad)
+        repair = messages + [
+            {"role": "assistant", "content": None, "function_call": {"name": FUNCTION_NAME, "arguments": raw}},
+            {
+                "role": "user",
+                "content": (
+                    f"Criteria {names} were missing or out of range. Call {FUNCTION_NAME} again with only "
+                    f"those criteria; points must be between 0 and each criterion's maximum."
+                ),
+            },
+        ]
+        resp, model = yield repair, {
+            "functions": [grade_function(criteria, only=bad)],
+            "function_call": {"name": FUNCTION_NAME},
+        }
+        _add_usage(usage, resp.get("usage"))
+        raw = _raw_arguments(resp)
+        fixed, bad, more_feedback = validate(_parse_arguments(raw), criteria, only=bad)
+        scores.update(fixed)
+        feedback = feedback or more_feedback
+
+    return StructuredGrade(criteria, scores, feedback, model, usage, repairs)
+
+
+def run(call, messages: list, criteria: list) -> StructuredGrade:
+    """call(messages, **kwargs) -> (response, model_used), e.g. model_router.complete."""
+    gen = _session(messages, criteria)
+    req = next(gen)
+    while True:
+        try:
+            req = gen.send(call(req[0], **req[1]))
+        except StopIteration as done:
+            return done.value
+
+
+async def run_async(call, messages: list, criteria: list) -> StructuredGrade:
+    """Same exchange with an async call (model_router.complete_async)."""
+    gen = _session(messages, criteria)
+    req = next(gen)
+    while True:
+        try:
+            req = gen.send(await call(req[0], **req[1]))
+        except StopIteration as done:
+            return done.value
@@ -0,0 +1,303 @@
+# app/utils/submission_events.py
+"""
+Submission change feed for the live grader dashboard (Server-Sent Events).
+
+The write paths publish what changed:
+
+    publish_submission(row)                 # insert / score / review
+    publish_submission(row, deleted=True)   # delete (only submission_id + scope needed)
+    publish_submissions(rows)               # a bulk action: one SQLite transaction
+
+and /grader-submissions/stream sends each open dashboard only the events in
+its (institution_id, course_id) scope:
+
+    id: 1842
+    event: submission
+    data: {"submission_id": "...", "score": 18, "reviewed": false, ...}
+
+- Events are appended to a SQLite log (SUBMISSION_EVENTS_SQLITE_PATH, default
+  data/submission_events.sqlite3) shared by the workers on a host, so event
+  ids are one sequence and a reconnect with Last-Event-ID gets exactly the
+  delta no matter which worker it lands on. The log keeps the newest
+  SUBMISSION_EVENTS_RETAIN events; a cursor older than that (or from a wiped
+  log) gets a single `reset` event and the page refetches /grader-submissions.
+- Each process runs one tail thread (only while it has subscribers) that
+  picks up other workers' events every POLL_SECONDS into an in-memory window;
+  subscribers block on a condition and read from that window. Work is per
+  change, not per open tab: an idle dashboard costs a sleeping thread and a
+  heartbeat comment every HEARTBEAT_SECONDS.
+- A stream is closed after STREAM_MAX_SECONDS; EventSource reconnects on its
+  own with Last-Event-ID, which keeps long-lived connections from pinning a
+  worker thread forever. An open stream holds one thread: a gthread worker
+  thread under gunicorn, or one of ASGI_WSGI_THREADS under app.asgi_grader.
+
+Separate hosts don't share the log; run one host per SQLite file or fall back
+to refetching.
+"""
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import deque
+
+from app.utils.logger import get_logger
+
+log = get_logger(__name__)
+
+RETAIN = int(os.getenv("SUBMISSION_EVENTS_RETAIN", "5000"))
+POLL_SECONDS = float(os.getenv("SUBMISSION_EVENTS_POLL_SECONDS", "1"))
+HEARTBEAT_SECONDS = float(os.getenv("SUBMISSION_EVENTS_HEARTBEAT_SECONDS", "15"))
+STREAM_MAX_SECONDS = float(os.getenv("SUBMISSION_EVENTS_STREAM_MAX_SECONDS", "300"))
+WINDOW = 1000  # recent events kept in memory per process
+READ_LIMIT = 500
+
+# What the dashboard table shows (same shape as /grader-submissions rows)
+FIELDS = ("submission_id", "user_id", "assignment_title", "created_at", "reviewed", "score")
+
+_SQLITE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS submission_events (
+    id             INTEGER PRIMARY KEY AUTOINCREMENT,
+    ts             REAL NOT NULL,
+    kind           TEXT NOT NULL,
+    institution_id TEXT,
+    course_id      TEXT,
+    payload        TEXT NOT NULL
+)
+"""
+
+
+def _sqlite_path() -> str:
+    return os.getenv("SUBMISSION_EVENTS_SQLITE_PATH") or os.path.join("data", "submission_events.sqlite3")
+
+
+def dashboard_row(r: dict) -> dict:
+    """A submissions row normalized the way /grader-submissions returns it; absent fields are left out."""
+    out = {
+        "submission_id": r.get("submission_id") or r.get("id"),
+        "user_id": r.get("user_id") or r.get("student_id"),
+        "assignment_title": r.get("assignment_title") or r.get("assignment_id"),
+        "created_at": r.get("created_at") or r.get("submitted_at") or r.get("submission_time"),
+        "reviewed": r.get("reviewed", r.get("instructor_reviewed")),
+        "score": r.get("score", r.get("instructor_score")),
+    }
+    out = {k: v for k, v in out.items() if v is not None or (k in r and k in ("score", "reviewed"))}
+    if "reviewed" in out:
+        out["reviewed"] = bool(out["reviewed"])
+    return out
+
+
+class _Event:
+    __slots__ = ("id", "kind", "institution_id", "course_id", "payload")
+
+    def __init__(self, id, kind, institution_id, course_id, payload):
+        self.id = id
+        self.kind = kind
+        self.institution_id = institution_id
+        self.course_id = course_id
+        self.payload = payload
+
+    def visible_to(self, scope) -> bool:
+        """Same rule as the dashboard query: own scope only; superusers see all, no scope sees nothing."""
+        inst, course, superuser = scope
+        if superuser:
+            return True
+        if not (inst or course):
+            return False
+        if inst and self.institution_id != str(inst):
+            return False
+        if course and self.course_id != str(course):
+            return False
+        return True
+
+    def sse(self) -> str:
+        return f"id: {self.id}\nevent: {self.kind}\ndata: {self.payload}\n\n"
+
+
+class SubmissionEvents:
+    def __init__(self, path: str = None):
+        self.path = path or _sqlite_path()
+        self._cond = threading.Condition()
+        self._window = deque(maxlen=WINDOW)
+        self._last_id = None  # newest id this process has seen
+        self._subscribers = 0
+        self._tail = None
+        self._pid = None
+
+    # ---------- storage ----------
+    def _connect(self):
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        con = sqlite3.connect(self.path, timeout=5)
+        con.execute(_SQLITE_SCHEMA)
+        return con
+
+    def _read(self, after_id: int, limit: int = READ_LIMIT) -> list:
+        con = self._connect()
+        try:
+            rows = con.execute(
+                "SELECT id, kind, institution_id, course_id, payload FROM submission_events "
+                "WHERE id > ? ORDER BY id LIMIT ?",
+                (after_id, limit),
+            ).fetchall()
+        finally:
+            con.close()
+        return [_Event(*r) for r in rows]
+
+    def _bounds(self):
+        con = self._connect()
+        try:
+            lo, hi = con.execute("SELECT MIN(id), MAX(id) FROM submission_events").fetchone()
+        finally:
+            con.close()
+        return lo or 0, hi or 0
+
+    def _remember(self, events):
+        with self._cond:
+            for e in events:
+                if self._last_id is None or e.id > self._last_id:
+                    self._window.append(e)
+                    self._last_id = e.id
+            self._cond.notify_all()
+
+    # ---------- writing ----------
+    def publish(self, kind: str, payload: dict, institution_id=None, course_id=None):
+        self.publish_many([(kind, payload, institution_id, course_id)])
+
+    def publish_many(self, events):
+        """Appends [(kind, payload, institution_id, course_id)] in one transaction."""
+        rows = [
+            (kind, str(inst) if inst else None, str(course) if course else None, json.dumps(payload, default=str))
+            for kind, payload, inst, course in events
+        ]
+        if not rows:
+            return
+        now = time.time()
+        ids = []
+        try:
+            con = self._connect()
+            try:
+                with con:
+                    for kind, inst, course, body in rows:
+                        cur = con.execute(
+                            "INSERT INTO submission_events (ts, kind, institution_id, course_id, payload) "
+                            "VALUES (?, ?, ?, ?, ?)",
+                            (now, kind, inst, course, body),
+                        )
+                        ids.append(cur.lastrowid)
+                    if ids[-1] // 100 != (ids[0] - 1) // 100:
+                        con.execute("DELETE FROM submission_events WHERE id <= ?", (ids[-1] - RETAIN,))
+            finally:
+                con.close()
+        except sqlite3.Error as e:
+            log.warning("⚠️ %s submission event(s) not recorded: %s", len(rows), e)
+            return
+        if self._last_id is not None:
+            # Subscribers here see them now; other workers' tails pick them up from the log
+            self._remember(self._read(self._last_id) if ids[0] != self._last_id + 1
+                           else [_Event(i, *r) for i, r in zip(ids, rows)])
+
+    # ---------- tailing ----------
+    def _ensure_tail(self):
+        with self._cond:
+            if self._tail is not None and self._pid == os.getpid() and self._tail.is_alive():
+                return
+            self._pid = os.getpid()
+            if self._last_id is None:
+                self._last_id = self._bounds()[1]
+            self._tail = threading.Thread(target=self._run_tail, name="submission-events-tail", daemon=True)
+            self._tail.start()
+
+    def _run_tail(self):
+        while True:
+            with self._cond:
+                if self._subscribers <= 0:
+                    self._tail = None
+                    return
+                after = self._last_id or 0
+            try:
+                events = self._read(after)
+            except sqlite3.Error as e:
+                log.warning("⚠️ Submission event tail failed: %s", e)
+                events = []
+            if events:
+                self._remember(events)
+            time.sleep(POLL_SECONDS)
+
+    # ---------- reading ----------
+    def _since(self, cursor: int):
+        """(events after cursor, reset needed)."""
+        with self._cond:
+            last = self._last_id or 0
+            window = list(self._window)
+        if cursor == last:
+            return [], False
+        if cursor < last and window and window[0].id <= cursor + 1:
+            return [e for e in window if e.id > cursor], False
+        lo, hi = self._bounds()
+        if cursor > hi or (lo and cursor < lo - 1):
+            return [], True
+        return self._read(cursor), False
+
+    def stream(self, scope, last_event_id=None):
+        """Generator of SSE text for one dashboard connection."""
+        with self._cond:
+            self._subscribers += 1
+        try:
+            self._ensure_tail()
+            try:
+                cursor = int(last_event_id) if last_event_id else None
+            except ValueError:
+                cursor = None
+            if cursor is None:
+                cursor = self._last_id or 0
+            yield f"retry: 3000\nid: {cursor}\n\n"
+
+            deadline = time.monotonic() + STREAM_MAX_SECONDS
+            while time.monotonic() < deadline:
+                events, reset = self._since(cursor)
+                if reset:
+                    cursor = self._last_id or 0
+                    yield f"id: {cursor}\nevent: reset\ndata: {{}}\n\n"
+                    continue
+                for e in events:
+                    cursor = e.id
+                    if e.visible_to(scope):
+                        yield e.sse()
+                if events:
+                    continue
+                with self._cond:
+                    if (self._last_id or 0) <= cursor:
+                        self._cond.wait(HEARTBEAT_SECONDS)
+                    idle = (self._last_id or 0) <= cursor
+                if idle:
+                    yield ": keepalive\n\n"
+        finally:
+            with self._cond:
+                self._subscribers -= 1
+
+
+EVENTS = SubmissionEvents()
+
+
+def _submission_event(row: dict, deleted: bool, institution_id, course_id):
+    row = row or {}
+    payload = {"submission_id": row.get("submission_id") or row.get("id")} if deleted else dashboard_row(row)
+    if not payload.get("submission_id"):
+        return None
+    return (
+        "delete" if deleted else "submission",
+        payload,
+        institution_id or row.get("institution_id"),
+        course_id or row.get("course_id"),
+    )
+
+
+def publish_submission(row: dict, deleted: bool = False, institution_id=None, course_id=None):
+    """Tell open dashboards about a new, changed or deleted grader submission."""
+    publish_submissions([row], deleted, institution_id, course_id)
+
+
+def publish_submissions(rows, deleted: bool = False, institution_id=None, course_id=None):
+    """publish_submission for many rows, written as one batch."""
+    events = [_submission_event(row, deleted, institution_id, course_id) for row in rows or []]
+    EVENTS.publish_many([e for e in events if e is not None])
@@ -0,0 +1,194 @@
+# app/utils/uploads.py
+"""
+Spooled file uploads.
+
+Werkzeug already spools multipart bodies over 500 KB to a temp file, but every
+route then did `file.read()` and kept the whole upload in RAM (twice when it
+also wrapped it in BytesIO for extraction). SpooledUpload copies the incoming
+stream once, in chunks:
+
+- up to UPLOAD_SPOOL_MEMORY_MB (default 1) stays in memory, larger files spill
+  to a named temp file;
+- the size cap (MAX_UPLOAD_MB, default 25) is enforced while copying, so an
+  oversized file is rejected before any parser sees it;
+- the SHA-256 is computed on the same pass.
+
+Consumers then read from the spool independently:
+
+    upload = SpooledUpload.from_filestorage(request.files["file"])
+    with upload.body() as body:            # bytes or an open file for storage3
+        supabase.storage.from_("submissions").upload(path, body)
+    with upload.open() as fh:              # fresh handle at offset 0
+        doc = Document(fh)
+    upload.close()
+
+MAX_CONTENT_LENGTH (set from the same env in main.py) makes Werkzeug refuse
+the whole request with 413 before the form is parsed.
+"""
+import hashlib
+import io
+import os
+import tempfile
+from contextlib import contextmanager
+
+MB = 1024 * 1024
+MAX_UPLOAD_BYTES = int(float(os.getenv("MAX_UPLOAD_MB", "25")) * MB)
+SPOOL_MEMORY_BYTES = int(float(os.getenv("UPLOAD_SPOOL_MEMORY_MB", "1")) * MB)
+CHUNK_SIZE = 64 * 1024
+
+# Headroom for the non-file form fields and multipart boundaries
+MAX_CONTENT_LENGTH = MAX_UPLOAD_BYTES + MB
+
+
+def _mb(n: int) -> str:
+    return f"{n / MB:.1f}".rstrip("0").rstrip(".")
+
+
+class UploadTooLarge(Exception):
+    def __init__(self, limit: int):
+        super().__init__(f"Upload exceeds {_mb(limit)} MB limit")
+        self.limit = limit
+
+    @property
+    def message(self) -> str:
+        return f"❌ File is too large. The maximum upload size is {_mb(self.limit)} MB."
+
+
+class SpooledUpload:
+    def __init__(self, filename: str = "", content_type: str = None,
+                 max_bytes: int = None, memory_bytes: int = None):
+        self.filename = filename or ""
+        self.content_type = content_type or "application/octet-stream"
+        self.max_bytes = MAX_UPLOAD_BYTES if max_bytes is None else max_bytes
+        self.memory_bytes = SPOOL_MEMORY_BYTES if memory_bytes is None else memory_bytes
+        self.size = 0
+        self.sha256 = None
+        self._buf = io.BytesIO()
+        self._data = None  # bytes once finished, if it stayed in memory
+        self._path = None  # temp file path once spilled
+        self._fh = None
+
+    # ---------- building ----------
+    @classmethod
+    def from_stream(cls, stream, filename="", content_type=None, **kwargs):
+        up = cls(filename, content_type, **kwargs)
+        hasher = hashlib.sha256()
+        try:
+            while True:
+                chunk = stream.read(CHUNK_SIZE)
+                if not chunk:
+                    break
+                up._write(chunk)
+                hasher.update(chunk)
+        except Exception:
+            up.close()
+            raise
+        up._finish()
+        up.sha256 = hasher.hexdigest()
+        return up
+
+    @classmethod
+    def from_filestorage(cls, fs, **kwargs):
+        """Spool a Werkzeug FileStorage (request.files[...])."""
+        return cls.from_stream(fs.stream, fs.filename or "", getattr(fs, "mimetype", None), **kwargs)
+
+    def _write(self, chunk: bytes):
+        self.size += len(chunk)
+        if self.size > self.max_bytes:
+            raise UploadTooLarge(self.max_bytes)
+        if self._fh is None and self.size > self.memory_bytes:
+            fd, self._path = tempfile.mkstemp(prefix="rubiqs-upload-")
+            self._fh = os.fdopen(fd, "wb")
+            self._fh.write(self._buf.getbuffer())
+            self._buf = None
+        (self._fh or self._buf).write(chunk)
+
+    def _finish(self):
+        if self._fh is not None:
+            self._fh.close()
+            self._fh = None
+        else:
+            self._data = self._buf.getvalue()
+            self._buf = None
+
+    # ---------- reading ----------
+    @property
+    def ext(self) -> str:
+        return os.path.splitext(self.filename.lower())[-1]
+
+    @property
+    def in_memory(self) -> bool:
+        return self._path is None
+
+    def open(self):
+        """A new independent read handle positioned at 0 (safe to use from another thread)."""
+        if self._path is not None:
+            return open(self._path, "rb")
+        return io.BytesIO(self._data or b"")
+
+    def payload(self):
+        """
+        What storage3's upload() accepts: bytes when small, otherwise a new open
+        file the caller must close. Holds its own reference, so it stays valid
+        if the spool is closed first (e.g. an upload still running in a thread
+        when the request tears down).
+        """
+        if self._path is None:
+            return self._data or b""
+        return open(self._path, "rb")
+
+    @contextmanager
+    def body(self):
+        """payload() that closes itself."""
+        body = self.payload()
+        try:
+            yield body
+        finally:
+            if hasattr(body, "close"):
+                body.close()
+
+    def read(self) -> bytes:
+        """Whole payload as bytes — only for consumers that really need it."""
+        with self.open() as fh:
+            return fh.read()
+
+    # ---------- cleanup ----------
+    def close(self):
+        if self._fh is not None:
+            self._fh.close()
+            self._fh = None
+        if self._path is not None:
+            try:
+                os.unlink(self._path)
+            except OSError:
+                pass
+            self._path = None
+        self._data = None
+        self._buf = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __del__(self):
+        self.close()
+
+
+# ---------- request-scoped helpers (teardown wired in main.py) ----------
+def spool_request_file(fs, **kwargs) -> SpooledUpload:
+    """Spool an uploaded file and delete its temp file when the request ends."""
+    from flask import g, has_request_context
+
+    up = SpooledUpload.from_filestorage(fs, **kwargs)
+    if has_request_context():
+        g.setdefault("_spooled_uploads", []).append(up)
+    return up
+
+
+def close_request_uploads(exc=None):
+    from flask import g
+
+    for up in g.pop("_spooled_uploads", []):
+        up.close()
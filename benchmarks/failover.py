@@ -0,0 +1,122 @@
+# benchmarks/failover.py
+"""
+Failover timing harness for app/utils/model_router.py against the fake model server.
+
+    python -m benchmarks.failover --slo 3 --slow-ms 6000 --fast-ms 200
+
+Scenarios (sync openai 0.28 path and the async httpx path):
+
+    slow_primary   primary sleeps --slow-ms, fallback answers in --fast-ms:
+                   expect the fallback's answer within the SLO, after roughly
+                   the primary's share of it
+    rate_limited   primary always 429s: expect an immediate failover
+    breaker        after LLM_BREAKER_FAILURES slow calls the primary is skipped:
+                   expect the next call to take about --fast-ms
+    healthy        primary fast: expect no failover
+
+Prints one line per scenario and exits 1 if any expectation fails.
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+
+from benchmarks.fake_openai import FakeOpenAI  # noqa: E402
+
+PRIMARY = "gpt-4"
+FALLBACK = "gpt-3.5-turbo"
+ROUTE = "failover_bench"
+MESSAGES = [{"role": "user", "content": "Grade this essay. Score: <n> Feedback: <text>"}]
+
+
+def _check(name, model, elapsed, want_model, max_s, min_s=0.0):
+    ok = model == want_model and min_s <= elapsed <= max_s
+    print(
+        f"{'ok  ' if ok else 'FAIL'} {name:<24} model={model:<14} {elapsed * 1000:8.0f} ms "
+        f"(want {want_model}, {min_s * 1000:.0f}–{max_s * 1000:.0f} ms)"
+    )
+    return ok
+
+
+def _sync(router, tiers):
+    t0 = time.perf_counter()
+    _, model = router.complete(ROUTE, tiers, MESSAGES, temperature=0.5, max_tokens=50)
+    return model, time.perf_counter() - t0
+
+
+def _async(router, tiers):
+    async def go():
+        from app.utils.async_llm import aclose
+
+        t0 = time.perf_counter()
+        try:
+            _, model = await router.complete_async(ROUTE, tiers, MESSAGES, temperature=0.5, max_tokens=50)
+        finally:
+            await aclose()
+        return model, time.perf_counter() - t0
+
+    return asyncio.run(go())
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--slo", type=float, default=3.0, help="route SLO, seconds")
+    ap.add_argument("--slow-ms", type=float, default=6000.0)
+    ap.add_argument("--fast-ms", type=float, default=200.0)
+    ap.add_argument("--slack", type=float, default=0.5, help="allowed overhead, seconds")
+    args = ap.parse_args(argv)
+
+    slow = FakeOpenAI(model_latency_ms={PRIMARY: args.slow_ms, FALLBACK: args.fast_ms}).start()
+    limited = FakeOpenAI(latency_ms=args.fast_ms, model_rate_429={PRIMARY: 1.0}).start()
+    healthy = FakeOpenAI(latency_ms=args.fast_ms).start()
+
+    os.environ[f"LLM_SLO_{ROUTE.upper()}_SECONDS"] = str(args.slo)
+    os.environ.setdefault("OPENAI_API_KEY", "sk-fake")
+    import openai
+
+    from app.utils import async_llm
+    from app.utils import model_router as router
+
+    openai.api_key = os.environ["OPENAI_API_KEY"]
+    tiers = [PRIMARY, FALLBACK]
+    primary_timeout = router.attempt_timeouts(args.slo, 2)[0]
+    fast = args.fast_ms / 1000.0
+    results = []
+
+    def use(server):
+        openai.api_base = server.api_base
+        async_llm.API_BASE = server.api_base
+        router.reset_health()
+
+    for path, call in (("sync", _sync), ("async", _async)):
+        use(slow)
+        model, dt = call(router, tiers)
+        results.append(_check(f"{path}.slow_primary", model, dt, FALLBACK,
+                              primary_timeout + fast + args.slack, primary_timeout))
+
+        use(limited)
+        model, dt = call(router, tiers)
+        results.append(_check(f"{path}.rate_limited", model, dt, FALLBACK, 2 * fast + args.slack))
+
+        use(slow)
+        for _ in range(router.BREAKER_FAILURES):
+            call(router, tiers)
+        model, dt = call(router, tiers)
+        results.append(_check(f"{path}.breaker", model, dt, FALLBACK, fast + args.slack))
+
+        use(healthy)
+        model, dt = call(router, tiers)
+        results.append(_check(f"{path}.healthy", model, dt, PRIMARY, fast + args.slack))
+
+    for server in (slow, limited, healthy):
+        server.stop()
+    sys.exit(0 if all(results) else 1)
+
+
+if __name__ == "__main__":
+    main()
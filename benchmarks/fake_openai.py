@@ -0,0 +1,186 @@
+# benchmarks/fake_openai.py
+"""
+Fake OpenAI chat-completions server.
+
+- POST /v1/chat/completions returns a "Score: N / Feedback: ..." completion
+  with a plausible `usage` block.
+- Latency = latency_ms ± jitter_ms (uniform), optionally per model
+  (model_latency_ms={"gpt-4": 8000, "gpt-3.5-turbo": 900}).
+- Requests with `functions` (structured grading) get a function_call back
+  with points for every enumerated criterion; malformed_rate drops one
+  criterion from that answer with that probability, to exercise repairs.
+- rate_429 injects HTTP 429 rate-limit errors with that probability, also per
+  model (model_rate_429={"gpt-4": 1.0}).
+
+Point the app at it with OPENAI_API_BASE=<fake.url>/v1 (openai==0.28 reads it).
+"""
+import json
+import random
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class FakeOpenAIState:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.calls = 0
+        self.rate_limited = 0
+        self.calls_by_model = {}
+
+
+def _function_call(body: dict, malformed_rate: float) -> dict:
+    fn = body["functions"][0]
+    item = fn["parameters"]["properties"]["criteria"]["items"]["properties"]
+    numbers = list(item["criterion"].get("enum") or [])
+    if len(numbers) > 1 and random.random() < malformed_rate:
+        numbers.pop(random.randrange(len(numbers)))
+    args = {
+        "criteria": [
+            {"criterion": n, "points": random.randint(0, 10), "comment": "Meets most expectations."}
+            for n in numbers
+        ],
+        "feedback": "Clear thesis and good structure. Strengthen the evidence in the second paragraph.",
+    }
+    return {"role": "assistant", "content": None, "function_call": {"name": fn["name"], "arguments": json.dumps(args)}}
+
+
+def _completion(model: str, prompt_chars: int, body: dict, malformed_rate: float = 0.0) -> dict:
+    if body.get("functions"):
+        message = _function_call(body, malformed_rate)
+        content = message["function_call"]["arguments"]
+    else:
+        score = random.randint(60, 100)
+        content = (
+            f"Score: {score}\n"
+            "Feedback: Clear thesis and good structure. Strengthen the evidence in "
+            "the second paragraph and tighten the conclusion."
+        )
+        message = {"role": "assistant", "content": content}
+    prompt_tokens = max(1, prompt_chars // 4)
+    completion_tokens = len(content) // 4
+    return {
+        "id": f"chatcmpl-fake-{random.getrandbits(32):08x}",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": model,
+        "choices": [
+            {
+                "index": 0,
+                "message": message,
+                "finish_reason": "function_call" if "function_call" in message else "stop",
+            }
+        ],
+        "usage": {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens,
+        },
+    }
+
+
+class _Handler(BaseHTTPRequestHandler):
+    state: FakeOpenAIState = None
+    latency_ms: float = 0.0
+    jitter_ms: float = 0.0
+    model_latency_ms: dict = {}
+    rate_429: float = 0.0
+    model_rate_429: dict = {}
+    malformed_rate: float = 0.0
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, *args):
+        pass
+
+    def _send(self, status, payload, headers=None):
+        data = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        for k, v in (headers or {}).items():
+            self.send_header(k, v)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_POST(self):
+        n = int(self.headers.get("Content-Length") or 0)
+        body = json.loads(self.rfile.read(n) or b"{}")
+        if not self.path.rstrip("/").endswith("/chat/completions"):
+            return self._send(404, {"error": {"message": f"no route {self.path}"}})
+
+        model = body.get("model") or "gpt-4"
+        base = self.model_latency_ms.get(model, self.latency_ms)
+        delay = max(0.0, base + random.uniform(-self.jitter_ms, self.jitter_ms)) / 1000.0
+
+        with self.state.lock:
+            self.state.calls += 1
+            self.state.calls_by_model[model] = self.state.calls_by_model.get(model, 0) + 1
+            limited = random.random() < self.model_rate_429.get(model, self.rate_429)
+            if limited:
+                self.state.rate_limited += 1
+
+        if limited:
+            time.sleep(min(delay, 0.05))
+            return self._send(
+                429,
+                {"error": {"message": "Rate limit reached (fake)", "type": "requests", "code": "rate_limit_exceeded"}},
+                {"Retry-After": "1"},
+            )
+
+        time.sleep(delay)
+        prompt_chars = sum(len(m.get("content") or "") for m in body.get("messages", []))
+        self._send(200, _completion(model, prompt_chars, body, self.malformed_rate))
+
+
+class _Server(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        # Clients that time out (the failover harness does it on purpose) hang up mid-reply
+        if isinstance(sys.exc_info()[1], (BrokenPipeError, ConnectionResetError)):
+            return
+        super().handle_error(request, client_address)
+
+
+class FakeOpenAI:
+    def __init__(self, host="127.0.0.1", port=0, latency_ms=0.0, jitter_ms=0.0,
+                 rate_429=0.0, model_latency_ms=None, model_rate_429=None, malformed_rate=0.0):
+        self.state = FakeOpenAIState()
+        handler = type(
+            "Handler",
+            (_Handler,),
+            {
+                "state": self.state,
+                "latency_ms": latency_ms,
+                "jitter_ms": jitter_ms,
+                "rate_429": rate_429,
+                "model_latency_ms": dict(model_latency_ms or {}),
+                "model_rate_429": dict(model_rate_429 or {}),
+                "malformed_rate": malformed_rate,
+            },
+        )
+        self.httpd = _Server((host, port), handler)
+
+    @property
+    def url(self) -> str:
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    @property
+    def api_base(self) -> str:
+        return self.url + "/v1"
+
+    def start(self):
+        threading.Thread(target=self.httpd.serve_forever, name="fake-openai", daemon=True).start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
@@ -0,0 +1,384 @@
+# benchmarks/fake_supabase.py
+"""
+In-process stand-in for the parts of Supabase the app talks to:
+
+- PostgREST:  GET/POST/PATCH/DELETE /rest/v1/<table>  (eq, neq, is, lt/lte/gt/gte,
+              like/ilike, in, or=(...) with nested and(...), order, limit/offset, select, count=exact,
+              single-object Accept header, Prefer: return=representation)
+- RPC:        POST /rest/v1/rpc/set_client_uid (recorded, no-op)
+- Storage:    POST/PUT /storage/v1/object/<bucket>/<path>  (multipart "file" field)
+              GET/HEAD /storage/v1/object/[public/]<bucket>/<path>
+              DELETE   /storage/v1/object/<bucket>  ({"prefixes": [...]})
+
+Tables live in memory (dict of lists) behind one lock, which is plenty for load
+tests: the point is to remove network + Postgres variance, not to emulate it.
+Optional fixed latency per request simulates the HTTPS round trip.
+"""
+import io
+import json
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qsl, unquote, urlsplit
+
+from werkzeug.formparser import parse_form_data
+
+TABLES = (
+    "assignments",
+    "submissions",
+    "uscis_assignments",
+    "uscis_submissions",
+    "users",
+    "ai_usage_events",
+)
+
+
+class FakeSupabaseState:
+    def __init__(self, tables=TABLES):
+        self.lock = threading.Lock()
+        self.tables = {t: [] for t in tables}
+        self.objects = {}  # (bucket, path) -> (bytes, content_type)
+        self.rpc_calls = 0
+        self.requests = 0
+        self.user_jwt_requests = 0  # sent with a per-user JWT rather than the service key
+
+    def seed(self, table, rows):
+        with self.lock:
+            self.tables.setdefault(table, []).extend(dict(r) for r in rows)
+
+
+# ---------- PostgREST filter evaluation ----------
+def _coerce(raw: str, current):
+    if isinstance(current, bool) or raw in ("true", "false"):
+        return {"true": True, "false": False}.get(raw, raw)
+    if isinstance(current, (int, float)) and not isinstance(current, bool):
+        try:
+            return type(current)(raw)
+        except ValueError:
+            return raw
+    return raw
+
+
+def _split_top(s: str):
+    out, depth, cur, quoted = [], 0, "", False
+    for ch in s:
+        if ch == '"':
+            quoted = not quoted
+        elif not quoted and ch == "(":
+            depth += 1
+        elif not quoted and ch == ")":
+            depth -= 1
+        if ch == "," and depth == 0 and not quoted:
+            out.append(cur)
+            cur = ""
+        else:
+            cur += ch
+    if cur:
+        out.append(cur)
+    return out
+
+
+def _like(pattern: str, value, ci: bool) -> bool:
+    rx = "^" + re.escape(pattern).replace("%", ".*").replace("\\*", ".*").replace("_", ".") + "$"
+    return re.match(rx, str(value), re.I if ci else 0) is not None
+
+
+def _match(row: dict, column: str, expr: str) -> bool:
+    negate = False
+    if expr.startswith("not."):
+        negate, expr = True, expr[4:]
+    op, _, raw = expr.partition(".")
+    if len(raw) >= 2 and raw[0] == raw[-1] == '"':
+        raw = raw[1:-1].replace('\\"', '"')
+    val = row.get(column)
+
+    if op == "is":
+        ok = val is None if raw == "null" else val is _coerce(raw, True)
+    elif op == "in":
+        items = [v.strip().strip('"') for v in _split_top(raw.strip("()"))]
+        ok = str(val) in items or val in [_coerce(i, val) for i in items]
+    elif op in ("like", "ilike"):
+        ok = val is not None and _like(raw, val, op == "ilike")
+    elif val is None:
+        ok = False
+    else:
+        target = _coerce(raw, val)
+        try:
+            ok = {
+                "eq": val == target,
+                "neq": val != target,
+                "lt": val < target,
+                "lte": val <= target,
+                "gt": val > target,
+                "gte": val >= target,
+            }[op]
+        except (KeyError, TypeError):
+            ok = str(val) == raw if op == "eq" else False
+    return not ok if negate else ok
+
+
+def _match_cond(row: dict, cond: str) -> bool:
+    if cond.startswith("and("):
+        return all(_match_cond(row, c) for c in _split_top(cond[4:-1]))
+    if cond.startswith("or("):
+        return any(_match_cond(row, c) for c in _split_top(cond[3:-1]))
+    column, _, rest = cond.partition(".")
+    return _match(row, column, rest)
+
+
+def _match_or(row: dict, expr: str) -> bool:
+    return any(_match_cond(row, cond) for cond in _split_top(expr[1:-1] if expr.startswith("(") else expr))
+
+
+_NON_FILTER_PARAMS = {"select", "order", "limit", "offset", "columns", "on_conflict"}
+
+
+def _filter(rows, params):
+    """The stored row objects (not copies) that pass every filter param."""
+    out = rows
+    for key, value in params:
+        if key in _NON_FILTER_PARAMS:
+            continue
+        if key == "or":
+            out = [r for r in out if _match_or(r, value)]
+        else:
+            out = [r for r in out if _match(r, key, value)]
+    return out
+
+
+def _apply_query(rows, params):
+    out = _filter(rows, params)
+    order, limit, offset, select = None, None, 0, "*"
+    for key, value in params:
+        if key == "select":
+            select = value
+        elif key == "order":
+            order = value
+        elif key == "limit":
+            limit = int(value)
+        elif key == "offset":
+            offset = int(value)
+
+    if order:
+        for part in reversed(order.split(",")):
+            bits = part.split(".")
+            col, desc = bits[0], "desc" in bits[1:]
+            # PostgREST default: NULLS LAST ascending, NULLS FIRST descending
+            nulls_first = "nullsfirst" in bits[1:] or (desc and "nullslast" not in bits[1:])
+            out = sorted(
+                out,
+                key=lambda r: ((r.get(col) is None) != (nulls_first != desc),
+                               r.get(col) if r.get(col) is not None else ""),
+                reverse=desc,
+            )
+    total = len(out)
+    out = out[offset:]
+    if limit is not None:
+        out = out[:limit]
+
+    if select and select.strip() != "*":
+        cols = [c.strip() for c in select.split(",") if c.strip()]
+        out = [{c: r.get(c) for c in cols} for r in out]
+    else:
+        out = [dict(r) for r in out]
+    return out, total
+
+
+class _Handler(BaseHTTPRequestHandler):
+    state: FakeSupabaseState = None
+    latency_s: float = 0.0
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, *args):
+        pass
+
+    # ---------- plumbing ----------
+    def _body(self) -> bytes:
+        # Read once per request; unread bodies would desync keep-alive connections
+        if getattr(self, "_raw_body", None) is None:
+            n = int(self.headers.get("Content-Length") or 0)
+            self._raw_body = self.rfile.read(n) if n else b""
+        return self._raw_body
+
+    def _send(self, status, payload=None, headers=None, raw: bytes = None, ctype="application/json"):
+        data = raw if raw is not None else (b"" if payload is None else json.dumps(payload, default=str).encode())
+        self.send_response(status)
+        self.send_header("Content-Type", ctype)
+        self.send_header("Content-Length", str(len(data)))
+        for k, v in (headers or {}).items():
+            self.send_header(k, v)
+        self.end_headers()
+        if self.command != "HEAD":
+            self.wfile.write(data)
+
+    def _route(self):
+        if self.latency_s:
+            time.sleep(self.latency_s)
+        self.state.requests += 1
+        if self._jwt_role() not in (None, "service_role"):
+            self.state.user_jwt_requests += 1
+        self._raw_body = None
+        self._body()
+        parts = urlsplit(self.path)
+        params = parse_qsl(parts.query, keep_blank_values=True)
+        path = unquote(parts.path)
+        if path.startswith("/rest/v1/rpc/"):
+            return self._rpc(path.rsplit("/", 1)[-1])
+        if path.startswith("/rest/v1/"):
+            return self._rest(path[len("/rest/v1/"):], params)
+        if path.startswith("/storage/v1/object/"):
+            return self._storage(path[len("/storage/v1/object/"):])
+        return self._send(404, {"message": f"no route {path}"})
+
+    def _jwt_role(self):
+        auth = self.headers.get("Authorization") or ""
+        if not auth.startswith("Bearer "):
+            return None
+        try:
+            import jwt
+
+            return jwt.decode(auth[7:], options={"verify_signature": False}).get("role")
+        except Exception:
+            return None
+
+    do_GET = do_POST = do_PATCH = do_DELETE = do_PUT = do_HEAD = lambda self: self._route()
+
+    # ---------- handlers ----------
+    def _rpc(self, name):
+        self._body()
+        self.state.rpc_calls += 1
+        self._send(200, None if name == "set_client_uid" else {})
+
+    def _rest(self, table, params):
+        st = self.state
+        prefer = self.headers.get("Prefer", "")
+        single = "vnd.pgrst.object" in (self.headers.get("Accept") or "")
+        representation = "return=representation" in prefer or self.command == "GET"
+
+        with st.lock:
+            rows = st.tables.setdefault(table, [])
+            if self.command == "GET" or self.command == "HEAD":
+                result, total = _apply_query(rows, params)
+            elif self.command == "POST":
+                body = json.loads(self._body() or b"[]")
+                new = body if isinstance(body, list) else [body]
+                rows.extend(dict(r) for r in new)
+                result, total = [dict(r) for r in new], len(new)
+            elif self.command == "PATCH":
+                patch = json.loads(self._body() or b"{}")
+                result = []
+                for r in _filter(rows, params):
+                    r.update(patch)
+                    result.append(dict(r))
+                total = len(result)
+            elif self.command == "DELETE":
+                doomed = {id(r) for r in _filter(rows, params)}
+                result = [dict(r) for r in rows if id(r) in doomed]
+                rows[:] = [r for r in rows if id(r) not in doomed]
+                total = len(result)
+            else:
+                return self._send(405, {"message": "method not allowed"})
+
+        headers = {}
+        if "count=exact" in prefer:
+            end = max(len(result) - 1, 0)
+            headers["Content-Range"] = f"0-{end}/{total}"
+        if single:
+            if len(result) != 1:
+                return self._send(
+                    406,
+                    {"code": "PGRST116", "message": "JSON object requested, multiple (or no) rows returned",
+                     "details": f"The result contains {len(result)} rows", "hint": None},
+                )
+            return self._send(200, result[0], headers)
+        if not representation:
+            return self._send(201 if self.command == "POST" else 204, raw=b"", headers=headers)
+        self._send(201 if self.command == "POST" else 200, result, headers)
+
+    def _storage(self, rest):
+        st = self.state
+        public = rest.startswith("public/")
+        if public:
+            rest = rest[len("public/"):]
+        bucket, _, key = rest.partition("/")
+
+        if self.command in ("POST", "PUT"):
+            ctype = self.headers.get("Content-Type", "")
+            body = self._body()
+            data, file_ctype = body, ctype
+            if ctype.startswith("multipart/form-data"):
+                environ = {
+                    "REQUEST_METHOD": "POST",
+                    "CONTENT_TYPE": ctype,
+                    "CONTENT_LENGTH": str(len(body)),
+                    "wsgi.input": io.BytesIO(body),
+                }
+                _, _, files = parse_form_data(environ)
+                item = files.get("file")
+                data = item.read() if item is not None else b""
+                file_ctype = (item.mimetype if item is not None else None) or "application/octet-stream"
+            with st.lock:
+                exists = (bucket, key) in st.objects
+                if exists and self.command == "POST" and self.headers.get("x-upsert", "").lower() != "true":
+                    return self._send(400, {"statusCode": "409", "error": "Duplicate", "message": "The resource already exists"})
+                st.objects[(bucket, key)] = (data, file_ctype)
+            return self._send(200, {"Key": f"{bucket}/{key}", "Id": key})
+
+        if self.command in ("GET", "HEAD"):
+            with st.lock:
+                obj = st.objects.get((bucket, key))
+            if obj is None:
+                return self._send(404, {"statusCode": "404", "error": "not_found", "message": "Object not found"})
+            return self._send(200, raw=obj[0], ctype=obj[1])
+
+        if self.command == "DELETE":
+            # storage3 remove(): DELETE /object/<bucket> {"prefixes": [...]}
+            body = json.loads(self._body() or b"{}")
+            keys = body.get("prefixes") or ([key] if key else [])
+            with st.lock:
+                removed = [k for k in keys if st.objects.pop((bucket, k), None) is not None]
+            return self._send(200, [{"name": k, "bucket_id": bucket} for k in removed])
+        return self._send(405, {"message": "method not allowed"})
+
+
+class FakeSupabase:
+    """
+    with FakeSupabase(latency_ms=20) as fake:
+        os.environ["SUPABASE_URL"] = fake.url
+    """
+
+    def __init__(self, host="127.0.0.1", port=0, latency_ms=0.0, state=None):
+        self.state = state or FakeSupabaseState()
+        handler = type("Handler", (_Handler,), {"state": self.state, "latency_s": latency_ms / 1000.0})
+        self.httpd = ThreadingHTTPServer((host, port), handler)
+        self.httpd.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self) -> str:
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def public_url(self, bucket: str, path: str) -> str:
+        return f"{self.url}/storage/v1/object/public/{bucket}/{path}"
+
+    def put_object(self, bucket: str, path: str, data: bytes, content_type="application/octet-stream"):
+        with self.state.lock:
+            self.state.objects[(bucket, path)] = (data, content_type)
+        return self.public_url(bucket, path)
+
+    def start(self):
+        self._thread = threading.Thread(target=self.httpd.serve_forever, name="fake-supabase", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
@@ -0,0 +1,398 @@
+# benchmarks/load_test.py
+"""
+Deadline-traffic load test against local Supabase + OpenAI stand-ins.
+
+    python -m benchmarks.load_test --concurrency 20 --duration 30 \
+        --llm-latency-ms 4000 --llm-jitter-ms 1500 --rate-429 0.02 --db-latency-ms 15
+
+By default this boots the fakes, seeds them, starts the Flask app in-process on
+a threaded WSGI server and replays a weighted mix of:
+
+    grade_docx        POST /grade-docx?slug=...      (docx upload or inline text)
+    grade_uscis_form  POST /grade-uscis-form          (PDF upload)
+    dashboards        GET  /grader, /grader-submissions, /grader-assignments,
+                           /nomas-dashboard, /nomas-training-dashboard
+
+Use --target http://host:port to drive an already-running app instead (start
+it with the env printed by `python -m benchmarks.serve_fakes`).
+
+Reports throughput and p50/p95/p99 per route; --json writes the same numbers
+to a file so runs can be diffed.
+"""
+import argparse
+import io
+import json
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+from collections import defaultdict
+
+import requests
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+
+from benchmarks.fake_openai import FakeOpenAI  # noqa: E402
+from benchmarks.fake_supabase import FakeSupabase  # noqa: E402
+
+DASHBOARD_PATHS = (
+    "/grader",
+    "/grader-submissions",
+    "/grader-assignments",
+    "/nomas-dashboard",
+    "/nomas-training-dashboard",
+)
+USCIS_TITLE = "form n-400"
+GRADER_PASSWORD = "bench-password"
+
+ESSAY_WORDS = (
+    "the argument evidence claim however therefore student analysis reasoning "
+    "paragraph thesis conclusion source context example counterpoint data"
+).split()
+
+
+# ---------- fixtures ----------
+def make_essay(words: int) -> str:
+    rnd = random.Random(words)
+    sentences, cur = [], []
+    for _ in range(words):
+        cur.append(rnd.choice(ESSAY_WORDS))
+        if len(cur) >= 14:
+            sentences.append(" ".join(cur).capitalize() + ".")
+            cur = []
+    if cur:
+        sentences.append(" ".join(cur).capitalize() + ".")
+    return " ".join(sentences)
+
+
+def make_docx(words: int) -> bytes:
+    from docx import Document
+
+    doc = Document()
+    text = make_essay(words)
+    chunk = 120
+    tokens = text.split()
+    for i in range(0, len(tokens), chunk):
+        doc.add_paragraph(" ".join(tokens[i:i + chunk]))
+    buf = io.BytesIO()
+    doc.save(buf)
+    return buf.getvalue()
+
+
+def make_pdf() -> bytes:
+    try:
+        import fitz  # PyMuPDF
+
+        doc = fitz.open()
+        page = doc.new_page()
+        page.insert_text((72, 72), "N-400 practice form")
+        return doc.tobytes()
+    except Exception:
+        # Smallest valid-enough PDF for code paths that only check the extension
+        return b"%PDF-1.4\n1 0 obj<<>>endobj\ntrailer<<>>\n%%EOF\n"
+
+
+FAKE_JWT_SECRET = "fake-jwt-secret-for-benchmarks-only"
+
+
+def fake_service_key() -> str:
+    import jwt
+
+    return jwt.encode({"role": "service_role", "iss": "benchmarks"}, FAKE_JWT_SECRET, algorithm="HS256")
+
+
+def seed(fake: FakeSupabase, assignments: int, history: int):
+    rubric = {
+        "criteria": [
+            {"description": "Clear thesis", "max_points": 25},
+            {"description": "Evidence and reasoning", "max_points": 40},
+            {"description": "Organization", "max_points": 20},
+            {"description": "Mechanics", "max_points": 15},
+        ]
+    }
+    rubric_url = fake.put_object("rubrics", "bench/rubric.json", json.dumps(rubric).encode(), "application/json")
+    answer_key = {f"Page1_Field_{i}": f"value {i}" for i in range(60)}
+    key_url = fake.put_object("rubrics", "bench/n400_key.json", json.dumps(answer_key).encode(), "application/json")
+
+    now = time.time()
+    iso = lambda t: time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime(t)) + "Z"
+
+    rows = []
+    for i in range(assignments):
+        rows.append(
+            {
+                "assignment_id": f"a_bench{i:04d}",
+                "assignment_title": f"Bench Essay {i}",
+                "display_title": f"Bench Essay {i}",
+                "slug": f"bench-essay-{i}",
+                "tool": "grader",
+                "institution_id": None,
+                "course_id": "demo_course",
+                "created_at": iso(now - i * 60),
+                "rubric_file": rubric_url,
+                "gpt_model": "gpt-4",
+                "total_points": 100,
+                "delay_posting": "immediate",
+                "instructor_approval": False,
+            }
+        )
+    fake.state.seed("assignments", rows)
+    fake.state.seed(
+        "uscis_assignments",
+        [
+            {
+                "assignment_id": "a_benchn400",
+                "assignment_title": USCIS_TITLE,
+                "form_type": "n400",
+                "institution_id": None,
+                "course_id": "demo_course",
+                "created_at": iso(now),
+                "answer_key_file": key_url,
+                "rubric_file": key_url,
+                "gpt_model": "json",
+                "delay_posting": "immediate",
+            }
+        ],
+    )
+    subs = []
+    for i in range(history):
+        subs.append(
+            {
+                "submission_id": f"00000000-0000-4000-8000-{i:012d}",
+                "tool": "grader",
+                "student_id": "00000000-0000-0000-0000-000000000001",
+                "assignment_title": f"Bench Essay {i % max(assignments, 1)}",
+                "institution_id": None,
+                "course_id": "demo_course",
+                "submission_time": iso(now - i),
+                "score": random.randint(50, 100),
+                "feedback": "ok",
+                "pending": i % 3 == 0,
+                "reviewed": i % 3 != 0,
+                "ready_to_post": False,
+                "student_text": make_essay(200),
+            }
+        )
+    fake.state.seed("submissions", subs)
+
+
+# ---------- app under test ----------
+def start_app_in_process(env: dict, workdir: str):
+    os.environ.update(env)
+    os.makedirs(os.path.join(workdir, "data"), exist_ok=True)
+    os.chdir(workdir)
+
+    import main  # noqa: F401  (reads env at import time)
+    from werkzeug.serving import WSGIRequestHandler, make_server
+
+    class QuietHandler(WSGIRequestHandler):
+        def log_request(self, *args, **kwargs):
+            pass
+
+    server = make_server("127.0.0.1", 0, main.app, threaded=True, request_handler=QuietHandler)
+    threading.Thread(target=server.serve_forever, name="app-under-test", daemon=True).start()
+    host, port = server.server_address[:2]
+    return f"http://{host}:{port}", server
+
+
+# ---------- virtual users ----------
+class Recorder:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.samples = defaultdict(list)  # route -> [(latency_s, status)]
+
+    def add(self, route, latency, status):
+        with self.lock:
+            self.samples[route].append((latency, status))
+
+
+def student_session(base: str, title: str) -> requests.Session:
+    s = requests.Session()
+    s.get(f"{base}/student-demo", params={"title": title}, timeout=30)
+    return s
+
+
+def instructor_session(base: str) -> requests.Session:
+    s = requests.Session()
+    s.post(f"{base}/rubiqs-suite-login", data={"username": "bench@local", "password": GRADER_PASSWORD}, timeout=30)
+    return s
+
+
+def run_load(base, concurrency, duration, max_requests, mix, assignments, essay_words, rec: Recorder):
+    docx_bytes = make_docx(essay_words)
+    pdf_bytes = make_pdf()
+    inline_text = make_essay(essay_words)
+    routes, weights = zip(*mix.items())
+    deadline = time.perf_counter() + duration
+    issued = [0]
+    issued_lock = threading.Lock()
+
+    def take() -> bool:
+        with issued_lock:
+            if max_requests and issued[0] >= max_requests:
+                return False
+            issued[0] += 1
+        return time.perf_counter() < deadline
+
+    def worker(n):
+        rnd = random.Random(n)
+        essay = student_session(base, "")
+        uscis = student_session(base, USCIS_TITLE)
+        staff = instructor_session(base)
+        while take():
+            route = rnd.choices(routes, weights)[0]
+            t0 = time.perf_counter()
+            try:
+                if route == "grade_docx":
+                    slug = f"bench-essay-{rnd.randrange(assignments)}"
+                    if rnd.random() < 0.7:
+                        files = {"file": ("essay.docx", docx_bytes)}
+                        r = essay.post(f"{base}/grade-docx", params={"slug": slug}, files=files, timeout=300)
+                    else:
+                        r = essay.post(f"{base}/grade-docx", params={"slug": slug},
+                                       data={"inline_text": inline_text}, timeout=300)
+                elif route == "grade_uscis_form":
+                    files = {"file": ("n400.pdf", pdf_bytes, "application/pdf")}
+                    r = uscis.post(f"{base}/grade-uscis-form", files=files, timeout=300)
+                else:
+                    r = staff.get(base + rnd.choice(DASHBOARD_PATHS), timeout=120)
+                status = r.status_code
+            except requests.RequestException:
+                status = 0
+            rec.add(route, time.perf_counter() - t0, status)
+
+    threads = [threading.Thread(target=worker, args=(i,), daemon=True) for i in range(concurrency)]
+    t0 = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return time.perf_counter() - t0
+
+
+# ---------- reporting ----------
+def percentile(sorted_vals, p):
+    if not sorted_vals:
+        return 0.0
+    k = max(0, min(len(sorted_vals) - 1, int(round(p / 100.0 * len(sorted_vals) + 0.5)) - 1))
+    return sorted_vals[k]
+
+
+def summarize(rec: Recorder, wall_s: float) -> dict:
+    out = {"wall_s": round(wall_s, 3), "routes": {}}
+    everything = []
+    for route, samples in sorted(rec.samples.items()):
+        lat = sorted(s[0] for s in samples)
+        everything.extend(lat)
+        statuses = defaultdict(int)
+        for _, st in samples:
+            statuses[str(st)] += 1
+        out["routes"][route] = {
+            "n": len(samples),
+            "rps": round(len(samples) / wall_s, 2) if wall_s else 0.0,
+            "p50_ms": round(percentile(lat, 50) * 1000, 1),
+            "p95_ms": round(percentile(lat, 95) * 1000, 1),
+            "p99_ms": round(percentile(lat, 99) * 1000, 1),
+            "max_ms": round(lat[-1] * 1000, 1) if lat else 0.0,
+            "status": dict(statuses),
+        }
+    everything.sort()
+    out["total"] = {
+        "n": len(everything),
+        "rps": round(len(everything) / wall_s, 2) if wall_s else 0.0,
+        "p50_ms": round(percentile(everything, 50) * 1000, 1),
+        "p95_ms": round(percentile(everything, 95) * 1000, 1),
+        "p99_ms": round(percentile(everything, 99) * 1000, 1),
+    }
+    return out
+
+
+def print_report(summary: dict):
+    hdr = f"{'route':<18}{'n':>7}{'rps':>9}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}  status"
+    print(hdr)
+    print("-" * len(hdr))
+    for route, r in summary["routes"].items():
+        print(f"{route:<18}{r['n']:>7}{r['rps']:>9}{r['p50_ms']:>10}{r['p95_ms']:>10}{r['p99_ms']:>10}  {r['status']}")
+    t = summary["total"]
+    print("-" * len(hdr))
+    print(f"{'total':<18}{t['n']:>7}{t['rps']:>9}{t['p50_ms']:>10}{t['p95_ms']:>10}{t['p99_ms']:>10}")
+    print(f"wall time: {summary['wall_s']}s")
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--target", help="Drive an existing app instead of starting one in-process")
+    ap.add_argument("--concurrency", type=int, default=20)
+    ap.add_argument("--duration", type=float, default=30.0, help="seconds")
+    ap.add_argument("--requests", type=int, default=0, help="stop after N requests (0 = duration only)")
+    ap.add_argument("--assignments", type=int, default=20)
+    ap.add_argument("--history", type=int, default=2000, help="pre-seeded submissions for dashboards")
+    ap.add_argument("--essay-words", type=int, default=1200)
+    ap.add_argument("--mix", default="grade_docx=55,grade_uscis_form=15,dashboards=30")
+    ap.add_argument("--db-latency-ms", type=float, default=10.0)
+    ap.add_argument("--llm-latency-ms", type=float, default=3000.0)
+    ap.add_argument("--llm-jitter-ms", type=float, default=1000.0)
+    ap.add_argument("--rate-429", type=float, default=0.0)
+    ap.add_argument("--rls-jwt", action="store_true",
+                    help="mint per-user RLS JWTs (SUPABASE_JWT_SECRET) instead of the set_client_uid RPC")
+    ap.add_argument("--json", help="write the summary to this file")
+    args = ap.parse_args(argv)
+    if args.json:
+        args.json = os.path.abspath(args.json)  # the in-process app chdirs to a temp dir
+
+    mix = {k: float(v) for k, v in (p.split("=") for p in args.mix.split(","))}
+
+    fake_db = FakeSupabase(latency_ms=args.db_latency_ms).start()
+    fake_llm = FakeOpenAI(
+        latency_ms=args.llm_latency_ms, jitter_ms=args.llm_jitter_ms, rate_429=args.rate_429
+    ).start()
+    seed(fake_db, args.assignments, args.history)
+
+    base, server = args.target, None
+    if not base:
+        env = {
+            "SUPABASE_URL": fake_db.url,
+            "SUPABASE_SERVICE_ROLE_KEY": fake_service_key(),
+            "SUPABASE_PROJECT_ID": fake_db.url.split("://", 1)[1],
+            "OPENAI_API_KEY": "sk-fake",
+            "OPENAI_API_BASE": fake_llm.api_base,
+            "GRADER_PASSWORD": GRADER_PASSWORD,
+            "DEV_INSECURE_COOKIES": "1",
+            "LOG_LEVEL": os.getenv("LOG_LEVEL", "WARNING"),
+            "AI_USAGE_SINK": "none",
+        }
+        if args.rls_jwt:
+            env["SUPABASE_JWT_SECRET"] = FAKE_JWT_SECRET
+        base, server = start_app_in_process(env, tempfile.mkdtemp(prefix="rubiqs-bench-"))
+
+    rec = Recorder()
+    wall = run_load(base, args.concurrency, args.duration, args.requests, mix, args.assignments,
+                    args.essay_words, rec)
+    summary = summarize(rec, wall)
+    summary["config"] = vars(args)
+    summary["fakes"] = {
+        "db_requests": fake_db.state.requests,
+        "rpc_calls": fake_db.state.rpc_calls,
+        "user_jwt_requests": fake_db.state.user_jwt_requests,
+        "llm_calls": fake_llm.state.calls,
+        "llm_429": fake_llm.state.rate_limited,
+    }
+    print_report(summary)
+    print("fakes:", summary["fakes"])
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(summary, f, indent=2)
+
+    if server is not None:
+        server.shutdown()
+    fake_db.stop()
+    fake_llm.stop()
+    return summary
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,245 @@
+# benchmarks/micro.py
+"""
+Micro-benchmarks for the CPU-bound grading helpers.
+
+    python -m benchmarks.micro                 # run + compare with the saved baseline
+    python -m benchmarks.micro --save          # run + overwrite the baseline
+    python -m benchmarks.micro -k compare      # only benchmarks whose name contains "compare"
+
+Inputs are synthetic and seeded: PDF-form field dicts of 100/1000/5000 fields
+and essays of 1k/10k/50k words. Each case is timed like pytest-benchmark does
+(calibrate a loop count to ~--min-time seconds, take the best of --rounds) and
+reported in microseconds per call.
+
+Baselines live in benchmarks/baselines/micro.json. Any case slower than the
+baseline by more than --tolerance (default 25%) is flagged and the exit status
+is 1, so this can gate a local pre-push hook. Baselines are machine-specific;
+re-save them when you change hardware.
+"""
+import argparse
+import io
+import json
+import os
+import platform
+import random
+import sys
+import time
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+
+from app.utils.grading_functions import (  # noqa: E402
+    _compare_generic,
+    compare_answer_key_fields,
+    group_radio_fields,
+    parse_rubric,
+    parse_score_feedback,
+)
+from app.utils.slug import slugify  # noqa: E402
+from app.utils.text_utils import normalize_title  # noqa: E402
+
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baselines", "micro.json")
+FORM_SIZES = (100, 1000, 5000)
+ESSAY_SIZES = (1000, 10000, 50000)
+
+WORDS = (
+    "the argument evidence claim however therefore student analysis reasoning "
+    "paragraph thesis conclusion source context example counterpoint data "
+    "résumé naïve café"
+).split()
+
+
+# ---------- fixtures ----------
+def make_form(n_fields: int, seed: int = 0):
+    """
+    (student_fields, answer_key) shaped like a USCIS PDF export: radio groups of
+    3 options ("Off" unless picked), some text fields left blank, some wrong.
+    """
+    rnd = random.Random(seed + n_fields)
+    student, key = {}, {}
+    i = 0
+    while len(key) < n_fields:
+        page = i // 40 + 1
+        if i % 5 == 0:
+            base = f"Page{page}_Choice{i}"
+            picked = rnd.randint(1, 3)
+            for opt in range(1, 4):
+                student[f"{base}_{opt}"] = "On" if opt == picked else "Off"
+            key[f"{base}_1"] = "on"
+        else:
+            name = f"Page{page}_Line{i}_Text"
+            value = " ".join(rnd.choices(WORDS, k=rnd.randint(1, 4)))
+            roll = rnd.random()
+            student[name] = "" if roll < 0.1 else (value.upper() if roll < 0.2 else value)
+            key[name] = value if roll < 0.9 else {"expected": value, "match": "contains"}
+        i += 1
+    return student, key
+
+
+def make_essay(words: int) -> str:
+    rnd = random.Random(words)
+    out = []
+    for n in range(words):
+        out.append(rnd.choice(WORDS))
+        if n % 120 == 119:
+            out.append("\n\n")
+        elif n % 15 == 14:
+            out.append(".  ")
+    return " ".join(out)
+
+
+def make_completion(words: int) -> str:
+    return f"Score: 87\nFeedback: {make_essay(words)}"
+
+
+def make_json_rubric(criteria: int) -> bytes:
+    return json.dumps(
+        {
+            "criteria": [
+                {"description": f"Criterion {i}: " + " ".join(WORDS[i % 7 : i % 7 + 6]), "max_points": 1 + i % 5}
+                for i in range(criteria)
+            ]
+        }
+    ).encode()
+
+
+def make_docx_rubric(words: int) -> bytes:
+    from docx import Document
+
+    doc = Document()
+    for para in make_essay(words).split("\n\n"):
+        doc.add_paragraph(para)
+    buf = io.BytesIO()
+    doc.save(buf)
+    return buf.getvalue()
+
+
+# ---------- cases ----------
+def build_cases():
+    """[(name, fn, args)] — fixtures are built once, outside the timed loop."""
+    cases = []
+    for n in FORM_SIZES:
+        student, key = make_form(n)
+        flat_key = {k: (v["expected"] if isinstance(v, dict) else v) for k, v in key.items()}
+        cases.append((f"compare_generic[{n}]", _compare_generic, (student, flat_key)))
+        cases.append((f"compare_answer_key_fields[{n}]", compare_answer_key_fields, (student, key)))
+        cases.append((f"group_radio_fields[{n}]", group_radio_fields, (student,)))
+        cases.append((f"parse_rubric_json[{n}]", parse_rubric, (make_json_rubric(n), "rubric.json")))
+
+    for w in ESSAY_SIZES:
+        essay = make_essay(w)
+        cases.append((f"slugify[{w}w]", slugify, (essay,)))
+        cases.append((f"normalize_title[{w}w]", normalize_title, (essay,)))
+        cases.append((f"parse_score_feedback[{w}w]", parse_score_feedback, (make_completion(w),)))
+        cases.append((f"parse_rubric_docx[{w}w]", parse_rubric, (make_docx_rubric(w), "rubric.docx")))
+    return cases
+
+
+# ---------- timing ----------
+def time_case(fn, args, min_time: float, rounds: int) -> dict:
+    loops = 1
+    while True:
+        t0 = time.perf_counter()
+        for _ in range(loops):
+            fn(*args)
+        dt = time.perf_counter() - t0
+        if dt >= min_time or loops >= 1_000_000:
+            break
+        loops = max(loops * 2, int(loops * min_time / max(dt, 1e-9)))
+
+    samples = []
+    for _ in range(rounds):
+        t0 = time.perf_counter()
+        for _ in range(loops):
+            fn(*args)
+        samples.append((time.perf_counter() - t0) / loops)
+    samples.sort()
+    return {
+        "min_us": round(samples[0] * 1e6, 3),
+        "median_us": round(samples[len(samples) // 2] * 1e6, 3),
+        "loops": loops,
+        "rounds": rounds,
+    }
+
+
+def load_baseline(path):
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        return json.load(f)
+
+
+def compare(results: dict, baseline: dict, tolerance: float):
+    """[(name, base_us, now_us, ratio)] for cases slower than baseline * (1 + tolerance)."""
+    regressions = []
+    for name, r in results.items():
+        b = (baseline.get("results") or {}).get(name)
+        if not b:
+            continue
+        ratio = r["min_us"] / b["min_us"] if b["min_us"] else 1.0
+        if ratio > 1.0 + tolerance:
+            regressions.append((name, b["min_us"], r["min_us"], ratio))
+    return regressions
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("-k", dest="filter", default="", help="only run cases whose name contains this")
+    ap.add_argument("--min-time", type=float, default=0.1, help="seconds per round (default 0.1)")
+    ap.add_argument("--rounds", type=int, default=5)
+    ap.add_argument("--baseline", default=BASELINE_PATH)
+    ap.add_argument("--save", action="store_true", help="write results as the new baseline")
+    ap.add_argument("--tolerance", type=float, default=0.25, help="allowed slowdown vs baseline (0.25 = 25%%)")
+    args = ap.parse_args(argv)
+
+    baseline = load_baseline(args.baseline)
+    base_results = (baseline or {}).get("results") or {}
+
+    results = {}
+    print(f"{'case':<36} {'min µs':>12} {'median µs':>12} {'baseline':>12} {'Δ':>8}")
+    for name, fn, fargs in build_cases():
+        if args.filter and args.filter not in name:
+            continue
+        r = time_case(fn, fargs, args.min_time, args.rounds)
+        results[name] = r
+        b = base_results.get(name)
+        delta = f"{(r['min_us'] / b['min_us'] - 1) * 100:+.0f}%" if b and b["min_us"] else ""
+        base = f"{b['min_us']:.1f}" if b else "-"
+        print(f"{name:<36} {r['min_us']:>12.1f} {r['median_us']:>12.1f} {base:>12} {delta:>8}")
+
+    if args.save:
+        merged = dict(base_results) if args.filter else {}
+        merged.update(results)
+        os.makedirs(os.path.dirname(args.baseline), exist_ok=True)
+        with open(args.baseline, "w") as f:
+            json.dump(
+                {
+                    "python": platform.python_version(),
+                    "machine": platform.machine(),
+                    "saved_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+                    "results": dict(sorted(merged.items())),
+                },
+                f,
+                indent=2,
+            )
+            f.write("\n")
+        print(f"\nSaved baseline -> {args.baseline}")
+        return 0
+
+    if baseline is None:
+        print("\nNo baseline yet; run with --save to create one.")
+        return 0
+
+    regressions = compare(results, baseline, args.tolerance)
+    if regressions:
+        print(f"\n{len(regressions)} regression(s) over {args.tolerance:.0%}:")
+        for name, b, now, ratio in regressions:
+            print(f"  {name}: {b:.1f} -> {now:.1f} µs ({ratio:.2f}x)")
+        return 1
+    print("\nNo regressions.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,62 @@
+# benchmarks/serve_fakes.py
+"""
+Run the Supabase + OpenAI stand-ins as standalone servers and print the env
+needed to point a real app process (gunicorn, the ASGI app, ...) at them:
+
+    python -m benchmarks.serve_fakes --db-port 54321 --llm-port 54322 --llm-latency-ms 3000
+    # then paste the printed `export ...` lines into the shell that starts the app
+"""
+import argparse
+import os
+import sys
+import time
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+
+from benchmarks.fake_openai import FakeOpenAI  # noqa: E402
+from benchmarks.fake_supabase import FakeSupabase  # noqa: E402
+from benchmarks.load_test import GRADER_PASSWORD, fake_service_key, seed  # noqa: E402
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--db-port", type=int, default=54321)
+    ap.add_argument("--llm-port", type=int, default=54322)
+    ap.add_argument("--db-latency-ms", type=float, default=10.0)
+    ap.add_argument("--llm-latency-ms", type=float, default=3000.0)
+    ap.add_argument("--llm-jitter-ms", type=float, default=1000.0)
+    ap.add_argument("--rate-429", type=float, default=0.0)
+    ap.add_argument("--assignments", type=int, default=20)
+    ap.add_argument("--history", type=int, default=2000)
+    args = ap.parse_args(argv)
+
+    db = FakeSupabase(port=args.db_port, latency_ms=args.db_latency_ms).start()
+    llm = FakeOpenAI(
+        port=args.llm_port,
+        latency_ms=args.llm_latency_ms,
+        jitter_ms=args.llm_jitter_ms,
+        rate_429=args.rate_429,
+    ).start()
+    seed(db, args.assignments, args.history)
+
+    print(f"export SUPABASE_URL={db.url}")
+    print(f"export SUPABASE_SERVICE_ROLE_KEY={fake_service_key()}")
+    print(f"export SUPABASE_PROJECT_ID={db.url.split('://', 1)[1]}")
+    print("export OPENAI_API_KEY=sk-fake")
+    print(f"export OPENAI_API_BASE={llm.api_base}")
+    print(f"export GRADER_PASSWORD={GRADER_PASSWORD}")
+    print("export DEV_INSECURE_COOKIES=1")
+    sys.stdout.flush()
+
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        db.stop()
+        llm.stop()
+
+
+if __name__ == "__main__":
+    main()
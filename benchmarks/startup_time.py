@@ -0,0 +1,93 @@
+# benchmarks/startup_time.py
+"""
+Cold-start budget check for the web app.
+
+    python -m benchmarks.startup_time                  # median of 5 cold imports vs 1.0s budget
+    python -m benchmarks.startup_time --budget 0.6 --runs 9
+
+Each run is a fresh interpreter doing `import main` (which builds the app
+through create_app()), so nothing is cached between runs except the OS page
+cache and .pyc files (one warm-up run is discarded). The same child also
+checks that none of LAZY_MODULES were imported: those are only loaded by the
+requests that need them, and one sneaking back into an import-time path is
+the usual way startup regresses.
+
+Exit status is 1 if the median is over --budget or a lazy module was
+imported at startup, so this can gate a local pre-push hook like
+benchmarks/micro.py. Supabase/OpenAI settings are dummies; nothing is
+contacted.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+DEFAULT_BUDGET_SECONDS = 1.0
+LAZY_MODULES = ("supabase", "postgrest", "openai", "docx", "requests_oauthlib", "requests", "pyarrow", "psycopg2")
+
+_CHILD = """
+import json, sys, time
+t0 = time.perf_counter()
+import main
+elapsed = time.perf_counter() - t0
+print(json.dumps({"seconds": elapsed, "loaded": [m for m in %r if m in sys.modules]}))
+""" % (LAZY_MODULES,)
+
+
+def _env() -> dict:
+    env = dict(os.environ)
+    env.update(
+        SUPABASE_URL="http://127.0.0.1:9",
+        SUPABASE_SERVICE_ROLE_KEY="startup-check",
+        OPENAI_API_KEY="sk-startup-check",
+        LOG_LEVEL="WARNING",
+    )
+    return env
+
+
+def measure_once() -> dict:
+    out = subprocess.run(
+        [sys.executable, "-c", _CHILD],
+        cwd=PROJECT_ROOT,
+        env=_env(),
+        capture_output=True,
+        text=True,
+        timeout=120,
+    )
+    if out.returncode != 0:
+        raise RuntimeError(f"import main failed:\n{out.stderr}")
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--budget", type=float, default=float(os.getenv("STARTUP_BUDGET_SECONDS", DEFAULT_BUDGET_SECONDS)))
+    ap.add_argument("--runs", type=int, default=5)
+    args = ap.parse_args(argv)
+
+    measure_once()  # warm-up: compiles .pyc, fills the page cache
+    results = [measure_once() for _ in range(max(1, args.runs))]
+    times = [r["seconds"] for r in results]
+    median = statistics.median(times)
+    loaded = sorted({m for r in results for m in r["loaded"]})
+
+    print(f"import main: median {median * 1000:.0f} ms, min {min(times) * 1000:.0f} ms, "
+          f"max {max(times) * 1000:.0f} ms over {len(times)} runs (budget {args.budget * 1000:.0f} ms)")
+    failed = False
+    if median > args.budget:
+        print(f"❌ over budget by {(median - args.budget) * 1000:.0f} ms")
+        failed = True
+    if loaded:
+        print(f"❌ imported at startup (should be lazy): {', '.join(loaded)}")
+        failed = True
+    if not failed:
+        print("✅ within budget")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,29 @@
+# gunicorn.conf.py  —  gunicorn -c gunicorn.conf.py main:app
+#
+# The app is imported once in the master (preload_app) and forked into the
+# workers, so route modules and templates are loaded once and shared
+# copy-on-write. Nothing with a socket or a thread is created at import
+# time; the Supabase client, background pool, usage flusher and event tail
+# are created on first use in each worker (and post_fork drops anything the
+# master did create), so workers never share connections.
+import os
+
+bind = os.getenv("GUNICORN_BIND", f"0.0.0.0:{os.getenv('PORT', '5050')}")
+workers = int(os.getenv("WEB_CONCURRENCY", "2"))
+threads = int(os.getenv("GUNICORN_THREADS", "8"))
+timeout = int(os.getenv("GUNICORN_TIMEOUT", "120"))
+preload_app = os.getenv("GUNICORN_PRELOAD", "1") == "1"
+
+
+def post_fork(server, worker):
+    from app.supabase_client import supabase
+
+    supabase.reset()
+
+
+def worker_exit(server, worker):
+    from app.utils.ai_usage_logger import flush_ai_usage
+    from app.utils.logger import shutdown_logging
+
+    flush_ai_usage()
+    shutdown_logging()
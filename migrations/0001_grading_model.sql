@@ -0,0 +1,6 @@
+-- Model that actually produced the grade (primary or a fallback tier).
+ALTER TABLE public.submissions ADD COLUMN IF NOT EXISTS grading_model text;
+ALTER TABLE public.uscis_submissions ADD COLUMN IF NOT EXISTS grading_model text;
+
+-- Optional per-assignment fallback chain, e.g. '{gpt-4o-mini,gpt-3.5-turbo}'.
+ALTER TABLE public.assignments ADD COLUMN IF NOT EXISTS fallback_models text[];
@@ -0,0 +1,4 @@
+-- Per-criterion points from structured grading:
+-- [{"criterion": 1, "description": "...", "points": 18, "max_points": 25, "comment": "..."}, ...]
+ALTER TABLE public.submissions ADD COLUMN IF NOT EXISTS criterion_scores jsonb;
+ALTER TABLE public.uscis_submissions ADD COLUMN IF NOT EXISTS criterion_scores jsonb;
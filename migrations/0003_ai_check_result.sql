@@ -0,0 +1,3 @@
+-- Near-duplicate check written at insert by the local MinHash index:
+-- {"method": "minhash", "threshold": 0.8, "flagged": bool, "matches": [{"submission_id", "similarity"}]}
+ALTER TABLE public.submissions ADD COLUMN IF NOT EXISTS ai_check_result jsonb;
@@ -0,0 +1,117 @@
+-- Per-assignment grade aggregates, maintained by trigger on every insert,
+-- score/review change and delete of public.submissions (see app/utils/grade_stats.py).
+--
+-- Scope keys are '' instead of NULL so legacy unscoped rows share one key.
+-- histogram[i] counts scored submissions with score/total_points in
+-- [10*i %, 10*(i+1) %); the last bucket also takes 100 % and above.
+-- Percentages use the assignment's total_points when the row is counted
+-- (100 if unknown); refresh_assignment_stats() rebuilds everything from scratch
+-- if totals are edited afterwards.
+CREATE TABLE IF NOT EXISTS public.assignment_stats (
+    institution_key  text        NOT NULL DEFAULT '',
+    course_key       text        NOT NULL DEFAULT '',
+    assignment_title text        NOT NULL,
+    submissions      integer     NOT NULL DEFAULT 0,
+    scored           integer     NOT NULL DEFAULT 0,
+    pending          integer     NOT NULL DEFAULT 0,
+    score_sum        numeric     NOT NULL DEFAULT 0,
+    histogram        integer[]   NOT NULL DEFAULT array_fill(0, ARRAY[10]),
+    total_points     numeric,
+    updated_at       timestamptz NOT NULL DEFAULT now(),
+    PRIMARY KEY (institution_key, course_key, assignment_title)
+);
+
+-- SECURITY DEFINER: the trigger fires under the writer's RLS role, which
+-- need not be allowed to write the summary table itself.
+CREATE OR REPLACE FUNCTION public._assignment_stats_apply(r public.submissions, delta integer)
+RETURNS void
+LANGUAGE plpgsql
+SECURITY DEFINER
+SET search_path = public
+AS $$
+DECLARE
+    total  numeric;
+    bucket integer;
+    hist   integer[] := array_fill(0, ARRAY[10]);
+BEGIN
+    IF r.assignment_title IS NULL OR coalesce(r.tool, 'grader') <> 'grader' THEN
+        RETURN;
+    END IF;
+
+    SELECT NULLIF(a.total_points::text, '')::numeric INTO total
+    FROM public.assignments a
+    WHERE a.assignment_title = r.assignment_title AND a.tool = 'grader'
+    ORDER BY a.created_at DESC
+    LIMIT 1;
+    total := coalesce(NULLIF(total, 0), 100);
+
+    IF r.score IS NOT NULL THEN
+        bucket := least(greatest(floor(r.score * 10 / total)::integer, 0), 9);
+        hist[bucket + 1] := delta;
+    END IF;
+
+    INSERT INTO public.assignment_stats AS s
+        (institution_key, course_key, assignment_title, submissions, scored, pending,
+         score_sum, histogram, total_points, updated_at)
+    VALUES (
+        coalesce(r.institution_id::text, ''),
+        coalesce(r.course_id::text, ''),
+        r.assignment_title,
+        delta,
+        CASE WHEN r.score IS NULL THEN 0 ELSE delta END,
+        CASE WHEN coalesce(r.reviewed, false) THEN 0 ELSE delta END,
+        coalesce(r.score, 0) * delta,
+        hist,
+        total,
+        now()
+    )
+    ON CONFLICT (institution_key, course_key, assignment_title) DO UPDATE SET
+        submissions  = s.submissions + EXCLUDED.submissions,
+        scored       = s.scored + EXCLUDED.scored,
+        pending      = s.pending + EXCLUDED.pending,
+        score_sum    = s.score_sum + EXCLUDED.score_sum,
+        histogram    = ARRAY(
+            SELECT s.histogram[i] + EXCLUDED.histogram[i] FROM generate_series(1, 10) AS i
+        ),
+        total_points = EXCLUDED.total_points,
+        updated_at   = now();
+END;
+$$;
+
+CREATE OR REPLACE FUNCTION public._assignment_stats_trigger()
+RETURNS trigger
+LANGUAGE plpgsql
+AS $$
+BEGIN
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        PERFORM public._assignment_stats_apply(OLD, -1);
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        PERFORM public._assignment_stats_apply(NEW, 1);
+    END IF;
+    RETURN NULL;
+END;
+$$;
+
+DROP TRIGGER IF EXISTS submissions_assignment_stats ON public.submissions;
+CREATE TRIGGER submissions_assignment_stats
+    AFTER INSERT OR DELETE OR UPDATE OF score, reviewed, assignment_title, institution_id, course_id, tool
+    ON public.submissions
+    FOR EACH ROW EXECUTE FUNCTION public._assignment_stats_trigger();
+
+CREATE OR REPLACE FUNCTION public.refresh_assignment_stats()
+RETURNS void
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    r public.submissions;
+BEGIN
+    DELETE FROM public.assignment_stats;
+    FOR r IN SELECT * FROM public.submissions LOOP
+        PERFORM public._assignment_stats_apply(r, 1);
+    END LOOP;
+END;
+$$;
+
+-- Backfill existing rows
+SELECT public.refresh_assignment_stats();
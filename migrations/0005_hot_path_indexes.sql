@@ -0,0 +1,147 @@
+-- Indexes for the hot query patterns (routes in app/routes/grader.py and
+-- app/utils/pg_reads.py):
+--   dashboards      tool = 'grader' AND institution_id = $1 AND course_id = $2
+--                   ORDER BY submission_time / created_at DESC LIMIT 300
+--   review queue    pending AND NOT reviewed, same scope, newest first
+--   release scans   pending AND release_time < now(); ready_to_post = false
+--   lookups         submission_id, assignment slug / title
+--
+-- The scope indexes only help once the legacy NULL scopes are gone and the
+-- queries use plain equality (0006_backfill_scopes.sql).
+--
+-- Plain CREATE INDEX, inside the migration's transaction: it holds off writes
+-- to the table while it builds, which is seconds at this data size. On a big
+-- table run the same statement by hand with CONCURRENTLY first; IF NOT EXISTS
+-- then makes this a no-op.
+
+-- Creates idx unless one of cols is missing (older projects lack some
+-- columns; skip rather than fail). Temporary: gone when the session ends.
+CREATE OR REPLACE FUNCTION pg_temp.ensure_index(idx text, tbl regclass, cols text[], spec text, pred text DEFAULT NULL)
+RETURNS void
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    missing text;
+BEGIN
+    SELECT c INTO missing
+    FROM unnest(cols) AS c
+    WHERE NOT EXISTS (
+        SELECT 1 FROM pg_attribute
+        WHERE attrelid = tbl AND attname = c AND attnum > 0 AND NOT attisdropped
+    )
+    LIMIT 1;
+    IF missing IS NOT NULL THEN
+        RAISE NOTICE 'skipping %: %.% does not exist', idx, tbl, missing;
+        RETURN;
+    END IF;
+    EXECUTE format(
+        'CREATE INDEX IF NOT EXISTS %I ON %s (%s)%s',
+        idx, tbl, spec, CASE WHEN pred IS NULL THEN '' ELSE ' WHERE ' || pred END
+    );
+END;
+$$;
+
+-- Creates idx on (col) unless some index already leads with col (e.g. the primary key).
+CREATE OR REPLACE FUNCTION pg_temp.ensure_lookup_index(idx text, tbl regclass, col text)
+RETURNS void
+LANGUAGE plpgsql
+AS $$
+BEGIN
+    IF EXISTS (
+        SELECT 1
+        FROM pg_index i
+        JOIN pg_attribute a ON a.attrelid = i.indrelid AND a.attnum = i.indkey[0]
+        WHERE i.indrelid = tbl AND a.attname = col
+    ) THEN
+        RETURN;
+    END IF;
+    PERFORM pg_temp.ensure_index(idx, tbl, ARRAY[col], quote_ident(col));
+END;
+$$;
+
+-- ---------- submissions ----------
+-- Scoped dashboard listing, newest first
+SELECT pg_temp.ensure_index(
+    'submissions_scope_time_idx', 'public.submissions',
+    ARRAY['tool', 'institution_id', 'course_id', 'submission_time', 'submission_id'],
+    'tool, institution_id, course_id, submission_time DESC, submission_id'
+);
+-- Superuser listing (no scope filter)
+SELECT pg_temp.ensure_index(
+    'submissions_tool_time_idx', 'public.submissions',
+    ARRAY['tool', 'submission_time'],
+    'tool, submission_time DESC'
+);
+-- Review queue: only the unreviewed rows are indexed
+SELECT pg_temp.ensure_index(
+    'submissions_review_queue_idx', 'public.submissions',
+    ARRAY['institution_id', 'course_id', 'submission_time', 'pending', 'reviewed'],
+    'institution_id, course_id, submission_time DESC',
+    'pending = true AND reviewed = false'
+);
+-- /release-pending
+SELECT pg_temp.ensure_index(
+    'submissions_release_due_idx', 'public.submissions',
+    ARRAY['release_time', 'pending'],
+    'release_time',
+    'pending = true'
+);
+-- /run-delay-checker
+SELECT pg_temp.ensure_index(
+    'submissions_not_ready_idx', 'public.submissions',
+    ARRAY['release_time', 'ready_to_post'],
+    'release_time',
+    'ready_to_post = false'
+);
+-- Stats, export and NoMas fallbacks filter by title
+SELECT pg_temp.ensure_index(
+    'submissions_tool_title_idx', 'public.submissions',
+    ARRAY['tool', 'assignment_title'],
+    'tool, assignment_title'
+);
+SELECT pg_temp.ensure_lookup_index('submissions_submission_id_idx', 'public.submissions', 'submission_id');
+
+-- ---------- assignments ----------
+SELECT pg_temp.ensure_index(
+    'assignments_scope_created_idx', 'public.assignments',
+    ARRAY['tool', 'institution_id', 'course_id', 'created_at'],
+    'tool, institution_id, course_id, created_at DESC'
+);
+SELECT pg_temp.ensure_index(
+    'assignments_tool_created_idx', 'public.assignments',
+    ARRAY['tool', 'created_at'],
+    'tool, created_at DESC'
+);
+SELECT pg_temp.ensure_index(
+    'assignments_tool_slug_idx', 'public.assignments',
+    ARRAY['tool', 'slug'],
+    'tool, slug'
+);
+SELECT pg_temp.ensure_index(
+    'assignments_tool_title_idx', 'public.assignments',
+    ARRAY['tool', 'assignment_title'],
+    'tool, assignment_title'
+);
+SELECT pg_temp.ensure_index(
+    'assignments_tool_display_title_idx', 'public.assignments',
+    ARRAY['tool', 'display_title'],
+    'tool, display_title'
+);
+
+-- ---------- NoMas / USCIS ----------
+SELECT pg_temp.ensure_index(
+    'uscis_assignments_scope_created_idx', 'public.uscis_assignments',
+    ARRAY['institution_id', 'course_id', 'created_at'],
+    'institution_id, course_id, created_at DESC'
+);
+SELECT pg_temp.ensure_index(
+    'uscis_submissions_submitted_at_idx', 'public.uscis_submissions',
+    ARRAY['submitted_at'],
+    'submitted_at DESC'
+);
+SELECT pg_temp.ensure_index(
+    'uscis_submissions_submission_time_idx', 'public.uscis_submissions',
+    ARRAY['submission_time'],
+    'submission_time DESC'
+);
+SELECT pg_temp.ensure_lookup_index('uscis_submissions_submission_id_idx', 'public.uscis_submissions', 'submission_id');
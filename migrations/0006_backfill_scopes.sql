@@ -0,0 +1,129 @@
+-- Give legacy rows a scope so dashboards can filter with plain equality.
+--
+-- Rows with a NULL institution_id / course_id used to be shown to every
+-- institution and course, which is why the routes filtered with
+-- `institution_id = X OR institution_id IS NULL`: an OR the scope indexes in
+-- 0005 can't serve in order. After this migration the routes use equality,
+-- and a row that is still NULL is only visible to superusers.
+--
+-- 1. A submission takes the scope of its assignment (same title and tool),
+--    one column at a time, but only when every scoped assignment with that
+--    title has the same (institution_id, course_id). Titles like "Essay 1"
+--    exist in many tenants, and guessing would move one tenant's students
+--    into another's dashboards; those rows stay NULL and are reported.
+-- 2. Whatever is still NULL takes rubiqs.legacy_institution_id /
+--    rubiqs.legacy_course_id when they are set (python -m app.utils.migrate
+--    sets them from LEGACY_INSTITUTION_ID / LEGACY_COURSE_ID). Only set
+--    those when every legacy row belongs to one tenant.
+-- The counts left NULL are reported as NOTICEs.
+--
+-- The assignment_stats trigger (0004) moves each row's contribution to its
+-- new scope as it is updated.
+
+UPDATE public.submissions s
+SET institution_id = coalesce(s.institution_id, a.institution_id),
+    course_id      = coalesce(s.course_id, a.course_id)
+FROM (
+    SELECT assignment_title, tool,
+           (array_agg(institution_id))[1] AS institution_id,
+           (array_agg(course_id))[1]      AS course_id
+    FROM public.assignments
+    WHERE institution_id IS NOT NULL OR course_id IS NOT NULL
+    GROUP BY assignment_title, tool
+    HAVING count(DISTINCT (institution_id, course_id)) = 1
+) a
+WHERE a.assignment_title = s.assignment_title
+  AND a.tool = coalesce(s.tool, 'grader')
+  AND (s.institution_id IS NULL AND a.institution_id IS NOT NULL
+       OR s.course_id IS NULL AND a.course_id IS NOT NULL);
+
+DO $$
+DECLARE
+    n      bigint;
+    titles text;
+BEGIN
+    SELECT count(*), string_agg(DISTINCT s.assignment_title, ', ')
+    INTO n, titles
+    FROM public.submissions s
+    WHERE (s.institution_id IS NULL OR s.course_id IS NULL)
+      AND (s.assignment_title, coalesce(s.tool, 'grader')) IN (
+          SELECT assignment_title, tool FROM public.assignments
+          WHERE institution_id IS NOT NULL OR course_id IS NOT NULL
+          GROUP BY assignment_title, tool
+          HAVING count(DISTINCT (institution_id, course_id)) > 1
+      );
+    IF n > 0 THEN
+        RAISE NOTICE 'submissions: % row(s) not backfilled, title used in several scopes: %', n, left(titles, 500);
+    END IF;
+END;
+$$;
+
+-- Older projects have no scope columns on uscis_submissions
+DO $$
+DECLARE
+    n      bigint;
+    titles text;
+BEGIN
+    IF (SELECT count(*) FROM information_schema.columns
+        WHERE table_schema = 'public' AND table_name = 'uscis_submissions'
+          AND column_name IN ('institution_id', 'course_id')) = 2 THEN
+        UPDATE public.uscis_submissions s
+        SET institution_id = coalesce(s.institution_id, a.institution_id),
+            course_id      = coalesce(s.course_id, a.course_id)
+        FROM (
+            SELECT assignment_title,
+                   (array_agg(institution_id))[1] AS institution_id,
+                   (array_agg(course_id))[1]      AS course_id
+            FROM public.uscis_assignments
+            WHERE institution_id IS NOT NULL OR course_id IS NOT NULL
+            GROUP BY assignment_title
+            HAVING count(DISTINCT (institution_id, course_id)) = 1
+        ) a
+        WHERE a.assignment_title = s.assignment_title
+          AND (s.institution_id IS NULL AND a.institution_id IS NOT NULL
+               OR s.course_id IS NULL AND a.course_id IS NOT NULL);
+
+        SELECT count(*), string_agg(DISTINCT s.assignment_title, ', ')
+        INTO n, titles
+        FROM public.uscis_submissions s
+        WHERE (s.institution_id IS NULL OR s.course_id IS NULL)
+          AND s.assignment_title IN (
+              SELECT assignment_title FROM public.uscis_assignments
+              WHERE institution_id IS NOT NULL OR course_id IS NOT NULL
+              GROUP BY assignment_title
+              HAVING count(DISTINCT (institution_id, course_id)) > 1
+          );
+        IF n > 0 THEN
+            RAISE NOTICE 'uscis_submissions: % row(s) not backfilled, title used in several scopes: %', n, left(titles, 500);
+        END IF;
+    END IF;
+END;
+$$;
+
+DO $$
+DECLARE
+    legacy_inst   text := NULLIF(current_setting('rubiqs.legacy_institution_id', true), '');
+    legacy_course text := NULLIF(current_setting('rubiqs.legacy_course_id', true), '');
+    tbl           text;
+    col           text;
+    val           text;
+    remaining     bigint;
+BEGIN
+    FOREACH tbl IN ARRAY ARRAY['assignments', 'submissions', 'uscis_assignments', 'uscis_submissions'] LOOP
+        FOREACH col IN ARRAY ARRAY['institution_id', 'course_id'] LOOP
+            CONTINUE WHEN NOT EXISTS (
+                SELECT 1 FROM information_schema.columns
+                WHERE table_schema = 'public' AND table_name = tbl AND column_name = col
+            );
+            val := CASE col WHEN 'institution_id' THEN legacy_inst ELSE legacy_course END;
+            IF val IS NOT NULL THEN
+                EXECUTE format('UPDATE public.%I SET %I = %L WHERE %I IS NULL', tbl, col, val, col);
+            END IF;
+            EXECUTE format('SELECT count(*) FROM public.%I WHERE %I IS NULL', tbl, col) INTO remaining;
+            IF remaining > 0 THEN
+                RAISE NOTICE '%.% still NULL in % row(s) (superusers only)', tbl, col, remaining;
+            END IF;
+        END LOOP;
+    END LOOP;
+END;
+$$;
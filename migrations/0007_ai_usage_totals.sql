@@ -0,0 +1,69 @@
+-- Token usage read back from the persisted ledger (AI_USAGE_SINK=supabase,
+-- app/utils/ai_usage_logger.py), so monthly quotas and /grader/ai-usage see
+-- every worker's calls, not just the process that serves the request.
+--
+-- The table is written by the app's service client only. It was created by
+-- hand on existing projects; this matches the SQLite sink's schema.
+CREATE TABLE IF NOT EXISTS public.ai_usage_events (
+    ts                timestamptz NOT NULL,
+    kind              text        NOT NULL,
+    user_id           text,
+    institution_id    text,
+    tool              text,
+    model             text,
+    assignment_id     text,
+    submission_id     text,
+    prompt_tokens     integer,
+    completion_tokens integer,
+    total_tokens      integer,
+    latency_ms        real,
+    score             real
+);
+
+-- No policies: PostgREST callers other than the service role see nothing
+ALTER TABLE public.ai_usage_events ENABLE ROW LEVEL SECURITY;
+
+CREATE INDEX IF NOT EXISTS ai_usage_events_inst_ts_idx
+    ON public.ai_usage_events (institution_id, ts)
+    WHERE kind = 'completion';
+
+-- Per-(institution, assignment) totals of completions in [p_since, p_until)
+-- (no upper bound when NULL; all institutions when p_institution_id is NULL).
+-- ts may be text on older projects, hence the cast.
+CREATE OR REPLACE FUNCTION public.ai_usage_totals(
+    p_institution_id text,
+    p_since timestamptz,
+    p_until timestamptz DEFAULT NULL
+)
+RETURNS TABLE (
+    institution_id    text,
+    assignment_id     text,
+    requests          bigint,
+    prompt_tokens     bigint,
+    completion_tokens bigint,
+    total_tokens      bigint,
+    latency_ms_avg    numeric,
+    latency_ms_max    real
+)
+LANGUAGE sql
+STABLE
+SET search_path = public
+AS $$
+    SELECT e.institution_id,
+           e.assignment_id,
+           count(*),
+           coalesce(sum(e.prompt_tokens), 0),
+           coalesce(sum(e.completion_tokens), 0),
+           coalesce(sum(e.total_tokens), 0),
+           round(coalesce(avg(e.latency_ms), 0)::numeric, 1),
+           coalesce(max(e.latency_ms), 0)
+    FROM public.ai_usage_events e
+    WHERE e.kind = 'completion'
+      AND e.ts::timestamptz >= p_since
+      AND (p_until IS NULL OR e.ts::timestamptz < p_until)
+      AND (p_institution_id IS NULL OR e.institution_id = p_institution_id)
+    GROUP BY e.institution_id, e.assignment_id;
+$$;
+
+-- Billing data: the service client only, never /rpc for API callers
+REVOKE EXECUTE ON FUNCTION public.ai_usage_totals(text, timestamptz, timestamptz) FROM PUBLIC, anon, authenticated;
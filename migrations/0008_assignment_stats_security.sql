@@ -0,0 +1,132 @@
+-- Hardening for 0004_assignment_stats.sql.
+--
+-- 1. The stats functions are internal. PostgREST exposes every function in
+--    public at /rpc/... to anyone with EXECUTE (PUBLIC by default), which let
+--    any API caller add arbitrary deltas through the SECURITY DEFINER
+--    _assignment_stats_apply, or wipe the table and rebuild it from only the
+--    rows their RLS shows them via refresh_assignment_stats(). EXECUTE is now
+--    revoked from API roles; the trigger runs as the table owner instead.
+-- 2. assignment_stats gets RLS. A caller reads a summary row only if RLS lets
+--    them see at least one submission it was built from, so the table follows
+--    whatever the submissions policies allow. Nobody writes it through the API.
+-- 3. A row's histogram bucket depends on its assignment's total_points, read
+--    when the row is counted. Editing the total (or adding / removing the
+--    assignment row it is read from) used to leave older contributions in the
+--    old buckets, so later -1s hit other buckets and the histogram drifted,
+--    even below zero. Those changes now rebuild that title's stats.
+
+-- ---------- 1. internal functions ----------
+CREATE OR REPLACE FUNCTION public._assignment_stats_trigger()
+RETURNS trigger
+LANGUAGE plpgsql
+SECURITY DEFINER
+SET search_path = public
+AS $$
+BEGIN
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        PERFORM public._assignment_stats_apply(OLD, -1);
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        PERFORM public._assignment_stats_apply(NEW, 1);
+    END IF;
+    RETURN NULL;
+END;
+$$;
+
+-- Rebuilds one assignment title's rows (every scope) from all its submissions
+CREATE OR REPLACE FUNCTION public._assignment_stats_rebuild(p_title text)
+RETURNS void
+LANGUAGE plpgsql
+SECURITY DEFINER
+SET search_path = public
+AS $$
+DECLARE
+    r public.submissions;
+BEGIN
+    IF p_title IS NULL THEN
+        RETURN;
+    END IF;
+    DELETE FROM public.assignment_stats WHERE assignment_title = p_title;
+    FOR r IN SELECT * FROM public.submissions s WHERE s.assignment_title = p_title LOOP
+        PERFORM public._assignment_stats_apply(r, 1);
+    END LOOP;
+END;
+$$;
+
+-- SECURITY DEFINER so a rebuild always sees every submission, not the caller's share
+CREATE OR REPLACE FUNCTION public.refresh_assignment_stats()
+RETURNS void
+LANGUAGE plpgsql
+SECURITY DEFINER
+SET search_path = public
+AS $$
+DECLARE
+    r public.submissions;
+BEGIN
+    DELETE FROM public.assignment_stats;
+    FOR r IN SELECT * FROM public.submissions LOOP
+        PERFORM public._assignment_stats_apply(r, 1);
+    END LOOP;
+END;
+$$;
+
+REVOKE EXECUTE ON FUNCTION public._assignment_stats_apply(public.submissions, integer) FROM PUBLIC, anon, authenticated;
+REVOKE EXECUTE ON FUNCTION public._assignment_stats_trigger() FROM PUBLIC, anon, authenticated;
+REVOKE EXECUTE ON FUNCTION public._assignment_stats_rebuild(text) FROM PUBLIC, anon, authenticated;
+REVOKE EXECUTE ON FUNCTION public.refresh_assignment_stats() FROM PUBLIC, anon, authenticated;
+
+-- ---------- 2. RLS on the summary ----------
+ALTER TABLE public.assignment_stats ENABLE ROW LEVEL SECURITY;
+REVOKE INSERT, UPDATE, DELETE, TRUNCATE ON public.assignment_stats FROM anon, authenticated;
+
+DROP POLICY IF EXISTS assignment_stats_read ON public.assignment_stats;
+CREATE POLICY assignment_stats_read ON public.assignment_stats
+    FOR SELECT
+    TO anon, authenticated
+    USING (
+        -- Evaluated with the caller's own RLS on submissions
+        EXISTS (
+            SELECT 1 FROM public.submissions s
+            WHERE s.assignment_title = assignment_stats.assignment_title
+              AND coalesce(s.institution_id::text, '') = assignment_stats.institution_key
+              AND coalesce(s.course_id::text, '') = assignment_stats.course_key
+        )
+    );
+
+-- ---------- 3. total_points changes ----------
+CREATE OR REPLACE FUNCTION public._assignment_stats_assignments_trigger()
+RETURNS trigger
+LANGUAGE plpgsql
+SECURITY DEFINER
+SET search_path = public
+AS $$
+BEGIN
+    IF TG_OP = 'UPDATE'
+       AND NEW.total_points IS NOT DISTINCT FROM OLD.total_points
+       AND NEW.assignment_title IS NOT DISTINCT FROM OLD.assignment_title
+       AND NEW.tool IS NOT DISTINCT FROM OLD.tool
+       AND NEW.created_at IS NOT DISTINCT FROM OLD.created_at THEN
+        RETURN NULL;
+    END IF;
+    IF TG_OP IN ('UPDATE', 'DELETE') AND coalesce(OLD.tool, '') = 'grader' THEN
+        PERFORM public._assignment_stats_rebuild(OLD.assignment_title);
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') AND coalesce(NEW.tool, '') = 'grader'
+       AND NOT (TG_OP = 'UPDATE' AND coalesce(OLD.tool, '') = 'grader'
+                AND NEW.assignment_title IS NOT DISTINCT FROM OLD.assignment_title) THEN
+        PERFORM public._assignment_stats_rebuild(NEW.assignment_title);
+    END IF;
+    RETURN NULL;
+END;
+$$;
+
+REVOKE EXECUTE ON FUNCTION public._assignment_stats_assignments_trigger() FROM PUBLIC, anon, authenticated;
+
+DROP TRIGGER IF EXISTS assignments_assignment_stats ON public.assignments;
+CREATE TRIGGER assignments_assignment_stats
+    AFTER INSERT OR DELETE OR UPDATE OF total_points, assignment_title, tool, created_at
+    ON public.assignments
+    FOR EACH ROW EXECUTE FUNCTION public._assignment_stats_assignments_trigger();
+
+-- Undo any drift from totals edited since 0004
+SELECT public.refresh_assignment_stats();